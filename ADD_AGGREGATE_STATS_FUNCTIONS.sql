@@ -0,0 +1,127 @@
+-- =====================================================
+-- 📊 SERVER-SIDE STORAGE & QUALITY STATISTICS
+-- =====================================================
+-- Used by: backend/app/services/storage_cleanup.py (get_storage_stats)
+--          backend/app/services/data_quality_monitor.py
+-- Each function returns one small JSON document computed in Postgres,
+-- so response size and time stay flat as a user's history grows.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+-- =====================================================
+-- INDEXES
+-- =====================================================
+
+-- Storage stats: index-only scan over one user's documents
+CREATE INDEX IF NOT EXISTS idx_documents_user_created_size
+ON documents(user_id, created_at) INCLUDE (file_size);
+
+-- Quality reports: one user's logs inside a time window
+CREATE INDEX IF NOT EXISTS idx_quality_logs_user_created
+ON invoice_quality_logs(user_id, created_at DESC)
+INCLUDE (severity, issue_type, invoice_id);
+
+
+-- =====================================================
+-- get_storage_stats
+-- =====================================================
+CREATE OR REPLACE FUNCTION get_storage_stats(user_id_param UUID)
+RETURNS JSON AS $$
+  SELECT json_build_object(
+    'total_documents', COUNT(*),
+    'total_storage_bytes', COALESCE(SUM(file_size), 0),
+    'oldest_document', MIN(created_at),
+    'newest_document', MAX(created_at)
+  )
+  FROM documents
+  WHERE user_id = user_id_param;
+$$ LANGUAGE sql STABLE;
+
+
+-- =====================================================
+-- get_quality_summary
+-- =====================================================
+-- Severity counts and per-issue-type counts since since_param
+CREATE OR REPLACE FUNCTION get_quality_summary(
+  user_id_param UUID,
+  since_param TIMESTAMPTZ
+)
+RETURNS JSON AS $$
+  WITH window_logs AS (
+    SELECT severity, issue_type
+    FROM invoice_quality_logs
+    WHERE user_id = user_id_param
+      AND created_at >= since_param
+  ),
+  by_type AS (
+    SELECT issue_type, COUNT(*) AS issue_count
+    FROM window_logs
+    GROUP BY issue_type
+  )
+  SELECT json_build_object(
+    'critical', (SELECT COUNT(*) FROM window_logs WHERE severity = 'critical'),
+    'warning', (SELECT COUNT(*) FROM window_logs WHERE severity = 'warning'),
+    'info', (SELECT COUNT(*) FROM window_logs WHERE severity = 'info'),
+    'issue_breakdown', (
+      SELECT COALESCE(json_object_agg(issue_type, issue_count), '{}'::json)
+      FROM by_type
+    )
+  );
+$$ LANGUAGE sql STABLE;
+
+
+-- =====================================================
+-- get_problematic_invoices
+-- =====================================================
+-- Top invoices by (critical issues, total issues) since since_param,
+-- each with its most recent issues (at most issues_per_invoice)
+CREATE OR REPLACE FUNCTION get_problematic_invoices(
+  user_id_param UUID,
+  since_param TIMESTAMPTZ,
+  limit_param INTEGER DEFAULT 10,
+  issues_per_invoice INTEGER DEFAULT 10
+)
+RETURNS JSON AS $$
+  WITH window_logs AS (
+    SELECT invoice_id, document_id, severity, issue_type, description, created_at,
+           ROW_NUMBER() OVER (PARTITION BY invoice_id ORDER BY created_at DESC) AS recency
+    FROM invoice_quality_logs
+    WHERE user_id = user_id_param
+      AND created_at >= since_param
+      AND invoice_id IS NOT NULL
+  ),
+  ranked AS (
+    SELECT invoice_id,
+           (ARRAY_AGG(document_id ORDER BY created_at DESC))[1] AS document_id,
+           COUNT(*) AS issue_count,
+           COUNT(*) FILTER (WHERE severity = 'critical') AS critical_count,
+           MAX(created_at) AS last_issue
+    FROM window_logs
+    GROUP BY invoice_id
+    ORDER BY critical_count DESC, issue_count DESC
+    LIMIT limit_param
+  )
+  SELECT COALESCE(json_agg(json_build_object(
+    'invoice_id', r.invoice_id,
+    'document_id', r.document_id,
+    'issue_count', r.issue_count,
+    'critical_count', r.critical_count,
+    'last_issue', r.last_issue,
+    'issues', (
+      SELECT json_agg(json_build_object(
+        'type', w.issue_type,
+        'severity', w.severity,
+        'description', w.description
+      ) ORDER BY w.created_at DESC)
+      FROM window_logs w
+      WHERE w.invoice_id = r.invoice_id AND w.recency <= issues_per_invoice
+    )
+  ) ORDER BY r.critical_count DESC, r.issue_count DESC), '[]'::json)
+  FROM ranked r;
+$$ LANGUAGE sql STABLE;
+
+REVOKE ALL ON FUNCTION get_storage_stats(UUID) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION get_quality_summary(UUID, TIMESTAMPTZ) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION get_problematic_invoices(UUID, TIMESTAMPTZ, INTEGER, INTEGER) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION get_storage_stats(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION get_quality_summary(UUID, TIMESTAMPTZ) TO service_role;
+GRANT EXECUTE ON FUNCTION get_problematic_invoices(UUID, TIMESTAMPTZ, INTEGER, INTEGER) TO service_role;
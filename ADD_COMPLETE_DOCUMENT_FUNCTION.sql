@@ -0,0 +1,44 @@
+-- =====================================================
+-- ✅ COMPLETE DOCUMENT PROCESSING IN ONE ROUND TRIP
+-- =====================================================
+-- Used by: backend/app/api/documents.py (_process_document)
+-- Replaces 3 HTTP round trips after an invoice is saved (subscription
+-- select, subscription update, document status update) with 1 RPC, and
+-- makes the scan counter increment atomic.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+CREATE OR REPLACE FUNCTION complete_document_processing(
+  document_id_param UUID,
+  user_id_param UUID,
+  scans_to_add INTEGER DEFAULT 1
+)
+RETURNS JSON AS $$
+DECLARE
+  documents_updated INTEGER;
+  new_usage INTEGER;
+BEGIN
+  UPDATE documents
+  SET status = 'completed',
+      updated_at = NOW()
+  WHERE id = document_id_param;
+  GET DIAGNOSTICS documents_updated = ROW_COUNT;
+
+  -- Anonymous uploads have no subscription to charge
+  IF user_id_param IS NOT NULL THEN
+    UPDATE subscriptions
+    SET scans_used_this_period = COALESCE(scans_used_this_period, 0) + scans_to_add
+    WHERE user_id = user_id_param
+    RETURNING scans_used_this_period INTO new_usage;
+  END IF;
+
+  RETURN json_build_object(
+    'document_updated', documents_updated > 0,
+    'usage_incremented', new_usage IS NOT NULL,
+    'scans_used', new_usage
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the backend (service role) may charge usage
+REVOKE ALL ON FUNCTION complete_document_processing(UUID, UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION complete_document_processing(UUID, UUID, INTEGER) TO service_role;
@@ -0,0 +1,250 @@
+-- =====================================================
+-- 🗂️ PER-USER FIELD REGISTRY (DYNAMIC EXPORT COLUMNS)
+-- =====================================================
+-- Used by: backend/app/services/field_registry.py (bulk Excel and
+-- columnar exports)
+-- Records every field a user's invoices carry, with its fill count and
+-- per-type value counts:
+--   scope 'invoice'   - table columns
+--   scope 'raw'       - raw_extracted_data keys
+--   scope 'line_item' - keys of every line item
+-- The registry is kept current by a trigger on invoices, so exporters read
+-- it instead of rescanning every invoice to discover columns and types.
+--
+-- Type rules are mirrored in Python (FieldRegistry); keep them in sync.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+-- =====================================================
+-- STEP 1: REGISTRY TABLES
+-- =====================================================
+CREATE TABLE IF NOT EXISTS invoice_field_registry (
+  user_id UUID NOT NULL,
+  scope TEXT NOT NULL CHECK (scope IN ('invoice', 'raw', 'line_item')),
+  field TEXT NOT NULL,
+  fill_count INTEGER NOT NULL DEFAULT 0,      -- non-null scalar values
+  integer_count INTEGER NOT NULL DEFAULT 0,
+  decimal_count INTEGER NOT NULL DEFAULT 0,
+  boolean_count INTEGER NOT NULL DEFAULT 0,
+  date_count INTEGER NOT NULL DEFAULT 0,      -- strings shaped like a date
+  datetime_count INTEGER NOT NULL DEFAULT 0,  -- strings shaped like an ISO timestamp
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (user_id, scope, field)
+);
+
+CREATE TABLE IF NOT EXISTS invoice_field_registry_totals (
+  user_id UUID PRIMARY KEY,
+  invoice_count INTEGER NOT NULL DEFAULT 0,
+  line_item_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Backend-only tables
+ALTER TABLE invoice_field_registry ENABLE ROW LEVEL SECURITY;
+ALTER TABLE invoice_field_registry_totals ENABLE ROW LEVEL SECURITY;
+
+
+-- =====================================================
+-- STEP 2: HELPERS
+-- =====================================================
+-- JSON columns may be stored as JSONB or as JSON text; bad text counts as empty
+CREATE OR REPLACE FUNCTION invoice_field_registry_json(value JSONB)
+RETURNS JSONB AS $$
+BEGIN
+  IF jsonb_typeof(value) = 'string' THEN
+    RETURN (value #>> '{}')::jsonb;
+  END IF;
+  RETURN value;
+EXCEPTION WHEN others THEN
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Per-field deltas for one set of (field, value) pairs; nested values are skipped.
+-- The CASEs keep the numeric casts away from non-number values.
+CREATE OR REPLACE FUNCTION invoice_field_registry_upsert(
+  p_user_id UUID, p_scope TEXT, pairs JSONB, sign INTEGER
+)
+RETURNS VOID AS $$
+  INSERT INTO invoice_field_registry AS t
+    (user_id, scope, field, fill_count, integer_count, decimal_count,
+     boolean_count, date_count, datetime_count)
+  SELECT p_user_id, p_scope, p.key,
+         sign * COUNT(*),
+         sign * COUNT(*) FILTER (WHERE CASE WHEN jsonb_typeof(p.value) = 'number'
+                                   THEN (p.value #>> '{}')::numeric = trunc((p.value #>> '{}')::numeric) END),
+         sign * COUNT(*) FILTER (WHERE CASE WHEN jsonb_typeof(p.value) = 'number'
+                                   THEN (p.value #>> '{}')::numeric <> trunc((p.value #>> '{}')::numeric) END),
+         sign * COUNT(*) FILTER (WHERE jsonb_typeof(p.value) = 'boolean'),
+         sign * COUNT(*) FILTER (WHERE jsonb_typeof(p.value) = 'string'
+                                   AND (p.value #>> '{}') ~ '^(\d{4}-\d{2}-\d{2}|\d{2}[/.-]\d{2}[/.-]\d{4})$'),
+         sign * COUNT(*) FILTER (WHERE jsonb_typeof(p.value) = 'string'
+                                   AND (p.value #>> '{}') ~ '^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}')
+  FROM jsonb_to_recordset(pairs) AS p(key TEXT, value JSONB)
+  WHERE jsonb_typeof(p.value) IN ('string', 'number', 'boolean')
+  GROUP BY p.key
+  -- Same row lock order in every call, so concurrent upserts for one user can't deadlock
+  ORDER BY p.key
+  ON CONFLICT (user_id, scope, field) DO UPDATE SET
+    fill_count = t.fill_count + EXCLUDED.fill_count,
+    integer_count = t.integer_count + EXCLUDED.integer_count,
+    decimal_count = t.decimal_count + EXCLUDED.decimal_count,
+    boolean_count = t.boolean_count + EXCLUDED.boolean_count,
+    date_count = t.date_count + EXCLUDED.date_count,
+    datetime_count = t.datetime_count + EXCLUDED.datetime_count,
+    updated_at = NOW();
+$$ LANGUAGE sql;
+
+
+-- =====================================================
+-- STEP 3: APPLY ONE ROW (+1 add, -1 remove)
+-- =====================================================
+CREATE OR REPLACE FUNCTION invoice_field_registry_apply(r invoices, sign INTEGER)
+RETURNS VOID AS $$
+DECLARE
+  doc JSONB := to_jsonb(r);
+  raw JSONB := invoice_field_registry_json(doc -> 'raw_extracted_data');
+  items JSONB := invoice_field_registry_json(doc -> 'line_items');
+  item_count INTEGER;
+BEGIN
+  IF r.user_id IS NULL THEN
+    RETURN;
+  END IF;
+  IF items IS NULL OR jsonb_typeof(items) <> 'array' THEN
+    items := '[]'::jsonb;
+  END IF;
+  item_count := (SELECT COUNT(*) FROM jsonb_array_elements(items) e WHERE jsonb_typeof(e) = 'object');
+
+  INSERT INTO invoice_field_registry_totals AS t (user_id, invoice_count, line_item_count)
+  VALUES (r.user_id, sign, sign * item_count)
+  ON CONFLICT (user_id) DO UPDATE SET
+    invoice_count = t.invoice_count + EXCLUDED.invoice_count,
+    line_item_count = t.line_item_count + EXCLUDED.line_item_count,
+    updated_at = NOW();
+
+  -- Table columns (the JSON documents and search columns are not export fields)
+  PERFORM invoice_field_registry_upsert(r.user_id, 'invoice', (
+    SELECT COALESCE(jsonb_agg(jsonb_build_object('key', key, 'value', value)), '[]'::jsonb)
+    FROM jsonb_each(doc - ARRAY['raw_extracted_data', 'line_items', 'search_text', 'search_vector'])
+  ), sign);
+
+  -- raw_extracted_data, minus AI bookkeeping keys
+  IF jsonb_typeof(raw) = 'object' THEN
+    PERFORM invoice_field_registry_upsert(r.user_id, 'raw', (
+      SELECT COALESCE(jsonb_agg(jsonb_build_object('key', key, 'value', value)), '[]'::jsonb)
+      FROM jsonb_each(raw)
+      WHERE key NOT LIKE '%\_confidence'
+        AND key NOT IN ('_extraction_metadata', '_formatting_metadata')
+    ), sign);
+  END IF;
+
+  -- Every line item's keys (grouped, so one upsert per key)
+  PERFORM invoice_field_registry_upsert(r.user_id, 'line_item', (
+    SELECT COALESCE(jsonb_agg(jsonb_build_object('key', kv.key, 'value', kv.value)), '[]'::jsonb)
+    FROM jsonb_array_elements(items) e, jsonb_each(e) kv
+    WHERE jsonb_typeof(e) = 'object'
+  ), sign);
+
+  IF sign < 0 THEN
+    DELETE FROM invoice_field_registry WHERE user_id = r.user_id AND fill_count <= 0;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- =====================================================
+-- STEP 4: TRIGGER
+-- =====================================================
+CREATE OR REPLACE FUNCTION invoices_field_registry_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM invoice_field_registry_apply(OLD, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM invoice_field_registry_apply(NEW, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS invoices_field_registry_insert_delete ON invoices;
+CREATE TRIGGER invoices_field_registry_insert_delete
+AFTER INSERT OR DELETE ON invoices
+FOR EACH ROW EXECUTE FUNCTION invoices_field_registry_trigger();
+
+-- Any column can add or remove a field; identical rewrites are skipped
+DROP TRIGGER IF EXISTS invoices_field_registry_update ON invoices;
+CREATE TRIGGER invoices_field_registry_update
+AFTER UPDATE ON invoices
+FOR EACH ROW
+WHEN (OLD.* IS DISTINCT FROM NEW.*)
+EXECUTE FUNCTION invoices_field_registry_trigger();
+
+
+-- =====================================================
+-- STEP 5: REBUILD (backfill now; repair if the registry ever drifts)
+-- =====================================================
+CREATE OR REPLACE FUNCTION rebuild_invoice_field_registry(user_id_param UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  r invoices;
+  applied INTEGER := 0;
+BEGIN
+  DELETE FROM invoice_field_registry WHERE user_id_param IS NULL OR user_id = user_id_param;
+  DELETE FROM invoice_field_registry_totals WHERE user_id_param IS NULL OR user_id = user_id_param;
+
+  FOR r IN SELECT * FROM invoices WHERE user_id_param IS NULL OR user_id = user_id_param LOOP
+    PERFORM invoice_field_registry_apply(r, 1);
+    applied := applied + 1;
+  END LOOP;
+  RETURN applied;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_invoice_field_registry();
+
+
+-- =====================================================
+-- STEP 6: get_invoice_field_registry
+-- =====================================================
+-- data_type: boolean / integer / decimal / date / datetime when every
+-- value agrees, string otherwise. fill_rate is per invoice for the
+-- 'invoice' and 'raw' scopes, per line item for 'line_item'.
+CREATE OR REPLACE FUNCTION get_invoice_field_registry(user_id_param UUID)
+RETURNS JSON AS $$
+  SELECT json_build_object(
+    'invoice_count', COALESCE(t.invoice_count, 0),
+    'line_item_count', COALESCE(t.line_item_count, 0),
+    'fields', (
+      SELECT COALESCE(json_agg(json_build_object(
+        'scope', f.scope,
+        'field', f.field,
+        'data_type', CASE
+          WHEN f.boolean_count = f.fill_count THEN 'boolean'
+          WHEN f.integer_count = f.fill_count THEN 'integer'
+          WHEN f.integer_count + f.decimal_count = f.fill_count THEN 'decimal'
+          WHEN f.date_count = f.fill_count THEN 'date'
+          WHEN f.datetime_count = f.fill_count THEN 'datetime'
+          ELSE 'string'
+        END,
+        'fill_count', f.fill_count,
+        'fill_rate', round(f.fill_count::numeric / GREATEST(
+          CASE WHEN f.scope = 'line_item' THEN t.line_item_count ELSE t.invoice_count END, 1), 4)
+      ) ORDER BY f.scope, f.field), '[]'::json)
+      FROM invoice_field_registry f
+      WHERE f.user_id = user_id_param AND f.fill_count > 0
+    )
+  )
+  FROM (SELECT 1) one
+  LEFT JOIN invoice_field_registry_totals t ON t.user_id = user_id_param;
+$$ LANGUAGE sql STABLE;
+
+REVOKE ALL ON FUNCTION get_invoice_field_registry(UUID) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION rebuild_invoice_field_registry(UUID) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION get_invoice_field_registry(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION rebuild_invoice_field_registry(UUID) TO service_role;
+
+-- =====================================================
+-- VERIFY
+-- =====================================================
+-- SELECT get_invoice_field_registry('<user-uuid>');
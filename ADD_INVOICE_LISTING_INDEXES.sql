@@ -0,0 +1,44 @@
+-- =====================================================
+-- 📄 INVOICE LISTING: KEYSET PAGINATION INDEXES
+-- =====================================================
+-- Used by: backend/app/services/invoice_listing.py (GET /api/invoices/)
+-- Pages are fetched with
+--   WHERE user_id = $1 AND (<sort>, id) after the cursor
+--   ORDER BY <sort> DESC NULLS LAST, id DESC LIMIT n + 1
+-- Each index below matches one sort exactly, so every page - first or
+-- five-hundredth - is a single short range scan with no sort step.
+-- Postgres scans these backwards for the ascending sorts.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+-- Default sort: newest uploads first
+-- (supersedes idx_invoices_user_date, which has no id tiebreaker)
+CREATE INDEX IF NOT EXISTS idx_invoices_user_created_id
+ON invoices(user_id, created_at DESC NULLS LAST, id DESC);
+
+-- Sort by invoice date
+CREATE INDEX IF NOT EXISTS idx_invoices_user_invoice_date_id
+ON invoices(user_id, invoice_date DESC NULLS LAST, id DESC);
+
+-- Sort by amount (idx_invoices_user_amount skips NULL amounts, which
+-- the listing still has to page through)
+CREATE INDEX IF NOT EXISTS idx_invoices_user_total_id
+ON invoices(user_id, total_amount DESC NULLS LAST, id DESC);
+
+-- Vendor substring filter (vendor=... is ILIKE '%term%')
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_invoices_vendor_trgm
+ON invoices USING gin (vendor_name gin_trgm_ops);
+
+ANALYZE invoices;
+
+-- =====================================================
+-- VERIFY: should show an Index Scan on idx_invoices_user_created_id
+-- and no Sort node
+-- =====================================================
+-- EXPLAIN ANALYZE
+-- SELECT id, created_at, vendor_name, total_amount
+-- FROM invoices
+-- WHERE user_id = '<user-uuid>'
+--   AND (created_at < '2025-10-01' OR (created_at = '2025-10-01' AND id < '<uuid>'))
+-- ORDER BY created_at DESC NULLS LAST, id DESC
+-- LIMIT 51;
@@ -0,0 +1,141 @@
+-- =====================================================
+-- 🔎 INVOICE SEARCH: FULL-TEXT + TRIGRAM INDEX
+-- =====================================================
+-- Used by: backend/app/services/invoice_search.py (GET /api/invoices/search)
+-- Searches vendor_name, invoice_number, vendor_gstin (weight A) and
+-- line-item descriptions (weight C). Every query word must match as a
+-- word prefix (tsvector) or fuzzily (pg_trgm word similarity).
+-- The search columns are maintained by a trigger, so nothing in the
+-- application writes them.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- =====================================================
+-- STEP 1: SEARCH COLUMNS
+-- =====================================================
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS search_text TEXT;
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+-- Flattened line-item descriptions (keys vary by extractor version)
+CREATE OR REPLACE FUNCTION invoice_line_item_text(items JSONB)
+RETURNS TEXT AS $$
+  SELECT COALESCE(string_agg(
+           COALESCE(elem->>'description', elem->>'item_name', elem->>'item', elem->>'name'),
+           ' '), '')
+  FROM jsonb_array_elements(
+         CASE WHEN jsonb_typeof(items) = 'array' THEN items ELSE '[]'::jsonb END
+       ) AS elem;
+$$ LANGUAGE sql IMMUTABLE;
+
+
+-- =====================================================
+-- STEP 2: TRIGGER
+-- =====================================================
+-- 'simple' config: no stemming or stop words, which suits vendor names,
+-- GSTINs and invoice numbers
+CREATE OR REPLACE FUNCTION invoices_search_refresh()
+RETURNS TRIGGER AS $$
+DECLARE
+  items_text TEXT := invoice_line_item_text(NEW.line_items::jsonb);
+BEGIN
+  NEW.search_text := lower(concat_ws(' ',
+    NEW.vendor_name, NEW.invoice_number, NEW.vendor_gstin, items_text));
+  NEW.search_vector :=
+       setweight(to_tsvector('simple', concat_ws(' ',
+         NEW.vendor_name,
+         NEW.invoice_number,
+         -- 'INV/2025/001' is also searchable as its parts
+         regexp_replace(COALESCE(NEW.invoice_number, ''), '[^A-Za-z0-9]+', ' ', 'g'),
+         NEW.vendor_gstin)), 'A')
+    || setweight(to_tsvector('simple', items_text), 'C');
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS invoices_search_refresh ON invoices;
+CREATE TRIGGER invoices_search_refresh
+BEFORE INSERT OR UPDATE OF vendor_name, invoice_number, vendor_gstin, line_items
+ON invoices
+FOR EACH ROW EXECUTE FUNCTION invoices_search_refresh();
+
+-- Backfill existing rows (fires the trigger)
+UPDATE invoices SET vendor_name = vendor_name WHERE search_vector IS NULL;
+
+
+-- =====================================================
+-- STEP 3: INDEXES
+-- =====================================================
+CREATE INDEX IF NOT EXISTS idx_invoices_search_vector
+ON invoices USING gin (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_invoices_search_trgm
+ON invoices USING gin (search_text gin_trgm_ops);
+
+ANALYZE invoices;
+
+
+-- =====================================================
+-- STEP 4: search_invoices
+-- =====================================================
+-- Returns a JSON array of at most limit_param rows, best match first.
+-- The first WHERE clause (any word, by prefix or fuzzily) is answered
+-- from the two GIN indexes; the NOT EXISTS then requires every word.
+CREATE OR REPLACE FUNCTION search_invoices(
+  user_id_param UUID,
+  query_text TEXT,
+  limit_param INT DEFAULT 21,
+  offset_param INT DEFAULT 0
+)
+RETURNS JSON AS $$
+DECLARE
+  words TEXT[];
+  any_query TSQUERY;
+  all_query TSQUERY;
+  normalized TEXT;
+  result JSON;
+BEGIN
+  SELECT array_agg(DISTINCT w) INTO words
+  FROM (
+    SELECT w FROM regexp_split_to_table(lower(query_text), '[^a-z0-9]+') AS w
+    WHERE w <> '' LIMIT 8
+  ) t;
+
+  IF words IS NULL THEN
+    RETURN '[]'::json;
+  END IF;
+
+  normalized := array_to_string(words, ' ');
+  any_query := to_tsquery('simple', (SELECT string_agg(quote_literal(w) || ':*', ' | ') FROM unnest(words) w));
+  all_query := to_tsquery('simple', (SELECT string_agg(quote_literal(w) || ':*', ' & ') FROM unnest(words) w));
+
+  SELECT COALESCE(json_agg(r), '[]'::json) INTO result
+  FROM (
+    SELECT i.id, i.created_at, i.vendor_name, i.invoice_number, i.vendor_gstin,
+           i.invoice_date, i.total_amount, i.currency, i.payment_status,
+           round((ts_rank(i.search_vector, all_query)
+                  + 0.8 * word_similarity(normalized, i.search_text))::numeric, 4) AS rank
+    FROM invoices i
+    WHERE i.user_id = user_id_param
+      AND (i.search_vector @@ any_query OR normalized <% i.search_text)
+      AND NOT EXISTS (
+        SELECT 1 FROM unnest(words) w
+        WHERE NOT (i.search_vector @@ to_tsquery('simple', quote_literal(w) || ':*')
+                   OR w <% i.search_text)
+      )
+    ORDER BY rank DESC, i.created_at DESC, i.id DESC
+    LIMIT LEAST(limit_param, 101) OFFSET GREATEST(offset_param, 0)
+  ) r;
+
+  RETURN result;
+END;
+$$ LANGUAGE plpgsql STABLE
+SET pg_trgm.word_similarity_threshold = 0.5;
+
+REVOKE ALL ON FUNCTION search_invoices(UUID, TEXT, INT, INT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION search_invoices(UUID, TEXT, INT, INT) TO service_role;
+
+-- =====================================================
+-- VERIFY
+-- =====================================================
+-- SELECT search_invoices('<user-uuid>', 'penny bazar', 21, 0);
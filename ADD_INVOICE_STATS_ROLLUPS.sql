@@ -0,0 +1,321 @@
+-- =====================================================
+-- 📊 PER-USER DASHBOARD ROLLUPS (INCREMENTALLY MAINTAINED)
+-- =====================================================
+-- Used by: backend/app/services/invoice_stats.py (GET /api/invoices/stats)
+-- A trigger on invoices adds each inserted row to its user's rollups,
+-- subtracts each deleted row, and does both for an update that changes
+-- an aggregated column. get_invoice_stats() then reads a handful of
+-- small rows per user. Its cost does not grow with the invoice count.
+--
+-- Bucketing rules are mirrored in Python (InvoiceStatsRollup); keep
+-- them in sync.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+-- =====================================================
+-- STEP 1: ROLLUP TABLES
+-- =====================================================
+CREATE TABLE IF NOT EXISTS invoice_stats_totals (
+  user_id UUID PRIMARY KEY,
+  invoice_count INTEGER NOT NULL DEFAULT 0,
+  total_amount NUMERIC(18,2) NOT NULL DEFAULT 0,
+  subtotal NUMERIC(18,2) NOT NULL DEFAULT 0,
+  cgst NUMERIC(18,2) NOT NULL DEFAULT 0,
+  sgst NUMERIC(18,2) NOT NULL DEFAULT 0,
+  igst NUMERIC(18,2) NOT NULL DEFAULT 0,
+  cess NUMERIC(18,2) NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS invoice_stats_by_vendor (
+  user_id UUID NOT NULL,
+  vendor_key TEXT NOT NULL,
+  vendor_name TEXT,
+  invoice_count INTEGER NOT NULL DEFAULT 0,
+  total_amount NUMERIC(18,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, vendor_key)
+);
+CREATE INDEX IF NOT EXISTS idx_stats_vendor_user_total
+ON invoice_stats_by_vendor(user_id, total_amount DESC);
+
+CREATE TABLE IF NOT EXISTS invoice_stats_by_month (
+  user_id UUID NOT NULL,
+  month TEXT NOT NULL,                -- 'YYYY-MM'
+  invoice_count INTEGER NOT NULL DEFAULT 0,
+  total_amount NUMERIC(18,2) NOT NULL DEFAULT 0,
+  tax_amount NUMERIC(18,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS invoice_stats_by_status (
+  user_id UUID NOT NULL,
+  payment_status TEXT NOT NULL,
+  invoice_count INTEGER NOT NULL DEFAULT 0,
+  total_amount NUMERIC(18,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, payment_status)
+);
+
+CREATE TABLE IF NOT EXISTS invoice_stats_by_gst_rate (
+  user_id UUID NOT NULL,
+  gst_rate TEXT NOT NULL,             -- GST slab ('0', '5', '18', ...) or 'mixed'
+  invoice_count INTEGER NOT NULL DEFAULT 0,
+  taxable_amount NUMERIC(18,2) NOT NULL DEFAULT 0,
+  tax_amount NUMERIC(18,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, gst_rate)
+);
+
+-- Backend-only tables
+ALTER TABLE invoice_stats_totals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE invoice_stats_by_vendor ENABLE ROW LEVEL SECURITY;
+ALTER TABLE invoice_stats_by_month ENABLE ROW LEVEL SECURITY;
+ALTER TABLE invoice_stats_by_status ENABLE ROW LEVEL SECURITY;
+ALTER TABLE invoice_stats_by_gst_rate ENABLE ROW LEVEL SECURITY;
+
+
+-- =====================================================
+-- STEP 2: BUCKETING HELPERS
+-- =====================================================
+CREATE OR REPLACE FUNCTION invoice_stats_month(invoice_date TEXT, created_at TIMESTAMPTZ)
+RETURNS TEXT AS $$
+  SELECT CASE
+    WHEN invoice_date ~ '^\d{4}-\d{2}' THEN substr(invoice_date, 1, 7)
+    ELSE to_char(COALESCE(created_at, NOW()), 'YYYY-MM')
+  END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Effective GST rate snapped to the nearest slab, 'mixed' if none is within 1 point
+CREATE OR REPLACE FUNCTION invoice_stats_gst_rate(subtotal NUMERIC, total NUMERIC, tax NUMERIC)
+RETURNS TEXT AS $$
+DECLARE
+  base NUMERIC := CASE WHEN COALESCE(subtotal, 0) > 0 THEN subtotal ELSE COALESCE(total, 0) - tax END;
+  rate NUMERIC;
+  slab NUMERIC;
+BEGIN
+  IF base <= 0 THEN
+    RETURN 'mixed';
+  END IF;
+  rate := tax / base * 100;
+  SELECT s INTO slab FROM unnest(ARRAY[0, 0.25, 3, 5, 12, 18, 28]::NUMERIC[]) s
+  ORDER BY abs(s - rate) LIMIT 1;
+  IF abs(slab - rate) > 1 THEN
+    RETURN 'mixed';
+  END IF;
+  RETURN CASE WHEN slab = trunc(slab) THEN trunc(slab)::INTEGER::TEXT ELSE slab::TEXT END;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+
+-- =====================================================
+-- STEP 3: APPLY ONE ROW (+1 add, -1 remove)
+-- =====================================================
+CREATE OR REPLACE FUNCTION invoice_stats_apply(r invoices, sign INTEGER)
+RETURNS VOID AS $$
+DECLARE
+  total NUMERIC := COALESCE(r.total_amount, 0);
+  subtotal NUMERIC := COALESCE(r.subtotal, 0);
+  tax NUMERIC := COALESCE(r.cgst, 0) + COALESCE(r.sgst, 0) + COALESCE(r.igst, 0);
+  v_key TEXT := COALESCE(NULLIF(lower(trim(r.vendor_name)), ''), '(unknown)');
+  v_month TEXT := invoice_stats_month(r.invoice_date::TEXT, r.created_at::TIMESTAMPTZ);
+  v_status TEXT := COALESCE(NULLIF(lower(trim(r.payment_status)), ''), 'unknown');
+  v_rate TEXT := invoice_stats_gst_rate(r.subtotal, r.total_amount, tax);
+BEGIN
+  IF r.user_id IS NULL THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO invoice_stats_totals AS t
+    (user_id, invoice_count, total_amount, subtotal, cgst, sgst, igst, cess)
+  VALUES (r.user_id, sign, sign * total, sign * subtotal,
+          sign * COALESCE(r.cgst, 0), sign * COALESCE(r.sgst, 0),
+          sign * COALESCE(r.igst, 0), sign * COALESCE(r.cess, 0))
+  ON CONFLICT (user_id) DO UPDATE SET
+    invoice_count = t.invoice_count + EXCLUDED.invoice_count,
+    total_amount = t.total_amount + EXCLUDED.total_amount,
+    subtotal = t.subtotal + EXCLUDED.subtotal,
+    cgst = t.cgst + EXCLUDED.cgst,
+    sgst = t.sgst + EXCLUDED.sgst,
+    igst = t.igst + EXCLUDED.igst,
+    cess = t.cess + EXCLUDED.cess,
+    updated_at = NOW();
+
+  INSERT INTO invoice_stats_by_vendor AS t (user_id, vendor_key, vendor_name, invoice_count, total_amount)
+  VALUES (r.user_id, v_key, r.vendor_name, sign, sign * total)
+  ON CONFLICT (user_id, vendor_key) DO UPDATE SET
+    vendor_name = CASE WHEN sign > 0 THEN COALESCE(EXCLUDED.vendor_name, t.vendor_name) ELSE t.vendor_name END,
+    invoice_count = t.invoice_count + EXCLUDED.invoice_count,
+    total_amount = t.total_amount + EXCLUDED.total_amount;
+
+  INSERT INTO invoice_stats_by_month AS t (user_id, month, invoice_count, total_amount, tax_amount)
+  VALUES (r.user_id, v_month, sign, sign * total, sign * tax)
+  ON CONFLICT (user_id, month) DO UPDATE SET
+    invoice_count = t.invoice_count + EXCLUDED.invoice_count,
+    total_amount = t.total_amount + EXCLUDED.total_amount,
+    tax_amount = t.tax_amount + EXCLUDED.tax_amount;
+
+  INSERT INTO invoice_stats_by_status AS t (user_id, payment_status, invoice_count, total_amount)
+  VALUES (r.user_id, v_status, sign, sign * total)
+  ON CONFLICT (user_id, payment_status) DO UPDATE SET
+    invoice_count = t.invoice_count + EXCLUDED.invoice_count,
+    total_amount = t.total_amount + EXCLUDED.total_amount;
+
+  INSERT INTO invoice_stats_by_gst_rate AS t (user_id, gst_rate, invoice_count, taxable_amount, tax_amount)
+  VALUES (r.user_id, v_rate, sign, sign * (total - tax), sign * tax)
+  ON CONFLICT (user_id, gst_rate) DO UPDATE SET
+    invoice_count = t.invoice_count + EXCLUDED.invoice_count,
+    taxable_amount = t.taxable_amount + EXCLUDED.taxable_amount,
+    tax_amount = t.tax_amount + EXCLUDED.tax_amount;
+
+  -- Emptied buckets disappear (a vendor whose last invoice was deleted)
+  IF sign < 0 THEN
+    DELETE FROM invoice_stats_by_vendor WHERE user_id = r.user_id AND vendor_key = v_key AND invoice_count <= 0;
+    DELETE FROM invoice_stats_by_month WHERE user_id = r.user_id AND month = v_month AND invoice_count <= 0;
+    DELETE FROM invoice_stats_by_status WHERE user_id = r.user_id AND payment_status = v_status AND invoice_count <= 0;
+    DELETE FROM invoice_stats_by_gst_rate WHERE user_id = r.user_id AND gst_rate = v_rate AND invoice_count <= 0;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- =====================================================
+-- STEP 4: TRIGGER
+-- =====================================================
+CREATE OR REPLACE FUNCTION invoices_stats_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM invoice_stats_apply(OLD, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM invoice_stats_apply(NEW, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS invoices_stats_insert_delete ON invoices;
+CREATE TRIGGER invoices_stats_insert_delete
+AFTER INSERT OR DELETE ON invoices
+FOR EACH ROW EXECUTE FUNCTION invoices_stats_trigger();
+
+-- Updates that don't touch an aggregated column (notes, confidence, search
+-- columns...) skip the rollups entirely
+DROP TRIGGER IF EXISTS invoices_stats_update ON invoices;
+CREATE TRIGGER invoices_stats_update
+AFTER UPDATE ON invoices
+FOR EACH ROW
+WHEN (
+  OLD.user_id IS DISTINCT FROM NEW.user_id
+  OR OLD.total_amount IS DISTINCT FROM NEW.total_amount
+  OR OLD.subtotal IS DISTINCT FROM NEW.subtotal
+  OR OLD.cgst IS DISTINCT FROM NEW.cgst
+  OR OLD.sgst IS DISTINCT FROM NEW.sgst
+  OR OLD.igst IS DISTINCT FROM NEW.igst
+  OR OLD.cess IS DISTINCT FROM NEW.cess
+  OR OLD.vendor_name IS DISTINCT FROM NEW.vendor_name
+  OR OLD.invoice_date IS DISTINCT FROM NEW.invoice_date
+  OR OLD.payment_status IS DISTINCT FROM NEW.payment_status
+)
+EXECUTE FUNCTION invoices_stats_trigger();
+
+
+-- =====================================================
+-- STEP 5: REBUILD (backfill now; repair if rollups ever drift)
+-- =====================================================
+CREATE OR REPLACE FUNCTION rebuild_invoice_stats(user_id_param UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  r invoices;
+  applied INTEGER := 0;
+BEGIN
+  DELETE FROM invoice_stats_totals WHERE user_id_param IS NULL OR user_id = user_id_param;
+  DELETE FROM invoice_stats_by_vendor WHERE user_id_param IS NULL OR user_id = user_id_param;
+  DELETE FROM invoice_stats_by_month WHERE user_id_param IS NULL OR user_id = user_id_param;
+  DELETE FROM invoice_stats_by_status WHERE user_id_param IS NULL OR user_id = user_id_param;
+  DELETE FROM invoice_stats_by_gst_rate WHERE user_id_param IS NULL OR user_id = user_id_param;
+
+  FOR r IN SELECT * FROM invoices WHERE user_id_param IS NULL OR user_id = user_id_param LOOP
+    PERFORM invoice_stats_apply(r, 1);
+    applied := applied + 1;
+  END LOOP;
+  RETURN applied;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_invoice_stats();
+
+
+-- =====================================================
+-- STEP 6: get_invoice_stats
+-- =====================================================
+-- Reads only rollup rows: top vendors and recent months are bounded,
+-- so the cost is the same for 10 invoices or 100,000
+CREATE OR REPLACE FUNCTION get_invoice_stats(
+  user_id_param UUID,
+  top_vendors INTEGER DEFAULT 10,
+  months INTEGER DEFAULT 12
+)
+RETURNS JSON AS $$
+  SELECT json_build_object(
+    'totals', (
+      SELECT json_build_object(
+        'invoice_count', COALESCE(t.invoice_count, 0),
+        'total_amount', COALESCE(t.total_amount, 0),
+        'subtotal', COALESCE(t.subtotal, 0),
+        'updated_at', t.updated_at
+      )
+      FROM (SELECT 1) one LEFT JOIN invoice_stats_totals t ON t.user_id = user_id_param
+    ),
+    'tax', (
+      SELECT json_build_object(
+        'cgst', COALESCE(t.cgst, 0),
+        'sgst', COALESCE(t.sgst, 0),
+        'igst', COALESCE(t.igst, 0),
+        'cess', COALESCE(t.cess, 0),
+        'total', COALESCE(t.cgst + t.sgst + t.igst, 0)
+      )
+      FROM (SELECT 1) one LEFT JOIN invoice_stats_totals t ON t.user_id = user_id_param
+    ),
+    'vendor_count', (SELECT COUNT(*) FROM invoice_stats_by_vendor WHERE user_id = user_id_param),
+    'by_vendor', (
+      SELECT COALESCE(json_agg(v), '[]'::json) FROM (
+        SELECT vendor_name, invoice_count, total_amount
+        FROM invoice_stats_by_vendor
+        WHERE user_id = user_id_param
+        ORDER BY total_amount DESC, vendor_key
+        LIMIT top_vendors
+      ) v
+    ),
+    'by_month', (
+      SELECT COALESCE(json_agg(m ORDER BY m.month), '[]'::json) FROM (
+        SELECT month, invoice_count, total_amount, tax_amount
+        FROM invoice_stats_by_month
+        WHERE user_id = user_id_param
+        ORDER BY month DESC
+        LIMIT months
+      ) m
+    ),
+    'by_status', (
+      SELECT COALESCE(json_object_agg(payment_status, json_build_object(
+        'invoice_count', invoice_count, 'total_amount', total_amount)), '{}'::json)
+      FROM invoice_stats_by_status WHERE user_id = user_id_param
+    ),
+    'by_gst_rate', (
+      SELECT COALESCE(json_agg(g ORDER BY g.gst_rate), '[]'::json) FROM (
+        SELECT gst_rate, invoice_count, taxable_amount, tax_amount
+        FROM invoice_stats_by_gst_rate WHERE user_id = user_id_param
+      ) g
+    ),
+    'quota', (
+      SELECT json_build_object(
+        'tier', s.tier,
+        'scans_used', COALESCE(s.scans_used_this_period, 0),
+        'period_end', s.current_period_end
+      )
+      FROM subscriptions s WHERE s.user_id::TEXT = user_id_param::TEXT LIMIT 1
+    )
+  );
+$$ LANGUAGE sql STABLE;
+
+REVOKE ALL ON FUNCTION get_invoice_stats(UUID, INTEGER, INTEGER) FROM PUBLIC, anon;
+REVOKE ALL ON FUNCTION rebuild_invoice_stats(UUID) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION get_invoice_stats(UUID, INTEGER, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION rebuild_invoice_stats(UUID) TO service_role;
@@ -0,0 +1,18 @@
+-- =====================================================
+-- 🛡️ QUARANTINE SCAN LEASE
+-- =====================================================
+-- Used by: backend/app/api/documents.py (upload_document,
+-- resume_quarantined_documents)
+-- An upload the virus scanner hasn't seen is stored under quarantine/
+-- with status 'quarantined' and scanned in the background. The scan
+-- holds a lease (scan_started_at); at startup every worker only
+-- claims rows whose lease has expired (SCAN_LEASE_SECONDS, default
+-- 15 minutes), so a file is scanned by one worker at a time.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS scan_started_at TIMESTAMP;
+
+-- Resume only looks at quarantined rows
+CREATE INDEX IF NOT EXISTS idx_documents_quarantined_scan
+  ON documents (scan_started_at)
+  WHERE status = 'quarantined';
@@ -0,0 +1,98 @@
+-- =====================================================
+-- 🧹 SET-BASED RETENTION CLEANUP
+-- =====================================================
+-- Used by: backend/app/services/storage_cleanup.py
+-- Replaces 2 HTTP round trips per document with 1 RPC per batch.
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+-- Index: retention scans filter on owner + age
+CREATE INDEX IF NOT EXISTS idx_documents_user_created
+ON documents(user_id, created_at);
+
+-- Index: anonymous uploads are purged after 24h
+CREATE INDEX IF NOT EXISTS idx_documents_anonymous_created
+ON documents(created_at)
+WHERE user_id IS NULL;
+
+-- Index: invoice deletes by document
+CREATE INDEX IF NOT EXISTS idx_invoices_document_id
+ON invoices(document_id);
+
+
+-- =====================================================
+-- purge_expired_documents
+-- =====================================================
+-- user_id_param NULL = anonymous uploads.
+--
+-- dry_run = true: nothing is deleted; returns totals for everything
+--   older than the cutoff (documents, invoices, bytes).
+-- dry_run = false: deletes ONE batch (oldest first, at most batch_size
+--   documents) together with their invoices, and returns the storage
+--   paths so the caller can remove the objects. Call again until
+--   documents_deleted < batch_size.
+CREATE OR REPLACE FUNCTION purge_expired_documents(
+  user_id_param UUID,
+  cutoff_param TIMESTAMPTZ,
+  batch_size INTEGER DEFAULT 1000,
+  dry_run BOOLEAN DEFAULT false
+)
+RETURNS JSON AS $$
+DECLARE
+  result JSON;
+BEGIN
+  IF dry_run THEN
+    SELECT json_build_object(
+      'documents', COUNT(*),
+      'bytes', COALESCE(SUM(d.file_size), 0),
+      'invoices', (
+        SELECT COUNT(*) FROM invoices i
+        WHERE i.document_id IN (
+          SELECT id FROM documents
+          WHERE ((user_id_param IS NULL AND user_id IS NULL) OR user_id = user_id_param)
+            AND created_at < cutoff_param
+        )
+      )
+    ) INTO result
+    FROM documents d
+    WHERE ((user_id_param IS NULL AND d.user_id IS NULL) OR d.user_id = user_id_param)
+      AND d.created_at < cutoff_param;
+    RETURN result;
+  END IF;
+
+  WITH doomed AS (
+    SELECT id
+    FROM documents
+    WHERE ((user_id_param IS NULL AND user_id IS NULL) OR user_id = user_id_param)
+      AND created_at < cutoff_param
+    ORDER BY created_at
+    LIMIT batch_size
+    FOR UPDATE SKIP LOCKED
+  ),
+  deleted_invoices AS (
+    DELETE FROM invoices
+    WHERE document_id IN (SELECT id FROM doomed)
+    RETURNING 1
+  ),
+  deleted_documents AS (
+    DELETE FROM documents
+    WHERE id IN (SELECT id FROM doomed)
+    RETURNING storage_path, file_size
+  )
+  SELECT json_build_object(
+    'documents_deleted', (SELECT COUNT(*) FROM deleted_documents),
+    'invoices_deleted', (SELECT COUNT(*) FROM deleted_invoices),
+    'bytes', (SELECT COALESCE(SUM(file_size), 0) FROM deleted_documents),
+    'storage_paths', (
+      SELECT COALESCE(json_agg(storage_path), '[]'::json)
+      FROM deleted_documents
+      WHERE storage_path IS NOT NULL
+    )
+  ) INTO result;
+
+  RETURN result;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the backend (service role) may purge
+REVOKE ALL ON FUNCTION purge_expired_documents(UUID, TIMESTAMPTZ, INTEGER, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION purge_expired_documents(UUID, TIMESTAMPTZ, INTEGER, BOOLEAN) TO service_role;
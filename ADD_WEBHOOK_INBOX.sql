@@ -0,0 +1,77 @@
+-- =====================================================
+-- 📬 WEBHOOK INBOX (STORE-THEN-PROCESS RAZORPAY WEBHOOKS)
+-- =====================================================
+-- Used by: backend/app/services/webhook_inbox.py (POST /api/payments/webhook)
+-- The endpoint inserts each verified event into webhook_logs as
+-- 'pending' (ON CONFLICT (event_id) DO NOTHING) and returns. A
+-- background consumer claims it ('processing'), applies it and leaves
+-- it 'processed' or 'failed'. Events that share an ordering_key
+-- (subscription, else order / payment id) are applied one at a time in
+-- arrival order across every process: an event is only claimed once all
+-- earlier events for its key are 'processed' (or 'dead'). A failed event
+-- is retried with backoff (next_attempt_at) and marked 'dead' after the
+-- last attempt, so it stops holding back its key.
+-- Requires WEBHOOK_LOGS_MIGRATION.sql
+-- Run this in Supabase SQL Editor (safe to re-run)
+
+-- =====================================================
+-- STEP 1: STATUSES
+-- =====================================================
+-- 'processing' marks an event claimed by a consumer worker, 'dead' one
+-- that failed every automatic retry (replay it by hand)
+ALTER TABLE webhook_logs DROP CONSTRAINT IF EXISTS check_webhook_logs_status;
+ALTER TABLE webhook_logs
+  ADD CONSTRAINT check_webhook_logs_status
+  CHECK (status IN ('pending', 'processing', 'processed', 'failed', 'dead'));
+
+-- When a failed event is retried next
+ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
+
+-- The inbox keeps every signed event, including types without a handler;
+-- rejecting them would fail the webhook and make Razorpay redeliver forever
+ALTER TABLE webhook_logs DROP CONSTRAINT IF EXISTS check_webhook_logs_event_type;
+
+-- =====================================================
+-- STEP 2: ORDERING KEY
+-- =====================================================
+-- Set by store_event from the payload (webhook_inbox.ordering_key)
+ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS ordering_key VARCHAR(255);
+
+-- Backfill events that may still be claimed, same precedence as ordering_key()
+UPDATE webhook_logs
+SET ordering_key = COALESCE(
+  payload->'payload'->'subscription'->'entity'->>'id',
+  payload->'payload'->'payment'->'entity'->>'subscription_id',
+  payload->'payload'->'invoice'->'entity'->>'subscription_id',
+  payload->'payload'->'payment'->'entity'->>'order_id',
+  payload->'payload'->'order'->'entity'->>'id',
+  payload->'payload'->'payment'->'entity'->>'id'
+)
+WHERE ordering_key IS NULL AND status NOT IN ('processed', 'dead');
+
+-- =====================================================
+-- STEP 3: INDEXES
+-- =====================================================
+-- Startup recovery and stale-claim sweeps only look at unfinished events
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_unfinished
+  ON webhook_logs (id)
+  WHERE status IN ('pending', 'processing');
+
+-- A claim checks for earlier unfinished events with the same key
+DROP INDEX IF EXISTS idx_webhook_logs_ordering_unprocessed;
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_ordering_unfinished
+  ON webhook_logs (ordering_key, id)
+  WHERE status NOT IN ('processed', 'dead');
+
+-- The retry sweeper looks for failed events that are due
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_retry_due
+  ON webhook_logs (next_attempt_at)
+  WHERE status = 'failed';
+
+-- =====================================================
+-- STEP 4: VERIFY
+-- =====================================================
+SELECT status, COUNT(*) AS events
+FROM webhook_logs
+GROUP BY status
+ORDER BY status;
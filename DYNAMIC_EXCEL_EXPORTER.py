@@ -235,16 +235,18 @@ class DynamicExcelExporter:
             if has_data:
                 available_columns[field] = info
 
-        # Analyze raw_extracted_data for additional fields
+        # Analyze raw_extracted_data for additional fields (one pass, keeping
+        # the first value of each field for type inference)
         raw_fields = set()
+        samples = {}
         for invoice in invoices:
             raw_data = invoice.get('raw_extracted_data', {})
-            self._extract_fields_from_dict(raw_data, '', raw_fields)
+            self._extract_fields_from_dict(raw_data, '', raw_fields, samples)
 
         # Add raw fields with lower priority
         for field in raw_fields:
             if field not in available_columns:
-                field_type = self._infer_field_type(field, invoices)
+                field_type = self._infer_field_type(field, invoices, samples.get(field))
                 available_columns[field] = {
                     'type': field_type,
                     'priority': 3,
@@ -260,25 +262,27 @@ class DynamicExcelExporter:
 
         return sorted_columns
 
-    def _extract_fields_from_dict(self, data: Dict, prefix: str, fields: set):
+    def _extract_fields_from_dict(self, data: Dict, prefix: str, fields: set, samples: Dict = None):
         """Recursively extract all field paths from nested dictionary"""
         for key, value in data.items():
             field_path = f"{prefix}{key}" if prefix else key
 
             if isinstance(value, dict):
-                self._extract_fields_from_dict(value, f"{field_path}.", fields)
+                self._extract_fields_from_dict(value, f"{field_path}.", fields, samples)
             elif isinstance(value, list):
                 # For lists, add the field itself
                 fields.add(field_path)
                 # If list contains dicts, extract their fields too
                 if value and isinstance(value[0], dict):
                     for item in value[:1]:  # Just check first item
-                        self._extract_fields_from_dict(item, f"{field_path}.", fields)
+                        self._extract_fields_from_dict(item, f"{field_path}.", fields, samples)
             else:
                 fields.add(field_path)
+                if samples is not None and value is not None:
+                    samples.setdefault(field_path, value)
 
-    def _infer_field_type(self, field_name: str, invoices: List[Dict]) -> str:
-        """Infer field type based on field name and sample values"""
+    def _infer_field_type(self, field_name: str, invoices: List[Dict], sample: Any = None) -> str:
+        """Infer field type based on field name and a sample value (scans invoices if none given)"""
         field_lower = field_name.lower()
 
         # Currency indicators
@@ -298,8 +302,10 @@ class DynamicExcelExporter:
             return 'numeric'
 
         # Check sample values
-        for invoice in invoices:
-            value = self._get_nested_value(invoice, field_name)
+        values = [sample] if sample is not None else (
+            self._get_nested_value(invoice, field_name) for invoice in invoices
+        )
+        for value in values:
             if value is not None:
                 if isinstance(value, (int, float)):
                     return 'numeric'
@@ -9,19 +9,24 @@ OPTIMIZED VERSION:
 - Rate limiting on critical endpoints
 """
 from fastapi import APIRouter, HTTPException, File, UploadFile, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import json
 import os
+import uuid
 import re
 import requests
 import io
 import logging
-from app.services.supabase_helper import supabase
+from app.services.supabase_helper import supabase, call_rpc
 from app.middleware.rate_limiter import limiter
-from PIL import Image
+from importlib.util import find_spec
 
 # Security: Set max image pixels to prevent decompression bombs
-Image.MAX_IMAGE_PIXELS = 178956970  # ~14000x14000 pixels (178 megapixels)
+MAX_IMAGE_PIXELS = 178956970  # ~14000x14000 pixels (178 megapixels)
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -29,6 +34,17 @@ from app.services.invoice_validator import InvoiceValidator, validate_invoice_be
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.middleware.subscription import check_subscription, increment_usage
+from app.auth import get_current_user
+from app.config.plans import get_bulk_upload_limit
+from app.services.batch_processor import AdaptiveConcurrencyLimiter, BatchItem, BatchProcessor
+from app.services.stage_timer import StageTimer
+from app.services import invoice_search
+from app.core.caching import CacheInvalidation
+from app.core.metrics import extraction_started, extraction_finished, record_fallback
+from app.services.upload_stream import (
+    SNIFF_BYTES, IncomingFile, MultipartFileStream, StorageUpload, UploadRejected,
+    image_dimensions, matches_declared_type, read_upload
+)
 
 # Load environment variables for AI services
 import pathlib
@@ -37,36 +53,83 @@ env_path = backend_dir / ".env"
 from dotenv import load_dotenv
 load_dotenv(env_path, encoding='utf-8')
 
-# Try to import AI extractor and PDF processing
+# AI extractor and PDF processing - only check the packages are installed;
+# the Gemini SDK, PyPDF2 and PIL are imported on first use so they don't
+# slow down startup
 try:
-    from app.services.vision_ocr_flash_lite_extractor import VisionOCR_FlashLite_Extractor
-    import PyPDF2
-    AI_AVAILABLE = True
-    print("✅ VISION OCR + FLASH-LITE extraction ENABLED - 99% cost reduction target")
-except ImportError as e:
-    AI_AVAILABLE = False
-    print(f"⚠️ AI extraction DISABLED (Import Error): {e}")
-except RuntimeError as e:
-    AI_AVAILABLE = False
-    print(f"⚠️ AI extraction DISABLED (Runtime Error): {e}")
-except Exception as e:
-    AI_AVAILABLE = False
-    print(f"⚠️ AI extraction DISABLED (Unexpected Error): {e}")
+    _missing = [name for name in ("google.generativeai", "PyPDF2") if find_spec(name) is None]
+except (ImportError, ValueError) as e:
+    _missing = [str(e)]
+AI_AVAILABLE = not _missing
+if AI_AVAILABLE:
+    logger.info('VISION OCR + FLASH-LITE extraction ENABLED - 99% cost reduction target')
+else:
+    logger.warning('AI extraction DISABLED (not installed): %s', ', '.join(_missing))
+
+
+def _vision_flash_lite_extractor():
+    """Build the extractor, importing it (and the Gemini SDK) on first use"""
+    from app.services.vision_ocr_flash_lite_extractor import VisionOCR_FlashLite_Extractor as extractor_class
+    return extractor_class()
+
+
+def _pil_image():
+    """PIL.Image with the decompression bomb limit applied, imported on first use"""
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    return Image
+
+
+def _image_bomb_reason(dimensions) -> Optional[str]:
+    """Rejection reason for an image whose header declares too many pixels"""
+    if dimensions and dimensions[0] * dimensions[1] > MAX_IMAGE_PIXELS:
+        return "Image too large (decompression bomb protection)"
+    return None
 
 # SECURITY FIX: Try to import virus scanner (optional)
 try:
-    from app.services.virus_scanner import scan_file
+    from app.services.virus_scanner import check_file, scan_in_background, verdict_message
     VIRUS_SCAN_ENABLED = True
-    print("✅ VIRUS SCANNING ENABLED - Malware protection active")
+    logger.info('VIRUS SCANNING ENABLED - Malware protection active')
 except ImportError:
     VIRUS_SCAN_ENABLED = False
-    print("ℹ️  VIRUS SCANNING DISABLED - Set VIRUSTOTAL_API_KEY to enable")
+    logger.info('VIRUS SCANNING DISABLED - Set VIRUSTOTAL_API_KEY to enable')
 except Exception as e:
     VIRUS_SCAN_ENABLED = False
-    print(f"ℹ️  VIRUS SCANNING DISABLED: {e}")
+    logger.info('VIRUS SCANNING DISABLED: %s', e)
 
 router = APIRouter()
 
+ALLOWED_CONTENT_TYPES = [
+    'application/pdf',
+    'image/jpeg', 'image/jpg', 'image/png',
+    'image/webp', 'image/heic', 'image/heif'
+]
+ALLOWED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.webp', '.heic', '.heif'}
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB
+
+# Uploads the virus scanner hasn't seen wait here (status 'quarantined')
+# until a background scan clears them
+QUARANTINE_PREFIX = "quarantine/"
+
+# A scan owns its quarantined row for this long (scan_started_at): longer
+# than a VirusTotal upload plus every poll, so resume only takes over scans
+# whose worker died
+SCAN_LEASE_SECONDS = int(os.getenv('SCAN_LEASE_SECONDS', '900'))
+
+# Background scans in flight - kept referenced until they finish
+_background_scans = set()
+
+# Columns the processing pipeline reads from a document row
+DOCUMENT_COLUMNS = "id, user_id, file_name, storage_path, status"
+
+# Shared by all bulk uploads: Vision + Gemini quotas are per API key, not per request
+bulk_concurrency = AdaptiveConcurrencyLimiter(
+    initial=int(os.getenv('BULK_INITIAL_CONCURRENCY', '5')),
+    max_limit=int(os.getenv('BULK_MAX_CONCURRENCY', '20'))
+)
+_bulk_tasks = set()  # keep running batches referenced until they finish
+
 
 class ProcessResponse(BaseModel):
     success: bool
@@ -74,6 +137,7 @@ class ProcessResponse(BaseModel):
     invoice_id: str = None
     vendor_name: str = None
     total_amount: float = None
+    timings: Optional[dict] = None  # per-stage milliseconds + round trips
 
 
 @router.post("/{document_id}/process", response_model=ProcessResponse)
@@ -84,13 +148,32 @@ async def process_document(document_id: str, request: Request):
     OPTIMIZED VERSION: Supports PDFs + Images, All Users, Production-Ready
     Rate Limited: 10 requests/minute to prevent AI extraction abuse
     """
+    return await _process_document(document_id)
+
+
+async def _process_document(
+    document_id: str,
+    document: Optional[dict] = None,
+    file_content: Optional[bytes] = None
+) -> ProcessResponse:
+    """
+    Extraction pipeline behind /process (shared with upload and bulk upload, which have their own limits)
+    
+    Callers that have just stored the file pass the inserted document row and
+    the uploaded bytes, which skips the document read and the storage download.
+    """
+    timer = StageTimer(f"process_document {document_id[:8]}")
+    extraction_started()
     try:
         # Get document from Supabase
-        doc_response = supabase.table("documents").select("*").eq("id", document_id).execute()
-        if not doc_response.data:
-            raise HTTPException(status_code=404, detail="Document not found")
-            
-        document = doc_response.data[0]
+        if document is None:
+            with timer.stage("fetch_document", round_trips=1):
+                doc_response = supabase.table("documents").select(DOCUMENT_COLUMNS).eq("id", document_id).execute()
+            if not doc_response.data:
+                raise HTTPException(status_code=404, detail="Document not found")
+            document = doc_response.data[0]
+            if document.get("status") == "quarantined":
+                raise HTTPException(status_code=409, detail="Document is still being scanned for malware")
         
         # SECURITY FIX: Verify document belongs to user (if not anonymous)
         document_user_id = document.get("user_id")
@@ -104,7 +187,8 @@ async def process_document(document_id: str, request: Request):
         is_anonymous = user_id is None
         
         if not is_anonymous:
-            await check_subscription(user_id)
+            with timer.stage("check_subscription", round_trips=1):
+                await check_subscription(user_id)
         
         # Extract invoice data using AI if available
         file_name = document.get("file_name", "Invoice")
@@ -113,17 +197,19 @@ async def process_document(document_id: str, request: Request):
         
         # Allow anonymous uploads (user_id can be None)
         if not user_id:
-            print("👤 Anonymous upload detected")
+            logger.info('Anonymous upload detected')
         else:
-            print(f"👤 Authenticated user: {user_id}")
+            logger.info('Authenticated user: %s', user_id)
         
         # Try AI extraction first
         invoice_data = None
         if AI_AVAILABLE and storage_path:
             try:
-                # Download file from Supabase storage
-                print(f"⬇️ Downloading from storage: {storage_path}")
-                file_content = supabase.storage.from_("invoice-documents").download(storage_path)
+                # Download file from Supabase storage (unless the caller still has the bytes)
+                if file_content is None:
+                    logger.info('Downloading from storage: %s', storage_path)
+                    with timer.stage("download", round_trips=1):
+                        file_content = supabase.storage.from_("invoice-documents").download(storage_path)
                 if not file_content:
                     raise HTTPException(status_code=404, detail="File not found in storage")
                 
@@ -131,10 +217,10 @@ async def process_document(document_id: str, request: Request):
                 gemini_key = os.getenv('GOOGLE_AI_API_KEY')
                 
                 if not gemini_key:
-                    print("⚠️ No Gemini API key found")
+                    logger.warning('No Gemini API key found')
                     raise HTTPException(status_code=500, detail="AI service not configured")
                 
-                extractor = VisionOCR_FlashLite_Extractor()
+                extractor = _vision_flash_lite_extractor()
                 ai_result = None
                 
                 # Check file type and extract accordingly
@@ -142,41 +228,45 @@ async def process_document(document_id: str, request: Request):
                 
                 # IMAGES: JPG, JPEG, PNG - Use Vision OCR + Flash-Lite
                 if file_ext in ['jpg', 'jpeg', 'png', 'webp', 'heic', 'heif']:
-                    print(f"📸 Image detected - using Vision OCR + Flash-Lite...")
-                    ai_result = extractor.extract_invoice_data(file_content, file_name)
+                    logger.info('Image detected - using Vision OCR + Flash-Lite...')
+                    with timer.stage("extract"):
+                        ai_result = extractor.extract_invoice_data(file_content, file_name)
                 
                 # PDFs: Extract text and use Flash-Lite for formatting
                 elif file_name.lower().endswith('.pdf'):
-                    print(f"📄 PDF detected - extracting text and using Flash-Lite...")
+                    logger.info('PDF detected - extracting text and using Flash-Lite...')
                     extracted_text = ""
                     try:
-                        pdf_file = io.BytesIO(file_content)
-                        pdf_reader = PyPDF2.PdfReader(pdf_file)
-                        
-                        for page_num, page in enumerate(pdf_reader.pages):
-                            text = page.extract_text()
-                            extracted_text += text
-                            print(f"   Page {page_num + 1}: {len(text)} chars")
+                        with timer.stage("pdf_text"):
+                            import PyPDF2
+                            pdf_file = io.BytesIO(file_content)
+                            pdf_reader = PyPDF2.PdfReader(pdf_file)
+                            
+                            for page_num, page in enumerate(pdf_reader.pages):
+                                text = page.extract_text()
+                                extracted_text += text
+                                logger.debug('Page %s: %s chars', page_num + 1, len(text))
                         
                         if extracted_text.strip():
-                            print(f"📝 Extracted {len(extracted_text)} chars - formatting with Flash-Lite...")
+                            logger.info('Extracted %s chars - formatting with Flash-Lite...', len(extracted_text))
                             # Use Flash-Lite directly for text formatting
                             from app.services.flash_lite_formatter import FlashLiteFormatter
                             formatter = FlashLiteFormatter()
-                            ai_result = formatter.format_text_to_json(extracted_text)
+                            with timer.stage("extract"):
+                                ai_result = formatter.format_text_to_json(extracted_text)
                         else:
                             raise HTTPException(status_code=422, detail="No text found in PDF - might be scanned image")
                     except Exception as e:
-                        print(f"⚠️ PDF text extraction failed: {str(e)}")
+                        logger.warning('PDF text extraction failed: %s', str(e))
                         raise HTTPException(status_code=500, detail=f"PDF processing failed: {str(e)}")
                 
                 else:
-                    print(f"  ⚠️ Unsupported file type: {file_ext}")
+                    logger.warning('Unsupported file type: %s', file_ext)
                 
                 # Use AI results if successful
                 if ai_result:
-                    print(f"  ✅ AI extracted: {ai_result.get('vendor_name')} - ₹{ai_result.get('total_amount'):,.2f}")
-                    print(f"  📊 Fields found: {list(ai_result.keys())}")
+                    logger.info('AI extracted: %s - ₹%.2f', ai_result.get('vendor_name'), ai_result.get('total_amount'))
+                    logger.debug('Fields found: %s', list(ai_result.keys()))
                     
                     # Store raw text for vendor name extraction fallback
                     raw_text_for_vendor_detection = extracted_text if 'extracted_text' in locals() else ""
@@ -227,7 +317,7 @@ async def process_document(document_id: str, request: Request):
                     if not invoice_num or (isinstance(invoice_num, str) and not invoice_num.strip()):
                         # Generate fallback invoice number from document_id
                         invoice_num = f"INV-{document_id[:8].upper()}"
-                        print(f"  ⚠️  AI didn't extract invoice_number, using fallback: {invoice_num}")
+                        logger.warning("AI didn't extract invoice_number, using fallback: %s", invoice_num)
                     else:
                         invoice_num = str(invoice_num).strip()
                     invoice_data['invoice_number'] = invoice_num
@@ -244,7 +334,7 @@ async def process_document(document_id: str, request: Request):
                         if sub_vendors:
                             invoice_data['is_consolidated'] = True
                             invoice_data['sub_vendor_count'] = len(sub_vendors)
-                            print(f"  📋 Consolidated invoice detected: {len(sub_vendors)} sub-vendors ({', '.join(list(sub_vendors)[:3])}...)")
+                            logger.info('Consolidated invoice detected: %s sub-vendors (%s...)', len(sub_vendors), ', '.join(list(sub_vendors)[:3]))
                             
                             # ✨ SMART VENDOR DETECTION: If vendor_name is empty but we have sub-vendors,
                             # extract the main vendor from document header or use first sub-vendor
@@ -260,14 +350,14 @@ async def process_document(document_id: str, request: Request):
                                         if any(keyword in line.upper() for keyword in ['TRADING', 'COMPANY', 'CORPORATION', 'LTD', 'PRIVATE', 'PVT', 'INC', 'LLC']):
                                             if len(line) > 5 and len(line) < 100:  # Reasonable company name length
                                                 vendor_name = line
-                                                print(f"  🔍 Detected main vendor from header: {vendor_name}")
+                                                logger.info('Detected main vendor from header: %s', vendor_name)
                                                 break
                                 
                                 # If still empty, use descriptive name based on sub-vendors
                                 if not vendor_name:
                                     first_sub = list(sub_vendors)[0] if sub_vendors else "UNKNOWN"
                                     vendor_name = f"Consolidated Bill - {first_sub} + {len(sub_vendors)-1} more"
-                                    print(f"  🔧 Generated vendor name: {vendor_name}")
+                                    logger.info('Generated vendor name: %s', vendor_name)
                                 
                                 invoice_data['vendor_name'] = vendor_name
                         else:
@@ -283,13 +373,13 @@ async def process_document(document_id: str, request: Request):
                         # Try customer_name as vendor (sometimes documents are reversed)
                         customer_name = invoice_data.get('customer_name', '').strip() if invoice_data.get('customer_name') else ''
                         if customer_name:
-                            print(f"  🔄 Using customer_name as vendor (might be reversed): {customer_name}")
+                            logger.info('Using customer_name as vendor (might be reversed): %s', customer_name)
                             invoice_data['vendor_name'] = customer_name
                             invoice_data['customer_name'] = "Unknown Customer"
                         else:
                             # Last resort: use invoice number
                             vendor_name = f"Vendor-{invoice_num}"
-                            print(f"  ⚠️  No vendor name found, using fallback: {vendor_name}")
+                            logger.warning('No vendor name found, using fallback: %s', vendor_name)
                             invoice_data['vendor_name'] = vendor_name
                     
                     # Clean up other string fields to remove extra whitespace
@@ -310,21 +400,22 @@ async def process_document(document_id: str, request: Request):
                                 invoice_data[field] = None  # NULL in database
 
                 if not invoice_data:
-                    print(f"⚠️ AI extraction returned no results")
+                    logger.warning('AI extraction returned no results')
                     raise HTTPException(status_code=422, detail="AI extraction failed to extract data")
                     
             except Exception as e:
-                print(f"❌ AI extraction failed: {str(e)}")
+                logger.error('AI extraction failed: %s', str(e))
                 raise HTTPException(status_code=500, detail=f"AI extraction error: {str(e)}")
         else:
             if not AI_AVAILABLE:
-                print(f"⚠️ AI not available")
+                logger.warning('AI not available')
                 raise HTTPException(status_code=501, detail="AI extraction not available")
             if not storage_path:
-                print(f"⚠️ No storage path")
+                logger.warning('No storage path')
                 raise HTTPException(status_code=422, detail="Document has no file")        # Fallback: Extract from filename if AI fails
         if not invoice_data:
-            print(f"  📝 Using filename extraction fallback")
+            logger.info('Using filename extraction fallback')
+            record_fallback("filename_extraction")
             
             # Extract invoice number (look for # followed by digits)
             invoice_num_match = re.search(r'#(\d+)', file_name)
@@ -358,87 +449,117 @@ async def process_document(document_id: str, request: Request):
                 "total_amount": 0.0,  # User will see 0 and know to check manually
                 "payment_status": "pending"  # Must be valid: pending, paid, overdue, cancelled, refunded, partial, processing, failed
             }
-            print(f"  ⚠️ Fallback values used - amounts set to 0 (user should verify)")
+            logger.warning('Fallback values used - amounts set to 0 (user should verify)')
         
         # 3. Create invoice in Supabase (with user_id for RLS)
-        print(f"  💾 Creating invoice for user {user_id}...")
-        print(f"  📋 Invoice data keys: {list(invoice_data.keys())}")
+        logger.info('Creating invoice for user %s...', user_id)
+        logger.debug('Invoice data keys: %s', list(invoice_data.keys()))
         
         # VALIDATION: Check data quality before saving
-        is_valid, validation_message, cleaned_invoice_data = InvoiceValidator.validate_invoice_data(invoice_data)
+        with timer.stage("validate"):
+            is_valid, validation_message, cleaned_invoice_data = InvoiceValidator.validate_invoice_data(invoice_data)
         if not is_valid:
-            print(f"  ❌ {validation_message}")
+            logger.error('Validation failed: %s', validation_message)
             raise HTTPException(status_code=422, detail=validation_message)
-        print(f"  ✅ {validation_message}")
+        logger.info('Validation: %s', validation_message)
         
         # Use cleaned data for database insertion
         invoice_data = cleaned_invoice_data
         
         try:
-            created_invoice_response = supabase.table("invoices").insert(invoice_data).execute()
+            # The insert returns the new row, so no separate verification read is needed
+            with timer.stage("insert_invoice", round_trips=1):
+                created_invoice_response = supabase.table("invoices").insert(invoice_data).execute()
             created_invoice = created_invoice_response.data[0] if created_invoice_response.data else None
             
             if not created_invoice:
-                print(f"  ❌ Supabase returned empty response!")
+                logger.error('Supabase returned empty response!')
                 raise HTTPException(status_code=500, detail="Failed to create invoice - Supabase returned empty")
             
             invoice_id = created_invoice.get('id')
-            print(f"  ✅ Invoice created: {invoice_id}")
-            
-            # CRITICAL FIX: Increment subscription usage for quota enforcement
-            # This ensures users cannot bypass their plan limits
-            if not is_anonymous:
-                try:
-                    success = await increment_usage(user_id, 1)
-                    if success:
-                        print(f"  ✅ Scan count incremented for user {user_id} in subscriptions table")
-                    else:
-                        logger.warning(f"  ⚠️ Failed to increment scan count for user {user_id}")
-                except Exception as e:
-                    logger.error(f"  ❌ Error incrementing scan count: {str(e)}")
-                    # Don't fail the whole process, but log the error for monitoring
-            
-            # Verify invoice was created
-            print(f"  🔍 Verifying invoice exists...")
-            verify_response = supabase.table("invoices").select("*").eq("id", invoice_id).execute()
-            if verify_response.data:
-                print(f"  ✅ Verification successful - invoice found in database")
-            else:
-                print(f"  ⚠️ Invoice created but not found in database!")
+            invoice_search.invalidate_user_index(user_id)
+            logger.info('Invoice created: %s', invoice_id)
         except Exception as e:
-            print(f"  ❌ Error creating invoice: {str(e)}")
+            logger.error('Error creating invoice: %s', str(e))
             raise HTTPException(status_code=500, detail=f"Failed to create invoice: {str(e)}")
         
-        # 4. Update document status to 'completed'
-        try:
-            supabase.table("documents").update({"status": "completed"}).eq("id", document_id).execute()
-        except Exception as e:
-            print(f"  ⚠️ Warning: Failed to update document status: {str(e)}")
-            # Don't fail the whole process just because status update failed
+        # 4. Mark document 'completed' and charge the scan (quota enforcement)
+        await _complete_document(document_id, user_id, timer)
+        if user_id:
+            # Totals and quota usage both changed
+            CacheInvalidation.on_user_stats_change(user_id)
         
         return ProcessResponse(
             success=True,
             message="Invoice processed successfully",
             invoice_id=created_invoice["id"],
             vendor_name=invoice_data["vendor_name"],
-            total_amount=invoice_data["total_amount"]
+            total_amount=invoice_data["total_amount"],
+            timings=timer.summary()
         )
         
     except HTTPException as he:
-        # Update document status to failed on HTTP exceptions
-        try:
-            supabase.table("documents").update({"status": "failed"}).eq("id", document_id).execute()
-        except Exception as update_error:
-            logger.warning(f"Failed to update document status after HTTP error: {update_error}")
+        # Update document status to failed on HTTP exceptions (a quarantined
+        # document stays quarantined)
+        if he.status_code != 409:
+            try:
+                supabase.table("documents").update({"status": "failed"}).eq("id", document_id).execute()
+            except Exception as update_error:
+                logger.warning('Failed to update document status after HTTP error: %s', update_error)
         raise
     except Exception as e:
-        print(f"  ❌ Processing error: {str(e)}")
+        logger.error('Processing error: %s', str(e))
         # Update document status to failed on general exceptions
         try:
             supabase.table("documents").update({"status": "failed"}).eq("id", document_id).execute()
         except Exception as update_error:
-            logger.warning(f"Failed to update document status after error: {update_error}")
+            logger.warning('Failed to update document status after error: %s', update_error)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        extraction_finished()
+        timer.log()
+
+
+async def _complete_document(document_id: str, user_id: Optional[str], timer: StageTimer) -> None:
+    """
+    Document status + usage increment in one RPC (ADD_COMPLETE_DOCUMENT_FUNCTION.sql)
+    
+    Falls back to the separate status update and increment_usage calls when
+    the function is not deployed or fails. Failures are logged, never raised: the
+    invoice is already saved.
+    """
+    try:
+        with timer.stage("complete_document", round_trips=1):
+            result = call_rpc(supabase, "complete_document_processing", {
+                "document_id_param": document_id,
+                "user_id_param": user_id,
+                "scans_to_add": 1
+            })
+        if result is not None:
+            if user_id and not result.get("usage_incremented"):
+                logger.warning('No subscription row to charge for user %s', user_id)
+            return
+    except Exception as e:
+        # The function runs in one transaction, so nothing was applied: retry the slow way
+        logger.error('complete_document_processing failed: %s', str(e))
+    
+    try:
+        with timer.stage("complete_document", round_trips=1):
+            supabase.table("documents").update({"status": "completed"}).eq("id", document_id).execute()
+    except Exception as e:
+        logger.warning('Failed to update document status: %s', str(e))
+        # Don't fail the whole process just because status update failed
+    
+    if user_id:
+        try:
+            with timer.stage("increment_usage", round_trips=2):
+                success = await increment_usage(user_id, 1)
+            if success:
+                logger.info('Scan count incremented for user %s in subscriptions table', user_id)
+            else:
+                logger.warning('Failed to increment scan count for user %s', user_id)
+        except Exception as e:
+            logger.error('Error incrementing scan count: %s', str(e))
 
 
 @router.post("/process-anonymous")
@@ -454,13 +575,7 @@ async def process_anonymous_document(file: UploadFile = File(...)):
             raise HTTPException(status_code=503, detail="AI processing temporarily unavailable")
         
         # Validate file type
-        allowed_types = [
-            'application/pdf',
-            'image/jpeg', 'image/jpg', 'image/png',
-            'image/webp', 'image/heic', 'image/heif'
-        ]
-        
-        if file.content_type not in allowed_types:
+        if file.content_type not in ALLOWED_CONTENT_TYPES:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Unsupported file type: {file.content_type}. Supported: PDF, JPG, PNG, WebP, HEIC"
@@ -471,6 +586,7 @@ async def process_anonymous_document(file: UploadFile = File(...)):
         
         # SECURITY FIX: Image bomb protection for image files
         if file.content_type.startswith('image/'):
+            Image = _pil_image()
             try:
                 img = Image.open(io.BytesIO(file_content))
                 
@@ -490,10 +606,11 @@ async def process_anonymous_document(file: UploadFile = File(...)):
                     raise HTTPException(status_code=413, detail="Image decompression bomb detected")
         
         # Process with AI extractor
-        extractor = VisionOCR_FlashLite_Extractor()
+        extractor = _vision_flash_lite_extractor()
         
         if file.content_type == 'application/pdf':
             # Extract text from PDF and use Flash-Lite for formatting
+            import PyPDF2
             pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
             text_content = ""
             for page in pdf_reader.pages:
@@ -528,7 +645,7 @@ async def process_anonymous_document(file: UploadFile = File(...)):
         }
         
     except Exception as e:
-        print(f"❌ Anonymous processing error: {e}")
+        logger.error('Anonymous processing error: %s', e)
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
 
@@ -548,155 +665,295 @@ async def get_document(document_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/upload")
+async def _reject_quarantined(document_id: str, quarantine_path: str) -> None:
+    """Delete a malicious quarantined file and mark its row 'rejected'"""
+    await asyncio.to_thread(supabase.storage.from_("invoice-documents").remove, [quarantine_path])
+    await asyncio.to_thread(lambda: supabase.table("documents").update(
+        {"status": "rejected", "updated_at": datetime.now().isoformat()}
+    ).eq("id", document_id).execute())
+
+
+async def _move_out_of_quarantine(document_id: str, quarantine_path: str) -> Optional[str]:
+    """
+    Move the file out of quarantine, then mark the row 'uploaded' at the new
+    path (a conditional update, so the row never points at an object that
+    isn't there); returns the new path, None if the row was released or
+    rejected elsewhere
+    """
+    bucket = supabase.storage.from_("invoice-documents")
+    storage_path = quarantine_path[len(QUARANTINE_PREFIX):]
+    try:
+        await asyncio.to_thread(bucket.move, quarantine_path, storage_path)
+    except Exception:
+        current = await asyncio.to_thread(lambda: supabase.table("documents").select("status").eq(
+            "id", document_id).execute())
+        if not current.data or current.data[0]["status"] != "quarantined":
+            return None
+        # Row and file both still in quarantine - the next resume retries
+        raise
+    claimed = await asyncio.to_thread(lambda: supabase.table("documents").update(
+        {"status": "uploaded", "storage_path": storage_path, "updated_at": datetime.now().isoformat()}
+    ).eq("id", document_id).eq("status", "quarantined").execute())
+    if not claimed.data:
+        # The row changed (deleted) while the file moved - put the file back
+        await asyncio.to_thread(bucket.move, storage_path, quarantine_path)
+        return None
+    return storage_path
+
+
+async def _release_quarantined(document: dict, content) -> str:
+    """
+    Scan a quarantined upload, then release or reject it
+
+    Clean (or unscannable - the usual fail-open policy): the file moves out
+    of quarantine (_move_out_of_quarantine) and authenticated uploads are
+    processed. Malicious: the file is deleted and the row is marked
+    'rejected'. Returns released / rejected / skipped (already released or
+    rejected elsewhere).
+
+    content is the bytes, or the spooled upload file (read into memory only
+    if the document is processed).
+    """
+    if VIRUS_SCAN_ENABLED:
+        verdict = await scan_in_background(content, document["file_name"])
+    else:
+        # Staged bulk files are quarantined whatever the scanner setting
+        verdict = {"status": "clean", "message": "Virus scanning disabled"}
+
+    if verdict["status"] == "malicious":
+        logger.warning('Malware detected in quarantined file %s: %s', document["id"], verdict_message(verdict))
+        await _reject_quarantined(document["id"], document["storage_path"])
+        return "rejected"
+
+    storage_path = await _move_out_of_quarantine(document["id"], document["storage_path"])
+    if storage_path is None:
+        return "skipped"
+    logger.info('Released %s from quarantine: %s', document["id"], verdict["message"])
+
+    if document.get("user_id"):
+        released = {**document, "status": "uploaded", "storage_path": storage_path}
+        if not isinstance(content, bytes):
+            content.seek(0)
+            content = content.read()
+        await _process_document(document["id"], document=released, file_content=content)
+    return "released"
+
+
+def _start_background_scan(document: dict, content) -> None:
+    async def run():
+        try:
+            await _release_quarantined(document, content)
+        except Exception as e:
+            logger.error('Quarantine release failed for %s: %s', document["id"], e)
+        finally:
+            if not isinstance(content, bytes):
+                content.close()
+
+    task = asyncio.get_running_loop().create_task(run())
+    _background_scans.add(task)
+    task.add_done_callback(_background_scans.discard)
+
+
+async def resume_quarantined_documents(limit: int = 100) -> int:
+    """
+    Restart background scans for uploads left in quarantine (e.g. by a restart)
+
+    Every worker runs this at startup, so a row is claimed before it is
+    scanned: a conditional update takes the scan lease only if the last one
+    expired, and only the worker that gets it downloads and scans the file.
+    """
+    now = datetime.now()
+    cutoff = (now - timedelta(seconds=SCAN_LEASE_SECONDS)).isoformat()
+    lease_expired = f"scan_started_at.is.null,scan_started_at.lt.{cutoff}"
+    response = await asyncio.to_thread(lambda: supabase.table("documents").select("*").eq(
+        "status", "quarantined").or_(lease_expired).limit(limit).execute())
+    bucket = supabase.storage.from_("invoice-documents")
+    resumed = 0
+    for document in response.data or []:
+        claimed = await asyncio.to_thread(lambda: supabase.table("documents").update(
+            {"scan_started_at": now.isoformat()}
+        ).eq("id", document["id"]).eq("status", "quarantined").or_(lease_expired).execute())
+        if not claimed.data:
+            continue
+        content = await asyncio.to_thread(bucket.download, document["storage_path"])
+        _start_background_scan(claimed.data[0], content)
+        resumed += 1
+    return resumed
+
+
+# /upload reads the multipart body itself (no File() parameter), so the
+# request body is described for the API docs here
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["file"],
+        "properties": {"file": {"type": "string", "format": "binary"}}
+    }}}
+}
+
+
+def _storage_upload(storage_path: str, content_type: str) -> StorageUpload:
+    """Streamed upload into the documents bucket"""
+    return StorageUpload("invoice-documents", storage_path, content_type)
+
+
+@router.post("/upload", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
 @limiter.limit("20/minute")  # Max 20 uploads per minute per IP
 async def upload_document(
-    file: UploadFile = File(...),
-    user_id: str = None,  # Optional for anonymous uploads
-    request: Request = None
+    request: Request,
+    user_id: str = None  # Optional for anonymous uploads
 ):
     """
     Upload a document and optionally trigger processing
     Supports both authenticated and anonymous uploads
     Rate Limited: 20 uploads/minute to prevent abuse
+    
+    The multipart body is read as it arrives: the size limit, magic bytes
+    and SHA-256 are checked per chunk and the chunks are streamed on to
+    storage, so memory stays at a fixed spool buffer whatever the file size.
     """
+    incoming = None
     try:
-        # Validate file type (MIME type check)
-        allowed_types = [
-            'application/pdf',
-            'image/jpeg', 'image/jpg', 'image/png',
-            'image/webp', 'image/heic', 'image/heif'
-        ]
+        stream = MultipartFileStream(request, "file")
+        await stream.open()
+        filename, content_type = stream.filename, stream.content_type
         
-        if file.content_type not in allowed_types:
+        # Validate file type (MIME type check)
+        if content_type not in ALLOWED_CONTENT_TYPES:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Unsupported file type: {file.content_type}. Supported: PDF, JPG, PNG, WebP, HEIC"
+                detail=f"Unsupported file type: {content_type}. Supported: PDF, JPG, PNG, WebP, HEIC"
             )
         
         # SECURITY FIX: Validate file extension (defense in depth)
-        allowed_extensions = {'.pdf', '.jpg', '.jpeg', '.png', '.webp', '.heic', '.heif'}
-        file_ext = os.path.splitext(file.filename.lower())[1]
+        file_ext = os.path.splitext(filename.lower())[1]
         
-        if file_ext not in allowed_extensions:
+        if file_ext not in ALLOWED_EXTENSIONS:
             raise HTTPException(
                 status_code=400,
                 detail=f"Invalid file extension: {file_ext}. Allowed: PDF, JPG, PNG, WebP, HEIC"
             )
         
-        # Check file size (10MB limit)
-        file_size = 0
-        content = await file.read()
-        file_size = len(content)
-        
-        # SECURITY FIX: Image bomb protection
-        if file.content_type.startswith('image/'):
-            try:
-                img = Image.open(io.BytesIO(content))
-                if img.width * img.height > Image.MAX_IMAGE_PIXELS:
-                    raise HTTPException(
-                        status_code=413,
-                        detail="Image too large (decompression bomb protection)"
-                    )
-            except Image.DecompressionBombError:
-                raise HTTPException(
-                    status_code=413,
-                    detail="Image exceeds safe decompression limits"
-                )
-            except HTTPException:
-                raise
-            except Exception as e:
-                if "decompression bomb" in str(e).lower():
-                    raise HTTPException(status_code=413, detail="Image decompression bomb detected")
-        
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(status_code=413, detail="File too large. Maximum size: 10MB")
-        
-        # SECURITY FIX: Virus/malware scanning (optional but recommended)
-        if VIRUS_SCAN_ENABLED:
-            try:
-                is_safe, scan_message = scan_file(content, file.filename)
-                if not is_safe:
-                    logger.warning(f"Malware detected in file: {file.filename} - {scan_message}")
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"File failed security scan: {scan_message}"
-                    )
-                logger.info(f"Virus scan passed: {file.filename} - {scan_message}")
-            except HTTPException:
-                raise
-            except Exception as scan_error:
-                # Don't block upload if scanner fails, just log it
-                logger.warning(f"Virus scan error (continuing anyway): {str(scan_error)}")
-        
         # Generate document ID
-        import uuid
         doc_id = str(uuid.uuid4())
-        
-        # Upload file to Supabase storage
-        from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        storage_path = f"documents/{user_id or 'anonymous'}/{timestamp}_{file.filename}"
+        storage_path = f"documents/{user_id or 'anonymous'}/{timestamp}_{filename}"
         
+        incoming = IncomingFile(filename, content_type, MAX_UPLOAD_BYTES)
+        storage = _storage_upload(storage_path, content_type)
         try:
-            # Reset file pointer and upload
-            await file.seek(0)
-            content = await file.read()
+            # Size (10MB limit) and magic bytes are enforced as the chunks
+            # arrive; nothing is stored until the type is confirmed
+            await read_upload(stream, incoming, storage, allowed_type=content_type)
+            file_size = incoming.size
             
-            supabase.storage.from_("invoice-documents").upload(
-                path=storage_path,
-                file=content,
-                file_options={"content-type": file.content_type}
-            )
-            print(f"✅ File uploaded to storage: {storage_path}")
+            # SECURITY FIX: Image bomb protection (dimensions from the header, no decode)
+            if content_type.startswith('image/'):
+                reason = _image_bomb_reason(incoming.dimensions())
+                if reason:
+                    raise UploadRejected(413, reason)
+            
+            # SECURITY FIX: Virus/malware scanning (optional but recommended) -
+            # verdict by SHA-256 first; a file the scanner doesn't know is
+            # quarantined and scanned in the background
+            quarantined = False
+            if VIRUS_SCAN_ENABLED:
+                try:
+                    verdict = await check_file(incoming.file, filename, sha256=incoming.sha256)
+                    if verdict["status"] == "malicious":
+                        scan_message = verdict_message(verdict)
+                        logger.warning('Malware detected in file: %s - %s', filename, scan_message)
+                        raise UploadRejected(400, f"File failed security scan: {scan_message}")
+                    quarantined = verdict["status"] == "pending"
+                    logger.info('Virus scan: %s - %s', filename, verdict['message'])
+                except UploadRejected:
+                    raise
+                except Exception as scan_error:
+                    # Don't block upload if scanner fails, just log it
+                    logger.warning('Virus scan error (continuing anyway): %s', str(scan_error))
             
+            if quarantined:
+                # Unscanned bytes never reach the normal path: drop the
+                # streamed upload and store the spool under quarantine/
+                await storage.abort()
+                storage_path = QUARANTINE_PREFIX + storage_path
+                storage = _storage_upload(storage_path, content_type)
+                for chunk in incoming.chunks():
+                    await storage.write(chunk)
+            
+            # Every check passed: end the streamed body so storage keeps the object
+            await storage.finish()
+            logger.info('File uploaded to storage: %s', storage_path)
+        except UploadRejected as rejected:
+            await storage.abort()
+            raise HTTPException(status_code=rejected.status_code, detail=rejected.detail)
         except Exception as e:
-            print(f"❌ Storage upload failed: {str(e)}")
+            await storage.abort()
+            logger.error('Storage upload failed: %s', str(e))
             raise HTTPException(status_code=500, detail=f"File storage failed: {str(e)}")
         
+        bucket = supabase.storage.from_("invoice-documents")
+        
         # Create document record in database
         doc_data = {
             "id": doc_id,
             "user_id": user_id,
-            "file_name": file.filename,
+            "file_name": filename,
             "file_size": file_size,
-            "file_type": file.content_type,
+            "file_type": content_type,
             "storage_path": storage_path,
-            "status": "uploaded",
+            "status": "quarantined" if quarantined else "uploaded",
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat()
         }
+        if quarantined:
+            # The background scan started below holds the lease
+            doc_data["scan_started_at"] = datetime.now().isoformat()
         
         try:
             doc_response = supabase.table("documents").insert(doc_data).execute()
             if not doc_response.data:
                 raise Exception("No data returned from document creation")
-            print(f"✅ Document record created: {doc_id}")
+            document = doc_response.data[0]
+            logger.info('Document record created: %s', doc_id)
             
         except Exception as e:
-            print(f"❌ Document creation failed: {str(e)}")
+            logger.error('Document creation failed: %s', str(e))
             # Try to clean up storage file
             try:
-                supabase.storage.from_("invoice-documents").remove([storage_path])
+                bucket.remove([storage_path])
             except Exception as cleanup_error:
-                logger.warning(f"Failed to cleanup storage after document creation error: {cleanup_error}")
+                logger.warning('Failed to cleanup storage after document creation error: %s', cleanup_error)
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         
+        if quarantined:
+            # The background scan owns the spooled file from here
+            _start_background_scan(document, incoming.file)
+            incoming = None
+            return {
+                "id": doc_id,
+                "message": "Document uploaded - security scan in progress, processing starts when it passes",
+                "status": "quarantined",
+                "file_name": filename,
+                "file_size": file_size,
+                "storage_path": storage_path
+            }
+        
         # For authenticated users, auto-process the document
         if user_id:
-            print(f"🔄 Auto-processing authenticated upload: {doc_id}")
+            logger.info('Auto-processing authenticated upload: %s', doc_id)
             try:
-                # Call process endpoint internally
-                from fastapi import Request as FastAPIRequest
-                # Create a mock request for the process endpoint
-                process_response = await process_document(doc_id, request)
-                print(f"✅ Auto-processing completed: {process_response.invoice_id}")
+                # Process in-line with the row and the spooled bytes: no
+                # document re-read and no download back from storage
+                process_response = await _process_document(doc_id, document=document, file_content=incoming.read())
+                logger.info('Auto-processing completed: %s', process_response.invoice_id)
                 
                 return {
                     "id": doc_id,
                     "message": "Document uploaded and processed successfully",
                     "status": "processed",
-                    "file_name": file.filename,
+                    "file_name": filename,
                     "file_size": file_size,
                     "storage_path": storage_path,
                     "invoice_id": process_response.invoice_id,
@@ -706,13 +963,13 @@ async def upload_document(
                     }
                 }
             except Exception as e:
-                print(f"⚠️ Auto-processing failed (will require manual process): {str(e)}")
+                logger.warning('Auto-processing failed (will require manual process): %s', str(e))
                 # Still return success for upload, process can be called manually
                 return {
                     "id": doc_id,
                     "message": "Document uploaded successfully (auto-process failed, will process manually)",
                     "status": "uploaded",
-                    "file_name": file.filename,
+                    "file_name": filename,
                     "file_size": file_size,
                     "storage_path": storage_path,
                     "process_url": f"/api/documents/{doc_id}/process",
@@ -724,13 +981,259 @@ async def upload_document(
                 "id": doc_id,
                 "message": "Document uploaded successfully (anonymous)",
                 "status": "uploaded",
-                "file_name": file.filename,
+                "file_name": filename,
                 "file_size": file_size,
                 "storage_path": storage_path
             }
         
+    except UploadRejected as rejected:
+        raise HTTPException(status_code=rejected.status_code, detail=rejected.detail)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Upload error: {str(e)}")
+        logger.error('Upload error: %s', str(e))
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    finally:
+        if incoming is not None:
+            incoming.close()
+
+
+def _validate_bulk_file(file: UploadFile, content: bytes) -> Optional[str]:
+    """Same checks as /upload; returns the rejection reason or None"""
+    if file.content_type not in ALLOWED_CONTENT_TYPES:
+        return f"Unsupported file type: {file.content_type}"
+    if os.path.splitext((file.filename or '').lower())[1] not in ALLOWED_EXTENSIONS:
+        return "Invalid file extension"
+    if len(content) > MAX_UPLOAD_BYTES:
+        return "File too large. Maximum size: 10MB"
+    if not matches_declared_type(content[:SNIFF_BYTES], file.content_type):
+        return "File content doesn't match declared type"
+    if file.content_type.startswith('image/'):
+        return _image_bomb_reason(image_dimensions(io.BytesIO(content)))
+    return None
+
+
+def _get_user_tier(user_id: str) -> str:
+    """Active subscription tier (free when missing or inactive)"""
+    response = supabase.table("subscriptions").select("tier, status").eq("user_id", user_id).execute()
+    if not response.data or response.data[0].get("status") != "active":
+        return "free"
+    return response.data[0].get("tier") or "free"
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _process_bulk_item(item: BatchItem) -> dict:
+    """
+    Scan one staged bulk file, release it and run the extraction pipeline on it
+    
+    The request stored each file under quarantine/ with a 'quarantined'
+    row as it read it, so the batch only holds paths: the bytes are
+    downloaded here, one file per concurrency slot, and dropped when the
+    item finishes. If the process dies first, resume_quarantined_documents
+    picks the rows up. Extraction (Vision, PyPDF2, Gemini, Supabase) is
+    blocking, so it runs in a worker thread with its own event loop;
+    otherwise concurrent items would serialize on the server loop. The
+    release happens once, so retries only repeat extraction.
+    """
+    meta = item.metadata
+    if meta.get('rejected'):
+        raise ValueError(meta['rejected'])
+    bucket = supabase.storage.from_("invoice-documents")
+    released = meta.get('document') is not None
+    content = await asyncio.to_thread(bucket.download, item.file_path if released else meta['staged_path'])
+    if not released:
+        if VIRUS_SCAN_ENABLED:
+            # The batch already runs off the request, so unknown files are
+            # scanned here rather than left in quarantine
+            verdict = await check_file(content, meta['file_name'])
+            if verdict["status"] == "pending":
+                verdict = await scan_in_background(content, meta['file_name'])
+            if verdict["status"] == "malicious":
+                meta['rejected'] = f"File failed security scan: {verdict_message(verdict)}"
+                await _reject_quarantined(item.id, meta['staged_path'])
+                raise ValueError(meta['rejected'])
+        
+        if await _move_out_of_quarantine(item.id, meta['staged_path']) is None:
+            meta['rejected'] = "Document was released or removed by another process"
+            raise ValueError(meta['rejected'])
+        meta['document'] = {
+            "id": item.id,
+            "user_id": meta['user_id'],
+            "file_name": meta['file_name'],
+            "storage_path": item.file_path,
+            "status": "uploaded"
+        }
+    
+    result = await asyncio.to_thread(
+        asyncio.run,
+        _process_document(item.id, document=meta.get('document'), file_content=content)
+    )
+    return {
+        "invoice_id": result.invoice_id,
+        "vendor_name": result.vendor_name,
+        "total_amount": result.total_amount
+    }
+
+
+@router.post("/bulk")
+@limiter.limit("5/minute")
+async def bulk_upload_documents(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    current_user_id: str = Depends(get_current_user)
+):
+    """
+    Upload and process many documents at once, reporting progress over SSE
+    
+    Files are processed through BatchProcessor with adaptive (AIMD)
+    concurrency shared across bulk requests. The batch keeps running if the
+    client disconnects; results are stored as usual.
+    
+    Events (text/event-stream):
+    - accepted / rejected: one per file after validation
+    - progress: {document_id, file_name, status, completed, total}
+      with status processing | retrying | succeeded | failed
+    - complete: batch summary with per-file results
+    """
+    tier = _get_user_tier(current_user_id)
+    bulk_limit = get_bulk_upload_limit(tier)
+    if len(files) > bulk_limit:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Bulk upload limit exceeded. Your plan allows {bulk_limit} files at once, "
+                   f"but you're trying to upload {len(files)} files"
+        )
+    await check_subscription(current_user_id)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    items: List[BatchItem] = []
+    rejected = []
+    staged = []  # (document id, quarantine path), removed again if staging fails
+    bucket = supabase.storage.from_("invoice-documents")
+    try:
+        # One file in memory at a time: each is checked and staged under
+        # quarantine/ with a 'quarantined' row (scanned and released by
+        # _process_bulk_item, or by resume after a crash), then dropped
+        for file in files:
+            if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+                await file.close()
+                rejected.append({"file_name": file.filename, "error": "File too large. Maximum size: 10MB"})
+                continue
+            # One byte over the limit is enough for _validate_bulk_file to reject it
+            content = await file.read(MAX_UPLOAD_BYTES + 1)
+            await file.close()
+            reason = _validate_bulk_file(file, content)
+            if reason:
+                rejected.append({"file_name": file.filename, "error": reason})
+                continue
+            doc_id = str(uuid.uuid4())
+            file_path = f"documents/{current_user_id}/{timestamp}_{doc_id[:8]}_{file.filename}"
+            await asyncio.to_thread(
+                bucket.upload,
+                path=QUARANTINE_PREFIX + file_path,
+                file=content,
+                file_options={"content-type": file.content_type}
+            )
+            now = datetime.now().isoformat()
+            staged.append((doc_id, QUARANTINE_PREFIX + file_path))
+            await asyncio.to_thread(lambda: supabase.table("documents").insert({
+                "id": doc_id,
+                "user_id": current_user_id,
+                "file_name": file.filename,
+                "file_size": len(content),
+                "file_type": file.content_type,
+                "storage_path": QUARANTINE_PREFIX + file_path,
+                "status": "quarantined",
+                "scan_started_at": now,
+                "created_at": now,
+                "updated_at": now
+            }).execute())
+            items.append(BatchItem(
+                id=doc_id,
+                file_id=file.filename,
+                file_path=file_path,
+                file_size=len(content),
+                metadata={
+                    "user_id": current_user_id,
+                    "file_name": file.filename,
+                    "content_type": file.content_type,
+                    "staged_path": QUARANTINE_PREFIX + file_path
+                }
+            ))
+            del content
+    except Exception as e:
+        logger.error('Bulk upload staging failed: %s', e)
+        if staged:
+            try:
+                await asyncio.to_thread(bucket.remove, [path for _, path in staged])
+                await asyncio.to_thread(lambda: supabase.table("documents").delete().in_(
+                    "id", [doc_id for doc_id, _ in staged]).eq("status", "quarantined").execute())
+            except Exception as cleanup_error:
+                logger.warning('Failed to clean up staged bulk files: %s', cleanup_error)
+        raise HTTPException(status_code=500, detail=f"File storage failed: {str(e)}")
+    
+    file_names = {item.id: item.file_id for item in items}
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    def on_progress(completed: int, total: int, item_id: str, status: str):
+        queue.put_nowait(_sse_event("progress", {
+            "document_id": item_id,
+            "file_name": file_names.get(item_id),
+            "status": status,
+            "completed": completed,
+            "total": total
+        }))
+    
+    async def run_batch():
+        try:
+            processor = BatchProcessor(max_retries=2, limiter=bulk_concurrency)
+            summary = await processor.process_batch(items, _process_bulk_item, on_progress)
+            queue.put_nowait(_sse_event("complete", {
+                "batch_id": summary["batch_id"],
+                "total": summary["total"],
+                "succeeded": summary["succeeded"],
+                "failed": summary["failed"],
+                "rejected": len(rejected),
+                "duration_ms": round(summary["duration_ms"]),
+                "concurrency": summary["concurrency"],
+                "results": [
+                    {
+                        "document_id": r.item_id,
+                        "file_name": r.file_id,
+                        "success": r.success,
+                        **(r.data or {}),
+                        **({"error": r.error} if r.error else {})
+                    }
+                    for r in summary["results"]
+                ]
+            }))
+        except Exception as e:
+            logger.error('Bulk upload batch failed: %s', e)
+            queue.put_nowait(_sse_event("error", {"error": str(e)}))
+        finally:
+            queue.put_nowait(None)
+    
+    task = asyncio.create_task(run_batch())
+    _bulk_tasks.add(task)
+    task.add_done_callback(_bulk_tasks.discard)
+    logger.info('Bulk upload: %s accepted, %s rejected for user %s', len(items), len(rejected), current_user_id)
+    
+    async def events():
+        for entry in rejected:
+            yield _sse_event("rejected", entry)
+        for item in items:
+            yield _sse_event("accepted", {"document_id": item.id, "file_name": item.file_id})
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
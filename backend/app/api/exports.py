@@ -2,17 +2,23 @@
 Bulk Export API Router - Multiple invoice exports with Professional Exporters
 PDF Export has been disabled
 """
+import asyncio
 import json
+import logging
 import os
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from app.services.supabase_helper import supabase
-from app.services.accountant_excel_exporter import AccountantExcelExporter
-from app.services.excel_exporter import export_invoices
+from app.services.field_registry import registry_for_export
+from app.services.columnar_exporter import FORMATS as COLUMNAR_FORMATS, PYARROW_AVAILABLE, ColumnarExporter
+from app.services.tally_xml_exporter import TallyXMLExporter, iter_user_invoices
 from app.auth import get_current_user
+from app.core.metrics import time_stage
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -20,6 +26,17 @@ class BulkExportRequest(BaseModel):
     invoice_ids: List[str]
     template: str = "simple"  # Default to simple template
 
+class ColumnarExportRequest(BaseModel):
+    invoice_ids: List[str]
+    format: str = "parquet"  # "parquet" or "arrow" (Arrow IPC stream)
+
+class TallyExportRequest(BaseModel):
+    invoice_ids: List[str] = []  # Empty = all of the user's invoices
+    date_from: Optional[str] = None  # invoice_date range, only used without invoice_ids
+    date_to: Optional[str] = None
+    company: Optional[str] = None  # Tally company name (SVCURRENTCOMPANY)
+    split_by_rate: bool = True  # "Purchase @ 18%" / "Input CGST @ 9%" ledgers
+
 @router.post("/export-excel")
 async def bulk_export_excel(request: BulkExportRequest, current_user_id: str = Depends(get_current_user)):
     """Bulk export multiple invoices to Excel"""
@@ -43,9 +60,13 @@ async def bulk_export_excel(request: BulkExportRequest, current_user_id: str = D
                     invoice['line_items'] = []
             print(f"   Invoice {idx+1}: {invoice.get('vendor_name', 'Unknown')}")
         
-        # Export to Excel
-        exporter = AccountantExcelExporter()
-        excel_filename = exporter.export_invoices_bulk(invoices)
+        # Export to Excel (large exports read their columns from the field registry)
+        from app.services.accountant_excel_exporter import AccountantExcelExporter
+        exporter = AccountantExcelExporter(
+            field_registry=registry_for_export(supabase, current_user_id, len(invoices))
+        )
+        with time_stage("export_excel"):
+            excel_filename = exporter.export_invoices_bulk(invoices)
         
         print(f"✅ Bulk Excel export successful: {excel_filename}")
         
@@ -90,7 +111,9 @@ async def bulk_export_csv(request: BulkExportRequest, current_user_id: str = Dep
                     invoice['line_items'] = []
         
         # Export to Excel with dynamic columns
-        excel_path = export_invoices(invoices)
+        from app.services.excel_exporter import export_invoices
+        with time_stage("export_csv"):
+            excel_path = export_invoices(invoices)
         
         return FileResponse(
             path=excel_path,
@@ -105,6 +128,76 @@ async def bulk_export_csv(request: BulkExportRequest, current_user_id: str = Dep
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
+@router.post("/export-columnar")
+async def bulk_export_columnar(request: ColumnarExportRequest, current_user_id: str = Depends(get_current_user)):
+    """
+    Export invoices and line items as typed Parquet / Arrow IPC tables (zip)
+
+    For pandas / BI tools: invoices.parquet and line_items.parquet, joined
+    on invoices.id = line_items.invoice_id
+    """
+    if not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Columnar export is not available on this server")
+    if request.format not in COLUMNAR_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(COLUMNAR_FORMATS)}")
+
+    invoice_ids = [str(inv_id) for inv_id in request.invoice_ids]
+    invoices = supabase.table("invoices").select("*").eq("user_id", current_user_id).in_("id", invoice_ids).execute().data
+    if not invoices:
+        raise HTTPException(status_code=404, detail="No invoices found")
+
+    exporter = ColumnarExporter(
+        format=request.format,
+        field_registry=registry_for_export(supabase, current_user_id, len(invoices)),
+    )
+    try:
+        with time_stage("export_columnar"):
+            zip_path = await asyncio.to_thread(exporter.export, invoices)
+    except Exception as e:
+        logger.exception("Columnar export failed")
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+
+    return FileResponse(
+        path=zip_path,
+        filename=f"invoices_{request.format}_{datetime.now().strftime('%Y-%m-%d')}.zip",
+        media_type="application/zip",
+    )
+
+
+@router.post("/export-tally")
+async def bulk_export_tally(request: TallyExportRequest, current_user_id: str = Depends(get_current_user)):
+    """
+    Export invoices as Tally purchase vouchers (XML import file)
+
+    Invoices are read page by page and streamed into the file, so large
+    exports do not build up in memory. The FY range in the header covers
+    every exported voucher.
+    """
+    exporter = TallyXMLExporter(company=request.company, split_by_rate=request.split_by_rate)
+    invoices = iter_user_invoices(
+        supabase, current_user_id, request.invoice_ids,
+        date_from=request.date_from, date_to=request.date_to,
+    )
+    try:
+        with time_stage("export_tally"):
+            xml_path = await asyncio.to_thread(exporter.export, invoices)
+    except Exception as e:
+        logger.exception("Tally export failed")
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+
+    if not exporter.vouchers:
+        os.remove(xml_path)
+        raise HTTPException(status_code=404, detail="No exportable invoices found")
+
+    start, end = exporter.period
+    return FileResponse(
+        path=xml_path,
+        filename=f"tally_vouchers_{start.year}-{end.year % 100:02d}.xml",
+        media_type="application/xml",
+        headers={"X-Vouchers-Exported": str(exporter.vouchers), "X-Vouchers-Skipped": str(exporter.skipped)},
+    )
+
+
 # Note: /export-pdf now uses the new HTMLPDFExporter by default
 # The old ProfessionalPDFExporterV2 is deprecated
 # If you need the old version, use ProfessionalPDFExporterV2 directly
@@ -1,7 +1,11 @@
 """Health Check Router"""
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import Optional
+import hmac
 import os
 
+from app.core.metrics import CONTENT_TYPE_LATEST, render_metrics
+
 router = APIRouter()
 
 @router.get("/health")
@@ -16,3 +20,15 @@ def health_check():
             "Supabase Integration"
         ]
     }
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint (set METRICS_TOKEN to require 'Authorization: Bearer <token>')"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    
+    body = render_metrics()
+    if body is None:
+        raise HTTPException(status_code=503, detail="Metrics disabled: prometheus_client not installed")
+    return Response(content=body, media_type=CONTENT_TYPE_LATEST)
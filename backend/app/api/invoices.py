@@ -2,23 +2,28 @@
 Invoices API - Retrieve and manage invoices
 Compatible with existing Supabase invoices table
 """
-from fastapi import APIRouter, HTTPException, Depends, Header, Body
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, Header, Body, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
 import os
+import asyncio
 import logging
 from app.services.supabase_helper import supabase
+from app.services import invoice_listing, invoice_search, invoice_stats
+from app.services.invoice_listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 # Set up logger
 logger = logging.getLogger(__name__)
-from app.services.accountant_excel_exporter import AccountantExcelExporter
 from app.config.plans import check_feature_access
 from app.services.usage_tracker import UsageTracker
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.auth import get_current_user
+from app.core.metrics import time_stage
+from app.core.caching import CacheInvalidation
 
 router = APIRouter()
 
@@ -53,7 +58,7 @@ async def invoice_health():
     return {
         "status": "healthy",
         "message": "Invoice API operational",
-        "endpoints": ["GET /", "GET /{id}", "POST /upload"]
+        "endpoints": ["GET /", "GET /search", "GET /stats", "GET /{id}", "POST /upload"]
     }
 
 
@@ -71,15 +76,29 @@ async def check_export_permission(user_id: str, db: Session = Depends(get_db)):
         )
     
     return True
-@router.get("/", response_model=List[Dict[Any, Any]])
+@router.get("/")
 async def get_invoices(
-    user_id: str = None, 
-    limit: int = 100,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, max_length=512, description="next_cursor from the previous page"),
+    sort: str = Query("created_at", description="created_at | invoice_date | total_amount"),
+    order: str = Query("desc", description="desc | asc"),
+    fields: Optional[str] = Query(None, max_length=1000, description="Comma-separated columns (default: list view)"),
+    vendor: Optional[str] = Query(None, max_length=200),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = Query(None, max_length=200, description="payment_status, comma-separated"),
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    if_none_match: Optional[str] = Header(None),
     current_user: str = Depends(get_current_user)
 ):
     """
-    Get all invoices filtered by authenticated user
+    List the authenticated user's invoices, one keyset page at a time
     SECURITY FIX: Always filter by current user's ID to prevent data leaks
+
+    Returns {items, next_cursor, has_more, limit}. Pass next_cursor back
+    (with the same sort/order) for the next page. Responses carry an ETag;
+    a matching If-None-Match gets 304 with no body.
     """
     try:
         # SECURITY FIX: Use authenticated user ID directly (it's already a string)
@@ -88,12 +107,44 @@ async def get_invoices(
         if not authenticated_user_id:
             raise HTTPException(status_code=401, detail="Authentication required")
         
-        # Always filter by authenticated user's ID
-        invoices_response = supabase.table("invoices").select("*").eq("user_id", authenticated_user_id).limit(limit).execute()
-        invoices = invoices_response.data
+        statuses = [s.strip().lower() for s in status.split(",") if s.strip()] if status else None
+        try:
+            columns = invoice_listing.parse_fields(fields, sort)
+            query = invoice_listing.build_query(
+                supabase,
+                authenticated_user_id,
+                columns,
+                sort=sort,
+                order=order,
+                limit=limit,
+                cursor=cursor,
+                vendor=vendor,
+                date_from=date_from.isoformat() if date_from else None,
+                date_to=date_to.isoformat() if date_to else None,
+                statuses=statuses,
+                min_amount=min_amount,
+                max_amount=max_amount,
+            )
+        except invoice_listing.InvoiceListingError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        try:
+            rows = query.execute().data or []
+        except Exception as e:
+            # PostgREST rejects unknown columns in fields= with 42703
+            if "42703" in str(e) or "does not exist" in str(e):
+                raise HTTPException(status_code=400, detail="Unknown field requested")
+            raise
         
-        logger.info(f"User {authenticated_user_id} retrieved {len(invoices) if invoices else 0} invoices")
-        return invoices or []
+        page = invoice_listing.paginate(rows, limit, sort, order)
+        etag = invoice_listing.compute_etag(page)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        
+        if invoice_listing.etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        
+        logger.info("User %s listed %d invoices (has_more=%s)", authenticated_user_id, len(page["items"]), page["has_more"])
+        return JSONResponse(content=jsonable_encoder(page), headers=headers)
         
     except HTTPException:
         raise
@@ -102,6 +153,65 @@ async def get_invoices(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/search")
+async def search_invoices(
+    q: str = Query(..., min_length=1, max_length=200, description="Vendor, invoice number, GSTIN or item words"),
+    limit: int = Query(invoice_search.DEFAULT_LIMIT, ge=1, le=invoice_search.MAX_LIMIT),
+    offset: int = Query(0, ge=0, le=1000),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Ranked search over the authenticated user's invoices
+    Word prefixes and near-misses match ("pen bazzar" finds "Penny Bazar");
+    returns {items, has_more, next_offset, limit}, each item with a rank
+    """
+    try:
+        authenticated_user_id = current_user
+        
+        if not authenticated_user_id:
+            raise HTTPException(status_code=401, detail="Authentication required")
+        
+        with time_stage("invoice_search"):
+            page = await asyncio.to_thread(
+                invoice_search.search_invoices, supabase, authenticated_user_id, q, limit, offset
+            )
+        return page
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching invoices: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats")
+async def get_invoice_stats(
+    refresh: bool = False,
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Dashboard aggregates for the authenticated user
+    Totals, tax by type, top vendors, monthly spend, GST-rate split,
+    payment-status counts and quota usage, read from precomputed rollups
+    """
+    try:
+        authenticated_user_id = current_user
+        
+        if not authenticated_user_id:
+            raise HTTPException(status_code=401, detail="Authentication required")
+        
+        with time_stage("invoice_stats"):
+            return await asyncio.to_thread(
+                invoice_stats.get_user_stats, supabase, authenticated_user_id, not refresh
+            )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching invoice stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{invoice_id}")
 async def get_invoice(
     invoice_id: str,
@@ -192,6 +302,8 @@ async def update_invoice(
         if not update_response.data:
             raise HTTPException(status_code=500, detail="Failed to update invoice")
         
+        invoice_search.invalidate_user_index(authenticated_user_id)
+        CacheInvalidation.on_user_stats_change(authenticated_user_id)
         logger.info(f"User {authenticated_user_id} updated invoice {invoice_id}")
         return update_response.data[0]
         
@@ -223,6 +335,8 @@ async def delete_invoice(
         if not delete_response.data:
             raise HTTPException(status_code=404, detail="Invoice not found or access denied")
         
+        invoice_search.invalidate_user_index(authenticated_user_id)
+        CacheInvalidation.on_user_stats_change(authenticated_user_id)
         logger.info(f"User {authenticated_user_id} deleted invoice {invoice_id}")
         return {"success": True, "message": "Invoice deleted"}
         
@@ -408,8 +522,10 @@ async def export_invoice_excel(
             user_template = "accountant"
 
         # Export to Excel with user's preferred template
+        from app.services.accountant_excel_exporter import AccountantExcelExporter
         exporter = AccountantExcelExporter()
-        excel_filename = exporter.export_invoices_bulk([invoice_data], template=user_template)
+        with time_stage("export_excel"):
+            excel_filename = exporter.export_invoices_bulk([invoice_data], template=user_template)
 
         # Return file
         return FileResponse(
@@ -496,7 +612,8 @@ async def export_invoice_csv(
         # Export to CSV using Professional CSV Exporter V2
         from backend.app.services.csv_exporter_v2 import ProfessionalCSVExporterV2
         exporter = ProfessionalCSVExporterV2()
-        csv_filename = exporter.export_invoice(invoice_data)
+        with time_stage("export_csv"):
+            csv_filename = exporter.export_invoice(invoice_data)
         
         # Return file
         return FileResponse(
@@ -553,7 +670,8 @@ async def export_invoices_excel(
         # Export to Excel using Accountant Excel Exporter
         from backend.app.services.accountant_excel_exporter import AccountantExcelExporter
         exporter = AccountantExcelExporter()
-        filename = exporter.export_invoices_bulk(invoices)
+        with time_stage("export_excel"):
+            filename = exporter.export_invoices_bulk(invoices)
         
         # Return file
         return FileResponse(
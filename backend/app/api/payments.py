@@ -3,6 +3,10 @@ Payment API Endpoints - Production Grade
 Handles Razorpay payment operations with full security checks
 """
 
+import asyncio
+import json
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
 from sqlalchemy.orm import Session
 from typing import Optional
@@ -11,14 +15,15 @@ from datetime import datetime, timedelta
 
 from app.core.database import get_db
 from app.services.razorpay_service import razorpay_service
+from app.services.webhook_inbox import ordering_key, store_event, webhook_consumer, webhook_event_id
 from app.auth import get_current_user, verify_user_ownership
 
-# Config, rate limiter and caching helpers
+# Config and rate limiter helpers
 from app.core.config import settings
 from app.core.redis_limiter import get_rate_limiter, get_tier_limit
-from app.core.caching import get_redis_client
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # Note: Using custom Redis-based rate limiting instead of SlowAPI
@@ -424,93 +429,70 @@ async def verify_payment(
 async def razorpay_webhook(
     request: Request,
     db: Session = Depends(get_db),
-    x_razorpay_signature: Optional[str] = Header(None)
+    x_razorpay_signature: Optional[str] = Header(None),
+    x_razorpay_event_id: Optional[str] = Header(None)
 ):
     """
-    Handle Razorpay webhook events.
+    Receive Razorpay webhook events.
     
-    Note: Webhooks don't have user context, so we verify signature and extract
-    user_id from order notes.
+    Verifies the signature over the raw body, stores the event in
+    webhook_logs and returns; the event is applied by the background
+    webhook consumer (app/services/webhook_inbox.py), so Razorpay gets its
+    200 without waiting on subscription updates. Redeliveries of an event
+    already stored are acknowledged and ignored.
     
     Args:
         request: FastAPI request object
         db: Database session
         x_razorpay_signature: Webhook signature from Razorpay header
+        x_razorpay_event_id: Event ID, the same on every redelivery
     
     Returns:
         Success response
     """
-    try:
-        # Get webhook body (raw json payload)
-        body = await request.json()
+    # Razorpay signs the exact bytes it sent - verify before parsing
+    raw_body = await request.body()
 
-        # Signature must be present and webhook secret must be configured
-        signature = x_razorpay_signature or ""
-        webhook_secret = getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', '')
-        if not webhook_secret:
-            print("🚨 RAZORPAY_WEBHOOK_SECRET not configured - rejecting webhook")
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Webhook secret not configured")
+    # Signature must be present and webhook secret must be configured
+    signature = x_razorpay_signature or ""
+    if not getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', ''):
+        logger.error("RAZORPAY_WEBHOOK_SECRET not configured - rejecting webhook")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Webhook secret not configured")
 
-        if not signature:
-            print("🚨 Webhook signature header missing")
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing webhook signature header")
+    if not signature:
+        logger.warning("Webhook signature header missing")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing webhook signature header")
 
-        # Idempotency: prevent duplicate processing of same payment
-        try:
-            redis_client = get_redis_client()
-        except Exception:
-            redis_client = None
+    if not razorpay_service.verify_webhook_signature(raw_body, signature):
+        logger.warning("Invalid webhook signature")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid webhook signature")
 
-        payment_id = None
-        try:
-            event_payload = body.get('payload', {})
-            payment = event_payload.get('payment', {})
-            entity = payment.get('entity', {})
-            payment_id = entity.get('id')
-        except Exception:
-            payment_id = None
-
-        if payment_id and redis_client:
-            processed_key = f"processed_payment:{payment_id}"
-            try:
-                # SETNX semantics: only set if not exists
-                set_ok = redis_client.set(processed_key, '1', nx=True, ex=60*60*24)
-                if not set_ok:
-                    # Already processed
-                    print(f"⚠️ Webhook already processed for payment {payment_id}")
-                    return {"status": "success", "message": "Already processed"}
-            except Exception as e:
-                print(f"⚠️ Redis idempotency check failed: {e}")
-
-        # Process webhook (service will verify signature using webhook secret)
-        success, message = razorpay_service.handle_webhook(
-            event=body,
-            signature=signature,
-            db=db
-        )
-        
-        if not success:
-            print(f"⚠️ Webhook processing failed: {message}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=message
-            )
-        
-        print(f"✅ Webhook processed: {message}")
-        return {
-            "status": "success",
-            "message": message
-        }
-    
-    except HTTPException:
-        raise
+    try:
+        event = json.loads(raw_body)
+    except ValueError:
+        event = None
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Webhook body is not a JSON object")
+
+    event_id = webhook_event_id(event, raw_body, x_razorpay_event_id)
+    try:
+        stored = await asyncio.to_thread(store_event, db, event_id, event, raw_body, signature)
     except Exception as e:
-        print(f"❌ Webhook error: {str(e)}")
+        # Not stored - fail so Razorpay redelivers
+        logger.error("Could not store webhook %s: %s", event_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Webhook processing failed: {str(e)}"
+            detail="Webhook could not be stored"
         )
 
+    if stored:
+        webhook_consumer.submit(event_id, ordering_key(event))
+    return {
+        "status": "success",
+        "message": "Queued" if stored else "Already received",
+        "event_id": event_id
+    }
+
 
 @router.get("/config")
 async def get_payment_config():
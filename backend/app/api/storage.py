@@ -36,6 +36,7 @@ class StorageStatsResponse(BaseModel):
 @limiter.limit("5/hour")
 async def cleanup_user_data(
     request: Request,
+    dry_run: bool = False,
     current_user: str = Depends(get_current_user)
 ):
     """
@@ -46,6 +47,7 @@ async def cleanup_user_data(
     
     Args:
         request: HTTP request (for rate limiting)
+        dry_run: Only report documents and bytes that would be deleted
         current_user: Current authenticated user (from JWT token)
     
     Returns:
@@ -63,11 +65,11 @@ async def cleanup_user_data(
             tier = subscription.data[0].get("tier", "free")
         
         # Perform cleanup
-        result = cleanup_user_storage(current_user, tier)
+        result = cleanup_user_storage(current_user, tier, dry_run)
         
         return CleanupResponse(
             success=True,
-            message="Storage cleanup completed",
+            message="Storage cleanup dry run completed" if dry_run else "Storage cleanup completed",
             details=result
         )
         
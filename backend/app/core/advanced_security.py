@@ -6,18 +6,29 @@ Industry-grade authentication with MFA, session management, and security feature
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Tuple
+from typing import Callable, Deque, Optional, Dict, List, Tuple, Union
+import bisect
+import heapq
+import logging
 import secrets
 import hashlib
+import math
 import re
+import threading
+import time
 import pyotp
 from passlib.context import CryptContext
 
+from app.core.caching import get_redis_client
 from app.core.database import get_db
 # from app.models import User  # User model not needed with Supabase auth
 
 
+logger = logging.getLogger(__name__)
+
+
 # Password context with bcrypt
 pwd_context = CryptContext(
     schemes=["bcrypt"],
@@ -125,15 +136,269 @@ class PasswordPolicy:
         return min(100, score)
 
 
+class RedisSecurityStore:
+    """
+    Session and lockout state in Redis, shared by every worker
+
+    - session:{token}           HASH of session fields, EXPIRE = idle timeout
+    - user_sessions:{user_id}   ZSET token -> last activity, for pruning
+                                expired tokens and evicting the least
+                                recently used session in O(log n)
+    - login_failures:{id}       ZSET of failure timestamps in the window
+    - login_lockout:{id}        flag whose TTL is the remaining lockout
+
+    Expiry is left to Redis TTLs; nothing scans all sessions.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _session_key(token: str) -> str:
+        return f"session:{token}"
+
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"user_sessions:{user_id}"
+
+    def add_session(self, token: str, user_id: str, fields: Dict[str, str], ttl: int, max_per_user: int) -> List[str]:
+        """Store a session; returns the tokens evicted to stay within max_per_user"""
+        now = time.time()
+        user_key = self._user_key(user_id)
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(user_key, '-inf', now - ttl)
+        pipe.hset(self._session_key(token), mapping=dict(fields, user_id=user_id))
+        pipe.expire(self._session_key(token), ttl)
+        pipe.zadd(user_key, {token: now})
+        pipe.expire(user_key, ttl)
+        pipe.zcard(user_key)
+        count = pipe.execute()[-1]
+        if count <= max_per_user:
+            return []
+        evicted = [member for member, _ in self.client.zpopmin(user_key, count - max_per_user)]
+        if evicted:
+            self.client.delete(*(self._session_key(t) for t in evicted))
+        return evicted
+
+    def touch_session(self, token: str, ttl: int, fields: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Session fields with its idle timeout restarted, None if missing or expired"""
+        session = self.client.hgetall(self._session_key(token))
+        if 'user_id' not in session:
+            return None
+        now = time.time()
+        user_key = self._user_key(session['user_id'])
+        pipe = self.client.pipeline()
+        pipe.hset(self._session_key(token), mapping=fields)
+        pipe.expire(self._session_key(token), ttl)
+        pipe.zadd(user_key, {token: now}, xx=True)
+        pipe.expire(user_key, ttl)
+        pipe.execute()
+        session.update(fields)
+        return session
+
+    def delete_session(self, token: str) -> bool:
+        user_id = self.client.hget(self._session_key(token), 'user_id')
+        if user_id is None:
+            return False
+        pipe = self.client.pipeline()
+        pipe.delete(self._session_key(token))
+        pipe.zrem(self._user_key(user_id), token)
+        return bool(pipe.execute()[0])
+
+    def delete_user_sessions(self, user_id: str) -> int:
+        tokens = self.client.zrange(self._user_key(user_id), 0, -1)
+        pipe = self.client.pipeline()
+        if tokens:
+            pipe.delete(*(self._session_key(t) for t in tokens))
+        pipe.delete(self._user_key(user_id))
+        results = pipe.execute()
+        return results[0] if tokens else 0
+
+    def add_failure(self, identifier: str, window: int, max_attempts: int, lockout: int) -> bool:
+        """Record a failed attempt; returns True if it (re)started a lockout"""
+        now = time.time()
+        key = f"login_failures:{identifier}"
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now - window)
+        pipe.zadd(key, {f"{now:.6f}:{secrets.token_hex(4)}": now})
+        pipe.expire(key, window)
+        pipe.zcard(key)
+        if pipe.execute()[-1] < max_attempts:
+            return False
+        self.client.set(f"login_lockout:{identifier}", '1', ex=lockout)
+        return True
+
+    def lockout_remaining(self, identifier: str) -> int:
+        return max(0, self.client.ttl(f"login_lockout:{identifier}"))
+
+
+class InMemorySecurityStore:
+    """
+    Same indexes as RedisSecurityStore, in this process (tests, and the
+    fallback when Redis is unavailable - state is then per worker)
+
+    Per-user tokens are kept sorted by last activity and failures by time,
+    so pruning and eviction only touch the entries they remove; keys that
+    are never read again are dropped from an expiry heap.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, str]] = {}
+        self._user_sessions: Dict[str, List[Tuple[float, str]]] = {}
+        self._scores: Dict[str, float] = {}  # token -> its score in _user_sessions
+        self._failures: Dict[str, Deque[float]] = {}
+        self._lockouts: Dict[str, float] = {}
+        self._expiry: Dict[Tuple[str, str], float] = {}
+        self._expiry_heap: List[Tuple[float, Tuple[str, str]]] = []
+
+    # -- expiry (Redis EXPIRE) ------------------------------------------
+
+    def _expire_at(self, key: Tuple[str, str], at: float) -> None:
+        self._expiry[key] = at
+        heapq.heappush(self._expiry_heap, (at, key))
+
+    def _live(self, key: Tuple[str, str], now: float) -> bool:
+        at = self._expiry.get(key)
+        return at is not None and at > now
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        self._expiry.pop(key, None)
+        kind, name = key
+        if kind == 'session':
+            session = self._sessions.pop(name, None)
+            if session is not None:
+                self._unindex(session['user_id'], name)
+        elif kind == 'failures':
+            self._failures.pop(name, None)
+        else:
+            self._lockouts.pop(name, None)
+
+    def _sweep(self, now: float) -> None:
+        """Drop keys whose expiry has passed (stale heap entries are skipped)"""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            at, key = heapq.heappop(heap)
+            if self._expiry.get(key) == at:
+                self._drop(key)
+
+    def _index(self, user_id: str, token: str, score: float) -> None:
+        self._scores[token] = score
+        bisect.insort(self._user_sessions.setdefault(user_id, []), (score, token))
+
+    def _unindex(self, user_id: str, token: str) -> None:
+        score = self._scores.pop(token, None)
+        entries = self._user_sessions.get(user_id)
+        if score is None or not entries:
+            return
+        i = bisect.bisect_left(entries, (score, token))
+        if i < len(entries) and entries[i][1] == token:
+            del entries[i]
+        if not entries:
+            del self._user_sessions[user_id]
+
+    # -- sessions -------------------------------------------------------
+
+    def add_session(self, token: str, user_id: str, fields: Dict[str, str], ttl: int, max_per_user: int) -> List[str]:
+        with self._lock:
+            now = self.clock()
+            self._sweep(now)
+            self._sessions[token] = dict(fields, user_id=user_id)
+            self._expire_at(('session', token), now + ttl)
+            self._index(user_id, token, now)
+            entries = self._user_sessions[user_id]
+            evicted = []
+            while len(entries) > max_per_user:
+                _, oldest = entries[0]
+                self._drop(('session', oldest))
+                evicted.append(oldest)
+            return evicted
+
+    def touch_session(self, token: str, ttl: int, fields: Dict[str, str]) -> Optional[Dict[str, str]]:
+        with self._lock:
+            now = self.clock()
+            self._sweep(now)
+            session = self._sessions.get(token)
+            if session is None or not self._live(('session', token), now):
+                return None
+            session.update(fields)
+            self._expire_at(('session', token), now + ttl)
+            self._unindex(session['user_id'], token)
+            self._index(session['user_id'], token, now)
+            return dict(session)
+
+    def delete_session(self, token: str) -> bool:
+        with self._lock:
+            if token not in self._sessions:
+                return False
+            self._drop(('session', token))
+            return True
+
+    def delete_user_sessions(self, user_id: str) -> int:
+        with self._lock:
+            tokens = [token for _, token in self._user_sessions.get(user_id, [])]
+            for token in tokens:
+                self._drop(('session', token))
+            return len(tokens)
+
+    # -- login attempts -------------------------------------------------
+
+    def add_failure(self, identifier: str, window: int, max_attempts: int, lockout: int) -> bool:
+        with self._lock:
+            now = self.clock()
+            self._sweep(now)
+            failures = self._failures.setdefault(identifier, deque())
+            while failures and failures[0] <= now - window:
+                failures.popleft()
+            failures.append(now)
+            self._expire_at(('failures', identifier), now + window)
+            if len(failures) < max_attempts:
+                return False
+            self._lockouts[identifier] = now + lockout
+            self._expire_at(('lockout', identifier), now + lockout)
+            return True
+
+    def lockout_remaining(self, identifier: str) -> int:
+        with self._lock:
+            now = self.clock()
+            if not self._live(('lockout', identifier), now):
+                return 0
+            return math.ceil(self._lockouts[identifier] - now)
+
+
+SecurityStore = Union[RedisSecurityStore, InMemorySecurityStore]
+_security_store: Optional[SecurityStore] = None
+
+
+def get_security_store() -> SecurityStore:
+    """Redis store when Redis is reachable, otherwise a per-process in-memory one"""
+    global _security_store
+    if _security_store is None:
+        client = get_redis_client()
+        if client is not None:
+            _security_store = RedisSecurityStore(client)
+        else:
+            logger.warning("Redis unavailable - sessions and login lockouts are per-process")
+            _security_store = InMemorySecurityStore()
+    return _security_store
+
+
+def set_security_store(store: Optional[SecurityStore]) -> None:
+    """Use a specific store (tests); None goes back to auto-detection"""
+    global _security_store
+    _security_store = store
+
+
 class SessionManager:
     """
     Advanced session management with security features
+
+    State lives in the security store (Redis in production, see
+    RedisSecurityStore), so sessions are shared by every worker.
     """
     
-    # In-memory session store (use Redis in production)
-    _sessions: Dict[str, Dict] = {}
-    
-    SESSION_TIMEOUT = 3600  # 1 hour
+    SESSION_TIMEOUT = 3600  # 1 hour of inactivity
     MAX_SESSIONS_PER_USER = 5  # Prevent session exhaustion attacks
     
     @classmethod
@@ -141,6 +406,9 @@ class SessionManager:
         """
         Create new session
         
+        Evicts the user's least recently used session when they already
+        have MAX_SESSIONS_PER_USER.
+        
         Args:
             user_id: User ID
             ip_address: Client IP address
@@ -149,36 +417,29 @@ class SessionManager:
         Returns:
             Session token
         """
-        # Clean up expired sessions
-        cls._cleanup_expired_sessions()
-        
-        # Check session limit per user
-        user_sessions = [s for s in cls._sessions.values() if s.get('user_id') == user_id]
-        if len(user_sessions) >= cls.MAX_SESSIONS_PER_USER:
-            # Remove oldest session
-            oldest = min(user_sessions, key=lambda s: s['created_at'])
-            del cls._sessions[oldest['token']]
-        
         # Generate secure token
         token = secrets.token_urlsafe(32)
-        
-        # Store session
-        cls._sessions[token] = {
-            'token': token,
-            'user_id': user_id,
-            'ip_address': ip_address,
-            'user_agent': user_agent,
-            'created_at': datetime.utcnow(),
-            'last_activity': datetime.utcnow(),
-            'is_valid': True
-        }
+        now = datetime.utcnow().isoformat()
+        
+        get_security_store().add_session(
+            token,
+            user_id,
+            {
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'created_at': now,
+                'last_activity': now,
+            },
+            cls.SESSION_TIMEOUT,
+            cls.MAX_SESSIONS_PER_USER
+        )
         
         return token
     
     @classmethod
     def validate_session(cls, token: str, ip_address: str, user_agent: str) -> Tuple[bool, Optional[str]]:
         """
-        Validate session token
+        Validate session token and restart its inactivity timeout
         
         Args:
             token: Session token
@@ -188,23 +449,18 @@ class SessionManager:
         Returns:
             Tuple of (is_valid: bool, user_id: Optional[str])
         """
-        session = cls._sessions.get(token)
+        # Expired sessions are gone from the store
+        session = get_security_store().touch_session(
+            token, cls.SESSION_TIMEOUT, {'last_activity': datetime.utcnow().isoformat()}
+        )
         
         if not session:
             return False, None
         
-        # Check if expired
-        if datetime.utcnow() - session['last_activity'] > timedelta(seconds=cls.SESSION_TIMEOUT):
-            cls.invalidate_session(token)
-            return False, None
-        
         # Check IP address (optional - can be disabled for mobile users)
         # if session['ip_address'] != ip_address:
         #     return False, None
         
-        # Update last activity
-        session['last_activity'] = datetime.utcnow()
-        
         return True, session['user_id']
     
     @classmethod
@@ -218,10 +474,7 @@ class SessionManager:
         Returns:
             True if successful
         """
-        if token in cls._sessions:
-            del cls._sessions[token]
-            return True
-        return False
+        return get_security_store().delete_session(token)
     
     @classmethod
     def invalidate_all_user_sessions(cls, user_id: str) -> int:
@@ -234,27 +487,7 @@ class SessionManager:
         Returns:
             Number of sessions invalidated
         """
-        tokens_to_remove = [
-            token for token, session in cls._sessions.items()
-            if session.get('user_id') == user_id
-        ]
-        
-        for token in tokens_to_remove:
-            del cls._sessions[token]
-        
-        return len(tokens_to_remove)
-    
-    @classmethod
-    def _cleanup_expired_sessions(cls):
-        """Remove expired sessions"""
-        current_time = datetime.utcnow()
-        expired_tokens = [
-            token for token, session in cls._sessions.items()
-            if current_time - session['last_activity'] > timedelta(seconds=cls.SESSION_TIMEOUT)
-        ]
-        
-        for token in expired_tokens:
-            del cls._sessions[token]
+        return get_security_store().delete_user_sessions(user_id)
 
 
 class MFAManager:
@@ -374,11 +607,11 @@ class SecurityHeaders:
 class LoginAttemptTracker:
     """
     Track and prevent brute force login attempts
+
+    MAX_ATTEMPTS failures within ATTEMPT_WINDOW lock the identifier out for
+    LOCKOUT_DURATION after the last failure (state in the security store).
     """
     
-    # In-memory store (use Redis in production)
-    _attempts: Dict[str, list] = {}
-    
     MAX_ATTEMPTS = 5
     LOCKOUT_DURATION = 900  # 15 minutes
     ATTEMPT_WINDOW = 300  # 5 minutes
@@ -392,16 +625,13 @@ class LoginAttemptTracker:
             identifier: IP address or email
             success: Whether attempt was successful
         """
-        if identifier not in cls._attempts:
-            cls._attempts[identifier] = []
-        
-        cls._attempts[identifier].append({
-            'timestamp': datetime.utcnow(),
-            'success': success
-        })
+        # Only failures count towards a lockout
+        if success:
+            return
         
-        # Clean old attempts
-        cls._cleanup_old_attempts(identifier)
+        get_security_store().add_failure(
+            identifier, cls.ATTEMPT_WINDOW, cls.MAX_ATTEMPTS, cls.LOCKOUT_DURATION
+        )
     
     @classmethod
     def is_locked_out(cls, identifier: str) -> Tuple[bool, int]:
@@ -414,43 +644,8 @@ class LoginAttemptTracker:
         Returns:
             Tuple of (is_locked: bool, seconds_remaining: int)
         """
-        if identifier not in cls._attempts:
-            return False, 0
-        
-        cls._cleanup_old_attempts(identifier)
-        
-        # Get failed attempts in window
-        recent_failures = [
-            a for a in cls._attempts[identifier]
-            if not a['success']
-        ]
-        
-        if len(recent_failures) < cls.MAX_ATTEMPTS:
-            return False, 0
-        
-        # Check if still in lockout period
-        last_failure = max(recent_failures, key=lambda a: a['timestamp'])
-        lockout_end = last_failure['timestamp'] + timedelta(seconds=cls.LOCKOUT_DURATION)
-        
-        if datetime.utcnow() < lockout_end:
-            seconds_remaining = int((lockout_end - datetime.utcnow()).total_seconds())
-            return True, seconds_remaining
-        
-        # Lockout expired, reset
-        cls._attempts[identifier] = []
-        return False, 0
-    
-    @classmethod
-    def _cleanup_old_attempts(cls, identifier: str):
-        """Remove attempts outside the window"""
-        if identifier not in cls._attempts:
-            return
-        
-        cutoff = datetime.utcnow() - timedelta(seconds=cls.ATTEMPT_WINDOW)
-        cls._attempts[identifier] = [
-            a for a in cls._attempts[identifier]
-            if a['timestamp'] > cutoff
-        ]
+        seconds_remaining = get_security_store().lockout_remaining(identifier)
+        return seconds_remaining > 0, seconds_remaining
 
 
 # Helper functions
@@ -0,0 +1,74 @@
+"""
+Debug Artifact Sink
+Opt-in, sampled capture of large debug payloads (raw OCR text, LLM responses)
+
+Disabled unless DEBUG_ARTIFACTS_DIR is set. Then a fraction
+DEBUG_ARTIFACTS_SAMPLE_RATE (default 0.01) of calls write one file each,
+named <kind>-<timestamp>-<request_id>-<random>.txt, from a background
+thread. Files are written to a temp name and renamed, so concurrent
+workers never interleave or overwrite each other's output.
+"""
+import logging
+import os
+import random
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from app.core.logging_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = os.getenv("DEBUG_ARTIFACTS_DIR")
+SAMPLE_RATE = float(os.getenv("DEBUG_ARTIFACTS_SAMPLE_RATE", "0.01"))
+MAX_ARTIFACT_CHARS = 2_000_000
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _write(directory: str, filename: str, content: str) -> None:
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, os.path.join(directory, filename))
+        logger.debug("Saved debug artifact %s (%d chars)", filename, len(content))
+    except OSError as e:
+        logger.warning("Failed to save debug artifact %s: %s", filename, e)
+
+
+def save_artifact(kind: str, content: str, directory: Optional[str] = None,
+                  sample_rate: Optional[float] = None) -> Optional[str]:
+    """
+    Maybe save content for offline inspection; never blocks the caller
+
+    Returns the file name that will be written, or None if capture is
+    disabled or this call was not sampled.
+    """
+    global _executor
+    directory = directory or ARTIFACTS_DIR
+    rate = SAMPLE_RATE if sample_rate is None else sample_rate
+    if not directory or rate <= 0 or random.random() >= rate:
+        return None
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{kind}-{stamp}-{request_id_var.get()}-{uuid.uuid4().hex[:8]}.txt"
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-artifacts")
+        _executor.submit(_write, directory, filename, content[:MAX_ARTIFACT_CHARS])
+    return filename
+
+
+def flush_artifacts() -> None:
+    """Wait for queued artifact writes (tests / shutdown)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
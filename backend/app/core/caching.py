@@ -5,26 +5,39 @@ FIX #10: Redis-Based Query & Response Caching
 Reduces database load by 50-70%, improves page load 75%
 """
 
-import redis
 import json
 import time
-from typing import Optional, Any, Callable, Dict
+import math
+import random
+import asyncio
+import hashlib
+import inspect
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Any, Callable, Dict
 from functools import wraps
 from app.core.config import settings
+from app.core.metrics import record_cache
 import logging
 
+if TYPE_CHECKING:
+    import redis
+
 logger = logging.getLogger(__name__)
 
 # Global Redis client
-_redis_client: Optional[redis.Redis] = None
+_redis_client: Optional["redis.Redis"] = None
 
 
-def get_redis_client() -> Optional[redis.Redis]:
+def get_redis_client() -> Optional["redis.Redis"]:
     """Get or initialize Redis client"""
     global _redis_client
     
     if _redis_client is None:
         try:
+            import redis
             _redis_client = redis.from_url(
                 settings.REDIS_URL,
                 decode_responses=True,
@@ -80,8 +93,10 @@ class CacheManager:
             value = client.get(key)
             if value:
                 logger.debug(f"✅ Cache HIT: {key}")
+                record_cache("redis", "hit")
                 return json.loads(value)
             logger.debug(f"❌ Cache MISS: {key}")
+            record_cache("redis", "miss")
             return None
         except Exception as e:
             logger.warning(f"⚠️  Cache GET error: {e}")
@@ -238,6 +253,407 @@ def cache_result(
     return decorator
 
 
+# ============ READ-THROUGH CACHE (stampede protected) ============
+
+def build_call_key(func: Callable, args: tuple, kwargs: dict, prefix: str = "rt:") -> str:
+    """
+    Build a stable, hash-based cache key for a function call
+    
+    Arguments are bound to the function signature first, so f(1, b=2),
+    f(1, 2) and f(a=1, b=2) all map to the same key. None values and
+    kwargs are part of the key (unlike cache_result's default builder).
+    """
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        call_args = dict(bound.arguments)
+    except (TypeError, ValueError):
+        call_args = {"args": list(args), "kwargs": kwargs}
+    
+    payload = json.dumps(call_args, sort_keys=True, default=str, separators=(",", ":"))
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+    return f"{prefix}{func.__module__}.{func.__qualname__}:{digest}"
+
+
+class _LocalCacheStore:
+    """Bounded in-process LRU used when Redis is unavailable"""
+    
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            envelope, hard_expiry = item
+            if hard_expiry <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return envelope
+    
+    def set(self, key: str, envelope: dict, ttl: float):
+        with self._lock:
+            self._data[key] = (envelope, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_store = _LocalCacheStore()
+
+
+class _InFlight:
+    """A computation in progress that concurrent callers can wait on"""
+    
+    __slots__ = ("event", "result", "error")
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ReadThroughCache:
+    """
+    Stampede-protected read-through cache
+    
+    Values are stored in an envelope {"v": value, "neg": bool, "exp": soft_expiry,
+    "d": compute_seconds}. The physical TTL is ttl + stale_ttl so that an
+    expired value can still be served while one caller refreshes it.
+    
+    - Single-flight: one computation per key per process (threading.Event /
+      asyncio.Future) plus a Redis SET NX lock across processes
+    - Probabilistic early refresh (XFetch): hot keys are refreshed shortly
+      before they expire, weighted by how long they take to compute
+    - Stale-while-revalidate: expired values are served while a background
+      refresh runs
+    - Negative caching: None results are cached for negative_ttl seconds
+    """
+    
+    def __init__(
+        self,
+        ttl: int,
+        stale_ttl: int = 0,
+        negative_ttl: int = 0,
+        beta: float = 1.0,
+        lock_timeout: float = 10.0,
+        key_builder: Optional[Callable] = None,
+        prefix: str = "rt:",
+    ):
+        self.ttl = ttl
+        self.stale_ttl = max(0, stale_ttl)
+        self.negative_ttl = max(0, negative_ttl)
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.key_builder = key_builder
+        self.prefix = prefix
+        
+        self._inflight: Dict[str, _InFlight] = {}
+        self._inflight_lock = threading.Lock()
+        # loop -> {key: Future}; futures are bound to the loop that created them
+        self._async_inflight: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._background: set = set()
+    
+    # ---------- keys & storage ----------
+    
+    def key_for(self, func: Callable, args: tuple, kwargs: dict) -> str:
+        if self.key_builder:
+            return self.key_builder(*args, **kwargs)
+        return build_call_key(func, args, kwargs, self.prefix)
+    
+    def _read(self, key: str) -> Optional[dict]:
+        client = get_redis_client()
+        if not client:
+            return _local_store.get(key)
+        try:
+            raw = client.get(key)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"⚠️  Read-through cache GET error: {e}")
+            return None
+    
+    def _write(self, key: str, value: Any, compute_seconds: float):
+        negative = value is None
+        ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0:
+            return
+        envelope = {"v": value, "neg": negative, "exp": time.time() + ttl, "d": compute_seconds}
+        physical_ttl = ttl + (0 if negative else self.stale_ttl)
+        
+        client = get_redis_client()
+        if not client:
+            _local_store.set(key, envelope, physical_ttl)
+            return
+        try:
+            client.set(key, json.dumps(envelope, default=str), ex=max(1, int(math.ceil(physical_ttl))))
+        except Exception as e:
+            logger.warning(f"⚠️  Read-through cache SET error: {e}")
+    
+    def invalidate(self, key: str):
+        """Drop a cached value (both backends)"""
+        _local_store.delete(key)
+        CacheManager.delete(key)
+    
+    # ---------- freshness ----------
+    
+    def _state(self, envelope: Optional[dict]) -> str:
+        """Classify an envelope as 'miss', 'fresh', 'early' or 'stale'"""
+        if envelope is None:
+            return "miss"
+        now = time.time()
+        expiry = envelope.get("exp", 0)
+        if now >= expiry:
+            return "stale" if not envelope.get("neg") else "miss"
+        delta = envelope.get("d", 0) or 0
+        if delta > 0 and self.beta > 0:
+            # XFetch: now - delta * beta * ln(rand) >= expiry
+            if now - delta * self.beta * math.log(random.random() or 1e-12) >= expiry:
+                return "early"
+        return "fresh"
+    
+    # ---------- distributed lock ----------
+    
+    def _acquire_remote(self, key: str) -> Optional[str]:
+        """Try to take the cross-process lock; returns a token, '' if no Redis, None if held elsewhere"""
+        client = get_redis_client()
+        if not client:
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            if client.set(f"lock:{key}", token, nx=True, px=int(self.lock_timeout * 1000)):
+                return token
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️  Read-through cache lock error: {e}")
+            return ""
+    
+    def _release_remote(self, key: str, token: Optional[str]):
+        if not token:
+            return
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            # Only delete the lock if we still own it
+            client.eval(
+                "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0",
+                1, f"lock:{key}", token
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Read-through cache unlock error: {e}")
+    
+    # ---------- sync path ----------
+    
+    def _compute_sync(self, key: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        """Single-flight compute within this process, guarded by the Redis lock across processes"""
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+        
+        if not leader:
+            if not flight.event.wait(self.lock_timeout):
+                # Leader is stuck - compute rather than block indefinitely
+                return func(*args, **kwargs)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            token = self._acquire_remote(key)
+            if token is None:
+                # Another process is computing - wait for its value to land
+                deadline = time.time() + self.lock_timeout
+                while time.time() < deadline:
+                    time.sleep(0.05)
+                    envelope = self._read(key)
+                    if self._state(envelope) in ("fresh", "early"):
+                        flight.result = envelope["v"]
+                        return flight.result
+            try:
+                start = time.perf_counter()
+                flight.result = func(*args, **kwargs)
+                self._write(key, flight.result, time.perf_counter() - start)
+                return flight.result
+            finally:
+                self._release_remote(key, token)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+    
+    def _refresh_in_background_sync(self, key: str, func: Callable, args: tuple, kwargs: dict):
+        with self._inflight_lock:
+            if key in self._inflight:
+                return
+        
+        def run():
+            try:
+                self._compute_sync(key, func, args, kwargs)
+            except Exception as e:
+                logger.warning(f"⚠️  Background refresh failed for {key}: {e}")
+        
+        threading.Thread(target=run, name=f"cache-refresh:{key[:24]}", daemon=True).start()
+    
+    def call_sync(self, func: Callable, args: tuple, kwargs: dict) -> Any:
+        key = self.key_for(func, args, kwargs)
+        envelope = self._read(key)
+        state = self._state(envelope)
+        record_cache("read_through", state)
+        
+        if state == "fresh":
+            return envelope["v"]
+        if state in ("early", "stale"):
+            self._refresh_in_background_sync(key, func, args, kwargs)
+            return envelope["v"]
+        return self._compute_sync(key, func, args, kwargs)
+    
+    # ---------- async path ----------
+    
+    def _loop_inflight(self) -> Dict[str, "asyncio.Future"]:
+        loop = asyncio.get_running_loop()
+        table = self._async_inflight.get(loop)
+        if table is None:
+            table = self._async_inflight[loop] = {}
+        return table
+    
+    async def _compute_async(self, key: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        table = self._loop_inflight()
+        future = table.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        
+        future = asyncio.get_running_loop().create_future()
+        table[key] = future
+        try:
+            token = self._acquire_remote(key)
+            if token is None:
+                deadline = time.time() + self.lock_timeout
+                while time.time() < deadline:
+                    await asyncio.sleep(0.05)
+                    envelope = self._read(key)
+                    if self._state(envelope) in ("fresh", "early"):
+                        future.set_result(envelope["v"])
+                        return envelope["v"]
+            try:
+                start = time.perf_counter()
+                result = await func(*args, **kwargs)
+                self._write(key, result, time.perf_counter() - start)
+            finally:
+                self._release_remote(key, token)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark retrieved so an unobserved failure doesn't log a warning
+                future.exception()
+            raise
+        finally:
+            table.pop(key, None)
+    
+    def _refresh_in_background_async(self, key: str, func: Callable, args: tuple, kwargs: dict):
+        if key in self._loop_inflight():
+            return
+        
+        async def run():
+            try:
+                await self._compute_async(key, func, args, kwargs)
+            except Exception as e:
+                logger.warning(f"⚠️  Background refresh failed for {key}: {e}")
+        
+        task = asyncio.get_running_loop().create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def call_async(self, func: Callable, args: tuple, kwargs: dict) -> Any:
+        key = self.key_for(func, args, kwargs)
+        envelope = self._read(key)
+        state = self._state(envelope)
+        record_cache("read_through", state)
+        
+        if state == "fresh":
+            return envelope["v"]
+        if state in ("early", "stale"):
+            self._refresh_in_background_async(key, func, args, kwargs)
+            return envelope["v"]
+        return await self._compute_async(key, func, args, kwargs)
+
+
+def read_through_cache(
+    ttl: int = CacheConfig.USER_SUBSCRIPTION_TTL,
+    stale_ttl: int = 0,
+    negative_ttl: int = 0,
+    beta: float = 1.0,
+    lock_timeout: float = 10.0,
+    key_builder: Optional[Callable] = None,
+    prefix: str = "rt:",
+):
+    """
+    Decorator for a stampede-protected read-through cache
+    
+    Works on both sync and async functions. Results must be JSON serializable.
+    
+    Args:
+        ttl: Seconds a value is considered fresh
+        stale_ttl: Extra seconds an expired value may be served while it is
+            refreshed in the background (stale-while-revalidate)
+        negative_ttl: Seconds to cache a None result (0 disables)
+        beta: XFetch early-refresh aggressiveness (0 disables, >1 refreshes earlier)
+        lock_timeout: Max seconds to wait on another caller's computation
+        key_builder: Custom function to build cache key (default: hash of bound args)
+        prefix: Key prefix for the default key builder
+    
+    Usage:
+        @read_through_cache(ttl=600, stale_ttl=60, negative_ttl=30)
+        async def get_user_subscription(user_id: str):
+            ...
+    
+    The decorated function exposes .cache (the ReadThroughCache) and
+    .invalidate(*args, **kwargs) to drop the entry for one call.
+    """
+    def decorator(func):
+        cache = ReadThroughCache(
+            ttl=ttl,
+            stale_ttl=stale_ttl,
+            negative_ttl=negative_ttl,
+            beta=beta,
+            lock_timeout=lock_timeout,
+            key_builder=key_builder,
+            prefix=prefix,
+        )
+        
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await cache.call_async(func, args, kwargs)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return cache.call_sync(func, args, kwargs)
+        
+        wrapper.cache = cache
+        wrapper.invalidate = lambda *args, **kwargs: cache.invalidate(cache.key_for(func, args, kwargs))
+        return wrapper
+    return decorator
+
+
 # Common cache keys
 def build_user_subscription_key(user_id: str) -> str:
     """Build cache key for user subscription"""
@@ -63,6 +63,17 @@ class Settings(BaseSettings):
     USE_GEMINI_DUAL_PIPELINE: str = os.getenv("USE_GEMINI_DUAL_PIPELINE", "true")
     MAX_GEMINI_COST_PER_REQUEST: float = float(os.getenv("MAX_GEMINI_COST_PER_REQUEST", "0.10"))
     
+    # Email (SMTP) - EmailService sends through a pooled background queue
+    SMTP_HOST: str = os.getenv("SMTP_HOST", "")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))
+    SMTP_USER: str = os.getenv("SMTP_USER", "")
+    SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
+    SMTP_STARTTLS: bool = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "2"))
+    EMAIL_FROM: str = os.getenv("EMAIL_FROM", "TrulyInvoice <noreply@trulyinvoice.com>")
+    EMAIL_QUEUE_SIZE: int = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+    EMAIL_MAX_RETRIES: int = int(os.getenv("EMAIL_MAX_RETRIES", "3"))
+
     # Storage
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
@@ -0,0 +1,173 @@
+"""
+Structured Logging Configuration
+Non-blocking log pipeline with request-ID correlation
+
+- Every logger writes to one QueueHandler; a background QueueListener does
+  the formatting and the (synchronous) stdout write, so request threads
+  and the event loop never block on stdout
+- Messages use %-style args (logger.info("Saved %s", path)): records below
+  the configured level are dropped before any string is built
+- Per-module levels: LOG_LEVELS="app.services.flash_lite_formatter=DEBUG,app.core.caching=WARNING"
+- LOG_FORMAT=json emits one JSON object per line (extra={...} fields are
+  included); LOG_FORMAT=text (default) is human-readable
+- A forked child (gunicorn worker with PRELOAD_APP=true) doesn't inherit
+  the listener thread, so it gets a fresh queue and listener right after
+  the fork
+- request_id is taken from a contextvar set by RequestIdMiddleware, so
+  every line logged while serving a request carries its ID, including
+  lines logged from worker threads started with asyncio.to_thread
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s"
+
+# LogRecord attributes that are not user-supplied extra={...} fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp the current request ID on the record (runs in the logging thread)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the listener with as little work as possible
+
+    The stock QueueHandler runs the full formatter in the caller. Here only
+    the %-interpolation happens up front (args may be mutated after the
+    call returns); timestamps, JSON encoding and I/O happen in the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, request_id, msg + extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    """'app.services=DEBUG, app.core.caching=WARNING' -> {name: level}"""
+    levels: Dict[str, int] = {}
+    for part in (spec or "").split(","):
+        name, sep, level = part.partition("=")
+        if not sep or not name.strip():
+            continue
+        value = logging.getLevelName(level.strip().upper())
+        if isinstance(value, int):
+            levels[name.strip()] = value
+    return levels
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    module_levels: Optional[str] = None,
+    fmt: Optional[str] = None,
+    stream=None,
+) -> logging.handlers.QueueListener:
+    """
+    Install the queue-based pipeline on the root logger (idempotent)
+
+    Defaults come from LOG_LEVEL (INFO), LOG_LEVELS and LOG_FORMAT (text).
+    Returns the running listener; it is stopped (and the queue flushed) at exit.
+    """
+    global _listener
+    if _listener is not None:
+        shutdown_logging()
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+    module_levels = module_levels if module_levels is not None else os.getenv("LOG_LEVELS", "")
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else _TextFormatter(TEXT_FORMAT))
+
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    for name, module_level in parse_module_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    return _listener
+
+
+def _restart_after_fork() -> None:
+    """
+    Give a forked child its own queue and listener: the parent's listener
+    thread doesn't exist in the child, so records would pile up unread
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _DeferredQueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,155 @@
+"""
+Prometheus Metrics
+Per-stage latency, pipeline counters and in-flight gauges for /metrics
+
+- Histograms: one series per pipeline stage (download, ocr, llm_format,
+  validate, insert_invoice, export, ...)
+- Counters: cache lookups by result, retries, JSON repairs, fallbacks
+- Gauge: extractions currently in flight
+
+Multi-worker uvicorn/gunicorn: set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory before the workers start. Every worker then writes its
+samples to mmap files in that directory and /metrics aggregates all of
+them, so any worker can answer the scrape.
+
+prometheus_client is optional: without it every helper is a no-op and
+/metrics returns 503.
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    logger.info("ℹ️  prometheus_client not installed - metrics disabled")
+
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+
+# Pipeline stages range from ~5ms DB calls to ~60s LLM formatting of long bills
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        "trulyinvoice_stage_seconds",
+        "Wall time of one extraction/export pipeline stage",
+        ["stage"],
+        buckets=STAGE_BUCKETS,
+    )
+    CACHE_LOOKUPS = Counter(
+        "trulyinvoice_cache_lookups_total",
+        "Cache lookups by cache and result (hit, miss, stale, early)",
+        ["cache", "result"],
+    )
+    RETRIES = Counter(
+        "trulyinvoice_retries_total",
+        "Retried operations",
+        ["operation"],
+    )
+    JSON_REPAIRS = Counter(
+        "trulyinvoice_json_repairs_total",
+        "LLM responses that needed JSON repair, by outcome",
+        ["kind"],
+    )
+    FALLBACKS = Counter(
+        "trulyinvoice_fallbacks_total",
+        "Code paths that fell back to a slower or less accurate method",
+        ["kind"],
+    )
+    IN_FLIGHT = Gauge(
+        "trulyinvoice_extractions_in_flight",
+        "Documents currently being extracted",
+        multiprocess_mode="livesum",
+    )
+
+
+# Label lookups take a lock and hash the label tuple; hot paths reuse the child
+_children: Dict[Tuple[int, Tuple[str, ...]], object] = {}
+
+
+def _child(metric, *labels: str):
+    key = (id(metric), labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if PROMETHEUS_AVAILABLE:
+        _child(STAGE_SECONDS, stage).observe(seconds)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Record the block's wall time in trulyinvoice_stage_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_cache(cache: str, result: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        _child(CACHE_LOOKUPS, cache, result).inc()
+
+
+def record_retry(operation: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        _child(RETRIES, operation).inc()
+
+
+def record_json_repair(kind: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        _child(JSON_REPAIRS, kind).inc()
+
+
+def record_fallback(kind: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        _child(FALLBACKS, kind).inc()
+
+
+def extraction_started() -> None:
+    """Pair with extraction_finished() in a finally block"""
+    if PROMETHEUS_AVAILABLE:
+        IN_FLIGHT.inc()
+
+
+def extraction_finished() -> None:
+    if PROMETHEUS_AVAILABLE:
+        IN_FLIGHT.dec()
+
+
+def render_metrics() -> Optional[bytes]:
+    """Prometheus text exposition for this process, or all workers in multiprocess mode"""
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def mark_worker_dead(pid: Optional[int] = None) -> None:
+    """Drop a stopped worker's live gauges from the shared directory (shutdown hook)"""
+    if PROMETHEUS_AVAILABLE and MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
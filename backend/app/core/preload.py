@@ -0,0 +1,48 @@
+"""
+Heavy Module Preloading
+Import the SDKs the app loads lazily, ahead of the first request
+
+app.main keeps startup fast by importing the Gemini SDK, PyPDF2, PIL,
+openpyxl and the Supabase client on first use. Under gunicorn with
+PRELOAD_APP=true (see gunicorn.conf.py) the master process imports them
+once before forking, so every worker shares those pages copy-on-write and
+no request pays the import cost. Only modules are imported here - network
+clients are created per worker in app.main's startup hooks, never in the
+master, because sockets must not be shared across a fork.
+"""
+import importlib
+import logging
+import time
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+HEAVY_MODULES = (
+    "google.generativeai",
+    "app.services.vision_ocr_flash_lite_extractor",
+    "PyPDF2",
+    "PIL.Image",
+    "app.services.accountant_excel_exporter",
+    "app.services.excel_exporter",
+    "supabase",
+    "redis",
+)
+
+
+def preload_modules(modules: Iterable[str] = HEAVY_MODULES) -> Dict[str, float]:
+    """
+    Import each module, skipping any that aren't installed
+
+    Returns seconds spent per module that was imported.
+    """
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.info("Preload skipped %s: %s", name, e)
+            continue
+        timings[name] = time.perf_counter() - start
+    logger.info("Preloaded %d modules in %.2fs", len(timings), sum(timings.values()))
+    return timings
@@ -7,7 +7,6 @@ Install: pip install redis fastapi-limiter2
 This replaces the in-memory rate limiter with Redis for persistence.
 """
 
-import redis
 import time
 from datetime import datetime, timedelta
 import os
@@ -25,6 +24,7 @@ class RedisRateLimiter:
     def __init__(self, redis_url: str = REDIS_URL):
         """Initialize Redis connection"""
         try:
+            import redis
             self.redis = redis.from_url(redis_url, decode_responses=True)
             self.redis.ping()
             print("✅ Redis connected successfully")
@@ -14,19 +14,22 @@ backend_dir = pathlib.Path(__file__).parent.parent
 env_path = backend_dir / ".env"
 load_dotenv(env_path, encoding='utf-8')
 
-# Initialize Sentry for error monitoring (PRODUCTION READY)
-try:
-    import sentry_sdk
-    from sentry_sdk.integrations.fastapi import FastApiIntegration
-    from sentry_sdk.integrations.starlette import StarletteIntegration
-    
-    sentry_dsn = os.getenv("SENTRY_DSN")
-    environment = os.getenv("ENVIRONMENT", "production")
-    
-    if sentry_dsn:
+# Structured, queue-based logging (LOG_LEVEL / LOG_LEVELS / LOG_FORMAT)
+from app.core.logging_config import configure_logging
+configure_logging()
+
+# Initialize Sentry for error monitoring (PRODUCTION READY) - the SDK is
+# only imported when a DSN is configured
+sentry_dsn = os.getenv("SENTRY_DSN")
+if sentry_dsn:
+    try:
+        import sentry_sdk
+        from sentry_sdk.integrations.fastapi import FastApiIntegration
+        from sentry_sdk.integrations.starlette import StarletteIntegration
+        
         sentry_sdk.init(
             dsn=sentry_dsn,
-            environment=environment,
+            environment=os.getenv("ENVIRONMENT", "production"),
             integrations=[
                 FastApiIntegration(),
                 StarletteIntegration(),
@@ -41,33 +44,15 @@ try:
             debug=False,
         )
         print("✅ Sentry error monitoring initialized")
-    else:
-        print("⚠️  SENTRY_DSN not set - Error monitoring disabled")
-except ImportError:
-    print("⚠️  Sentry SDK not installed - Run: pip install sentry-sdk")
-except Exception as e:
-    print(f"⚠️  Sentry initialization failed: {e}")
+    except ImportError:
+        print("⚠️  Sentry SDK not installed - Run: pip install sentry-sdk")
+    except Exception as e:
+        print(f"⚠️  Sentry initialization failed: {e}")
+else:
+    print("⚠️  SENTRY_DSN not set - Error monitoring disabled")
 
-# Initialize Redis Connection (FIX #3 & #10)
-try:
-    from app.core.caching import get_redis_client
-    from app.core.redis_limiter import get_rate_limiter
-    
-    # Test Redis connection
-    redis_client = get_redis_client()
-    if redis_client:
-        print("✅ Redis cache layer initialized")
-        redis_client.ping()
-    else:
-        print("⚠️  Redis unavailable - Using fallback in-memory caching")
-    
-    # Initialize rate limiter
-    rate_limiter = get_rate_limiter()
-    print("✅ Redis rate limiter initialized")
-except ImportError:
-    print("⚠️  Redis SDK not installed - Run: pip install redis")
-except Exception as e:
-    print(f"⚠️  Redis initialization warning: {e}")
+# Redis, the rate limiter and Supabase are connected in the startup hook
+# below, not at import
 
 app = FastAPI(
     title="TrulyInvoice API",
@@ -114,13 +99,13 @@ app.add_middleware(
     expose_headers=["X-Request-ID"],
 )
 
-# Add rate limiting middleware
-from .middleware.rate_limiter import rate_limit_middleware, rate_limit_exception_handler
+# Rate limit errors raised by slowapi limits
+from .middleware.rate_limiter import rate_limit_exception_handler
 from slowapi.errors import RateLimitExceeded
-app.middleware("http")(rate_limit_middleware)
 app.add_exception_handler(RateLimitExceeded, rate_limit_exception_handler)
 
-# Add Security Headers Middleware (FIX #8)
+# Request validation, tier rate limiting and security headers (FIX #8) -
+# one pure ASGI middleware
 try:
     from app.middleware.security_headers import add_security_middleware
     add_security_middleware(app)
@@ -128,6 +113,11 @@ try:
 except Exception as e:
     print(f"⚠️  Security headers initialization warning: {e}")
 
+# Request ID correlation - added last so it is the outermost middleware and
+# every log line (including the ones above) carries the ID
+from app.middleware.request_id import RequestIdMiddleware
+app.add_middleware(RequestIdMiddleware)
+
 # Environment validation
 @app.on_event("startup")
 async def validate_environment():
@@ -153,6 +143,75 @@ async def validate_environment():
     print(f"   - Gemini API: Configured")
     print(f"   - Razorpay: Configured")
 
+@app.on_event("startup")
+async def connect_external_services():
+    """Connect Redis, the Redis rate limiter and Supabase in parallel (each can take seconds)"""
+    import asyncio
+    from app.core.caching import get_redis_client
+    from app.core.redis_limiter import get_rate_limiter
+    from app.services.supabase_helper import supabase
+
+    redis_client, rate_limiter, supabase_client = await asyncio.gather(
+        asyncio.to_thread(get_redis_client),
+        asyncio.to_thread(get_rate_limiter),
+        asyncio.to_thread(supabase.connect),
+        return_exceptions=True
+    )
+    if redis_client and not isinstance(redis_client, Exception):
+        print("✅ Redis cache layer initialized")
+    else:
+        print("⚠️  Redis unavailable - Using fallback in-memory caching")
+    if isinstance(rate_limiter, Exception):
+        print(f"⚠️  Redis rate limiter initialization warning: {rate_limiter}")
+    if isinstance(supabase_client, Exception):
+        print(f"⚠️ WARNING: Failed to initialize Supabase client: {supabase_client}")
+
+@app.on_event("startup")
+async def start_webhook_consumer():
+    """Re-queue Razorpay webhooks stored but not yet applied (e.g. before a restart)"""
+    import asyncio
+    from app.services.webhook_inbox import webhook_consumer
+    try:
+        await asyncio.to_thread(webhook_consumer.recover)
+    except Exception as e:
+        print(f"⚠️  Webhook recovery skipped: {e}")
+
+@app.on_event("startup")
+async def resume_quarantined_uploads():
+    """Restart malware scans for uploads still in quarantine (e.g. before a restart)"""
+    from app.api.documents import resume_quarantined_documents
+    try:
+        await resume_quarantined_documents()
+    except Exception as e:
+        print(f"⚠️  Quarantine resume skipped: {e}")
+
+@app.on_event("shutdown")
+async def stop_webhook_consumer():
+    """Finish webhooks already queued before the process exits"""
+    import asyncio
+    from app.services.webhook_inbox import webhook_consumer
+    await asyncio.to_thread(webhook_consumer.stop)
+
+@app.on_event("shutdown")
+async def stop_mail_queue():
+    """Deliver queued emails and close pooled SMTP connections"""
+    import asyncio
+    from app.services.mail_queue import mail_queue
+    await asyncio.to_thread(mail_queue.stop)
+
+@app.on_event("shutdown")
+async def drain_log_sinks():
+    """Write out buffered quality/audit logs and debug artifacts, drop live metrics, flush logs"""
+    import asyncio
+    from app.services.log_sink import drain_all
+    from app.core.metrics import mark_worker_dead
+    from app.core.artifacts import flush_artifacts
+    from app.core.logging_config import shutdown_logging
+    await asyncio.to_thread(drain_all)
+    await asyncio.to_thread(flush_artifacts)
+    mark_worker_dead()
+    shutdown_logging()
+
 # Import routers
 # Import API routers
 import os
@@ -116,23 +116,20 @@ class RateLimitTracker:
 rate_limit_tracker = RateLimitTracker()
 
 
-async def check_user_rate_limit(
-    request: Request,
-    user_id: str,
-    tier: str
-) -> None:
+RETRY_AFTER_SECONDS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def rate_limit_violation(user_id: str, tier: str) -> Optional[dict]:
     """
-    Check rate limits for a user based on their subscription tier
+    Count a request against the user's tier limits
     
     Args:
-        request: FastAPI request object
         user_id: User ID
         tier: Subscription tier
     
-    Raises:
-        HTTPException: If rate limit is exceeded
+    Returns:
+        429 detail (with retry_after_seconds) for the first exceeded window, or None
     """
-    # Check all time windows
     for window in ['minute', 'hour', 'day']:
         allowed, current, limit = rate_limit_tracker.check_rate_limit(
             user_id, 
@@ -141,78 +138,46 @@ async def check_user_rate_limit(
         )
         
         if not allowed:
-            # Calculate retry-after time
-            if window == 'minute':
-                retry_after = 60
-            elif window == 'hour':
-                retry_after = 3600
-            else:
-                retry_after = 86400
-            
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
-                    "error": "Rate limit exceeded",
-                    "message": f"Too many requests. Limit: {limit} requests per {window}",
-                    "current_usage": current,
-                    "limit": limit,
-                    "window": window,
-                    "retry_after_seconds": retry_after,
-                    "tier": tier,
-                    "upgrade_message": "Upgrade your plan for higher rate limits"
-                },
-                headers={"Retry-After": str(retry_after)}
-            )
-
-
-async def rate_limit_middleware(request: Request, call_next: Callable):
+            return {
+                "error": "Rate limit exceeded",
+                "message": f"Too many requests. Limit: {limit} requests per {window}",
+                "current_usage": current,
+                "limit": limit,
+                "window": window,
+                "retry_after_seconds": RETRY_AFTER_SECONDS[window],
+                "tier": tier,
+                "upgrade_message": "Upgrade your plan for higher rate limits"
+            }
+    return None
+
+
+async def check_user_rate_limit(
+    request: Request,
+    user_id: str,
+    tier: str
+) -> None:
     """
-    Middleware to apply rate limiting to all requests
+    Check rate limits for a user based on their subscription tier
     
     Args:
         request: FastAPI request object
-        call_next: Next middleware/handler
+        user_id: User ID
+        tier: Subscription tier
     
-    Returns:
-        Response from the next handler
+    Raises:
+        HTTPException: If rate limit is exceeded
     """
-    # Skip rate limiting for certain paths
-    skip_paths = ["/health", "/docs", "/openapi.json", "/redoc"]
-    
-    if any(request.url.path.startswith(path) for path in skip_paths):
-        return await call_next(request)
-    
-    # Get user info from request (if authenticated)
-    user_id = getattr(request.state, "user_id", None)
-    
-    if user_id:
-        # Get user's subscription tier from request state
-        # (should be set by authentication middleware)
-        tier = getattr(request.state, "user_tier", "free")
-        
-        try:
-            await check_user_rate_limit(request, user_id, tier)
-        except HTTPException as e:
-            return JSONResponse(
-                status_code=e.status_code,
-                content=e.detail,
-                headers=e.headers
-            )
-    
-    # Continue with request
-    response = await call_next(request)
-    
-    # Add rate limit headers
-    if user_id:
-        tier = getattr(request.state, "user_tier", "free")
-        limits = get_rate_limits(tier)
-        
-        # Add informational headers
-        response.headers["X-RateLimit-Limit-Minute"] = str(limits["api_requests_per_minute"])
-        response.headers["X-RateLimit-Limit-Hour"] = str(limits["api_requests_per_hour"])
-        response.headers["X-RateLimit-Limit-Day"] = str(limits["api_requests_per_day"])
-    
-    return response
+    detail = rate_limit_violation(user_id, tier)
+    if detail:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(detail["retry_after_seconds"])}
+        )
+
+
+# Requests to these paths are never rate limited (used by SecurityMiddleware)
+RATE_LIMIT_SKIP_PATHS = ("/health", "/docs", "/openapi.json", "/redoc")
 
 
 # Rate limit exception handler
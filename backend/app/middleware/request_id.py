@@ -0,0 +1,52 @@
+"""
+Request ID Middleware
+Correlates every log line of a request with one ID
+
+Reuses a well-formed incoming X-Request-ID (so IDs set by the frontend or
+a load balancer carry through), otherwise generates one. The ID is put in
+request_id_var for the logging filter and echoed in the response header.
+
+Pure ASGI (no BaseHTTPMiddleware), so streaming responses are untouched
+and the contextvar is visible to everything the request runs.
+"""
+
+import re
+import uuid
+
+from app.core.logging_config import request_id_var
+
+REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(rb"^[A-Za-z0-9._-]{8,64}$")
+
+
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_ID_HEADER and _VALID_REQUEST_ID.match(value):
+                request_id = value.decode("ascii")
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+
+        token = request_id_var.set(request_id)
+        header = (REQUEST_ID_HEADER, request_id.encode("ascii"))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = [h for h in message.get("headers", ()) if h[0].lower() != REQUEST_ID_HEADER]
+                headers.append(header)
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,110 +1,209 @@
 """
-Security Headers Middleware
+Security Middleware
 FIX #8: Comprehensive Security Headers
 
-Adds CSP, X-Frame-Options, HSTS, and other security headers
+SecurityMiddleware is one pure ASGI layer (no BaseHTTPMiddleware) that:
+- rejects unsupported Content-Types (415) and bodies over 10MB (413),
+  including chunked bodies without a Content-Length, without buffering
+- applies per-user tier rate limits (429, app/middleware/rate_limiter.py)
+- adds CSP, X-Frame-Options, HSTS and the other security headers
+
+Header lists are built once, as raw (name, value) byte pairs, so a
+request costs one header list and no response buffering; streaming
+responses and uploads pass straight through.
 """
 
+import json
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
 from fastapi import FastAPI, Request
+from starlette.exceptions import HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 from app.core.config import settings
+from app.config.plans import get_rate_limits
+from app.middleware.rate_limiter import RATE_LIMIT_SKIP_PATHS, rate_limit_violation
+
+
+Headers = List[Tuple[bytes, bytes]]
+
+MAX_BODY_BYTES = 10 * 1024 * 1024  # 10MB
+BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+ALLOWED_CONTENT_TYPES = (
+    b"application/json",
+    b"multipart/form-data",
+    b"application/x-www-form-urlencoded",
+)
+SENSITIVE_PATHS = (
+    "/api/auth/",
+    "/api/payments/",
+    "/api/subscriptions/",
+    "/api/account/",
+)
+
+# Added to every response
+#
+# Prevents:
+# - Clickjacking (X-Frame-Options)
+# - MIME type sniffing (X-Content-Type-Options)
+# - XSS attacks (X-XSS-Protection, CSP)
+# - Man-in-the-middle (HSTS, production only)
+SECURITY_HEADERS: Headers = [
+    # Content Security Policy - restricts resources that can be loaded
+    (b"content-security-policy", (
+        b"default-src 'self'; "
+        b"script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
+        b"style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+        b"img-src 'self' data: https:; "
+        b"font-src 'self' https://fonts.gstatic.com; "
+        b"connect-src 'self' https://api.trulyinvoice.com; "
+        b"frame-ancestors 'none'; "
+        b"base-uri 'self'; "
+        b"form-action 'self'"
+    )),
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    # Control how much referrer info is shared
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    # Restrict which browser features can be used
+    (b"permissions-policy", (
+        b"accelerometer=(), ambient-light-sensor=(), autoplay=(), battery=(), camera=(), "
+        b"document-domain=(), encrypted-media=(), fullscreen=(), geolocation=(), gyroscope=(), "
+        b"magnetometer=(), microphone=(), midi=(), payment=(), picture-in-picture=(), "
+        b"sync-xhr=(), usb=(), vr=(), xr-spatial-tracking=()"
+    )),
+]
+HSTS_HEADER = (b"strict-transport-security", b"max-age=31536000; includeSubDomains; preload")
+# Disable client caching for sensitive pages
+NO_CACHE_HEADERS: Headers = [
+    (b"cache-control", b"no-store, no-cache, must-revalidate, proxy-revalidate"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+]
+
+
+@lru_cache(maxsize=None)
+def _rate_limit_headers(tier: str) -> Tuple[Tuple[bytes, bytes], ...]:
+    """Informational X-RateLimit-Limit-* headers for a tier"""
+    limits = get_rate_limits(tier)
+    return (
+        (b"x-ratelimit-limit-minute", str(limits["api_requests_per_minute"]).encode()),
+        (b"x-ratelimit-limit-hour", str(limits["api_requests_per_hour"]).encode()),
+        (b"x-ratelimit-limit-day", str(limits["api_requests_per_day"]).encode()),
+    )
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityMiddleware:
     """
-    Add security headers to all responses
-    
-    Prevents:
-    - Clickjacking (X-Frame-Options)
-    - MIME type sniffing (X-Content-Type-Options)
-    - XSS attacks (X-XSS-Protection, CSP)
-    - Man-in-the-middle (HSTS)
+    Request validation, rate limiting and security headers in one pure ASGI layer
+
+    Usage:
+        app.add_middleware(SecurityMiddleware)
     """
-    
-    async def dispatch(self, request: Request, call_next) -> Response:
-        """Add security headers to response"""
-        
-        response = await call_next(request)
-        
-        # Content Security Policy
-        # Restricts resources that can be loaded
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
-            "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
-            "img-src 'self' data: https:; "
-            "font-src 'self' https://fonts.gstatic.com; "
-            "connect-src 'self' https://api.trulyinvoice.com; "
-            "frame-ancestors 'none'; "
-            "base-uri 'self'; "
-            "form-action 'self'"
-        )
-        
-        # Prevent browsers from MIME-sniffing
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        
-        # Prevent clickjacking attacks
-        response.headers["X-Frame-Options"] = "DENY"
-        
-        # Enable browser XSS protection
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        
-        # HTTP Strict Transport Security
-        # Forces HTTPS in production
-        if settings.ENVIRONMENT == "production":
-            response.headers["Strict-Transport-Security"] = (
-                "max-age=31536000; includeSubDomains; preload"
-            )
-        
-        # Referrer Policy
-        # Control how much referrer info is shared
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
-        # Feature Policy (now Permissions-Policy)
-        # Restrict which browser features can be used
-        response.headers["Permissions-Policy"] = (
-            "accelerometer=(), "
-            "ambient-light-sensor=(), "
-            "autoplay=(), "
-            "battery=(), "
-            "camera=(), "
-            "document-domain=(), "
-            "encrypted-media=(), "
-            "fullscreen=(), "
-            "geolocation=(), "
-            "gyroscope=(), "
-            "magnetometer=(), "
-            "microphone=(), "
-            "midi=(), "
-            "payment=(), "
-            "picture-in-picture=(), "
-            "sync-xhr=(), "
-            "usb=(), "
-            "vr=(), "
-            "xr-spatial-tracking=()"
-        )
-        
-        # Disable client caching for sensitive pages
-        if self._is_sensitive_endpoint(request.url.path):
-            response.headers["Cache-Control"] = (
-                "no-store, no-cache, must-revalidate, proxy-revalidate"
-            )
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-        
-        return response
-    
+
+    def __init__(self, app, environment: Optional[str] = None, max_body_bytes: int = MAX_BODY_BYTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+        headers = list(SECURITY_HEADERS)
+        # HTTP Strict Transport Security - forces HTTPS in production
+        if (environment or settings.ENVIRONMENT) == "production":
+            headers.append(HSTS_HEADER)
+        self.headers = headers
+        self.sensitive_headers = headers + NO_CACHE_HEADERS
+        # Set by us, so any value the app chose is replaced
+        self.header_names = frozenset(name for name, _ in self.sensitive_headers)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        headers = self.sensitive_headers if path.startswith(SENSITIVE_PATHS) else self.headers
+
+        # ---- Request validation ----------------------------------------
+        content_type = content_length = None
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                content_type = value
+            elif name == b"content-length":
+                content_length = value
+
+        method = scope["method"]
+        if method in BODY_METHODS and content_type:
+            content_type = content_type.lower()
+            if not any(allowed in content_type for allowed in ALLOWED_CONTENT_TYPES):
+                await self._reject(send, 415, {"error": "Unsupported Media Type"}, headers)
+                return
+
+        if content_length is not None:
+            try:
+                too_large = int(content_length) > self.max_body_bytes
+            except ValueError:
+                too_large = False
+            if too_large:
+                await self._reject(send, 413, {"error": "Payload Too Large"}, headers)
+                return
+        elif method in BODY_METHODS:
+            receive = self._limit_body(receive)
+
+        # ---- Rate limiting ---------------------------------------------
+        # user_id / user_tier are set on request.state by authentication
+        state = scope.get("state") or {}
+        user_id = None if path.startswith(RATE_LIMIT_SKIP_PATHS) else state.get("user_id")
+        if user_id:
+            tier = state.get("user_tier", "free")
+            detail = rate_limit_violation(user_id, tier)
+            if detail:
+                retry_after = (b"retry-after", str(detail["retry_after_seconds"]).encode())
+                await self._reject(send, 429, detail, headers + [retry_after])
+                return
+            headers = headers + list(_rate_limit_headers(tier))
+
+        # ---- Response headers ------------------------------------------
+        header_names = self.header_names
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    h for h in message.get("headers", ()) if h[0].lower() not in header_names
+                ] + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    def _limit_body(self, receive):
+        """Count a body sent without Content-Length and stop it at max_body_bytes"""
+        limit = self.max_body_bytes
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Rendered as a 413 by the app's exception handling
+                    raise HTTPException(status_code=413, detail="Payload Too Large")
+            return message
+
+        return receive_limited
+
     @staticmethod
-    def _is_sensitive_endpoint(path: str) -> bool:
-        """Check if endpoint contains sensitive data"""
-        sensitive_paths = [
-            "/api/v1/auth/",
-            "/api/v1/payments/",
-            "/api/v1/subscriptions/",
-            "/api/v1/account/",
-        ]
-        return any(path.startswith(p) for p in sensitive_paths)
+    async def _reject(send, status_code: int, content: dict, headers: Headers) -> None:
+        body = json.dumps(content).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ] + headers,
+        })
+        await send({"type": "http.response.body", "body": body})
 
 
 class CORSEnhancedMiddleware(BaseHTTPMiddleware):
@@ -177,81 +276,12 @@ class CORSEnhancedMiddleware(BaseHTTPMiddleware):
         return False
 
 
-class RequestValidationMiddleware(BaseHTTPMiddleware):
-    """
-    Validate incoming requests for security issues
-    
-    Checks:
-    - Content-Type is valid
-    - Content-Length is reasonable
-    - No suspicious patterns
-    """
-    
-    async def dispatch(self, request: Request, call_next) -> Response:
-        """Validate request before processing"""
-        
-        # Check Content-Type for POST/PUT/PATCH
-        if request.method in ["POST", "PUT", "PATCH"]:
-            content_type = request.headers.get("content-type", "")
-            
-            # Whitelist of allowed content types
-            allowed_types = [
-                "application/json",
-                "multipart/form-data",
-                "application/x-www-form-urlencoded",
-            ]
-            
-            if content_type and not any(t in content_type for t in allowed_types):
-                return Response(
-                    status_code=415,
-                    content={"error": "Unsupported Media Type"}
-                )
-        
-        # Check Content-Length
-        content_length = request.headers.get("content-length", "0")
-        try:
-            length = int(content_length)
-            max_size = 10 * 1024 * 1024  # 10MB
-            
-            if length > max_size:
-                return Response(
-                    status_code=413,
-                    content={"error": "Payload Too Large"}
-                )
-        except ValueError:
-            pass
-        
-        # Check for suspicious headers
-        user_agent = request.headers.get("user-agent", "").lower()
-        if self._is_suspicious_user_agent(user_agent):
-            # Log but don't block (could be legitimate bots)
-            pass
-        
-        response = await call_next(request)
-        return response
-    
-    @staticmethod
-    def _is_suspicious_user_agent(user_agent: str) -> bool:
-        """Check for suspicious user agents"""
-        suspicious_patterns = [
-            "sqlmap",
-            "nikto",
-            "nmap",
-            "masscan",
-            "nessus",
-            "openvas",
-        ]
-        return any(pattern in user_agent for pattern in suspicious_patterns)
-
-
 def add_security_middleware(app: FastAPI) -> None:
     """Add all security middleware to FastAPI app"""
     
     print("🔒 Adding security middleware...")
     
-    # Order matters! Add in reverse order they should execute
     # NOTE: Do NOT add CORSEnhancedMiddleware here - use FastAPI's built-in CORSMiddleware in main.py
-    app.add_middleware(RequestValidationMiddleware)
-    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(SecurityMiddleware)
     
     print("✅ Security middleware added")
@@ -36,7 +36,10 @@ async def check_subscription(user_id: str, db: Optional[Session] = None) -> Tupl
 
         # Get user's subscription and current usage
         # Use execute() and check data array to handle missing subscriptions gracefully
-        subscription_response = supabase.table("subscriptions").select("*").eq("user_id", user_id).execute()
+        subscription_response = supabase.table("subscriptions")\
+            .select("tier, status, scans_used_this_period")\
+            .eq("user_id", user_id)\
+            .execute()
         
         if not subscription_response.data or len(subscription_response.data) == 0:
             # No subscription - default to free
@@ -157,7 +160,7 @@ async def increment_usage(user_id: str, amount: int = 1) -> bool:
         current_month = now.strftime("%Y-%m")
         
         # Update scan count
-        subscription_response = supabase.table("subscriptions").select("*").eq("user_id", user_id).execute()
+        subscription_response = supabase.table("subscriptions").select("scans_used_this_period").eq("user_id", user_id).execute()
         
         if subscription_response.data and len(subscription_response.data) > 0:
             current_scans = subscription_response.data[0].get("scans_used_this_period", 0)
@@ -32,6 +32,8 @@ import hashlib
 import decimal
 from decimal import Decimal, ROUND_HALF_UP
 
+from app.services.field_registry import fields_by_scope
+
 logger = logging.getLogger(__name__)
 
 
@@ -84,7 +86,11 @@ class AccountantExcelExporter:
         'created_at', 'updated_at', 'confidence_score'
     ]
 
-    def __init__(self):
+    def __init__(self, field_registry: Optional[Dict] = None):
+        # Precomputed columns (get_invoice_field_registry); None = scan the invoices
+        self.field_registry = field_registry
+        self._registry_fields = fields_by_scope(field_registry) if field_registry else None
+
         # Professional color scheme
         self.colors = {
             'header_bg': '1F4E79',      # Dark blue
@@ -198,7 +204,7 @@ class AccountantExcelExporter:
         # Save workbook
         wb.save(filename)
         
-        print(f"✅ Accountant-friendly Excel exported: {filename}")
+        logger.info('Accountant-friendly Excel exported: %s', filename)
         return filename
     
     def export_invoices_bulk(self, invoices: List[Dict], filename: str = None,
@@ -255,11 +261,11 @@ class AccountantExcelExporter:
         total_line_items = sum(len(inv.get('line_items', [])) for inv in validated_invoices)
         total_columns = self._count_dynamic_columns(validated_invoices)
 
-        print(f"✅ Professional Excel export completed: {filename}")
-        print(f"   📊 {total_invoices} invoices, {total_line_items} line items")
-        print(f"   🔧 {total_columns} dynamic columns created")
-        print(f"   🎨 Template: {template}")
-        print(f"   📁 Size: {self._get_file_size_mb(filename)} MB")
+        logger.info('Professional Excel export completed: %s', filename)
+        logger.info('%s invoices, %s line items', total_invoices, total_line_items)
+        logger.info('%s dynamic columns created', total_columns)
+        logger.info('Template: %s', template)
+        logger.info('Size: %s MB', self._get_file_size_mb(filename))
 
         return filename
     
@@ -273,9 +279,9 @@ class AccountantExcelExporter:
                 if cleaned:
                     validated.append(cleaned)
                 else:
-                    print(f"⚠️  Skipped invoice {idx + 1}: Invalid data structure")
+                    logger.warning('Skipped invoice %s: Invalid data structure', idx + 1)
             except Exception as e:
-                print(f"❌ Error processing invoice {idx + 1}: {str(e)}")
+                logger.error('Error processing invoice %s: %s', idx + 1, str(e))
                 continue
 
         return validated
@@ -284,7 +290,7 @@ class AccountantExcelExporter:
         """Clean and validate single invoice data"""
         # More lenient validation - at least vendor_name or invoice_number needed
         if not invoice.get('vendor_name') and not invoice.get('invoice_number'):
-            print(f"⚠️  Invoice missing vendor_name and invoice_number: {invoice}")
+            logger.warning('Invoice missing vendor_name and invoice_number: %s', invoice)
             return None
 
         cleaned = invoice.copy()
@@ -304,7 +310,7 @@ class AccountantExcelExporter:
             try:
                 cleaned['line_items'] = json.loads(cleaned['line_items'])
             except (json.JSONDecodeError, ValueError, TypeError) as e:
-                logger.warning(f"Failed to parse line_items: {e}")
+                logger.warning('Failed to parse line_items: %s', e)
                 cleaned['line_items'] = []
 
         # Ensure line_items is list
@@ -320,7 +326,7 @@ class AccountantExcelExporter:
                 try:
                     cleaned[field] = float(cleaned[field])
                 except (ValueError, TypeError) as e:
-                    logger.warning(f"Failed to convert {field} to float: {e}")
+                    logger.warning('Failed to convert %s to float: %s', field, e)
                     cleaned[field] = 0.0
             else:
                 cleaned[field] = 0.0  # Ensure None values become 0.0
@@ -338,7 +344,7 @@ class AccountantExcelExporter:
         for field in gstin_fields:
             if cleaned.get(field):
                 if not self._validate_gstin(cleaned[field]):
-                    print(f"⚠️  Invalid GSTIN format: {cleaned[field]}")
+                    logger.warning('Invalid GSTIN format: %s', cleaned[field])
 
         return cleaned
 
@@ -687,7 +693,7 @@ class AccountantExcelExporter:
             
             amount = Decimal(str(raw_amount))
         except (ValueError, TypeError, decimal.InvalidOperation) as e:
-            print(f"⚠️ Warning: Invalid amount in line item: {item.get('amount', 'N/A')} - Error: {e}")
+            logger.warning('Invalid amount in line item: %s - Error: %s', item.get('amount', 'N/A'), e)
             amount = Decimal('0')
         
         if amount == 0:
@@ -1188,13 +1194,17 @@ class AccountantExcelExporter:
         ws.freeze_panes = "A2"
         ws.auto_filter.ref = f"A1:{get_column_letter(len(headers))}1"
 
-        print(f"   📋 Complete Data sheet: {len(headers)} columns, {len(invoices)} rows")
+        logger.info('Complete Data sheet: %s columns, %s rows', len(headers), len(invoices))
 
     def _analyze_all_available_columns(self, invoices: List[Dict]) -> Dict[str, str]:
         """
         Analyze all invoices to find every possible field that exists
+        (read from the field registry instead when one was given)
         Returns a dict of {field_name: data_type}
         """
+        if self._registry_fields is not None:
+            return self._order_columns(self._registry_columns())
+
         all_fields = {}
 
         for invoice in invoices:
@@ -1229,7 +1239,23 @@ class AccountantExcelExporter:
                                 if not isinstance(value, (list, dict)):
                                     all_fields[field_name] = self._infer_data_type(value)
 
-        # Sort fields for consistent ordering
+        return self._order_columns(all_fields)
+
+    def _registry_columns(self) -> Dict[str, str]:
+        """Same columns as the scan, read from the field registry"""
+        registry = self._registry_fields
+        all_fields = {}
+        for field in self.STANDARD_FIELDS:
+            if field in registry['invoice']:
+                all_fields[field] = registry['invoice'][field]['data_type']
+        for key, entry in registry['raw'].items():
+            all_fields.setdefault(key, entry['data_type'])
+        for key, entry in registry['line_item'].items():
+            all_fields.setdefault(f"line_item_{key}", entry['data_type'])
+        return all_fields
+
+    def _order_columns(self, all_fields: Dict[str, str]) -> Dict[str, str]:
+        """Priority fields first, then the rest alphabetically"""
         sorted_fields = {}
         # Priority fields first
         priority_fields = ['invoice_number', 'invoice_date', 'vendor_name', 'total_amount',
@@ -1448,47 +1474,21 @@ class AccountantExcelExporter:
             
             if field_info['source'] == 'invoice':
                 # Check if any invoice has this field
-                for invoice in invoices:
-                    if invoice.get(field_info['field']) is not None:
-                        has_data = True
-                        break
+                has_data = self._has_invoice_data(invoices, field_info['field'])
                         
             elif field_info['source'] == 'item':
                 # Check if any line item has this field
-                for invoice in invoices:
-                    line_items_raw = invoice.get('line_items', [])
-                    if isinstance(line_items_raw, str):
-                        try:
-                            line_items = json.loads(line_items_raw)
-                        except:
-                            line_items = []
-                    else:
-                        line_items = line_items_raw if isinstance(line_items_raw, list) else []
-                    
-                    for item in line_items:
-                        if item.get(field_info['field']) is not None:
-                            has_data = True
-                            break
-                    if has_data:
-                        break
+                has_data = self._has_item_data(invoices, field_info['field'])
                         
             elif field_info['source'] == 'calculated':
                 # For calculated fields, check if the required base data exists
                 if field_info['field'] == 'balance_due':
                     # Need total_amount and paid_amount
-                    for invoice in invoices:
-                        if (invoice.get('total_amount') is not None or 
-                            invoice.get('paid_amount') is not None):
-                            has_data = True
-                            break
+                    has_data = (self._has_invoice_data(invoices, 'total_amount') or
+                                self._has_invoice_data(invoices, 'paid_amount'))
                 elif field_info['field'] in ['cgst_rate', 'cgst_amount', 'sgst_rate', 'sgst_amount', 'igst_rate', 'igst_amount']:
                     # Need GST data
-                    for invoice in invoices:
-                        if (invoice.get('cgst') is not None or 
-                            invoice.get('sgst') is not None or 
-                            invoice.get('igst') is not None):
-                            has_data = True
-                            break
+                    has_data = any(self._has_invoice_data(invoices, field) for field in ('cgst', 'sgst', 'igst'))
                 elif field_info['field'] == 'line_total':
                     # Always include if we have line items
                     has_data = True
@@ -1497,6 +1497,31 @@ class AccountantExcelExporter:
                 available_columns[header] = field_info
         
         return available_columns
+
+    def _has_invoice_data(self, invoices: List[Dict], field: str) -> bool:
+        """Whether any invoice has a value for field (registry lookup when available)"""
+        if self._registry_fields is not None:
+            return field in self._registry_fields['invoice']
+        return any(invoice.get(field) is not None for invoice in invoices)
+
+    def _has_item_data(self, invoices: List[Dict], field: str) -> bool:
+        """Whether any line item has a value for field (registry lookup when available)"""
+        if self._registry_fields is not None:
+            return field in self._registry_fields['line_item']
+        for invoice in invoices:
+            line_items_raw = invoice.get('line_items', [])
+            if isinstance(line_items_raw, str):
+                try:
+                    line_items = json.loads(line_items_raw)
+                except (TypeError, ValueError):
+                    line_items = []
+            else:
+                line_items = line_items_raw if isinstance(line_items_raw, list) else []
+
+            for item in line_items:
+                if isinstance(item, dict) and item.get(field) is not None:
+                    return True
+        return False
     
     def _calculate_field_value(self, field_name: str, invoice: Dict, item: Dict) -> Any:
         """Calculate value for calculated fields"""
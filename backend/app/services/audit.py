@@ -11,6 +11,7 @@ from typing import Optional, Dict, Any
 import json
 from sqlalchemy import Column, Integer, String, DateTime, Text
 from app.core.database import Base
+from app.services.log_sink import BatchedLogWriter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -103,6 +104,24 @@ class AuditLog(Base):
         }
 
 
+def _insert_audit_logs(rows: list) -> None:
+    """Write one batch of audit events in a single transaction"""
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(AuditLog, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+audit_log_writer = BatchedLogWriter("audit_logs", _insert_audit_logs)
+
+
 class AuditLogger:
     """Log audit events to database"""
     
@@ -126,8 +145,11 @@ class AuditLogger:
         """
         Log an action to audit log
         
+        The event is queued on audit_log_writer and written in a batch by
+        its own session, so the caller's session is never flushed here.
+        
         Args:
-            db: Database session
+            db: Database session (kept for callers; not written to)
             user_id: User performing action
             action: Action type
             status: success, failure, blocked
@@ -143,7 +165,7 @@ class AuditLogger:
             error_message: Error details if failed
         
         Returns:
-            AuditLog record
+            AuditLog record (unsaved, so id is None)
         """
         try:
             audit_log = AuditLog(
@@ -163,8 +185,11 @@ class AuditLogger:
                 created_at=datetime.utcnow()
             )
             
-            db.add(audit_log)
-            db.flush()
+            audit_log_writer.submit({
+                column.name: getattr(audit_log, column.name)
+                for column in AuditLog.__table__.columns
+                if column.name != "id"
+            })
             
             log_level = "WARNING" if status != "success" else "INFO"
             logger.log(
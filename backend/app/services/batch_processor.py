@@ -5,12 +5,18 @@ Safely handle 100 invoices in 1 minute instead of 8 minutes
 """
 
 import asyncio
+import random
+import re
 import uuid
 from typing import List, Dict, Any, Optional, Callable
 from dataclasses import dataclass
 from datetime import datetime
 import logging
 
+from starlette.exceptions import HTTPException
+
+from app.core.metrics import record_retry
+
 logger = logging.getLogger(__name__)
 
 
@@ -44,29 +50,155 @@ class BatchResult:
             self.created_at = datetime.utcnow()
 
 
+# Upstream throttling (Vision / Gemini quota) vs other transient failures
+THROTTLE_PATTERN = re.compile(r'\b(?:429|503)\b|rate limit|resource exhausted|quota|service unavailable', re.IGNORECASE)
+TRANSIENT_PATTERN = re.compile(r'timeout|timed out|connection|temporarily', re.IGNORECASE)
+THROTTLE_EXCEPTIONS = {'ResourceExhausted', 'ServiceUnavailable', 'TooManyRequests'}
+
+
+def is_client_error(error: BaseException) -> bool:
+    """
+    Our own 4xx (the monthly scan quota is used up, the file is invalid):
+    retrying can't change the answer and it says nothing about upstream load
+    """
+    return isinstance(error, HTTPException) and 400 <= error.status_code < 500
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """429/503-style errors from Vision / Gemini / storage: the upstream API wants us to slow down"""
+    if is_client_error(error):
+        return False
+    if type(error).__name__ in THROTTLE_EXCEPTIONS:
+        return True
+    # An HTTPException's status is ours (a 500 wrapping the upstream error
+    # text), so only client library errors are judged by their status
+    if not isinstance(error, HTTPException):
+        status_code = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+        if status_code in (429, 503):
+            return True
+    return bool(THROTTLE_PATTERN.search(str(error)))
+
+
+def is_transient_error(error: BaseException) -> bool:
+    if is_client_error(error):
+        return False
+    return is_throttle_error(error) or bool(TRANSIENT_PATTERN.search(str(error)))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit (like TCP congestion control)
+    
+    - Additive increase: +1 slot after a full window of successes
+      (each success adds 1/limit)
+    - Multiplicative decrease: limit * backoff_factor on a throttled call,
+      at most once per window so a burst of 429s from the same wave of
+      requests only halves the limit once
+    """
+    
+    def __init__(
+        self,
+        initial: int = 5,
+        min_limit: int = 1,
+        max_limit: int = 20,
+        backoff_factor: float = 0.5
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_factor = backoff_factor
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._started = 0               # calls admitted so far
+        self._decrease_barrier = 0      # throttles from calls admitted before this don't decrease again
+        self._condition = asyncio.Condition()
+        
+        self.throttled = 0
+        self.decreases = 0
+        self.peak_limit = int(self._limit)
+    
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+    
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+    
+    async def acquire(self) -> int:
+        """Wait for a slot; returns a ticket passed back to release()"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self._limit))
+            self._in_flight += 1
+            self._started += 1
+            return self._started
+    
+    async def release(self, ticket: int, throttled: bool = False) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                if ticket > self._decrease_barrier:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff_factor)
+                    self._decrease_barrier = self._started
+                    self.decreases += 1
+                    logger.warning(f"Upstream throttling - concurrency limit reduced to {self.limit}")
+            else:
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+            self._condition.notify_all()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "peak_limit": self.peak_limit,
+            "throttled": self.throttled,
+            "decreases": self.decreases
+        }
+
+
 class BatchProcessor:
     """
     Process multiple invoices in parallel with rate limiting
     
     Features:
-    - Concurrent processing with configurable limit (default: 5)
+    - Adaptive (AIMD) concurrency: starts at max_concurrent, grows while
+      calls succeed, halves when Vision/Gemini answer 429/503
     - Error handling per invoice (one failure doesn't crash batch)
     - Progress tracking
-    - Automatic retry on transient failures
+    - Automatic retry on transient failures (slot released while backing off)
     - Results aggregation
     """
     
-    def __init__(self, max_concurrent: int = 5, max_retries: int = 2):
+    def __init__(
+        self,
+        max_concurrent: int = 5,
+        max_retries: int = 2,
+        min_concurrent: int = 1,
+        concurrency_ceiling: int = 20,
+        retry_base_delay: float = 0.5,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None
+    ):
         """
         Initialize batch processor
         
         Args:
-            max_concurrent: Maximum parallel tasks (5 = good balance)
+            max_concurrent: Initial parallel tasks (5 = good balance)
             max_retries: Retry failed items (2 = reasonable for network)
+            min_concurrent: Lowest limit AIMD can back off to
+            concurrency_ceiling: Highest limit AIMD can grow to
+            retry_base_delay: Backoff unit in seconds (doubled per attempt, jittered)
+            limiter: Shared limiter, so concurrent batches hitting the same
+                upstream quota adapt together (overrides the limit arguments)
         """
         self.max_concurrent = max_concurrent
         self.max_retries = max_retries
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.retry_base_delay = retry_base_delay
+        self.limiter = limiter or AdaptiveConcurrencyLimiter(
+            initial=max_concurrent,
+            min_limit=min_concurrent,
+            max_limit=max(concurrency_ceiling, max_concurrent)
+        )
+        self._completed = 0
     
     async def process_batch(
         self,
@@ -80,7 +212,8 @@ class BatchProcessor:
         Args:
             items: List of BatchItem to process
             processor_fn: Async function(BatchItem) -> Dict with result
-            progress_callback: Optional callback(current, total, item_id)
+            progress_callback: Optional callback(completed, total, item_id, status)
+                where status is "processing", "retrying", "succeeded" or "failed"
         
         Returns: {
             batch_id: str,
@@ -89,11 +222,13 @@ class BatchProcessor:
             failed: int,
             duration_ms: float,
             results: [BatchResult],
-            success_rate: 0-1
+            success_rate: 0-1,
+            concurrency: {limit, peak_limit, throttled, decreases}
         }
         """
         batch_id = str(uuid.uuid4())
         start_time = datetime.utcnow()
+        self._completed = 0
         
         logger.info(f"Starting batch {batch_id} with {len(items)} items")
         
@@ -129,7 +264,8 @@ class BatchProcessor:
         
         logger.info(
             f"Batch {batch_id} complete: {succeeded}/{len(batch_results)} "
-            f"succeeded ({success_rate:.0%}) in {duration_ms:.0f}ms"
+            f"succeeded ({success_rate:.0%}) in {duration_ms:.0f}ms "
+            f"(concurrency limit {self.limiter.limit}, {self.limiter.throttled} throttled)"
         )
         
         return {
@@ -140,7 +276,8 @@ class BatchProcessor:
             "duration_ms": duration_ms,
             "results": batch_results,
             "success_rate": success_rate,
-            "items_per_second": len(batch_results) / (duration_ms / 1000) if duration_ms > 0 else 0
+            "items_per_second": len(batch_results) / (duration_ms / 1000) if duration_ms > 0 else 0,
+            "concurrency": self.limiter.stats()
         }
     
     async def _process_with_retry(
@@ -148,83 +285,77 @@ class BatchProcessor:
         item: BatchItem,
         processor_fn: Callable,
         progress_callback: Optional[Callable],
-        total: int,
-        attempt: int = 0
+        total: int
     ) -> BatchResult:
-        """Process single item with automatic retry"""
+        """
+        Process single item with automatic retry
+        
+        Retries loop instead of recursing, and the concurrency slot is
+        released before backing off, so waiting retries never starve the pool.
+        """
         start_time = datetime.utcnow()
+        attempt = 0
         
-        try:
-            # Acquire semaphore (limits concurrent tasks)
-            async with self.semaphore:
+        while True:
+            ticket = await self.limiter.acquire()
+            throttled = False
+            try:
                 logger.debug(f"Processing {item.id} (attempt {attempt + 1}/{self.max_retries + 1})")
+                if progress_callback and attempt == 0:
+                    await self._notify(progress_callback, total, item.id, "processing")
                 
-                try:
-                    # Call processor function
-                    result_data = await processor_fn(item)
-                    
-                    duration_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
-                    
-                    # Progress callback
-                    if progress_callback:
-                        await self._run_callback(
-                            progress_callback,
-                            attempt + 1, total, item.id, "succeeded"
-                        )
-                    
-                    return BatchResult(
-                        item_id=item.id,
-                        file_id=item.file_id,
-                        success=True,
-                        data=result_data,
-                        duration_ms=duration_ms
-                    )
-                
-                except Exception as e:
-                    error_str = str(e)
-                    is_transient = any(
-                        msg in error_str.lower()
-                        for msg in ['timeout', 'connection', 'rate limit', '503', '429']
-                    )
-                    
-                    # Retry on transient errors
-                    if is_transient and attempt < self.max_retries:
-                        logger.warning(
-                            f"Transient error on {item.id}, retrying... "
-                            f"({attempt + 1}/{self.max_retries}): {error_str}"
-                        )
-                        # Exponential backoff
-                        await asyncio.sleep((attempt + 1) * 0.5)
-                        return await self._process_with_retry(
-                            item, processor_fn, progress_callback, total, attempt + 1
-                        )
-                    
-                    duration_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
-                    
-                    # Progress callback
-                    if progress_callback:
-                        await self._run_callback(
-                            progress_callback,
-                            attempt + 1, total, item.id, "failed"
-                        )
-                    
-                    return BatchResult(
-                        item_id=item.id,
-                        file_id=item.file_id,
-                        success=False,
-                        error=error_str,
-                        duration_ms=duration_ms
-                    )
-        
-        except Exception as e:
-            logger.error(f"Unexpected error processing {item.id}: {e}")
+                result_data = await processor_fn(item)
+                error = None
+            except Exception as e:
+                error = e
+                throttled = is_throttle_error(e)
+            finally:
+                await self.limiter.release(ticket, throttled=throttled)
+            
+            if error is None:
+                self._completed += 1
+                if progress_callback:
+                    await self._notify(progress_callback, total, item.id, "succeeded")
+                return BatchResult(
+                    item_id=item.id,
+                    file_id=item.file_id,
+                    success=True,
+                    data=result_data,
+                    duration_ms=(datetime.utcnow() - start_time).total_seconds() * 1000
+                )
+            
+            error_str = str(error)
+            if is_transient_error(error) and attempt < self.max_retries:
+                attempt += 1
+                record_retry("batch_item")
+                logger.warning(
+                    f"Transient error on {item.id}, retrying... "
+                    f"({attempt}/{self.max_retries}): {error_str}"
+                )
+                if progress_callback:
+                    await self._notify(progress_callback, total, item.id, "retrying")
+                # Exponential backoff with jitter, outside the concurrency slot
+                await asyncio.sleep(self.retry_base_delay * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+                continue
+            
+            self._completed += 1
+            if progress_callback:
+                await self._notify(progress_callback, total, item.id, "failed")
             return BatchResult(
                 item_id=item.id,
                 file_id=item.file_id,
                 success=False,
-                error=str(e)
+                error=error_str,
+                duration_ms=(datetime.utcnow() - start_time).total_seconds() * 1000
             )
     
+    async def _notify(self, callback: Callable, total: int, item_id: str, status: str):
+        """Progress callbacks must never fail the item they report on"""
+        try:
+            await self._run_callback(callback, self._completed, total, item_id, status)
+        except Exception as e:
+            logger.warning(f"Progress callback failed for {item_id}: {e}")
+    
     async def _run_callback(self, callback, *args, **kwargs):
         """Run callback (handles both sync and async)"""
         if asyncio.iscoroutinefunction(callback):
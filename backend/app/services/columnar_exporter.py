@@ -0,0 +1,270 @@
+"""
+🧮 COLUMNAR EXPORTER - Parquet / Arrow IPC for analytics
+Backs POST /api/bulk/export-columnar
+
+Two tables, written as two files in one zip:
+- invoices: one row per invoice, every column AccountantExcelExporter's
+  _analyze_all_available_columns discovers (standard fields plus
+  raw_extracted_data), typed: float64 / int64 / bool / date32 / timestamp / string
+- line_items: one row per item (invoice_id, line_no, then every item key)
+
+Columns and types come from the user's field registry when the caller has
+it (field_registry.py), otherwise from one FieldRegistry pass over the rows.
+
+Vendor, state, status and currency columns are dictionary-encoded.
+Rows are converted and written ROW_GROUP_SIZE at a time, so only one row
+group is held as Arrow arrays; file size and read time are far below xlsx
+(python -m benchmarks.bench_columnar_export).
+"""
+
+import json
+import logging
+import os
+import zipfile
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.services.field_registry import FieldRegistry
+from app.services.tally_xml_exporter import parse_invoice_date
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.info("pyarrow not installed - Parquet/Arrow export disabled")
+
+FORMATS = ("parquet", "arrow")
+ROW_GROUP_SIZE = 10_000
+COMPRESSION = "zstd"
+
+# Low-cardinality text columns stored as dictionary<int32, string>
+DICTIONARY_COLUMNS = frozenset({
+    "vendor_name", "vendor_state", "vendor_type", "customer_name", "customer_state",
+    "place_of_supply", "payment_status", "payment_method", "currency", "invoice_type",
+    "document_type", "unit", "uom",
+})
+
+LINE_ITEM_KEYS = ("invoice_id", "invoice_number", "line_no")
+
+
+def _as_dict(value: Any) -> Dict[str, Any]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except (TypeError, ValueError):
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def _as_items(value: Any) -> List[Dict[str, Any]]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except (TypeError, ValueError):
+            return []
+    return [item for item in value if isinstance(item, dict)] if isinstance(value, list) else []
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    try:
+        return float(str(value).replace(",", "")) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value: Any) -> Optional[int]:
+    number = _to_float(value)
+    return int(number) if number is not None else None
+
+
+def _to_bool(value: Any) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+
+def _to_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    return parse_invoice_date(value)
+
+
+def _to_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime) or value in (None, ""):
+        return value or None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _to_str(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+class ColumnarExporter:
+    """
+    Invoices and line items as typed Parquet or Arrow IPC tables
+
+    Usage:
+        exporter = ColumnarExporter(format="parquet")
+        zip_path = exporter.export(invoices)
+    """
+
+    def __init__(self, format: str = "parquet", row_group_size: int = ROW_GROUP_SIZE,
+                 field_registry: Optional[Dict[str, Any]] = None):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is required for Parquet/Arrow export")
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        self.format = format
+        self.row_group_size = row_group_size
+        self.field_registry = field_registry
+        # Imported here so openpyxl only loads when an export runs
+        from app.services.accountant_excel_exporter import AccountantExcelExporter
+        self._excel = AccountantExcelExporter(field_registry=field_registry)
+
+    # ------------------------------------------------------------------
+    # Schema
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _arrow_type(name: str, data_type: str) -> Tuple["pa.DataType", Callable]:
+        """Arrow type and converter for a field registry data_type"""
+        if data_type == "integer":
+            return pa.int64(), _to_int
+        if data_type == "decimal":
+            return pa.float64(), _to_float
+        if data_type == "boolean":
+            return pa.bool_(), _to_bool
+        if data_type == "date":
+            return pa.date32(), _to_date
+        if data_type == "datetime":
+            return pa.timestamp("us", tz="UTC"), _to_timestamp
+        if name in DICTIONARY_COLUMNS:
+            return pa.dictionary(pa.int32(), pa.string()), _to_str
+        return pa.string(), _to_str
+
+    def invoice_schema(self, invoices: List[Dict[str, Any]]) -> List[Tuple[str, "pa.DataType", Callable]]:
+        """(column, arrow type, converter) for the invoices table"""
+        schema = []
+        for name, data_type in self._excel._analyze_all_available_columns(invoices).items():
+            if name.startswith("line_item_"):
+                continue  # items get their own table
+            schema.append((name, *self._arrow_type(name, data_type)))
+        return schema
+
+    def line_item_schema(self) -> List[Tuple[str, "pa.DataType", Callable]]:
+        """(column, arrow type, converter) for the line_items table; keys from every item"""
+        schema = [("invoice_id", pa.string(), _to_str), ("invoice_number", pa.string(), _to_str),
+                  ("line_no", pa.int32(), _to_int)]
+        for key, entry in sorted(self._excel._registry_fields["line_item"].items()):
+            if key not in LINE_ITEM_KEYS:
+                schema.append((key, *self._arrow_type(key, entry["data_type"])))
+        return schema
+
+    # ------------------------------------------------------------------
+    # Row groups
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _batch(schema, rows: List[Dict[str, Any]], arrow_schema: "pa.Schema") -> "pa.RecordBatch":
+        arrays = [pa.array([convert(row.get(name)) for row in rows], type=arrow_type)
+                  for name, arrow_type, convert in schema]
+        return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema)
+
+    def _invoice_rows(self, invoices: List[Dict[str, Any]], schema) -> Iterator[Dict[str, Any]]:
+        for invoice in invoices:
+            yield {name: self._excel._extract_field_value(invoice, name, "") for name, _, _ in schema}
+
+    @staticmethod
+    def _item_rows(invoices: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for invoice in invoices:
+            for line_no, item in enumerate(invoice["line_items"], 1):
+                row = dict(item)
+                row.update(invoice_id=invoice.get("id"), invoice_number=invoice.get("invoice_number"),
+                           line_no=line_no)
+                yield row
+
+    def write_table(self, path: str, schema, rows: Iterator[Dict[str, Any]]) -> int:
+        """Write rows in row groups of row_group_size; returns the row count"""
+        arrow_schema = pa.schema([pa.field(name, arrow_type) for name, arrow_type, _ in schema])
+        if self.format == "parquet":
+            dictionary = [name for name, arrow_type, _ in schema if pa.types.is_dictionary(arrow_type)]
+            writer = pq.ParquetWriter(path, arrow_schema, compression=COMPRESSION,
+                                      use_dictionary=dictionary or False)
+            write = writer.write_batch
+        else:
+            # Stream format: every batch may carry its own dictionary
+            writer = ipc.new_stream(path, arrow_schema,
+                                    options=ipc.IpcWriteOptions(compression=COMPRESSION))
+            write = writer.write_batch
+
+        count = 0
+        chunk: List[Dict[str, Any]] = []
+        try:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= self.row_group_size:
+                    write(self._batch(schema, chunk, arrow_schema))
+                    count += len(chunk)
+                    chunk = []
+            if chunk or not count:
+                write(self._batch(schema, chunk, arrow_schema))
+                count += len(chunk)
+        finally:
+            writer.close()
+        return count
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+    def export(self, invoices: List[Dict[str, Any]], filename: Optional[str] = None) -> str:
+        """Write invoices.<ext> and line_items.<ext> into a zip; returns its absolute path"""
+        invoices = [
+            dict(inv, line_items=_as_items(inv.get("line_items")),
+                 raw_extracted_data=_as_dict(inv.get("raw_extracted_data")))
+            for inv in invoices
+        ]
+        extension = "parquet" if self.format == "parquet" else "arrows"
+        if not filename:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"invoices_{self.format}_{timestamp}.zip"
+        if not os.path.isabs(filename):
+            export_dir = os.path.join(os.getcwd(), "exports")
+            os.makedirs(export_dir, exist_ok=True)
+            filename = os.path.join(export_dir, filename)
+
+        if self.field_registry is None:
+            # One pass over the rows in place of a stored registry
+            from app.services.accountant_excel_exporter import AccountantExcelExporter
+            self._excel = AccountantExcelExporter(field_registry=FieldRegistry(invoices).to_dict())
+
+        invoice_path = f"{filename}.invoices.{extension}"
+        items_path = f"{filename}.line_items.{extension}"
+        try:
+            invoice_schema = self.invoice_schema(invoices)
+            invoice_count = self.write_table(invoice_path, invoice_schema,
+                                             self._invoice_rows(invoices, invoice_schema))
+            item_count = self.write_table(items_path, self.line_item_schema(),
+                                          self._item_rows(invoices))
+            # Already compressed column chunks; storing avoids a second pass of deflate
+            with zipfile.ZipFile(filename, "w", compression=zipfile.ZIP_STORED) as archive:
+                archive.write(invoice_path, f"invoices.{extension}")
+                archive.write(items_path, f"line_items.{extension}")
+        finally:
+            for path in (invoice_path, items_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        logger.info("%s export: %s (%d invoices, %d line items, %d columns)",
+                    self.format, filename, invoice_count, item_count, len(invoice_schema))
+        return filename
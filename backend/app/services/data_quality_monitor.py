@@ -4,9 +4,17 @@ Tracks data issues and generates quality reports
 """
 
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-from app.services.supabase_helper import supabase
+from app.services.supabase_helper import supabase, call_rpc
+from app.services.log_sink import BatchedLogWriter
+
+
+def _insert_quality_logs(rows: List[Dict[str, Any]]) -> None:
+    supabase.table('invoice_quality_logs').insert(rows).execute()
+
+
+quality_log_writer = BatchedLogWriter('invoice_quality_logs', _insert_quality_logs)
 
 
 class DataQualityMonitor:
@@ -43,7 +51,7 @@ class DataQualityMonitor:
             description: Human-readable description of the issue
         
         Returns:
-            True if logged successfully
+            True if the issue was queued without dropping an older one
         """
         try:
             log_entry = {
@@ -63,14 +71,14 @@ class DataQualityMonitor:
                 'created_at': datetime.now().isoformat()
             }
             
-            # Try to save to monitoring table
-            supabase.table('invoice_quality_logs').insert(log_entry).execute()
+            # Queue for the monitoring table (written in batches)
+            queued = quality_log_writer.submit(log_entry)
             
             # Also print to logs for immediate visibility
             emoji = '🔴' if severity == cls.SEVERITY_CRITICAL else '⚠️' if severity == cls.SEVERITY_WARNING else 'ℹ️'
             print(f"{emoji} [{severity.upper()}] {issue_type}: {description}")
             
-            return True
+            return queued
         except Exception as e:
             print(f"❌ Failed to log quality issue: {e}")
             return False
@@ -88,16 +96,22 @@ class DataQualityMonitor:
             Quality report with statistics
         """
         try:
-            # Query logs from the last N days
-            start_date = datetime.now().isoformat()
+            # Severity and issue-type counts for the last N days, aggregated in Postgres
+            since = cls._window_start(days)
+            summary = call_rpc(supabase, 'get_quality_summary', {
+                'user_id_param': user_id,
+                'since_param': since
+            })
+            if summary is None:
+                summary = cls._quality_summary_fallback(user_id, since)
             
-            logs = supabase.table('invoice_quality_logs')\
-                .select('*')\
-                .eq('user_id', user_id)\
-                .order('created_at', desc=True)\
-                .execute()
+            critical = int(summary.get('critical') or 0)
+            warnings = int(summary.get('warning') or 0)
+            infos = int(summary.get('info') or 0)
+            issue_types = summary.get('issue_breakdown') or {}
             
-            if not logs.data:
+            total_issues = critical + warnings + infos
+            if not total_issues:
                 return {
                     'user_id': user_id,
                     'period_days': days,
@@ -108,25 +122,12 @@ class DataQualityMonitor:
                     'status': '✅ No issues found'
                 }
             
-            # Analyze logs
-            critical = sum(1 for log in logs.data if log['severity'] == cls.SEVERITY_CRITICAL)
-            warnings = sum(1 for log in logs.data if log['severity'] == cls.SEVERITY_WARNING)
-            infos = sum(1 for log in logs.data if log['severity'] == cls.SEVERITY_INFO)
-            
-            total_issues = critical + warnings + infos
-            
             # Calculate quality score (0-100)
             # Each critical issue = -20 points
             # Each warning = -5 points
             # Each info = -1 point
             quality_score = max(0, 100 - (critical * 20 + warnings * 5 + infos * 1))
             
-            # Group by issue type
-            issue_types = {}
-            for log in logs.data:
-                issue_type = log['issue_type']
-                issue_types[issue_type] = issue_types.get(issue_type, 0) + 1
-            
             status = '✅ Excellent' if quality_score >= 90 else \
                      '🟢 Good' if quality_score >= 70 else \
                      '🟡 Fair' if quality_score >= 50 else \
@@ -150,17 +151,27 @@ class DataQualityMonitor:
             return {'error': str(e)}
     
     @classmethod
-    def get_problematic_invoices(cls, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_problematic_invoices(cls, user_id: str, limit: int = 10, days: int = 30) -> List[Dict[str, Any]]:
         """
-        Get invoices with the most quality issues
+        Get invoices with the most quality issues in the last N days
         
         Returns:
             List of problematic invoices with issue counts
         """
         try:
+            since = cls._window_start(days)
+            ranked = call_rpc(supabase, 'get_problematic_invoices', {
+                'user_id_param': user_id,
+                'since_param': since,
+                'limit_param': limit
+            })
+            if ranked is not None:
+                return ranked
+            
             logs = supabase.table('invoice_quality_logs')\
-                .select('*')\
+                .select('invoice_id, document_id, severity, issue_type, description, created_at')\
                 .eq('user_id', user_id)\
+                .gte('created_at', since)\
                 .order('created_at', desc=True)\
                 .execute()
             
@@ -206,6 +217,29 @@ class DataQualityMonitor:
             return []
 
 
+    @staticmethod
+    def _window_start(days: int) -> str:
+        # Logs are written with local datetime.now(), so the window uses it too
+        return (datetime.now() - timedelta(days=days)).isoformat()
+    
+    @classmethod
+    def _quality_summary_fallback(cls, user_id: str, since: str) -> Dict[str, Any]:
+        """get_quality_summary without the SQL function: windowed, two columns only"""
+        logs = supabase.table('invoice_quality_logs')\
+            .select('severity, issue_type')\
+            .eq('user_id', user_id)\
+            .gte('created_at', since)\
+            .execute()
+        
+        summary: Dict[str, Any] = {'critical': 0, 'warning': 0, 'info': 0, 'issue_breakdown': {}}
+        for log in logs.data or []:
+            if log['severity'] in summary:
+                summary[log['severity']] += 1
+            breakdown = summary['issue_breakdown']
+            breakdown[log['issue_type']] = breakdown.get(log['issue_type'], 0) + 1
+        return summary
+
+
 # ============ CONVENIENCE FUNCTIONS ============
 
 def log_critical_issue(user_id: str, invoice_data: Dict, issue_type: str, description: str):
@@ -12,13 +12,9 @@ import uuid
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 from app.core.config import settings
+from app.core.metrics import extraction_started, extraction_finished, time_stage
 from app.services.ai_service import ai_service
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
@@ -91,6 +87,7 @@ class DocumentProcessor:
         import time
         start_time = time.time()
         logger.info(f"🚀 FAST processing started for document {document_id}")
+        extraction_started()
         
         try:
             # Step 1: Fetch document from Supabase (~0.5s)
@@ -99,7 +96,8 @@ class DocumentProcessor:
             print(f"   📄 Document fetched in {step1_time:.2f}s")
             
             # Step 2: Download file from storage (~1-2s)
-            file_path = await self._download_file(document)
+            with time_stage("download"):
+                file_path = await self._download_file(document)
             step2_time = time.time() - start_time
             print(f"   📥 File downloaded in {step2_time - step1_time:.2f}s")
             
@@ -107,15 +105,17 @@ class DocumentProcessor:
             await self._update_document_status(document_id, "processing")
             
             # Step 4: FAST AI extraction (~3-6s - main optimization target)
-            extracted_data = await self._extract_invoice_data(
-                file_path,
-                document.get('file_type', 'pdf')
-            )
+            with time_stage("extract"):
+                extracted_data = await self._extract_invoice_data(
+                    file_path,
+                    document.get('file_type', 'pdf')
+                )
             step4_time = time.time() - start_time
             print(f"   🤖 AI extraction completed in {step4_time - step2_time:.2f}s")
             
             # Step 5: Save invoice data (~0.5s)
-            invoice = await self._save_invoice_data(document, extracted_data)
+            with time_stage("insert_invoice"):
+                invoice = await self._save_invoice_data(document, extracted_data)
             step5_time = time.time() - start_time
             print(f"   💾 Data saved in {step5_time - step4_time:.2f}s")
             
@@ -154,6 +154,8 @@ class DocumentProcessor:
                 logger.error(f"Failed to update error status: {str(update_error)}")
             
             raise DocumentProcessingError(f"Failed to process document: {str(e)}")
+        finally:
+            extraction_finished()
     
     async def _fetch_document(
         self,
@@ -3,132 +3,83 @@ Email Service
 FIX #12: Email Notifications System
 
 Handles account verification, password reset, subscription notifications
+
+Templates are parsed once at import. Sending only renders the message and
+queues it on app.services.mail_queue, which delivers over pooled SMTP
+connections in the background - callers never wait on SMTP.
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import List, Optional, Dict
-from app.core.config import settings
+import copy
+import html
 import logging
-from jinja2 import Template
+import queue
+from concurrent.futures import Future, wait
+from email.message import EmailMessage
+from string import Template
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.mail_queue import mail_queue
 
 logger = logging.getLogger(__name__)
 
 
-class EmailService:
-    """Send emails for various events"""
-    
-    @staticmethod
-    def send_email(
-        to_email: str,
-        subject: str,
-        html_body: str,
-        text_body: Optional[str] = None,
-        reply_to: Optional[str] = None
-    ) -> bool:
-        """
-        Send email
-        
-        Args:
-            to_email: Recipient email
-            subject: Email subject
-            html_body: HTML email body
-            text_body: Plain text fallback
-            reply_to: Reply-to address
-        
-        Returns:
-            True if successful
-        """
-        try:
-            if not settings.SMTP_HOST:
-                logger.warning("⚠️  SMTP not configured - email not sent")
-                return False
-            
-            # Create message
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = subject
-            msg["From"] = settings.EMAIL_FROM
-            msg["To"] = to_email
-            
-            if reply_to:
-                msg["Reply-To"] = reply_to
-            
-            # Add plain text and HTML
-            if text_body:
-                msg.attach(MIMEText(text_body, "plain"))
-            msg.attach(MIMEText(html_body, "html"))
-            
-            # Send
-            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                server.starttls()
-                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                server.send_message(msg)
-            
-            logger.info(f"✅ Email sent to {to_email}: {subject}")
-            return True
-        
-        except Exception as e:
-            logger.error(f"❌ Failed to send email: {str(e)}")
-            return False
-    
-    @staticmethod
-    def send_verification_email(user_email: str, verification_link: str) -> bool:
-        """Send email verification link"""
-        
-        subject = "Verify your TrulyInvoice Account"
-        html_body = f"""
+class EmailTemplate:
+    """Subject / HTML / text parsed once at import; $values are HTML-escaped in the HTML part"""
+
+    def __init__(self, subject: str, html_body: str, text_body: Optional[str] = None):
+        self.subject = Template(subject)
+        self.html_body = Template(html_body)
+        self.text_body = Template(text_body) if text_body else None
+
+    def render(self, **context) -> Tuple[str, str, Optional[str]]:
+        escaped = {key: html.escape(str(value)) for key, value in context.items()}
+        return (
+            self.subject.substitute(context),
+            self.html_body.substitute(escaped),
+            self.text_body.substitute(context) if self.text_body else None,
+        )
+
+
+VERIFICATION = EmailTemplate(
+    "Verify your TrulyInvoice Account",
+    """
         <html>
             <body style="font-family: Arial, sans-serif;">
                 <h2>Welcome to TrulyInvoice!</h2>
                 <p>Please verify your email address to activate your account.</p>
-                <a href="{verification_link}" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">
+                <a href="$link" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">
                     Verify Email
                 </a>
                 <p>Link expires in 24 hours.</p>
                 <p>If you didn't create an account, please ignore this email.</p>
             </body>
         </html>
-        """
-        
-        text_body = f"Verify your email: {verification_link}"
-        
-        return EmailService.send_email(user_email, subject, html_body, text_body)
-    
-    @staticmethod
-    def send_password_reset_email(user_email: str, reset_link: str) -> bool:
-        """Send password reset link"""
-        
-        subject = "Reset your TrulyInvoice Password"
-        html_body = f"""
+    """,
+    "Verify your email: $link"
+)
+
+PASSWORD_RESET = EmailTemplate(
+    "Reset your TrulyInvoice Password",
+    """
         <html>
             <body style="font-family: Arial, sans-serif;">
                 <h2>Password Reset Request</h2>
                 <p>We received a request to reset your password.</p>
-                <a href="{reset_link}" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">
+                <a href="$link" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">
                     Reset Password
                 </a>
                 <p>Link expires in 1 hour.</p>
                 <p>If you didn't request this, please ignore this email.</p>
             </body>
         </html>
-        """
-        
-        text_body = f"Reset your password: {reset_link}"
-        
-        return EmailService.send_email(user_email, subject, html_body, text_body)
-    
-    @staticmethod
-    def send_payment_confirmation(
-        user_email: str,
-        amount: float,
-        tier: str,
-        invoice_number: str
-    ) -> bool:
-        """Send payment confirmation"""
-        
-        subject = f"Payment Confirmation - Invoice #{invoice_number}"
-        html_body = f"""
+    """,
+    "Reset your password: $link"
+)
+
+PAYMENT_CONFIRMATION = EmailTemplate(
+    "Payment Confirmation - Invoice #$invoice_number",
+    """
         <html>
             <body style="font-family: Arial, sans-serif;">
                 <h2>Payment Received</h2>
@@ -136,36 +87,31 @@ class EmailService:
                 <table style="border-collapse: collapse;">
                     <tr>
                         <td style="padding: 10px; border: 1px solid #ddd;"><b>Amount</b></td>
-                        <td style="padding: 10px; border: 1px solid #ddd;">₹{amount:,.2f}</td>
+                        <td style="padding: 10px; border: 1px solid #ddd;">₹$amount</td>
                     </tr>
                     <tr>
                         <td style="padding: 10px; border: 1px solid #ddd;"><b>Plan</b></td>
-                        <td style="padding: 10px; border: 1px solid #ddd;">{tier.capitalize()}</td>
+                        <td style="padding: 10px; border: 1px solid #ddd;">$plan</td>
                     </tr>
                     <tr>
                         <td style="padding: 10px; border: 1px solid #ddd;"><b>Invoice</b></td>
-                        <td style="padding: 10px; border: 1px solid #ddd;">#{invoice_number}</td>
+                        <td style="padding: 10px; border: 1px solid #ddd;">#$invoice_number</td>
                     </tr>
                 </table>
-                <p style="margin-top: 20px;">Your {tier} plan is now active. Start scanning invoices!</p>
+                <p style="margin-top: 20px;">Your $tier plan is now active. Start scanning invoices!</p>
             </body>
         </html>
-        """
-        
-        text_body = f"Payment confirmed: ₹{amount} for {tier} plan"
-        
-        return EmailService.send_email(user_email, subject, html_body, text_body)
-    
-    @staticmethod
-    def send_subscription_upgraded(user_email: str, new_tier: str) -> bool:
-        """Send subscription upgrade confirmation"""
-        
-        subject = f"Welcome to {new_tier.capitalize()} Plan!"
-        html_body = f"""
+    """,
+    "Payment confirmed: ₹$amount for $tier plan"
+)
+
+SUBSCRIPTION_UPGRADED = EmailTemplate(
+    "Welcome to $plan Plan!",
+    """
         <html>
             <body style="font-family: Arial, sans-serif;">
                 <h2>Subscription Upgraded!</h2>
-                <p>Your account has been upgraded to the <strong>{new_tier.capitalize()}</strong> plan.</p>
+                <p>Your account has been upgraded to the <strong>$plan</strong> plan.</p>
                 <p>You now have access to:</p>
                 <ul>
                     <li>Unlimited scans per month</li>
@@ -175,42 +121,26 @@ class EmailService:
                 <p>Start using your new features now!</p>
             </body>
         </html>
-        """
-        
-        return EmailService.send_email(user_email, subject, html_body)
-    
-    @staticmethod
-    def send_subscription_renewal_reminder(
-        user_email: str,
-        renewal_date: str,
-        tier: str
-    ) -> bool:
-        """Send subscription renewal reminder"""
-        
-        subject = "Your TrulyInvoice Plan Renews Soon"
-        html_body = f"""
+    """
+)
+
+RENEWAL_REMINDER = EmailTemplate(
+    "Your TrulyInvoice Plan Renews Soon",
+    """
         <html>
             <body style="font-family: Arial, sans-serif;">
                 <h2>Renewal Reminder</h2>
-                <p>Your <strong>{tier.capitalize()}</strong> plan will renew on <strong>{renewal_date}</strong>.</p>
+                <p>Your <strong>$plan</strong> plan will renew on <strong>$renewal_date</strong>.</p>
                 <p>No action needed - your subscription will automatically renew.</p>
                 <p>If you'd like to cancel or change your plan, please manage it in your account settings.</p>
             </body>
         </html>
-        """
-        
-        return EmailService.send_email(user_email, subject, html_body)
-    
-    @staticmethod
-    def send_invoice_processed(
-        user_email: str,
-        invoice_filename: str,
-        confidence_score: float
-    ) -> bool:
-        """Send invoice processing completion notification"""
-        
-        subject = f"Invoice Processed: {invoice_filename}"
-        html_body = f"""
+    """
+)
+
+INVOICE_PROCESSED = EmailTemplate(
+    "Invoice Processed: $filename",
+    """
         <html>
             <body style="font-family: Arial, sans-serif;">
                 <h2>Invoice Processed Successfully</h2>
@@ -218,30 +148,167 @@ class EmailService:
                 <table style="border-collapse: collapse;">
                     <tr>
                         <td style="padding: 10px; border: 1px solid #ddd;"><b>File</b></td>
-                        <td style="padding: 10px; border: 1px solid #ddd;">{invoice_filename}</td>
+                        <td style="padding: 10px; border: 1px solid #ddd;">$filename</td>
                     </tr>
                     <tr>
                         <td style="padding: 10px; border: 1px solid #ddd;"><b>Confidence</b></td>
-                        <td style="padding: 10px; border: 1px solid #ddd;">{confidence_score*100:.1f}%</td>
+                        <td style="padding: 10px; border: 1px solid #ddd;">$confidence%</td>
                     </tr>
                 </table>
                 <p style="margin-top: 20px;">View your extracted data in the dashboard.</p>
             </body>
         </html>
+    """
+)
+
+
+def build_message(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    text_body: Optional[str] = None,
+    reply_to: Optional[str] = None
+) -> EmailMessage:
+    """Plain text (when given) and HTML as multipart/alternative"""
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = settings.EMAIL_FROM
+    msg["To"] = to_email
+    if reply_to:
+        msg["Reply-To"] = reply_to
+    if text_body:
+        msg.set_content(text_body)
+        msg.add_alternative(html_body, subtype="html")
+    else:
+        msg.set_content(html_body, subtype="html")
+    return msg
+
+
+class EmailService:
+    """Send emails for various events"""
+
+    @staticmethod
+    def queue_email(message: EmailMessage) -> Optional[Future]:
+        """
+        Queue a built message for background delivery
+
+        Returns:
+            Future resolving to True once delivered (or raising the SMTP
+            error), or None if SMTP is not configured or the queue is full
+        """
+        if not settings.SMTP_HOST:
+            logger.warning("⚠️  SMTP not configured - email not sent")
+            return None
+        try:
+            return mail_queue.submit(message)
+        except queue.Full:
+            logger.error("❌ Email queue full - dropped email to %s: %s", message["To"], message["Subject"])
+            return None
+
+    @staticmethod
+    def send_email(
+        to_email: str,
+        subject: str,
+        html_body: str,
+        text_body: Optional[str] = None,
+        reply_to: Optional[str] = None
+    ) -> bool:
         """
-        
-        return EmailService.send_email(user_email, subject, html_body)
-    
+        Send email (queued - returns without waiting on SMTP)
+
+        Args:
+            to_email: Recipient email
+            subject: Email subject
+            html_body: HTML email body
+            text_body: Plain text fallback
+            reply_to: Reply-to address
+
+        Returns:
+            True if queued for delivery
+        """
+        message = build_message(to_email, subject, html_body, text_body, reply_to)
+        queued = EmailService.queue_email(message) is not None
+        if queued:
+            logger.info("📧 Email queued for %s: %s", to_email, subject)
+        return queued
+
+    @staticmethod
+    def _send_template(to_email: str, template: EmailTemplate, **context) -> bool:
+        subject, html_body, text_body = template.render(**context)
+        return EmailService.send_email(to_email, subject, html_body, text_body)
+
+    @staticmethod
+    def send_verification_email(user_email: str, verification_link: str) -> bool:
+        """Send email verification link"""
+        return EmailService._send_template(user_email, VERIFICATION, link=verification_link)
+
+    @staticmethod
+    def send_password_reset_email(user_email: str, reset_link: str) -> bool:
+        """Send password reset link"""
+        return EmailService._send_template(user_email, PASSWORD_RESET, link=reset_link)
+
+    @staticmethod
+    def send_payment_confirmation(
+        user_email: str,
+        amount: float,
+        tier: str,
+        invoice_number: str
+    ) -> bool:
+        """Send payment confirmation"""
+        return EmailService._send_template(
+            user_email, PAYMENT_CONFIRMATION,
+            amount=f"{amount:,.2f}", tier=tier, plan=tier.capitalize(), invoice_number=invoice_number
+        )
+
+    @staticmethod
+    def send_subscription_upgraded(user_email: str, new_tier: str) -> bool:
+        """Send subscription upgrade confirmation"""
+        return EmailService._send_template(user_email, SUBSCRIPTION_UPGRADED, plan=new_tier.capitalize())
+
+    @staticmethod
+    def send_subscription_renewal_reminder(
+        user_email: str,
+        renewal_date: str,
+        tier: str
+    ) -> bool:
+        """Send subscription renewal reminder"""
+        return EmailService._send_template(
+            user_email, RENEWAL_REMINDER, plan=tier.capitalize(), renewal_date=renewal_date
+        )
+
+    @staticmethod
+    def send_invoice_processed(
+        user_email: str,
+        invoice_filename: str,
+        confidence_score: float
+    ) -> bool:
+        """Send invoice processing completion notification"""
+        return EmailService._send_template(
+            user_email, INVOICE_PROCESSED, filename=invoice_filename, confidence=f"{confidence_score*100:.1f}"
+        )
+
     @staticmethod
-    def send_bulk_email(to_emails: List[str], subject: str, html_body: str) -> int:
-        """Send email to multiple recipients"""
-        
-        success_count = 0
+    def send_bulk_email(to_emails: List[str], subject: str, html_body: str, timeout: float = 300.0) -> int:
+        """
+        Send email to multiple recipients
+
+        The message is built once and queued per recipient; the sender
+        delivers the batch over pooled sessions. Blocks until delivery
+        finishes (or timeout) and returns the number delivered.
+        """
+        base = build_message("", subject, html_body)
+        futures = []
         for email in to_emails:
-            if EmailService.send_email(email, subject, html_body):
-                success_count += 1
-        
-        logger.info(f"📧 Sent {success_count}/{len(to_emails)} emails")
+            message = copy.deepcopy(base)
+            message.replace_header("To", email)
+            future = EmailService.queue_email(message)
+            if future is None:
+                break
+            futures.append(future)
+
+        done, _ = wait(futures, timeout=timeout)
+        success_count = sum(1 for future in done if future.exception() is None)
+        logger.info("📧 Sent %d/%d emails", success_count, len(to_emails))
         return success_count
 
 
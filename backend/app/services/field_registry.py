@@ -0,0 +1,157 @@
+"""
+🗂️ FIELD REGISTRY - Per-user catalogue of dynamic export columns
+Used by the bulk Excel and columnar exporters
+
+Every field a user's invoices carry, with its inferred type and fill rate:
+- scope "invoice":   table columns
+- scope "raw":       raw_extracted_data keys (minus *_confidence / metadata)
+- scope "line_item": keys of every line item
+
+- Postgres: invoice_field_registry, kept current by a trigger on invoices
+  (ADD_INVOICE_FIELD_REGISTRY.sql); get_invoice_field_registry() returns
+  it, so column discovery costs the same whatever the invoice count
+- FieldRegistry: the same counting and type rules in Python, folded over
+  rows in one pass (used when there is no stored registry to read)
+
+Types: boolean / integer / decimal / date / datetime when every value
+agrees, string otherwise.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.services.supabase_helper import call_rpc
+
+SCOPES = ("invoice", "raw", "line_item")
+EXCLUDED_COLUMNS = frozenset({"raw_extracted_data", "line_items", "search_text", "search_vector"})
+RAW_METADATA_KEYS = frozenset({"_extraction_metadata", "_formatting_metadata"})
+
+# Below this many invoices a scan costs less than the RPC round trip, and a
+# small export shouldn't carry every column the account has ever seen
+REGISTRY_MIN_INVOICES = 100
+
+_DATE = re.compile(r"^(\d{4}-\d{2}-\d{2}|\d{2}[/.-]\d{2}[/.-]\d{4})$")
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+_COUNTERS = ("fill_count", "integer_count", "decimal_count", "boolean_count", "date_count", "datetime_count")
+
+
+def skip_raw_key(key: str) -> bool:
+    return key.endswith("_confidence") or key in RAW_METADATA_KEYS
+
+
+def _json(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+
+def value_counters(value: Any) -> Optional[Tuple[str, ...]]:
+    """Counters one value increments, None for nulls and nested values"""
+    if value is None or isinstance(value, (list, dict)):
+        return None
+    if isinstance(value, bool):
+        return ("fill_count", "boolean_count")
+    if isinstance(value, int):
+        return ("fill_count", "integer_count")
+    if isinstance(value, float):
+        return ("fill_count", "integer_count" if value.is_integer() else "decimal_count")
+    text = str(value)
+    if _DATE.match(text):
+        return ("fill_count", "date_count")
+    if _DATETIME.match(text):
+        return ("fill_count", "datetime_count")
+    return ("fill_count",)
+
+
+def data_type(counts: Dict[str, int]) -> str:
+    fill = counts["fill_count"]
+    if counts["boolean_count"] == fill:
+        return "boolean"
+    if counts["integer_count"] == fill:
+        return "integer"
+    if counts["integer_count"] + counts["decimal_count"] == fill:
+        return "decimal"
+    if counts["date_count"] == fill:
+        return "date"
+    if counts["datetime_count"] == fill:
+        return "datetime"
+    return "string"
+
+
+class FieldRegistry:
+    """
+    Additive per-user field counts: apply(row, +1) on insert, apply(row, -1)
+    on delete, both for an update. Mirrors invoice_field_registry_apply() in SQL.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()):
+        self.invoice_count = 0
+        self.line_item_count = 0
+        self.fields: Dict[Tuple[str, str], Dict[str, int]] = {}
+        for row in rows:
+            self.apply(row, 1)
+
+    def _add(self, scope: str, pairs: Iterable[Tuple[str, Any]], sign: int) -> None:
+        for key, value in pairs:
+            counters = value_counters(value)
+            if counters is None:
+                continue
+            counts = self.fields.setdefault((scope, key), dict.fromkeys(_COUNTERS, 0))
+            for name in counters:
+                counts[name] += sign
+            if counts["fill_count"] <= 0:
+                del self.fields[(scope, key)]
+
+    def apply(self, row: Dict[str, Any], sign: int = 1) -> None:
+        raw = _json(row.get("raw_extracted_data"))
+        items = _json(row.get("line_items"))
+        items = [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+
+        self.invoice_count += sign
+        self.line_item_count += sign * len(items)
+        self._add("invoice", ((k, v) for k, v in row.items() if k not in EXCLUDED_COLUMNS), sign)
+        if isinstance(raw, dict):
+            self._add("raw", ((k, v) for k, v in raw.items() if not skip_raw_key(k)), sign)
+        for item in items:
+            self._add("line_item", item.items(), sign)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape as get_invoice_field_registry()"""
+        fields = []
+        for (scope, field), counts in sorted(self.fields.items()):
+            total = self.line_item_count if scope == "line_item" else self.invoice_count
+            fields.append({
+                "scope": scope,
+                "field": field,
+                "data_type": data_type(counts),
+                "fill_count": counts["fill_count"],
+                "fill_rate": round(counts["fill_count"] / max(total, 1), 4),
+            })
+        return {"invoice_count": self.invoice_count, "line_item_count": self.line_item_count, "fields": fields}
+
+
+def fields_by_scope(registry: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """{scope: {field: entry}} for a registry document"""
+    grouped: Dict[str, Dict[str, Dict[str, Any]]] = {scope: {} for scope in SCOPES}
+    for entry in registry.get("fields") or []:
+        grouped.setdefault(entry["scope"], {})[entry["field"]] = entry
+    return grouped
+
+
+def get_field_registry(client, user_id: str) -> Optional[Dict[str, Any]]:
+    """The stored registry, or None if the function isn't deployed or has nothing for the user"""
+    registry = call_rpc(client, "get_invoice_field_registry", {"user_id_param": user_id})
+    if not registry or not registry.get("fields"):
+        return None
+    return registry
+
+
+def registry_for_export(client, user_id: str, invoice_count: int) -> Optional[Dict[str, Any]]:
+    """Stored registry for exports of REGISTRY_MIN_INVOICES or more; None means scan the rows"""
+    if invoice_count < REGISTRY_MIN_INVOICES:
+        return None
+    return get_field_registry(client, user_id)
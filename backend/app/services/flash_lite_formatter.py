@@ -5,19 +5,169 @@ Ultra-cheap text-to-JSON formatting at ₹0.01 per invoice
 
 import os
 import json
+import logging
 import re
-from typing import Dict, Any, Optional
-import google.generativeai as genai
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from app.services.ocr_field_engine import (
+    analyze,
+    first_match,
+    largest_amount,
+    parse_amount,
+    GSTIN_PATTERN,
+    HSN_PATTERN,
+    INVOICE_NUMBER_PATTERNS,
+    TOTAL_AMOUNT_PATTERNS,
+    CUSTOMER_PATTERNS,
+    DATE_PATTERNS,
+)
+from app.services.prompt_compactor import CompactedDocument, compact_document
+from app.services.streaming_json import StreamingInvoiceParser
+from app.core.artifacts import save_artifact
+from app.core.metrics import record_fallback, record_json_repair, time_stage
+
+logger = logging.getLogger(__name__)
+
+# Concurrent Flash-Lite calls when a long document is formatted in chunks
+MAX_CHUNK_WORKERS = 4
+
+# Fallback patterns for pulling fields out of a broken model response
+BROKEN_JSON_PATTERNS = {
+    field: tuple(re.compile(p, re.IGNORECASE) for p in patterns)
+    for field, patterns in {
+        'invoice_number': [
+            r'"invoice_number"\s*:\s*"([^"]+)"',
+            r'"invoice_no"\s*:\s*"([^"]+)"',
+        ],
+        'vendor_name': [
+            r'"vendor_name"\s*:\s*"([^"]+)"',
+            r'"seller_name"\s*:\s*"([^"]+)"',
+        ],
+        'total_amount': [
+            r'"total_amount"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Standard format
+            r'"total"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Shortened
+            r'"grand_total"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Alternative
+            r'"invoice_total"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Alternative
+            r'"net_amount"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Alternative
+        ],
+        'customer_name': [
+            r'"customer_name"\s*:\s*"([^"]+)"',
+            r'"buyer_name"\s*:\s*"([^"]+)"',
+        ],
+        'invoice_date': [
+            r'"invoice_date"\s*:\s*"([^"]+)"',
+            r'"date"\s*:\s*"([^"]+)"',
+        ],
+    }.items()
+}
+
+JSON_FENCE_OPEN = re.compile(r'```json\s*')
+JSON_FENCE_CLOSE = re.compile(r'```\s*$')
+
+# Common model JSON mistakes
+JSON_FIXES = (
+    (re.compile(r',\s*}'), '}'),  # Remove trailing commas
+    (re.compile(r',\s*]'), ']'),  # Remove trailing commas in arrays
+    (re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*:'), r'"\1":'),  # Quote unquoted keys
+    (re.compile(r':\s*([^",\[\]{}\s]+)(?=\s*[,}])'), r': "\1"'),  # Quote unquoted string values
+)
+
+# Raw-text total patterns for the broken JSON fallback
+RAW_TOTAL_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'Total\s*(?:Amount|Rs\.?|INR)?\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
+    r'Grand\s+Total\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
+    r'Net\s+Amount\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
+    r'Invoice\s+Total\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
+))
+
+
+# ============ RESPONSE SCHEMAS (structured output mode) ============
+
+_INVOICE_STRING_FIELDS = (
+    'invoice_number', 'invoice_date', 'due_date', 'po_number',
+    'vendor_name', 'vendor_gstin', 'vendor_pan', 'vendor_address', 'vendor_state', 'vendor_phone', 'vendor_email',
+    'customer_name', 'customer_gstin', 'customer_pan', 'customer_address', 'customer_state',
+    'customer_phone', 'customer_email',
+    'currency', 'payment_status', 'payment_method', 'payment_terms', 'bank_account', 'notes', 'reference_number',
+)
+_INVOICE_NUMBER_FIELDS = (
+    'subtotal', 'discount', 'shipping_charges', 'cgst', 'sgst', 'igst', 'total_amount', 'paid_amount',
+)
+_ITEM_STRING_FIELDS = ('description', 'hsn_sac', 'unit', 'sub_vendor', 'sub_bill_number', 'sub_gstin')
+_ITEM_NUMBER_FIELDS = (
+    'quantity', 'rate', 'amount', 'cgst_rate', 'sgst_rate', 'igst_rate', 'cgst_amount', 'sgst_amount', 'igst_amount',
+)
+
+
+def _object_schema(string_fields, number_fields, confidences: bool, extra=None) -> Dict[str, Any]:
+    properties: Dict[str, Any] = {}
+    for name in string_fields + number_fields:
+        properties[name] = {'type': 'string' if name in string_fields else 'number'}
+        if confidences:
+            properties[f'{name}_confidence'] = {'type': 'number'}
+    properties.update(extra or {})
+    return {'type': 'object', 'properties': properties}
+
+
+LINE_ITEM_SCHEMA = _object_schema(_ITEM_STRING_FIELDS, _ITEM_NUMBER_FIELDS, confidences=False)
+INVOICE_RESPONSE_SCHEMA = _object_schema(
+    _INVOICE_STRING_FIELDS, _INVOICE_NUMBER_FIELDS, confidences=True,
+    extra={'line_items': {'type': 'array', 'items': LINE_ITEM_SCHEMA}},
+)
+LINE_ITEMS_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {'line_items': {'type': 'array', 'items': LINE_ITEM_SCHEMA}},
+    'required': ['line_items'],
+}
+
+# How often each parse path is taken (repairs should stay near zero with structured output)
+FORMATTER_STATS: Counter = Counter()
+_stats_lock = threading.Lock()
+
+# FORMATTER_STATS keys also exported as trulyinvoice_json_repairs_total{kind}
+_REPAIR_KINDS = {
+    'json_repairs': 'regex_fix',
+    'broken_json_extractions': 'field_scrape',
+    'truncated_responses': 'truncated_salvage',
+}
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        FORMATTER_STATS[name] += 1
+    if name in _REPAIR_KINDS:
+        record_json_repair(_REPAIR_KINDS[name])
+
+
+def get_formatter_stats() -> Dict[str, int]:
+    """Snapshot of structured/truncated/repair counters"""
+    with _stats_lock:
+        return dict(FORMATTER_STATS)
 
 
 class FlashLiteFormatter:
-    def __init__(self):
-        """Initialize Gemini 2.5 Flash-Lite for text formatting"""
+    def __init__(self, structured_output: Optional[bool] = None):
+        """
+        Initialize Gemini 2.5 Flash-Lite for text formatting
+        
+        Args:
+            structured_output: Request schema-constrained JSON and parse it while
+                streaming (default: FLASH_LITE_STRUCTURED_OUTPUT, on)
+        """
+        if structured_output is None:
+            structured_output = os.getenv('FLASH_LITE_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+        self.structured_output = structured_output
+        
         api_key = os.getenv('GOOGLE_AI_API_KEY') or os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GOOGLE_AI_API_KEY or GEMINI_API_KEY environment variable not set")
         
         try:
+            # Imported here: the SDK adds ~0.4s to app startup
+            import google.generativeai as genai
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
             self.generation_config = {
@@ -41,22 +191,50 @@ class FlashLiteFormatter:
         """
         # For large documents, try direct extraction first
         if len(raw_text) > 3000:
-            print("  📊 Large document detected - trying direct OCR extraction first...")
+            logger.info('Large document detected - trying direct OCR extraction first...')
             direct_result = self._direct_ocr_extraction(raw_text)
             if direct_result.get('total_amount', 0) > 0:
-                print(f"  ✅ Direct extraction successful: ₹{direct_result['total_amount']}")
+                logger.info('Direct extraction successful: ₹%s', direct_result['total_amount'])
                 return direct_result
-            print("  ⚠️ Direct extraction incomplete - falling back to Flash-Lite...")
+            logger.warning('Direct extraction incomplete - falling back to Flash-Lite...')
+            record_fallback('direct_extraction_incomplete')
+        
+        # Strip whitespace/boilerplate/repeated headers; split long bills into item chunks
+        document = compact_document(raw_text, max_output_tokens=self.generation_config['max_output_tokens'])
+        if document.is_chunked:
+            return self._format_chunked(document, raw_text)
         
         try:
             # Create optimized prompt for text-to-JSON conversion
-            prompt = self._create_formatting_prompt(raw_text)
+            prompt = self._create_formatting_prompt(document.text)
+            
+            if self.structured_output:
+                # Schema-constrained JSON, parsed incrementally as it streams
+                parsed_data, response_text, truncated = self._generate_structured(prompt, INVOICE_RESPONSE_SCHEMA)
+                if parsed_data is None:
+                    if not response_text:
+                        return self._create_error_response("No response from Flash-Lite model")
+                    return self._repair_response(response_text, raw_text)
+                
+                parsed_data['_formatting_metadata'] = {
+                    'model': 'gemini-2.5-flash-lite',
+                    'cost_inr': 0.01,
+                    'method': 'structured_output',
+                    'input_length': len(raw_text),
+                    'compact_length': document.compact_chars,
+                    'truncated': truncated,
+                    'success': True
+                }
+                parsed_data = self._enhance_payment_status(parsed_data, raw_text)
+                parsed_data = self._enhance_critical_fields(parsed_data, raw_text)
+                return parsed_data
             
             # Generate structured JSON using Flash-Lite
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
-            )
+            with time_stage('llm_format'):
+                response = self.model.generate_content(
+                    prompt,
+                    generation_config=self.generation_config
+                )
             
             if not response or not response.text:
                 return self._create_error_response("No response from Flash-Lite model")
@@ -73,6 +251,7 @@ class FlashLiteFormatter:
                     'cost_inr': 0.01,
                     'method': 'text_to_json_formatting',
                     'input_length': len(raw_text),
+                    'compact_length': document.compact_chars,
                     'success': True
                 }
                 
@@ -85,40 +264,190 @@ class FlashLiteFormatter:
                 return parsed_data
                 
             except json.JSONDecodeError as e:
-                print(f"⚠️ JSON parsing error: {e}")
-                print(f"  🔧 Attempting to fix truncated/malformed JSON...")
-                
-                # Try to fix common JSON issues including truncation
-                fixed_json = self._fix_json_issues(response.text)
-                
-                try:
-                    parsed_data = json.loads(fixed_json)
-                    print(f"  ✅ JSON fixed successfully!")
-                    parsed_data['_formatting_metadata'] = {
-                        'model': 'gemini-2.5-flash-lite',
-                        'cost_inr': 0.01,
-                        'method': 'text_to_json_formatting_fixed',
-                        'success': True,
-                        'json_fixed': True
-                    }
-                    # ✨ NEW: Enhance payment status for fixed JSON too
-                    parsed_data = self._enhance_payment_status(parsed_data, raw_text)
-                    
-                    # ✨ NEW: Enhance critical fields with regex extraction
-                    parsed_data = self._enhance_critical_fields(parsed_data, raw_text)
-                    
-                    return parsed_data
-                except json.JSONDecodeError as e2:
-                    print(f"  ❌ JSON fix failed: {e2}")
-                    print(f"  📄 Attempting aggressive extraction from partial JSON...")
-                    
-                    # Last resort: Extract what we can from the broken JSON
-                    return self._extract_from_broken_json(response.text, raw_text)
+                logger.warning('JSON parsing error: %s', e)
+                return self._repair_response(response.text, raw_text)
                     
         except Exception as e:
-            print(f"❌ Flash-Lite formatting error: {e}")
+            logger.error('Flash-Lite formatting error: %s', e)
             return self._create_error_response(str(e))
     
+    def _repair_response(self, response_text: str, raw_text: str) -> Dict[str, Any]:
+        """Last resort for unparseable responses: regex repair, then field scraping"""
+        logger.info('Attempting to fix truncated/malformed JSON...')
+        _count('json_repairs')
+        
+        # Try to fix common JSON issues including truncation
+        fixed_json = self._fix_json_issues(response_text)
+        
+        try:
+            parsed_data = json.loads(fixed_json)
+            logger.info('JSON fixed successfully!')
+            parsed_data['_formatting_metadata'] = {
+                'model': 'gemini-2.5-flash-lite',
+                'cost_inr': 0.01,
+                'method': 'text_to_json_formatting_fixed',
+                'success': True,
+                'json_fixed': True
+            }
+            # ✨ NEW: Enhance payment status for fixed JSON too
+            parsed_data = self._enhance_payment_status(parsed_data, raw_text)
+            
+            # ✨ NEW: Enhance critical fields with regex extraction
+            parsed_data = self._enhance_critical_fields(parsed_data, raw_text)
+            
+            return parsed_data
+        except json.JSONDecodeError as e2:
+            logger.error('JSON fix failed: %s', e2)
+            logger.info('Attempting aggressive extraction from partial JSON...')
+            _count('broken_json_extractions')
+            
+            # Last resort: Extract what we can from the broken JSON
+            return self._extract_from_broken_json(response_text, raw_text)
+    
+    def _generate_structured(self, prompt: str, schema: Dict[str, Any]):
+        """
+        Stream a schema-constrained response through StreamingInvoiceParser
+        
+        Returns (parsed dict or None, raw response text, truncated). Line items
+        are collected as each one closes, so hitting max_output_tokens (or a
+        dropped stream) still keeps every complete item.
+        """
+        config = dict(self.generation_config, response_mime_type='application/json', response_schema=schema)
+        parser = StreamingInvoiceParser()
+        try:
+            with time_stage('llm_format'):
+                response = self.model.generate_content(prompt, generation_config=config, stream=True)
+                for chunk in response:
+                    try:
+                        fragment = chunk.text
+                    except ValueError:
+                        continue  # chunk without text parts (e.g. final finish_reason chunk)
+                    parser.feed(fragment)
+        except Exception as e:
+            if not parser.text:
+                raise
+            logger.warning('Flash-Lite stream interrupted after %s chars: %s', len(parser.text), e)
+        
+        parsed_data, truncated = parser.finish()
+        _count('structured_responses')
+        if truncated:
+            _count('truncated_responses')
+            logger.info('Response truncated - kept %s complete line items', len(parser.items))
+        return parsed_data, parser.text, truncated
+    
+    def _format_chunked(self, document: CompactedDocument, raw_text: str) -> Dict[str, Any]:
+        """
+        Format a long document as one summary prompt + N line-item prompts
+        
+        The summary prompt sees only the header and totals regions, so its
+        response stays small. Each item chunk is sized so its response fits in
+        max_output_tokens; chunks run concurrently and are merged in order.
+        The chunks cover the whole text (header region included), so they are
+        the complete item list and replace any items the summary call returns.
+        """
+        chunk_count = len(document.item_chunks)
+        logger.info('Large document: %s → %s chars, formatting %s line-item chunks concurrently...', document.original_chars, document.compact_chars, chunk_count)
+        
+        summary_prompt = self._create_formatting_prompt(f"{document.header}\n...\n{document.summary}")
+        item_prompts = [
+            self._create_line_items_prompt(chunk, document.header, index + 1, chunk_count)
+            for index, chunk in enumerate(document.item_chunks)
+        ]
+        
+        with ThreadPoolExecutor(max_workers=min(MAX_CHUNK_WORKERS, chunk_count + 1)) as executor:
+            summary_future = executor.submit(self._generate_json, summary_prompt, INVOICE_RESPONSE_SCHEMA)
+            item_futures = [executor.submit(self._generate_json, prompt, LINE_ITEMS_RESPONSE_SCHEMA) for prompt in item_prompts]
+            summary_data, summary_text = summary_future.result()
+            item_results = [future.result() for future in item_futures]
+        
+        line_items: List[Dict[str, Any]] = []
+        failed_chunks = 0
+        for parsed, _ in item_results:
+            items = parsed.get('line_items') if isinstance(parsed, dict) else None
+            if isinstance(items, list):
+                line_items.extend(item for item in items if isinstance(item, dict))
+            else:
+                failed_chunks += 1
+        
+        if summary_data is None:
+            if not summary_text:
+                return self._create_error_response("No response from Flash-Lite model")
+            _count('broken_json_extractions')
+            summary_data = self._extract_from_broken_json(summary_text, raw_text)
+        
+        summary_data['line_items'] = line_items
+        summary_data['_formatting_metadata'] = {
+            'model': 'gemini-2.5-flash-lite',
+            'cost_inr': round(0.01 * (chunk_count + 1), 2),
+            'method': 'text_to_json_formatting_chunked',
+            'input_length': len(raw_text),
+            'compact_length': document.compact_chars,
+            'chunks': chunk_count,
+            'failed_chunks': failed_chunks,
+            'success': not summary_data.get('error', False)
+        }
+        logger.info('Merged %s line items from %s/%s chunks', len(line_items), chunk_count - failed_chunks, chunk_count)
+        
+        summary_data = self._enhance_payment_status(summary_data, raw_text)
+        summary_data = self._enhance_critical_fields(summary_data, raw_text)
+        return summary_data
+    
+    def _generate_json(self, prompt: str, schema: Optional[Dict[str, Any]] = None):
+        """Run one Flash-Lite call; returns (parsed dict or None, raw response text)"""
+        try:
+            if self.structured_output and schema is not None:
+                parsed, text, _ = self._generate_structured(prompt, schema)
+                if parsed is not None or not text:
+                    return parsed, text
+            else:
+                with time_stage('llm_format'):
+                    response = self.model.generate_content(prompt, generation_config=self.generation_config)
+                text = response.text if response else ''
+        except Exception as e:
+            logger.warning('Flash-Lite chunk call failed: %s', e)
+            return None, ''
+        if not text:
+            return None, ''
+        
+        try:
+            return json.loads(self._extract_json_from_response(text)), text
+        except json.JSONDecodeError:
+            pass
+        _count('json_repairs')
+        try:
+            return json.loads(self._fix_json_issues(text)), text
+        except json.JSONDecodeError:
+            return None, text
+    
+    def _create_line_items_prompt(self, chunk_text: str, header: str, index: int, total: int) -> str:
+        """Items-only prompt for one chunk (no per-field confidences to keep the response small)"""
+        return f"""Extract the invoice LINE ITEMS from this part ({index} of {total}) of a long invoice.
+
+INVOICE HEADER (context only - do not extract items from it):
+{header[:600]}
+
+TEXT PART {index}/{total}:
+{chunk_text}
+
+REQUIRED JSON FORMAT:
+{{
+  "line_items": [
+    {{"description": "Item name", "hsn_sac": "8471", "quantity": 10, "unit": "Pcs",
+      "rate": 85.00, "amount": 850.00, "cgst_rate": 9.0, "sgst_rate": 9.0, "igst_rate": 0.0,
+      "sub_vendor": "Source vendor if consolidated bill", "sub_bill_number": "Sub-bill number",
+      "sub_gstin": "Sub-vendor GSTIN"}}
+  ]
+}}
+
+INSTRUCTIONS:
+1. Include EVERY line item in this part, in document order
+2. Do not include totals, tax summary or subtotal rows as items
+3. For consolidated bills, tag each item with the "Bill No" header it appears under
+4. Remove currency symbols; omit fields that are not present
+5. Return ONLY valid JSON, no explanations
+
+JSON OUTPUT:"""
+    
     def _create_formatting_prompt(self, raw_text: str) -> str:
         """Create optimized prompt for Flash-Lite text formatting with ALL fields"""
         return f"""Convert this invoice text into structured JSON with confidence scores.
@@ -230,7 +559,7 @@ JSON OUTPUT:"""
         if any(indicator in text_lower for indicator in paid_indicators):
             result['payment_status'] = 'paid'
             result['payment_status_confidence'] = 0.95
-            print("  💚 Payment status: PAID (high confidence)")
+            logger.debug('Payment status: PAID (high confidence)')
             return result
         
         # Rule 2: Check for "Unpaid" indicators
@@ -242,7 +571,7 @@ JSON OUTPUT:"""
         if any(indicator in unpaid_indicators for indicator in unpaid_indicators):
             result['payment_status'] = 'unpaid'
             result['payment_status_confidence'] = 0.90
-            print("  🔴 Payment status: UNPAID (high confidence)")
+            logger.debug('Payment status: UNPAID (high confidence)')
             return result
         
         # Rule 3: Check for "Overdue" indicators
@@ -253,7 +582,7 @@ JSON OUTPUT:"""
         if any(indicator in overdue_indicators for indicator in overdue_indicators):
             result['payment_status'] = 'overdue'
             result['payment_status_confidence'] = 0.90
-            print("  ⚠️  Payment status: OVERDUE (high confidence)")
+            logger.debug('Payment status: OVERDUE (high confidence)')
             return result
         
         # Rule 4: Check for "Pending" / Credit Terms indicators
@@ -265,7 +594,7 @@ JSON OUTPUT:"""
         if any(indicator in pending_indicators for indicator in pending_indicators):
             result['payment_status'] = 'unpaid'  # Map pending to unpaid (DB constraint)
             result['payment_status_confidence'] = 0.80
-            print("  🟡 Payment status: UNPAID (pending/credit terms - medium confidence)")
+            logger.debug('Payment status: UNPAID (pending/credit terms - medium confidence)')
             return result
         
         # Rule 5: Check date-based logic
@@ -277,14 +606,14 @@ JSON OUTPUT:"""
                     if result.get('payment_status') != 'paid':
                         result['payment_status'] = 'overdue'
                         result['payment_status_confidence'] = 0.70
-                        print("  📅 Payment status: OVERDUE (date-based)")
+                        logger.debug('Payment status: OVERDUE (date-based)')
             except:
                 pass  # Date parsing failed, skip
         
         # Default: Set confidence score if not already set
         if 'payment_status_confidence' not in result or result['payment_status_confidence'] < 0.5:
             result['payment_status_confidence'] = 0.60
-            print("  ❓ Payment status: DEFAULT (low confidence)")
+            logger.debug('Payment status: DEFAULT (low confidence)')
         
         return result
     
@@ -293,51 +622,41 @@ JSON OUTPUT:"""
         ✨ Enhance critical fields using regex extraction
         Fills in GSTIN, PAN, phone, email if Flash-Lite missed them
         """
-        # GSTIN Pattern: 15 characters (2-digit state + 10-char PAN + 3-char suffix)
-        GSTIN_PATTERN = r'\b\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1}\b'
-        
-        # PAN Pattern: 10 characters
-        PAN_PATTERN = r'\b[A-Z]{5}\d{4}[A-Z]{1}\b'
-        
-        # Phone Pattern: 10 digits (with optional +91 prefix)
-        PHONE_PATTERN = r'(?:\+91[-\s]?)?(\d{10})\b'
-        
-        # Email Pattern
-        EMAIL_PATTERN = r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b'
+        doc = analyze(raw_text)
         
         # Extract GSTINs if not already present
-        gstin_matches = re.findall(GSTIN_PATTERN, raw_text, re.IGNORECASE)
+        gstin_matches = doc.values('gstin')
         
         if gstin_matches:
             # First GSTIN is usually vendor
             if not result.get('vendor_gstin') and len(gstin_matches) >= 1:
                 result['vendor_gstin'] = gstin_matches[0].upper()
                 result['vendor_gstin_confidence'] = 0.85
-                print(f"  🔍 Enhanced: vendor_gstin = {result['vendor_gstin']}")
+                logger.debug('Enhanced: vendor_gstin = %s', result['vendor_gstin'])
             
             # Second GSTIN is usually customer
             if not result.get('customer_gstin') and len(gstin_matches) >= 2:
                 result['customer_gstin'] = gstin_matches[1].upper()
                 result['customer_gstin_confidence'] = 0.80
-                print(f"  🔍 Enhanced: customer_gstin = {result['customer_gstin']}")
+                logger.debug('Enhanced: customer_gstin = %s', result['customer_gstin'])
         
         # Extract PANs if not already present
-        pan_matches = re.findall(PAN_PATTERN, raw_text)
+        pan_matches = doc.values('pan')
         
         if pan_matches:
             # Try to distinguish vendor vs customer PAN using context
             if not result.get('vendor_pan') and len(pan_matches) >= 1:
                 result['vendor_pan'] = pan_matches[0].upper()
                 result['vendor_pan_confidence'] = 0.75
-                print(f"  🔍 Enhanced: vendor_pan = {result['vendor_pan']}")
+                logger.debug('Enhanced: vendor_pan = %s', result['vendor_pan'])
             
             if not result.get('customer_pan') and len(pan_matches) >= 2:
                 result['customer_pan'] = pan_matches[1].upper()
                 result['customer_pan_confidence'] = 0.70
-                print(f"  🔍 Enhanced: customer_pan = {result['customer_pan']}")
+                logger.debug('Enhanced: customer_pan = %s', result['customer_pan'])
         
         # Extract phone numbers if not already present
-        phone_matches = re.findall(PHONE_PATTERN, raw_text)
+        phone_matches = doc.values('phone')
         
         if phone_matches:
             # Clean phone numbers (remove +91, spaces, dashes)
@@ -346,36 +665,34 @@ JSON OUTPUT:"""
             if not result.get('vendor_phone') and len(cleaned_phones) >= 1:
                 result['vendor_phone'] = cleaned_phones[0]
                 result['vendor_phone_confidence'] = 0.70
-                print(f"  🔍 Enhanced: vendor_phone = {result['vendor_phone']}")
+                logger.debug('Enhanced: vendor_phone = %s', result['vendor_phone'])
             
             if not result.get('customer_phone') and len(cleaned_phones) >= 2:
                 result['customer_phone'] = cleaned_phones[1]
                 result['customer_phone_confidence'] = 0.65
-                print(f"  🔍 Enhanced: customer_phone = {result['customer_phone']}")
+                logger.debug('Enhanced: customer_phone = %s', result['customer_phone'])
         
         # Extract emails if not already present
-        email_matches = re.findall(EMAIL_PATTERN, raw_text, re.IGNORECASE)
+        email_matches = doc.values('email')
         
         if email_matches:
             if not result.get('vendor_email') and len(email_matches) >= 1:
                 result['vendor_email'] = email_matches[0].lower()
                 result['vendor_email_confidence'] = 0.75
-                print(f"  🔍 Enhanced: vendor_email = {result['vendor_email']}")
+                logger.debug('Enhanced: vendor_email = %s', result['vendor_email'])
             
             if not result.get('customer_email') and len(email_matches) >= 2:
                 result['customer_email'] = email_matches[1].lower()
                 result['customer_email_confidence'] = 0.70
-                print(f"  🔍 Enhanced: customer_email = {result['customer_email']}")
-        
-        # Extract HSN/SAC codes from line items if missing
-        HSN_PATTERN = r'\b(\d{4,8})\b'  # 4-8 digit codes
+                logger.debug('Enhanced: customer_email = %s', result['customer_email'])
         
+        # Extract HSN/SAC codes (4-8 digits) from line items if missing
         if 'line_items' in result and result['line_items']:
             for item in result['line_items']:
                 if not item.get('hsn_sac'):
                     # Try to find HSN in item description
                     item_text = str(item.get('description', ''))
-                    hsn_matches = re.findall(HSN_PATTERN, item_text)
+                    hsn_matches = HSN_PATTERN.findall(item_text)
                     if hsn_matches:
                         item['hsn_sac'] = hsn_matches[0]
                         item['hsn_sac_confidence'] = 0.65
@@ -385,8 +702,8 @@ JSON OUTPUT:"""
     def _extract_json_from_response(self, response_text: str) -> str:
         """Extract JSON from model response, handling markdown"""
         # Remove markdown code blocks
-        text = re.sub(r'```json\s*', '', response_text)
-        text = re.sub(r'```\s*$', '', text)
+        text = JSON_FENCE_OPEN.sub('', response_text)
+        text = JSON_FENCE_CLOSE.sub('', text)
         text = text.strip()
         
         # Find JSON object
@@ -405,7 +722,7 @@ JSON OUTPUT:"""
         
         # ✨ NEW: Handle truncated JSON (common with large consolidated invoices)
         if not json_text.strip().endswith('}'):
-            print("  ⚠️  JSON appears truncated, attempting to close it...")
+            logger.warning('JSON appears truncated, attempting to close it...')
             # Count open braces and brackets
             open_braces = json_text.count('{') - json_text.count('}')
             open_brackets = json_text.count('[') - json_text.count(']')
@@ -424,18 +741,11 @@ JSON OUTPUT:"""
             # Close remaining open structures
             json_text += '\n}' * open_braces
             json_text += '\n]' * open_brackets
-            print(f"  🔧 Closed {open_braces} braces and {open_brackets} brackets")
+            logger.info('Closed %s braces and %s brackets', open_braces, open_brackets)
         
         # Fix common issues
-        fixes = [
-            (r',\s*}', '}'),  # Remove trailing commas
-            (r',\s*]', ']'),  # Remove trailing commas in arrays
-            (r'([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'"\1":'),  # Quote unquoted keys
-            (r':\s*([^",\[\]{}\s]+)(?=\s*[,}])', r': "\1"'),  # Quote unquoted string values
-        ]
-        
-        for pattern, replacement in fixes:
-            json_text = re.sub(pattern, replacement, json_text)
+        for pattern, replacement in JSON_FIXES:
+            json_text = pattern.sub(replacement, json_text)
         
         return json_text
     
@@ -444,7 +754,7 @@ JSON OUTPUT:"""
         Last resort: Extract what we can from severely broken JSON
         Uses regex to find key-value pairs and reconstruct minimal valid JSON
         """
-        print("  🚨 Using aggressive extraction from broken JSON...")
+        logger.info('Using aggressive extraction from broken JSON...')
         
         result = {
             'invoice_number': '',
@@ -457,66 +767,33 @@ JSON OUTPUT:"""
         }
         
         # Try to extract key fields using regex (with multiple fallback patterns)
-        patterns = {
-            'invoice_number': [
-                r'"invoice_number"\s*:\s*"([^"]+)"',
-                r'"invoice_no"\s*:\s*"([^"]+)"',
-            ],
-            'vendor_name': [
-                r'"vendor_name"\s*:\s*"([^"]+)"',
-                r'"seller_name"\s*:\s*"([^"]+)"',
-            ],
-            'total_amount': [
-                r'"total_amount"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Standard format
-                r'"total"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Shortened
-                r'"grand_total"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Alternative
-                r'"invoice_total"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Alternative
-                r'"net_amount"\s*:\s*([0-9]+(?:\.[0-9]+)?)',  # Alternative
-            ],
-            'customer_name': [
-                r'"customer_name"\s*:\s*"([^"]+)"',
-                r'"buyer_name"\s*:\s*"([^"]+)"',
-            ],
-            'invoice_date': [
-                r'"invoice_date"\s*:\s*"([^"]+)"',
-                r'"date"\s*:\s*"([^"]+)"',
-            ],
-        }
-        
-        for field, pattern_list in patterns.items():
+        for field, pattern_list in BROKEN_JSON_PATTERNS.items():
             for pattern in pattern_list:
-                match = re.search(pattern, broken_json, re.IGNORECASE)
+                match = pattern.search(broken_json)
                 if match:
                     value = match.group(1)
                     if field == 'total_amount':
                         try:
                             result[field] = float(value)
-                            print(f"  ✓ Extracted {field}: ₹{value}")
+                            logger.debug('Extracted %s: ₹%s', field, value)
                         except:
                             pass
                     else:
                         result[field] = value
-                        print(f"  ✓ Extracted {field}: {value}")
+                        logger.debug('Extracted %s: %s', field, value)
                     break  # Found a match, stop trying patterns for this field
         
         # If STILL no total_amount, scan raw text for amount patterns
         if result['total_amount'] == 0.0:
-            print("  🔍 Scanning raw text for total amount...")
+            logger.info('Scanning raw text for total amount...')
             # Look for common invoice total patterns
-            amount_patterns = [
-                r'Total\s*(?:Amount|Rs\.?|INR)?\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
-                r'Grand\s+Total\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
-                r'Net\s+Amount\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
-                r'Invoice\s+Total\s*:?\s*₹?\s*([0-9,]+(?:\.[0-9]{2})?)',
-            ]
-            
-            for pattern in amount_patterns:
-                match = re.search(pattern, raw_text, re.IGNORECASE)
+            for pattern in RAW_TOTAL_PATTERNS:
+                match = pattern.search(raw_text)
                 if match:
                     try:
                         amount_str = match.group(1).replace(',', '')
                         result['total_amount'] = float(amount_str)
-                        print(f"  ✓ Extracted total from raw text: ₹{amount_str}")
+                        logger.debug('Extracted total from raw text: ₹%s', amount_str)
                         break
                     except:
                         pass
@@ -529,7 +806,7 @@ JSON OUTPUT:"""
                 if any(kw in line.upper() for kw in ['TRADING', 'COMPANY', 'LTD', 'PVT', 'INC']):
                     if 5 < len(line) < 100:
                         result['vendor_name'] = line
-                        print(f"  ✓ Extracted vendor from raw text: {line}")
+                        logger.debug('Extracted vendor from raw text: %s', line)
                         break
         
         # Enhance with regex patterns
@@ -565,15 +842,10 @@ JSON OUTPUT:"""
         Extracts data directly from Vision OCR text using regex patterns
         This bypasses Flash-Lite entirely for maximum reliability
         """
-        print("  🔍 Starting direct OCR extraction...")
+        logger.info('Starting direct OCR extraction...')
         
-        # DEBUG: Save raw text for inspection
-        try:
-            with open('debug_ocr_text.txt', 'w', encoding='utf-8') as f:
-                f.write(raw_text)
-            print(f"  💾 Saved OCR text to debug_ocr_text.txt ({len(raw_text)} chars)")
-        except:
-            pass
+        # Sampled capture of the raw text for offline inspection (DEBUG_ARTIFACTS_DIR)
+        save_artifact('ocr_text', raw_text)
         
         result = {
             'invoice_number': '',
@@ -594,138 +866,89 @@ JSON OUTPUT:"""
             }
         }
         
-        # Clean text for better matching
-        text_upper = raw_text.upper()
+        # Derived views (uppercase, header lines) are built once per document
+        doc = analyze(raw_text)
+        text_upper = doc.upper
         
         # 1. EXTRACT VENDOR NAME (from header - first 10 lines)
-        lines = raw_text.split('\n')
-        for line in lines[:10]:
-            line = line.strip()
-            if len(line) > 10 and any(kw in line.upper() for kw in [
-                'TRADING', 'COMPANY', 'CORPORATION', 'LTD', 'LIMITED',
-                'PVT', 'PRIVATE', 'INC', 'LLC', 'INDUSTRIES', 'ENTERPRISE'
-            ]):
-                if not any(skip in line.upper() for skip in ['INVOICE', 'BILL', 'TO:', 'FROM:']):
-                    result['vendor_name'] = line
-                    print(f"  ✓ Vendor: {line}")
-                    break
+        vendor_name = doc.vendor_from_header()
+        if vendor_name:
+            result['vendor_name'] = vendor_name
+            logger.debug('Vendor: %s', vendor_name)
         
         # 2. EXTRACT INVOICE NUMBER (multiple patterns)
-        inv_patterns = [
-            r'INVOICE\s*(?:NO|NUMBER|#)?[:\s]+([A-Z0-9/-]+)',
-            r'BILL\s*(?:NO|NUMBER|#)?[:\s]+([A-Z0-9/-]+)',
-            r'INV[:\s-]+([A-Z0-9/-]+)',
-            r'#\s*([A-Z0-9/-]{3,})',
-        ]
-        for pattern in inv_patterns:
-            match = re.search(pattern, text_upper)
-            if match:
-                result['invoice_number'] = match.group(1)
-                print(f"  ✓ Invoice #: {match.group(1)}")
-                break
+        match = first_match(INVOICE_NUMBER_PATTERNS, text_upper)
+        if match:
+            result['invoice_number'] = match.group(1)
+            logger.debug('Invoice #: %s', match.group(1))
         
         # 3. EXTRACT TOTAL AMOUNT (most critical!)
         # For consolidated bills with format: "2,495.00 Total :Discount(-) :Bill Total :"
         # The amount comes BEFORE the "Bill Total" text
-        bill_total_pattern = r'([0-9,]+\.?\d{2})\s+TOTAL\s*:\s*DISCOUNT\([^)]*\)\s*:\s*BILL\s+TOTAL'
-        bill_totals = re.findall(bill_total_pattern, text_upper, re.IGNORECASE)
+        bill_totals = doc.bill_totals()
         
         if len(bill_totals) > 1:
             # Consolidated invoice with multiple bill totals
-            print(f"  📊 Found {len(bill_totals)} bill totals (consolidated invoice)")
+            logger.info('Found %s bill totals (consolidated invoice)', len(bill_totals))
             total = 0.0
             for bill_total_str in bill_totals:
-                try:
-                    amount = float(bill_total_str.replace(',', ''))
-                    total += amount
-                    print(f"     + ₹{amount:,.2f}")
-                except:
+                amount = parse_amount(bill_total_str)
+                if amount is None:
                     continue
+                total += amount
+                logger.debug('  + ₹%.2f', amount)
             if total > 0:
                 result['total_amount'] = total
                 result['is_consolidated'] = True
                 result['sub_vendor_count'] = len(bill_totals)
-                print(f"  ✓ Total Amount (sum of {len(bill_totals)} bills): ₹{total:,.2f}")
+                logger.info('Total Amount (sum of %s bills): ₹%.2f', len(bill_totals), total)
                 
                 # Extract line items from each sub-bill
-                print(f"  📋 Extracting line items from {len(bill_totals)} sub-bills...")
+                logger.info('Extracting line items from %s sub-bills...', len(bill_totals))
                 line_items = self._extract_consolidated_line_items(raw_text)
                 result['line_items'] = line_items
-                print(f"  ✓ Extracted {len(line_items)} line items")
+                logger.debug('Extracted %s line items', len(line_items))
         
         # If no bill totals found, try standard patterns
         if result['total_amount'] == 0.0:
-            total_patterns = [
-                r'GRAND\s+TOTAL[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
-                r'NET\s+AMOUNT[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
-                r'INVOICE\s+TOTAL[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
-                r'TOTAL\s+AMOUNT[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
-                r'AMOUNT\s+PAYABLE[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
-            ]
-            
-            for pattern in total_patterns:
-                match = re.search(pattern, text_upper)
+            for pattern in TOTAL_AMOUNT_PATTERNS:
+                match = pattern.search(text_upper)
                 if match:
-                    try:
-                        amount_str = match.group(1).replace(',', '')
-                        amount = float(amount_str)
-                        if amount > 0:
-                            result['total_amount'] = amount
-                            print(f"  ✓ Total Amount: ₹{amount:,.2f}")
-                            break
-                    except:
-                        continue
+                    amount = parse_amount(match.group(1))
+                    if amount:
+                        result['total_amount'] = amount
+                        logger.info('Total Amount: ₹%.2f', amount)
+                        break
         
         # Fallback: Find largest number in document (likely the total)
         if result['total_amount'] == 0:
-            all_numbers = re.findall(r'([0-9,]+\.?\d{0,2})', raw_text)
-            amounts = []
-            for num_str in all_numbers:
-                try:
-                    amount = float(num_str.replace(',', ''))
-                    if 10 < amount < 10000000:  # Reasonable invoice range
-                        amounts.append(amount)
-                except:
-                    continue
-            if amounts:
-                result['total_amount'] = max(amounts)
-                print(f"  ✓ Total Amount (fallback): ₹{result['total_amount']:,.2f}")
+            amount = largest_amount(raw_text)  # Reasonable invoice range
+            if amount is not None:
+                result['total_amount'] = amount
+                logger.info('Total Amount (fallback): ₹%.2f', result['total_amount'])
         
         # 4. EXTRACT CUSTOMER NAME
-        customer_patterns = [
-            r'(?:BILL\s+TO|BILLED\s+TO|CUSTOMER)[:\s]+([^\n]+)',
-            r'TO[:\s]+([A-Z][^\n]{5,80})',
-        ]
-        for pattern in customer_patterns:
-            match = re.search(pattern, text_upper)
-            if match:
-                result['customer_name'] = match.group(1).strip()
-                print(f"  ✓ Customer: {result['customer_name']}")
-                break
+        match = first_match(CUSTOMER_PATTERNS, text_upper)
+        if match:
+            result['customer_name'] = match.group(1).strip()
+            logger.debug('Customer: %s', result['customer_name'])
         
         # 5. EXTRACT DATES
-        date_patterns = [
-            r'(?:DATE|INVOICE\s+DATE)[:\s]+(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            r'(?:DATE|INVOICE\s+DATE)[:\s]+(\d{1,2}\s+[A-Z]{3,9}\s+\d{2,4})',
-        ]
-        for pattern in date_patterns:
-            match = re.search(pattern, text_upper)
-            if match:
-                result['invoice_date'] = match.group(1)
-                print(f"  ✓ Date: {result['invoice_date']}")
-                break
+        match = first_match(DATE_PATTERNS, text_upper)
+        if match:
+            result['invoice_date'] = match.group(1)
+            logger.debug('Date: %s', result['invoice_date'])
         
         # 6. EXTRACT GSTIN NUMBERS
-        gstin_pattern = r'\b(\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1})\b'
-        gstins = re.findall(gstin_pattern, raw_text)
+        gstins = GSTIN_PATTERN.findall(raw_text)
         if len(gstins) >= 1:
             result['vendor_gstin'] = gstins[0]
             result['vendor_gstin_confidence'] = 0.95
-            print(f"  ✓ Vendor GSTIN: {gstins[0]}")
+            logger.debug('Vendor GSTIN: %s', gstins[0])
         if len(gstins) >= 2:
             result['customer_gstin'] = gstins[1]
             result['customer_gstin_confidence'] = 0.95
-            print(f"  ✓ Customer GSTIN: {gstins[1]}")
+            logger.debug('Customer GSTIN: %s', gstins[1])
         
         return result
     
@@ -737,66 +960,7 @@ JSON OUTPUT:"""
         Item Name    Quantity  Case Quantity  Rate  Amount
         ITEM 1       1         6              1255   1255.00
         """
-        line_items = []
-        
-        # Split text into sub-bills using bill number pattern
-        bill_pattern = r'(.+?)\s+BILL\s+NO:\s*([A-Z0-9-]+)\s+DATED:\s*([0-9-A-Z]+)(?:\s+GSTIN:([0-9A-Z]+))?'
-        bills = re.finditer(bill_pattern, raw_text, re.IGNORECASE)
-        
-        bill_sections = []
-        for match in bills:
-            vendor_location = match.group(1).strip()
-            bill_no = match.group(2)
-            dated = match.group(3)
-            gstin = match.group(4) if match.group(4) else ''
-            
-            # Extract vendor name (before the /)
-            vendor_parts = vendor_location.split('/')
-            sub_vendor = vendor_parts[0].strip() if vendor_parts else vendor_location
-            
-            bill_sections.append({
-                'sub_vendor': sub_vendor,
-                'sub_bill_number': bill_no,
-                'sub_gstin': gstin,
-                'start_pos': match.end()
-            })
-        
-        # Extract items from each bill section
-        for idx, bill_info in enumerate(bill_sections):
-            start_pos = bill_info['start_pos']
-            # End position is start of next bill or end of text
-            end_pos = bill_sections[idx + 1]['start_pos'] if idx + 1 < len(bill_sections) else len(raw_text)
-            section_text = raw_text[start_pos:end_pos]
-            
-            # Extract line items from this section
-            # Pattern: Item name followed by numbers (quantity, rate, amount)
-            # Looking for lines with: TEXT  NUMBER  NUMBER  NUMBER  AMOUNT
-            item_pattern = r'^([A-Z][A-Z0-9\s\(\)\/+\.-]+?)\s+(\d+)\s+(\d+)\s+([0-9.]+)\s+([0-9,]+\.?\d{0,2})$'
-            
-            lines = section_text.split('\n')
-            for line in lines:
-                line = line.strip()
-                match = re.match(item_pattern, line, re.IGNORECASE)
-                if match:
-                    description = match.group(1).strip()
-                    quantity = int(match.group(2))
-                    rate = float(match.group(4))
-                    amount_str = match.group(5).replace(',', '')
-                    amount = float(amount_str)
-                    
-                    # Only add if amount > 0 and description is reasonable
-                    if amount > 0 and len(description) > 3 and len(description) < 150:
-                        line_items.append({
-                            'description': description,
-                            'quantity': quantity,
-                            'rate': rate,
-                            'amount': amount,
-                            'sub_vendor': bill_info['sub_vendor'],
-                            'sub_bill_number': bill_info['sub_bill_number'],
-                            'sub_gstin': bill_info['sub_gstin']
-                        })
-        
-        return line_items
+        return analyze(raw_text).consolidated_line_items()
     
     def get_cost_estimate(self) -> Dict[str, Any]:
         """Get cost information for Flash-Lite formatting"""
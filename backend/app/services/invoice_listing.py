@@ -0,0 +1,212 @@
+"""
+📄 INVOICE LISTING - Keyset pagination, filters and sparse fieldsets
+Backs GET /api/invoices/
+
+- Keyset (cursor) pagination on (sort column, id): every page is one index
+  range scan, so page 500 costs the same as page 1 and rows inserted while
+  a user pages through never shift or duplicate results (unlike OFFSET)
+- Sort by created_at (default), invoice_date or total_amount, either
+  direction; NULLs always sort last and are paged through like any value
+- Filters: vendor (substring), invoice_date range, payment_status, amount range
+- fields= selects columns; the default is the dashboard list projection,
+  which leaves out large JSON columns such as line_items
+- Weak ETag over the page body for If-None-Match revalidation
+
+Cursors are opaque base64url JSON tokens bound to the sort they were
+issued for. Indexes: ADD_INVOICE_LISTING_INDEXES.sql
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_FIELDS = 40
+
+# What the invoice list and dashboard actually render
+DEFAULT_LIST_FIELDS = (
+    "id", "created_at", "document_id", "vendor_name", "invoice_number",
+    "invoice_date", "due_date", "total_amount", "cgst", "sgst", "igst",
+    "currency", "payment_status", "confidence_score",
+)
+
+SORT_COLUMNS = ("created_at", "invoice_date", "total_amount")
+SORT_ORDERS = ("desc", "asc")
+
+_FIELD_NAME = re.compile(r"^[a-z_][a-z0-9_]{0,62}$")
+# Characters that end a value in a PostgREST vendor ilike pattern / or= list
+_PATTERN_SPECIALS = re.compile(r"[%_*,()\\\"]")
+
+
+class InvoiceListingError(ValueError):
+    """Invalid listing parameters (mapped to HTTP 400)"""
+    pass
+
+
+def parse_fields(fields: Optional[str], sort: str) -> List[str]:
+    """
+    fields= -> column list for select()
+
+    id and the sort column are always included because the next cursor is
+    built from them. Names are validated here; unknown (but well-formed)
+    columns are rejected by PostgREST.
+    """
+    if not fields:
+        columns = list(DEFAULT_LIST_FIELDS)
+    else:
+        columns = []
+        for name in fields.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if not _FIELD_NAME.match(name):
+                raise InvoiceListingError(f"Invalid field name: {name!r}")
+            if name not in columns:
+                columns.append(name)
+        if len(columns) > MAX_FIELDS:
+            raise InvoiceListingError(f"At most {MAX_FIELDS} fields can be requested")
+
+    for required in (sort, "id"):
+        if required not in columns:
+            columns.append(required)
+    return columns
+
+
+def encode_cursor(sort: str, order: str, value: Any, row_id: Any) -> str:
+    raw = json.dumps({"s": sort, "o": order, "v": value, "id": row_id}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, Any]:
+    """Cursor -> (last sort value, last id); rejects tampered or mismatched cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError):
+        raise InvoiceListingError("Invalid cursor")
+
+    if not isinstance(data, dict) or data.get("s") != sort or data.get("o") != order:
+        raise InvoiceListingError("Cursor does not match the requested sort; restart from the first page")
+    value, row_id = data.get("v"), data.get("id")
+    if not isinstance(value, (str, int, float, type(None))) or isinstance(value, bool):
+        raise InvoiceListingError("Invalid cursor")
+    if not isinstance(row_id, (str, int)) or isinstance(row_id, bool):
+        raise InvoiceListingError("Invalid cursor")
+    return value, row_id
+
+
+def _quote(value: Any) -> str:
+    """Quote a value for a PostgREST logical filter (commas, dots and colons are syntax)"""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def keyset_filter(column: str, descending: bool, value: Any, row_id: Any) -> str:
+    """
+    PostgREST or= expression for "rows after (value, row_id)"
+
+    Matches ORDER BY column <dir> NULLS LAST, id <dir>:
+    strictly past the value, a tie on the value with a later id, or any
+    NULL (NULLs come after every value). Once the cursor is inside the
+    NULL tail only the id decides.
+    """
+    op = "lt" if descending else "gt"
+    if value is None:
+        return f"and({column}.is.null,id.{op}.{_quote(row_id)})"
+    quoted = _quote(value)
+    return (
+        f"{column}.{op}.{quoted},"
+        f"and({column}.eq.{quoted},id.{op}.{_quote(row_id)}),"
+        f"{column}.is.null"
+    )
+
+
+def escape_like(text: str) -> str:
+    """Literal substring for ilike: strip pattern/list metacharacters"""
+    return _PATTERN_SPECIALS.sub(" ", text).strip()
+
+
+def build_query(
+    client,
+    user_id: str,
+    columns: Sequence[str],
+    sort: str = "created_at",
+    order: str = "desc",
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    vendor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    statuses: Optional[Sequence[str]] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+):
+    """One PostgREST request for limit + 1 rows (the extra row means "has more")"""
+    if sort not in SORT_COLUMNS:
+        raise InvoiceListingError(f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+    if order not in SORT_ORDERS:
+        raise InvoiceListingError("order must be 'asc' or 'desc'")
+    descending = order == "desc"
+
+    query = client.table("invoices").select(",".join(columns)).eq("user_id", user_id)
+
+    if vendor:
+        term = escape_like(vendor)
+        if term:
+            query = query.ilike("vendor_name", f"%{term}%")
+    if date_from:
+        query = query.gte("invoice_date", date_from)
+    if date_to:
+        query = query.lte("invoice_date", date_to)
+    if statuses:
+        query = query.in_("payment_status", list(statuses))
+    if min_amount is not None:
+        query = query.gte("total_amount", min_amount)
+    if max_amount is not None:
+        query = query.lte("total_amount", max_amount)
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort, order)
+        query = query.or_(keyset_filter(sort, descending, value, row_id))
+
+    return (
+        query.order(sort, desc=descending, nullsfirst=False)
+        .order("id", desc=descending)
+        .limit(limit + 1)
+    )
+
+
+def paginate(rows: List[Dict[str, Any]], limit: int, sort: str, order: str) -> Dict[str, Any]:
+    """Trim the look-ahead row and build the next cursor from the last row kept"""
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor(sort, order, last.get(sort), last.get("id"))
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more, "limit": limit}
+
+
+def compute_etag(payload: Dict[str, Any]) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return 'W/"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 9110 weak comparison against an If-None-Match header"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
@@ -0,0 +1,244 @@
+"""
+🔎 INVOICE SEARCH - Ranked full-text + fuzzy search over a user's invoices
+Backs GET /api/invoices/search
+
+Searchable: vendor_name, invoice_number, vendor_gstin (weight A) and
+line-item descriptions (weight C).
+
+- Every query word must match, either as a word prefix ("pen" finds
+  "Penny") or fuzzily by trigram similarity ("bazzar" finds "Bazar")
+- Ranked by match quality and field weight, newest first on ties
+- Postgres: search_invoices() over a trigger-maintained tsvector and a
+  pg_trgm index (ADD_INVOICE_SEARCH_INDEX.sql), one round trip per page
+- Fallback: when that function is not deployed (local SQLite setups, tests,
+  a fresh Supabase project) an in-process InvoiceSearchIndex with the same
+  matching rules is built from the user's rows and cached briefly
+"""
+
+import bisect
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.supabase_helper import call_rpc
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MAX_QUERY_TOKENS = 8
+
+# Same as ts_rank's default weights for A and C
+FIELD_WEIGHTS = {
+    "vendor_name": 1.0,
+    "invoice_number": 1.0,
+    "vendor_gstin": 1.0,
+    "line_items": 0.2,
+}
+# pg_trgm word similarity needed for a fuzzy match (set on the SQL function too)
+FUZZY_THRESHOLD = 0.5
+PREFIX_SCORE = 0.8
+
+RESULT_FIELDS = (
+    "id", "created_at", "vendor_name", "invoice_number", "vendor_gstin",
+    "invoice_date", "total_amount", "currency", "payment_status",
+)
+
+# Fallback index cache: built indexes per user, briefly reused across pages
+INDEX_TTL_SECONDS = 60
+MAX_CACHED_INDEXES = 128
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercase alphanumeric words, matching the SQL side's 'simple' parser"""
+    if not text:
+        return []
+    return _TOKEN.findall(str(text).lower())
+
+
+def query_tokens(query: str) -> List[str]:
+    tokens = []
+    for token in tokenize(query):
+        if token not in tokens:
+            tokens.append(token)
+    return tokens[:MAX_QUERY_TOKENS]
+
+
+def trigrams(word: str) -> Set[str]:
+    """pg_trgm trigrams: the word padded with two spaces in front and one behind"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def line_item_text(line_items: Any) -> str:
+    """Flatten line-item descriptions the way the SQL trigger does"""
+    if not isinstance(line_items, list):
+        return ""
+    parts = []
+    for item in line_items:
+        if isinstance(item, dict):
+            description = item.get("description") or item.get("item_name") or item.get("item") or item.get("name")
+            if description:
+                parts.append(str(description))
+    return " ".join(parts)
+
+
+class InvoiceSearchIndex:
+    """
+    In-memory inverted index with prefix and trigram lookups
+
+    Postings map word -> {doc position: best field weight}. A sorted
+    vocabulary gives prefix ranges via bisect, and a trigram -> words map
+    narrows fuzzy candidates to words sharing at least one trigram.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()):
+        self.docs: List[Dict[str, Any]] = []
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.trigram_words: Dict[str, Set[str]] = defaultdict(set)
+        self._vocabulary: Optional[List[str]] = None
+        for row in rows:
+            self.add(row)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        position = len(self.docs)
+        self.docs.append(row)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = row.get(field)
+            text = line_item_text(value) if field == "line_items" else value
+            for word in tokenize(text):
+                if word not in self.postings:
+                    for gram in trigrams(word):
+                        self.trigram_words[gram].add(word)
+                postings = self.postings[word]
+                if postings.get(position, 0.0) < weight:
+                    postings[position] = weight
+        self._vocabulary = None
+
+    @property
+    def vocabulary(self) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def _token_scores(self, token: str) -> Dict[int, float]:
+        """Best score per document for one query word (exact > prefix > fuzzy)"""
+        scores: Dict[int, float] = {}
+
+        def merge(word: str, quality: float):
+            for position, weight in self.postings[word].items():
+                score = weight * quality
+                if score > scores.get(position, 0.0):
+                    scores[position] = score
+
+        vocabulary = self.vocabulary
+        start = bisect.bisect_left(vocabulary, token)
+        for word in vocabulary[start:]:
+            if not word.startswith(token):
+                break
+            merge(word, 1.0 if word == token else PREFIX_SCORE)
+
+        token_grams = trigrams(token)
+        candidates: Set[str] = set()
+        for gram in token_grams:
+            candidates |= self.trigram_words.get(gram, set())
+        for word in candidates:
+            if word.startswith(token):
+                continue
+            score = similarity(token_grams, trigrams(word))
+            if score >= FUZZY_THRESHOLD:
+                merge(word, score * PREFIX_SCORE)
+        return scores
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT, offset: int = 0) -> List[Dict[str, Any]]:
+        """Ranked rows matching every query word; each row gets a 'rank' key"""
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+
+        totals: Optional[Dict[int, float]] = None
+        for token in tokens:
+            scores = self._token_scores(token)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {p: totals[p] + s for p, s in scores.items() if p in totals}
+            if not totals:
+                return []
+
+        ranked = sorted(
+            totals.items(),
+            key=lambda item: (item[1], str(self.docs[item[0]].get("created_at") or ""), str(self.docs[item[0]].get("id"))),
+            reverse=True,
+        )
+        results = []
+        for position, score in ranked[offset:offset + limit]:
+            row = {field: self.docs[position].get(field) for field in RESULT_FIELDS}
+            row["rank"] = round(score, 4)
+            results.append(row)
+        return results
+
+
+_index_cache: "OrderedDict[str, Tuple[float, InvoiceSearchIndex]]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def invalidate_user_index(user_id: str) -> None:
+    """Drop a user's cached fallback index after their invoices change"""
+    with _index_lock:
+        _index_cache.pop(user_id, None)
+
+
+def _user_index(client, user_id: str) -> InvoiceSearchIndex:
+    now = time.time()
+    with _index_lock:
+        cached = _index_cache.get(user_id)
+        if cached and cached[0] > now:
+            _index_cache.move_to_end(user_id)
+            return cached[1]
+
+    columns = ",".join(RESULT_FIELDS + ("line_items",))
+    rows = client.table("invoices").select(columns).eq("user_id", user_id).execute().data or []
+    index = InvoiceSearchIndex(rows)
+
+    with _index_lock:
+        _index_cache[user_id] = (now + INDEX_TTL_SECONDS, index)
+        _index_cache.move_to_end(user_id)
+        while len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def search_invoices(client, user_id: str, query: str, limit: int = DEFAULT_LIMIT, offset: int = 0) -> Dict[str, Any]:
+    """
+    One page of ranked results: {items, has_more, next_offset, limit}
+
+    Fetches limit + 1 rows to know whether another page exists.
+    """
+    if not query_tokens(query):
+        return {"items": [], "has_more": False, "next_offset": None, "limit": limit}
+
+    rows = call_rpc(client, "search_invoices", {
+        "user_id_param": user_id,
+        "query_text": query,
+        "limit_param": limit + 1,
+        "offset_param": offset,
+    })
+    if rows is None:
+        rows = _user_index(client, user_id).search(query, limit + 1, offset)
+
+    has_more = len(rows) > limit
+    return {
+        "items": rows[:limit],
+        "has_more": has_more,
+        "next_offset": offset + limit if has_more else None,
+        "limit": limit,
+    }
@@ -0,0 +1,201 @@
+"""
+📊 INVOICE STATS - Per-user dashboard aggregates
+Backs GET /api/invoices/stats
+
+Totals, tax by type, spend by vendor / month / GST rate, payment-status
+counts and quota usage for one user.
+
+- Postgres: rollup tables kept current by a trigger on invoices
+  (ADD_INVOICE_STATS_ROLLUPS.sql); get_invoice_stats() reads only those
+  rows, so the answer costs the same at 10 or 100,000 invoices
+- Response cached under build_user_stats_key; invoice writes made through
+  the API call CacheInvalidation.on_user_stats_change
+- Fallback (function not deployed): InvoiceStatsRollup, the same bucketing
+  rules in Python, folded over the user's rows
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config.plans import get_scan_limit
+from app.core.caching import CacheManager, build_user_stats_key
+from app.services.supabase_helper import call_rpc
+
+TOP_VENDORS = 10
+MONTHS = 12
+# Short: rows changed outside the API (e.g. directly by the frontend) are
+# only picked up when the cached copy expires
+STATS_CACHE_TTL = 60
+
+GST_SLABS = (0.0, 0.25, 3.0, 5.0, 12.0, 18.0, 28.0)
+
+ROLLUP_COLUMNS = (
+    "total_amount", "subtotal", "cgst", "sgst", "igst", "cess",
+    "vendor_name", "invoice_date", "created_at", "payment_status",
+)
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def vendor_key(vendor_name: Optional[str]) -> str:
+    return (vendor_name or "").strip().lower() or "(unknown)"
+
+
+def month_key(invoice_date: Any, created_at: Any) -> str:
+    """'YYYY-MM' from invoice_date when it is ISO-formatted, else from created_at"""
+    text = str(invoice_date or "")
+    if len(text) >= 7 and text[:4].isdigit() and text[4] == "-" and text[5:7].isdigit():
+        return text[:7]
+    return str(created_at or "")[:7] or "unknown"
+
+
+def status_key(payment_status: Optional[str]) -> str:
+    return (payment_status or "").strip().lower() or "unknown"
+
+
+def gst_rate_key(subtotal: float, total: float, tax: float) -> str:
+    """Effective GST rate snapped to the nearest slab; 'mixed' if none is within 1 point"""
+    base = subtotal if subtotal > 0 else total - tax
+    if base <= 0:
+        return "mixed"
+    rate = tax / base * 100
+    slab = min(GST_SLABS, key=lambda s: abs(s - rate))
+    if abs(slab - rate) > 1:
+        return "mixed"
+    return str(int(slab)) if slab == int(slab) else str(slab)
+
+
+class InvoiceStatsRollup:
+    """
+    Additive per-user aggregates: apply(row, +1) on insert, apply(row, -1)
+    on delete, both for an update. Mirrors invoice_stats_apply() in SQL.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()):
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.vendors: Dict[str, Dict[str, Any]] = {}
+        self.months: Dict[str, Dict[str, float]] = {}
+        self.statuses: Dict[str, Dict[str, float]] = {}
+        self.gst_rates: Dict[str, Dict[str, float]] = {}
+        for row in rows:
+            self.apply(row, 1)
+
+    @staticmethod
+    def _bump(buckets: Dict[str, Dict[str, Any]], key: str, sign: int, **amounts: float) -> Dict[str, Any]:
+        bucket = buckets.setdefault(key, defaultdict(float))
+        bucket["invoice_count"] += sign
+        for name, amount in amounts.items():
+            bucket[name] += sign * amount
+        if bucket["invoice_count"] <= 0:
+            del buckets[key]
+        return bucket
+
+    def apply(self, row: Dict[str, Any], sign: int = 1) -> None:
+        total = _num(row.get("total_amount"))
+        subtotal = _num(row.get("subtotal"))
+        cgst, sgst, igst = _num(row.get("cgst")), _num(row.get("sgst")), _num(row.get("igst"))
+        tax = cgst + sgst + igst
+
+        self.totals["invoice_count"] += sign
+        for name, amount in (("total_amount", total), ("subtotal", subtotal), ("cgst", cgst),
+                             ("sgst", sgst), ("igst", igst), ("cess", _num(row.get("cess")))):
+            self.totals[name] += sign * amount
+
+        vendor = self._bump(self.vendors, vendor_key(row.get("vendor_name")), sign, total_amount=total)
+        if sign > 0 and row.get("vendor_name"):
+            vendor["vendor_name"] = row["vendor_name"]
+        self._bump(self.months, month_key(row.get("invoice_date"), row.get("created_at")), sign,
+                   total_amount=total, tax_amount=tax)
+        self._bump(self.statuses, status_key(row.get("payment_status")), sign, total_amount=total)
+        self._bump(self.gst_rates, gst_rate_key(subtotal, total, tax), sign,
+                   taxable_amount=total - tax, tax_amount=tax)
+
+    def to_dict(self, top_vendors: int = TOP_VENDORS, months: int = MONTHS) -> Dict[str, Any]:
+        """Same shape as get_invoice_stats() (quota is added by the caller)"""
+        t = self.totals
+        vendors = sorted(self.vendors.items(), key=lambda kv: (-kv[1]["total_amount"], kv[0]))
+        recent_months = sorted(self.months)[-months:] if months > 0 else []
+        return {
+            "totals": {
+                "invoice_count": int(t["invoice_count"]),
+                "total_amount": round(t["total_amount"], 2),
+                "subtotal": round(t["subtotal"], 2),
+            },
+            "tax": {
+                "cgst": round(t["cgst"], 2),
+                "sgst": round(t["sgst"], 2),
+                "igst": round(t["igst"], 2),
+                "cess": round(t["cess"], 2),
+                "total": round(t["cgst"] + t["sgst"] + t["igst"], 2),
+            },
+            "vendor_count": len(self.vendors),
+            "by_vendor": [
+                {"vendor_name": bucket.get("vendor_name") or key, "invoice_count": int(bucket["invoice_count"]),
+                 "total_amount": round(bucket["total_amount"], 2)}
+                for key, bucket in vendors[:top_vendors]
+            ],
+            "by_month": [
+                {"month": month, "invoice_count": int(self.months[month]["invoice_count"]),
+                 "total_amount": round(self.months[month]["total_amount"], 2),
+                 "tax_amount": round(self.months[month]["tax_amount"], 2)}
+                for month in recent_months
+            ],
+            "by_status": {
+                status: {"invoice_count": int(b["invoice_count"]), "total_amount": round(b["total_amount"], 2)}
+                for status, b in self.statuses.items()
+            },
+            "by_gst_rate": [
+                {"gst_rate": rate, "invoice_count": int(b["invoice_count"]),
+                 "taxable_amount": round(b["taxable_amount"], 2), "tax_amount": round(b["tax_amount"], 2)}
+                for rate, b in sorted(self.gst_rates.items())
+            ],
+        }
+
+
+def _quota(raw: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    tier = (raw or {}).get("tier") or "free"
+    used = int((raw or {}).get("scans_used") or (raw or {}).get("scans_used_this_period") or 0)
+    limit = get_scan_limit(tier)
+    return {
+        "tier": tier,
+        "scans_used": used,
+        "scan_limit": limit,
+        "scans_remaining": max(0, limit - used),
+        "period_end": (raw or {}).get("period_end") or (raw or {}).get("current_period_end"),
+    }
+
+
+def _fallback_stats(client, user_id: str) -> Dict[str, Any]:
+    rows = client.table("invoices").select(",".join(ROLLUP_COLUMNS)).eq("user_id", user_id).execute().data or []
+    stats = InvoiceStatsRollup(rows).to_dict()
+    subscription = client.table("subscriptions").select(
+        "tier, scans_used_this_period, current_period_end"
+    ).eq("user_id", user_id).limit(1).execute().data
+    stats["quota"] = subscription[0] if subscription else None
+    return stats
+
+
+def get_user_stats(client, user_id: str, use_cache: bool = True) -> Dict[str, Any]:
+    """Dashboard aggregates for one user (cached for STATS_CACHE_TTL seconds)"""
+    key = build_user_stats_key(user_id)
+    if use_cache:
+        cached = CacheManager.get(key)
+        if cached is not None:
+            return cached
+
+    stats = call_rpc(client, "get_invoice_stats", {
+        "user_id_param": user_id,
+        "top_vendors": TOP_VENDORS,
+        "months": MONTHS,
+    })
+    if stats is None:
+        stats = _fallback_stats(client, user_id)
+
+    stats["quota"] = _quota(stats.get("quota"))
+    CacheManager.set(key, stats, STATS_CACHE_TTL)
+    return stats
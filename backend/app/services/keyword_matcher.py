@@ -0,0 +1,91 @@
+"""
+🔎 MULTI-PHRASE KEYWORD MATCHER
+Finds every occurrence of every phrase in one pass over the text
+
+Produces the same output as an Aho-Corasick automaton (all matches, including
+overlapping and nested ones, with positions), but the phrase trie is compiled
+into a single regex so the scan runs inside the sre engine instead of a
+Python per-character loop.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+@dataclass(frozen=True)
+class KeywordHit:
+    """One phrase occurrence"""
+    phrase: str
+    start: int
+    end: int
+
+
+def _build_trie(phrases: Iterable[str]) -> dict:
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[''] = True  # end-of-phrase marker
+    return trie
+
+
+def _trie_to_regex(node: dict) -> str:
+    """Emit a prefix-factored regex; greedy optionals make it match the longest phrase at a position"""
+    children = sorted((ch, sub) for ch, sub in node.items() if ch != '')
+    if not children:
+        return ''
+    alternatives = [re.escape(ch) + _trie_to_regex(sub) for ch, sub in children]
+    body = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    return '(?:' + body + ')?' if '' in node else body
+
+
+class KeywordMatcher:
+    """
+    Match a fixed phrase table against text in a single pass
+
+    At each position where any phrase starts, the regex returns the longest
+    phrase; shorter phrases starting there are necessarily its prefixes and
+    are recovered from a precomputed prefix table. Resuming the search one
+    character after each match start (rather than after its end) keeps
+    overlapping phrases such as "payment received" / "received by".
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases: Tuple[str, ...] = tuple(sorted({p for p in phrases if p}))
+        self._pattern = re.compile(_trie_to_regex(_build_trie(self.phrases))) if self.phrases else None
+
+        phrase_set = set(self.phrases)
+        self._prefixes: Dict[str, Tuple[str, ...]] = {
+            phrase: tuple(phrase[:n] for n in range(len(phrase), 0, -1) if phrase[:n] in phrase_set)
+            for phrase in self.phrases
+        }
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """Every occurrence of every phrase, ordered by start position (longest first)"""
+        hits: List[KeywordHit] = []
+        if self._pattern is None:
+            return hits
+
+        search = self._pattern.search
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if not match:
+                return hits
+            start = match.start()
+            for phrase in self._prefixes[match.group()]:
+                hits.append(KeywordHit(phrase, start, start + len(phrase)))
+            pos = start + 1
+
+    def found(self, text: str) -> Set[str]:
+        """Set of phrases present in text"""
+        return {hit.phrase for hit in self.find_all(text)}
+
+
+@lru_cache(maxsize=32)
+def get_matcher(phrases: Tuple[str, ...]) -> KeywordMatcher:
+    """Shared matcher per phrase table (compiling the trie regex is the expensive part)"""
+    return KeywordMatcher(phrases)
@@ -0,0 +1,242 @@
+"""
+📥 BATCHED LOG SINK
+Bounded in-memory buffer that writes log records to the database in batches
+
+Request handlers call submit() and return immediately; a background thread
+flushes a batch whenever batch_size records are waiting or flush_interval
+seconds have passed, so request latency no longer depends on how much is
+being logged.
+
+- Bounded ring buffer: when full, a producer waits up to put_timeout for
+  the flusher to make room (backpressure), then the OLDEST record is
+  overwritten and counted as dropped
+- A failed batch is retried up to max_retries times, then dropped and counted
+- drain() flushes everything that is buffered; all writers are drained on
+  application shutdown and at interpreter exit
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Every writer created in this process, for drain_all()
+_writers: List['BatchedLogWriter'] = []
+_writers_lock = threading.Lock()
+
+
+class BatchedLogWriter:
+    """
+    Usage:
+        writer = BatchedLogWriter('quality_logs', lambda rows: table.insert(rows).execute())
+        writer.submit({'severity': 'warning', ...})
+        ...
+        writer.drain()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: Callable[[List[Dict[str, Any]]], Any],
+        max_buffer: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        put_timeout: float = 0.05,
+        max_retries: int = 2,
+    ):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+
+        self._buffer: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._flush_requested = False
+        self._flushing = 0  # records taken by the flusher but not yet written
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped_overflow = 0
+        self.dropped_failed = 0
+        self.failed_batches = 0
+
+        with _writers_lock:
+            _writers.append(self)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        Queue one record; never blocks longer than put_timeout
+
+        Returns False if an older record had to be dropped to make room.
+        After drain() there is no flusher, so the record is written through
+        and the result is whether that write succeeded.
+        """
+        if self._closed:
+            return self._write([record])
+
+        accepted = True
+        with self._cond:
+            if len(self._buffer) >= self.max_buffer and self.put_timeout > 0:
+                self._cond.notify_all()  # wake the flusher, then wait for room
+                deadline = time.monotonic() + self.put_timeout
+                while len(self._buffer) >= self.max_buffer:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.dropped_overflow += 1
+                accepted = False
+            self._buffer.append(record)
+            self.submitted += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        self._ensure_started()
+        return accepted
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name=f'log-sink-{self.name}', daemon=True
+            )
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Flusher side
+    # ------------------------------------------------------------------
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Pop up to batch_size records (caller holds the lock)"""
+        count = min(self.batch_size, len(self._buffer))
+        batch = [self._buffer.popleft() for _ in range(count)]
+        self._flushing += len(batch)
+        if not self._buffer:
+            self._flush_requested = False
+        self._cond.notify_all()  # producers waiting for room
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while (not self._closed and not self._flush_requested
+                       and len(self._buffer) < self.batch_size):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed and not self._buffer:
+                    return
+                batch = self._take_batch()
+
+            if batch:
+                self._write(batch)
+                with self._cond:
+                    self._flushing -= len(batch)
+                    self._cond.notify_all()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.flush_fn(batch)
+                self.written += len(batch)
+                self.batches += 1
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed_batches += 1
+                    self.dropped_failed += len(batch)
+                    logger.warning(
+                        "Log sink '%s' dropped %d records: %s", self.name, len(batch), e
+                    )
+                    return False
+                time.sleep(min(0.1 * 2 ** attempt, 1.0))
+        return False
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything submitted so far has been written (or dropped)"""
+        self._ensure_started()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._buffer or self._flushing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Flush the buffer and stop the flusher thread (application shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+            if thread.is_alive():
+                return False
+        # No flusher was ever started, or it exited: write whatever is left
+        with self._cond:
+            leftover = list(self._buffer)
+            self._buffer.clear()
+        for start in range(0, len(leftover), self.batch_size):
+            self._write(leftover[start:start + self.batch_size])
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'buffered': len(self._buffer),
+            'submitted': self.submitted,
+            'written': self.written,
+            'batches': self.batches,
+            'dropped_overflow': self.dropped_overflow,
+            'dropped_failed': self.dropped_failed,
+            'failed_batches': self.failed_batches,
+        }
+
+
+def drain_all(timeout: float = 10.0) -> None:
+    """Drain every writer in this process (FastAPI shutdown / atexit)"""
+    with _writers_lock:
+        writers = list(_writers)
+    for writer in writers:
+        if writer._closed and not writer._buffer:
+            continue
+        writer.drain(timeout)
+        stats = writer.stats()
+        if stats['dropped_overflow'] or stats['dropped_failed']:
+            logger.info("Log sink '%s': %s", writer.name, stats)
+
+
+def get_log_sink_stats() -> List[Dict[str, Any]]:
+    with _writers_lock:
+        return [writer.stats() for writer in _writers]
+
+
+atexit.register(drain_all)
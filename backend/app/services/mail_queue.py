@@ -0,0 +1,330 @@
+"""
+📮 MAIL QUEUE - Pooled, queued SMTP delivery for EmailService
+
+EmailService only renders a message and puts it on a bounded queue, so a
+request handler never waits on an SMTP handshake. MailQueue delivers in
+the background:
+- SMTPConnectionPool keeps up to SMTP_POOL_SIZE logged-in connections open
+  and reuses them; a connection idle for longer than max_idle is checked
+  with NOOP before reuse, and a dropped one is replaced transparently
+- each worker takes whatever is waiting (up to batch_size messages) and
+  sends it over one connection - a bulk send is one session, not one
+  handshake per recipient
+- a dropped connection or a 4xx reply is retried with exponential backoff
+  (max_retries); a 5xx reply or refused recipient fails at once
+- submit() returns a concurrent.futures.Future that resolves to True, or
+  to the exception that made delivery fail; `await asyncio.wrap_future()`
+  it from async code
+"""
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from typing import Callable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Errors about one message; the session itself is still usable
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPConnectionPool:
+    """Persistent, reconnecting SMTP connections (STARTTLS + login done once per connection)"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 587,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        size: int = 2,
+        timeout: float = 10.0,
+        max_idle: float = 30.0,
+        smtp_class: Callable[..., smtplib.SMTP] = smtplib.SMTP,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.smtp_class = smtp_class
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[tuple] = []  # (connection, released at)
+        self._lock = threading.Lock()
+
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = self.smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+        except Exception:
+            self._close(smtp)
+            raise
+        self.connects += 1
+        logger.debug("Opened SMTP connection to %s:%s", self.host, self.port)
+        return smtp
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                smtp, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self.max_idle:
+                return smtp
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close(smtp)
+        return self._connect()
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """A live connection; it goes back to the pool unless the session broke"""
+        self._slots.acquire()
+        try:
+            smtp = self._checkout()
+            try:
+                yield smtp
+            except _MESSAGE_ERRORS:
+                self._release(smtp)
+                raise
+            except BaseException:
+                self._close(smtp)
+                raise
+            else:
+                self._release(smtp)
+        finally:
+            self._slots.release()
+
+    def _release(self, smtp: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((smtp, time.monotonic()))
+
+    def close(self) -> None:
+        """QUIT every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            self._close(smtp)
+
+
+@dataclass
+class OutgoingEmail:
+    message: EmailMessage
+    future: Future = field(default_factory=Future)
+    attempts: int = 0
+
+
+class MailQueue:
+    """
+    Usage:
+        future = mail_queue.submit(message)   # queue.Full when the queue is full
+        delivered = future.result(timeout=30)
+    """
+
+    def __init__(
+        self,
+        pool_factory: Optional[Callable[[], SMTPConnectionPool]] = None,
+        workers: int = 2,
+        maxsize: int = 1000,
+        batch_size: int = 50,
+        max_retries: int = 3,
+        retry_delay: float = 2.0,
+    ):
+        self.pool_factory = pool_factory or _default_pool
+        self.workers = workers
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self.pool: Optional[SMTPConnectionPool] = None
+        self._queue: Optional[queue.Queue] = None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._idle = threading.Condition()
+
+        self.sent = 0
+        self.failed = 0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def submit(self, message: EmailMessage) -> Future:
+        """Queue a rendered message without blocking; raises queue.Full if the queue is full"""
+        self._start()
+        item = OutgoingEmail(message)
+        with self._idle:
+            self._outstanding += 1
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._done()
+            raise
+        return item.future
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self.pool = self.pool_factory()
+            self._queue = queue.Queue(self.maxsize)
+            threads = [
+                threading.Thread(target=self._run, args=(self._queue,), name=f"mail-sender-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            self._threads = threads
+
+    def _run(self, messages: queue.Queue) -> None:
+        stopping = False
+        while not stopping:
+            item = messages.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = messages.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._send_batch(batch)
+            except Exception:
+                logger.exception("Mail sender error")
+
+    def _send_batch(self, batch: List[OutgoingEmail]) -> None:
+        pending = list(batch)
+        try:
+            with self.pool.connection() as smtp:
+                while pending:
+                    item = pending[0]
+                    try:
+                        smtp.send_message(item.message)
+                    except _MESSAGE_ERRORS as e:
+                        pending.pop(0)
+                        if getattr(e, "smtp_code", 500) < 500:
+                            self._retry(item, e)
+                        else:
+                            self._fail(item, e)
+                        continue
+                    pending.pop(0)
+                    self.sent += 1
+                    item.future.set_result(True)
+                    self._done()
+        except Exception as e:
+            # Connection-level failure: everything not yet sent is retried
+            logger.warning("SMTP session failed (%d messages to retry): %s", len(pending), e)
+            for item in pending:
+                self._retry(item, e)
+
+    def _retry(self, item: OutgoingEmail, error: Exception) -> None:
+        item.attempts += 1
+        if item.attempts > self.max_retries:
+            self._fail(item, error)
+            return
+        delay = self.retry_delay * 2 ** (item.attempts - 1)
+        timer = threading.Timer(delay, self._requeue, args=(item,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, item: OutgoingEmail) -> None:
+        messages = self._queue
+        if messages is None:
+            self._fail(item, RuntimeError("mail queue stopped"))
+            return
+        messages.put(item)
+
+    def _fail(self, item: OutgoingEmail, error: Exception) -> None:
+        self.failed += 1
+        logger.error("Failed to send email to %s: %s", item.message.get("To"), error)
+        item.future.set_exception(error)
+        self._done()
+
+    def _done(self) -> None:
+        with self._idle:
+            self._outstanding -= 1
+            if not self._outstanding:
+                self._idle.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Block until every submitted message is delivered or has failed; False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._outstanding, timeout)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Deliver what is queued, stop the workers and close the pool (FastAPI shutdown)"""
+        self.join(timeout)
+        with self._lock:
+            threads, messages, pool = self._threads, self._queue, self.pool
+            self._threads, self._queue = [], None
+        for _ in threads:
+            messages.put(None)
+        for thread in threads:
+            thread.join(timeout)
+        if pool:
+            pool.close()
+
+
+def _default_pool() -> SMTPConnectionPool:
+    from app.core.config import settings
+    return SMTPConnectionPool(
+        host=settings.SMTP_HOST,
+        port=settings.SMTP_PORT,
+        username=settings.SMTP_USER,
+        password=settings.SMTP_PASSWORD,
+        starttls=settings.SMTP_STARTTLS,
+        size=settings.SMTP_POOL_SIZE,
+    )
+
+
+def _default_queue() -> MailQueue:
+    from app.core.config import settings
+    return MailQueue(
+        workers=settings.SMTP_POOL_SIZE,
+        maxsize=settings.EMAIL_QUEUE_SIZE,
+        max_retries=settings.EMAIL_MAX_RETRIES,
+    )
+
+
+# Global instance
+mail_queue = _default_queue()
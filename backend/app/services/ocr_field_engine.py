@@ -0,0 +1,266 @@
+"""
+⚡ OCR FIELD EXTRACTION ENGINE
+Precompiled, linear-time field heuristics shared by FlashLiteFormatter
+
+All patterns are compiled once at import. OCRText wraps a raw OCR dump and
+builds its derived views (uppercase copy, line index, header lines,
+labelled candidates) lazily and at most once per document.
+
+Note: each labelled pattern is still scanned on its own. CPython's sre
+engine only applies its literal-prefix fast search to single patterns, so a
+combined (?P<a>..)|(?P<b>..) alternation benchmarks slower than N separate
+scans (see benchmarks/bench_field_extraction.py).
+"""
+
+import re
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Dict, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+
+# ============ IDENTIFIER PATTERNS ============
+
+# GSTIN: 2-digit state + 10-char PAN + entity + 'Z' + checksum
+GSTIN_PATTERN = re.compile(r'\b\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1}\b')
+GSTIN_PATTERN_ANYCASE = re.compile(GSTIN_PATTERN.pattern, re.IGNORECASE)
+PAN_PATTERN = re.compile(r'\b[A-Z]{5}\d{4}[A-Z]{1}\b')
+PHONE_PATTERN = re.compile(r'(?:\+91[-\s]?)?(\d{10})\b')
+EMAIL_PATTERN = re.compile(r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b', re.IGNORECASE)
+HSN_PATTERN = re.compile(r'\b(\d{4,8})\b')
+NUMBER_PATTERN = re.compile(r'[0-9,]+\.?\d{0,2}')
+
+CANDIDATE_PATTERNS: Dict[str, Pattern] = {
+    'gstin': GSTIN_PATTERN_ANYCASE,
+    'pan': PAN_PATTERN,
+    'phone': PHONE_PATTERN,
+    'email': EMAIL_PATTERN,
+}
+
+# ============ FIELD PATTERNS (run against uppercased text, in priority order) ============
+
+INVOICE_NUMBER_PATTERNS: Tuple[Pattern, ...] = tuple(re.compile(p) for p in (
+    r'INVOICE\s*(?:NO|NUMBER|#)?[:\s]+([A-Z0-9/-]+)',
+    r'BILL\s*(?:NO|NUMBER|#)?[:\s]+([A-Z0-9/-]+)',
+    r'INV[:\s-]+([A-Z0-9/-]+)',
+    r'#\s*([A-Z0-9/-]{3,})',
+))
+
+TOTAL_AMOUNT_PATTERNS: Tuple[Pattern, ...] = tuple(re.compile(p) for p in (
+    r'GRAND\s+TOTAL[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
+    r'NET\s+AMOUNT[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
+    r'INVOICE\s+TOTAL[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
+    r'TOTAL\s+AMOUNT[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
+    r'AMOUNT\s+PAYABLE[:\s]*₹?\s*([0-9,]+\.?\d{0,2})',
+))
+
+CUSTOMER_PATTERNS: Tuple[Pattern, ...] = tuple(re.compile(p) for p in (
+    r'(?:BILL\s+TO|BILLED\s+TO|CUSTOMER)[:\s]+([^\n]+)',
+    r'TO[:\s]+([A-Z][^\n]{5,80})',
+))
+
+DATE_PATTERNS: Tuple[Pattern, ...] = tuple(re.compile(p) for p in (
+    r'(?:DATE|INVOICE\s+DATE)[:\s]+(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
+    r'(?:DATE|INVOICE\s+DATE)[:\s]+(\d{1,2}\s+[A-Z]{3,9}\s+\d{2,4})',
+))
+
+# Amount precedes the label in consolidated bills: "2,495.00 Total :Discount(-) :Bill Total :"
+BILL_TOTAL_PATTERN = re.compile(
+    r'([0-9,]+\.?\d{2})\s+TOTAL\s*:\s*DISCOUNT\([^)]*\)\s*:\s*BILL\s+TOTAL', re.IGNORECASE
+)
+
+# Sub-bill header: "VENDOR / LOCATION Bill No: XXX Dated: XXX GSTIN:XXX"
+BILL_HEADER_PATTERN = re.compile(
+    r'(.+?)\s+BILL\s+NO:\s*([A-Z0-9-]+)\s+DATED:\s*([0-9-A-Z]+)(?:\s+GSTIN:([0-9A-Z]+))?',
+    re.IGNORECASE
+)
+_BILL_HEADER_MARKER = re.compile(r'BILL\s+NO:', re.IGNORECASE)
+
+# Sub-bill line item: "ITEM NAME  QTY  CASE_QTY  RATE  AMOUNT"
+LINE_ITEM_PATTERN = re.compile(
+    r'^([A-Z][A-Z0-9\s\(\)\/+\.-]+?)\s+(\d+)\s+(\d+)\s+([0-9.]+)\s+([0-9,]+\.?\d{0,2})$',
+    re.IGNORECASE
+)
+
+VENDOR_KEYWORDS = (
+    'TRADING', 'COMPANY', 'CORPORATION', 'LTD', 'LIMITED',
+    'PVT', 'PRIVATE', 'INC', 'LLC', 'INDUSTRIES', 'ENTERPRISE'
+)
+VENDOR_SKIP_KEYWORDS = ('INVOICE', 'BILL', 'TO:', 'FROM:')
+
+
+@dataclass(frozen=True)
+class FieldCandidate:
+    """A labelled match found in OCR text"""
+    label: str
+    value: str
+    start: int
+    end: int
+
+
+def first_match(patterns: Sequence[Pattern], text: str) -> Optional[re.Match]:
+    """Return the first hit of the highest-priority pattern that matches anywhere"""
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return match
+    return None
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """Parse an OCR amount like '1,255.00'; None if it isn't a number"""
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def largest_amount(text: str, low: float = 10, high: float = 10000000) -> Optional[float]:
+    """
+    Largest number strictly between low and high (fallback total heuristic)
+
+    A number can only beat the current best if its integer part has at least
+    as many digits, so most tokens are rejected on length alone and never
+    reach float().
+    """
+    best: Optional[float] = None
+    best_digits = 0
+    max_digits = len(str(int(high)))
+
+    for token in NUMBER_PATTERN.findall(text):
+        digits = len(token.partition('.')[0].replace(',', '').lstrip('0'))
+        if digits < best_digits or digits > max_digits:
+            continue
+        amount = parse_amount(token)
+        if amount is None or not (low < amount < high):
+            continue
+        if best is None or amount > best:
+            best = amount
+            best_digits = digits
+    return best
+
+
+def iter_bill_headers(text: str) -> Iterator[re.Match]:
+    """
+    Equivalent to BILL_HEADER_PATTERN.finditer(text), in linear time
+
+    The leading lazy (.+?) makes a plain finditer retry from every character
+    of every line, which is quadratic in line length. A header can only
+    start on the line where the whitespace before a "BILL NO:" marker
+    begins, so we locate markers first and anchor the full match there.
+    """
+    pos = 0            # earliest allowed match start (end of the previous match)
+    search_from = 0    # where to look for the next marker
+    while True:
+        marker = _BILL_HEADER_MARKER.search(text, search_from)
+        if not marker:
+            return
+        search_from = marker.start() + 1
+
+        # Walk back over the whitespace run that the pattern's \s+ consumes
+        ws_start = marker.start()
+        while ws_start > pos and text[ws_start - 1].isspace():
+            ws_start -= 1
+        if ws_start == marker.start():
+            continue
+
+        match = None
+        for start in range(max(pos, text.rfind('\n', 0, ws_start) + 1), marker.start()):
+            match = BILL_HEADER_PATTERN.match(text, start)
+            if match or text[start] != '\n':
+                # A later start on the same line only narrows (.+?)'s choices
+                break
+
+        if match:
+            yield match
+            pos = match.end()
+            search_from = max(search_from, pos)
+
+
+class OCRText:
+    """Raw OCR text plus lazily built derived views"""
+
+    HEADER_LINES = 10
+
+    def __init__(self, raw_text: str):
+        self.raw = raw_text
+
+    @cached_property
+    def upper(self) -> str:
+        return self.raw.upper()
+
+    @cached_property
+    def lines(self) -> List[str]:
+        return self.raw.split('\n')
+
+    @cached_property
+    def header_lines(self) -> List[str]:
+        """First lines of the document without splitting the whole text"""
+        return self.raw.split('\n', self.HEADER_LINES)[:self.HEADER_LINES]
+
+    @cached_property
+    def candidates(self) -> Dict[str, List[FieldCandidate]]:
+        """GSTIN / PAN / phone / email candidates with their positions"""
+        found: Dict[str, List[FieldCandidate]] = {}
+        for label, pattern in CANDIDATE_PATTERNS.items():
+            group = 1 if pattern.groups else 0
+            found[label] = [
+                FieldCandidate(label, m.group(group), m.start(), m.end())
+                for m in pattern.finditer(self.raw)
+            ]
+        return found
+
+    def values(self, label: str) -> List[str]:
+        return [c.value for c in self.candidates.get(label, [])]
+
+    def vendor_from_header(self) -> Optional[str]:
+        for line in self.header_lines:
+            line = line.strip()
+            if len(line) > 10:
+                upper = line.upper()
+                if any(kw in upper for kw in VENDOR_KEYWORDS) and not any(skip in upper for skip in VENDOR_SKIP_KEYWORDS):
+                    return line
+        return None
+
+    def bill_totals(self) -> List[str]:
+        return BILL_TOTAL_PATTERN.findall(self.upper)
+
+    def consolidated_line_items(self) -> List[Dict]:
+        """Line items of every sub-bill, tagged with their sub-vendor / bill number / GSTIN"""
+        raw_text = self.raw
+        bill_sections = []
+        for match in iter_bill_headers(raw_text):
+            vendor_location = match.group(1).strip()
+            vendor_parts = vendor_location.split('/')
+            bill_sections.append({
+                'sub_vendor': vendor_parts[0].strip() if vendor_parts else vendor_location,
+                'sub_bill_number': match.group(2),
+                'sub_gstin': match.group(4) if match.group(4) else '',
+                'start_pos': match.end()
+            })
+
+        line_items = []
+        for idx, bill_info in enumerate(bill_sections):
+            end_pos = bill_sections[idx + 1]['start_pos'] if idx + 1 < len(bill_sections) else len(raw_text)
+            for line in raw_text[bill_info['start_pos']:end_pos].split('\n'):
+                match = LINE_ITEM_PATTERN.match(line.strip())
+                if not match:
+                    continue
+                description = match.group(1).strip()
+                amount = float(match.group(5).replace(',', ''))
+                if amount > 0 and 3 < len(description) < 150:
+                    line_items.append({
+                        'description': description,
+                        'quantity': int(match.group(2)),
+                        'rate': float(match.group(4)),
+                        'amount': amount,
+                        'sub_vendor': bill_info['sub_vendor'],
+                        'sub_bill_number': bill_info['sub_bill_number'],
+                        'sub_gstin': bill_info['sub_gstin']
+                    })
+        return line_items
+
+
+@lru_cache(maxsize=8)
+def analyze(raw_text: str) -> OCRText:
+    """Shared OCRText for a document (direct extraction and enhancement reuse the same views)"""
+    return OCRText(raw_text)
@@ -6,6 +6,37 @@ Looks for multiple indicators: stamps, watermarks, text, signatures, etc.
 import re
 from typing import Dict, List, Optional, Tuple
 
+from app.services.keyword_matcher import KeywordHit, get_matcher
+
+# Payment methods that usually appear next to an amount
+PAYMENT_METHODS = (
+    'upi:', 'neft:', 'rtgs:', 'imps:', 'cheque no', 'cash:',
+    'card payment', 'net banking', 'online payment'
+)
+
+# Numerical transaction IDs
+TXN_PATTERNS = tuple(re.compile(p) for p in (
+    r'txn\s*id\s*:?\s*\d{8,}',
+    r'transaction\s*id\s*:?\s*\d{8,}',
+    r'ref\s*no\s*:?\s*\d{8,}',
+    r'utr\s*:?\s*\d{8,}'
+))
+
+# Advance/token amounts
+ADVANCE_PATTERNS = tuple(re.compile(p) for p in (
+    r'advance\s*paid\s*:?\s*₹?\s*\d+',
+    r'token\s*amount\s*:?\s*₹?\s*\d+',
+    r'part\s*payment\s*:?\s*₹?\s*\d+',
+    r'balance\s*due\s*:?\s*₹?\s*\d+'  # Strong indicator of partial payment
+))
+
+# Due dates (indicate unpaid)
+DUE_PATTERNS = tuple(re.compile(p) for p in (
+    r'due\s*date\s*:?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',
+    r'payment\s*due\s*:?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}'
+))
+
+
 class PaymentStatusDetector:
     """Advanced payment status detection with multiple indicators"""
     
@@ -56,6 +87,37 @@ class PaymentStatusDetector:
             'amount due', 'balance', 'overdue', 'payable'
         ]
     
+    def _indicator_categories(self) -> Dict[str, List[str]]:
+        """Every lowercase phrase table, keyed by evidence category"""
+        categories = {
+            category.upper(): [phrase.lower() for phrase in phrases]
+            for category, phrases in self.paid_indicators.items()
+        }
+        categories['PAYMENT_METHOD'] = list(PAYMENT_METHODS)
+        categories['PARTIAL'] = list(self.partial_indicators)
+        categories['UNPAID'] = list(self.unpaid_indicators)
+        return categories
+    
+    def _find_phrases(self, text_lower: str) -> set:
+        """All indicator phrases present in text, found in a single scan"""
+        phrases = tuple(sorted({p for group in self._indicator_categories().values() for p in group}))
+        return get_matcher(phrases).found(text_lower)
+    
+    def locate_indicators(self, text: str) -> Dict[str, List[KeywordHit]]:
+        """
+        Indicator hits with their positions, grouped by category
+        
+        Useful for proximity checks, e.g. whether "paid" appears near the total.
+        """
+        categories = self._indicator_categories()
+        phrases = tuple(sorted({p for group in categories.values() for p in group}))
+        located: Dict[str, List[KeywordHit]] = {}
+        for hit in get_matcher(phrases).find_all(text.lower()):
+            for category, group in categories.items():
+                if hit.phrase in group:
+                    located.setdefault(category, []).append(hit)
+        return located
+    
     def detect_payment_status(self, text: str) -> Tuple[str, float, List[str]]:
         """
         Detect payment status from text with confidence score
@@ -64,17 +126,18 @@ class PaymentStatusDetector:
             Tuple of (status, confidence_score, evidence_found)
         """
         text_lower = text.lower()
-        evidence = []
-        confidence = 0.0
+        
+        # One pass over the text finds every indicator phrase
+        found = self._find_phrases(text_lower)
         
         # Check for PAID indicators
-        paid_score, paid_evidence = self._check_paid_indicators(text, text_lower)
+        paid_score, paid_evidence = self._check_paid_indicators(text, text_lower, found)
         
         # Check for PARTIAL indicators  
-        partial_score, partial_evidence = self._check_partial_indicators(text_lower)
+        partial_score, partial_evidence = self._check_partial_indicators(text_lower, found)
         
         # Check for UNPAID indicators
-        unpaid_score, unpaid_evidence = self._check_unpaid_indicators(text_lower)
+        unpaid_score, unpaid_evidence = self._check_unpaid_indicators(text_lower, found)
         
         # Determine final status with improved logic
         if partial_score > 0.5:  # Check partial first (more specific)
@@ -93,108 +156,94 @@ class PaymentStatusDetector:
             best = max(scores, key=lambda x: x[1])
             return best[0], best[1], best[2]
     
-    def _check_paid_indicators(self, text: str, text_lower: str) -> Tuple[float, List[str]]:
+    def _check_paid_indicators(self, text: str, text_lower: str, found: Optional[set] = None) -> Tuple[float, List[str]]:
         """Check for PAID status indicators"""
+        if found is None:
+            found = self._find_phrases(text_lower)
         evidence = []
         score = 0.0
         
         # Check stamps (highest confidence)
         for stamp in self.paid_indicators['stamps']:
-            if stamp.lower() in text_lower:
+            if stamp.lower() in found:
                 evidence.append(f"STAMP: {stamp}")
                 score += 0.4
         
         # Check watermarks
         for watermark in self.paid_indicators['watermarks']:
-            if watermark.lower() in text_lower:
+            if watermark.lower() in found:
                 evidence.append(f"WATERMARK: {watermark}")
                 score += 0.3
         
         # Check text patterns
         for pattern in self.paid_indicators['text_patterns']:
-            if pattern in text_lower:
+            if pattern in found:
                 evidence.append(f"TEXT: {pattern}")
                 score += 0.2
         
         # Check transaction references
         for ref_pattern in self.paid_indicators['transaction_refs']:
-            if ref_pattern in text_lower:
+            if ref_pattern in found:
                 evidence.append(f"TRANSACTION_REF: {ref_pattern}")
                 score += 0.25
         
         # Check signatures
         for sig_pattern in self.paid_indicators['signatures']:
-            if sig_pattern in text_lower:
+            if sig_pattern in found:
                 evidence.append(f"SIGNATURE: {sig_pattern}")
                 score += 0.15
         
         # Check for specific payment methods with amounts
-        payment_methods = [
-            'upi:', 'neft:', 'rtgs:', 'imps:', 'cheque no', 'cash:',
-            'card payment', 'net banking', 'online payment'
-        ]
-        for method in payment_methods:
-            if method in text_lower:
+        for method in PAYMENT_METHODS:
+            if method in found:
                 evidence.append(f"PAYMENT_METHOD: {method}")
                 score += 0.2
         
         # Check for numerical transaction IDs
-        txn_patterns = [
-            r'txn\s*id\s*:?\s*\d{8,}',
-            r'transaction\s*id\s*:?\s*\d{8,}',
-            r'ref\s*no\s*:?\s*\d{8,}',
-            r'utr\s*:?\s*\d{8,}'
-        ]
-        for pattern in txn_patterns:
-            matches = re.findall(pattern, text_lower)
+        for pattern in TXN_PATTERNS:
+            matches = pattern.findall(text_lower)
             if matches:
                 evidence.append(f"TXN_ID: {matches[0]}")
                 score += 0.3
         
         return min(score, 1.0), evidence
     
-    def _check_partial_indicators(self, text_lower: str) -> Tuple[float, List[str]]:
+    def _check_partial_indicators(self, text_lower: str, found: Optional[set] = None) -> Tuple[float, List[str]]:
         """Check for PARTIAL payment indicators"""
+        if found is None:
+            found = self._find_phrases(text_lower)
         evidence = []
         score = 0.0
         
         for indicator in self.partial_indicators:
-            if indicator in text_lower:
+            if indicator in found:
                 evidence.append(f"PARTIAL: {indicator}")
                 score += 0.4  # Higher score for partial indicators
         
         # Check for advance/token amounts
-        advance_patterns = [
-            r'advance\s*paid\s*:?\s*₹?\s*\d+',
-            r'token\s*amount\s*:?\s*₹?\s*\d+',
-            r'part\s*payment\s*:?\s*₹?\s*\d+',
-            r'balance\s*due\s*:?\s*₹?\s*\d+'  # Strong indicator of partial payment
-        ]
-        for pattern in advance_patterns:
-            matches = re.findall(pattern, text_lower)
+        for pattern in ADVANCE_PATTERNS:
+            matches = pattern.findall(text_lower)
             if matches:
                 evidence.append(f"ADVANCE: {matches[0]}")
                 score += 0.5  # Strong indicator of partial payment
         
         return min(score, 1.0), evidence
     
-    def _check_unpaid_indicators(self, text_lower: str) -> Tuple[float, List[str]]:
+    def _check_unpaid_indicators(self, text_lower: str, found: Optional[set] = None) -> Tuple[float, List[str]]:
         """Check for UNPAID status indicators"""
+        if found is None:
+            found = self._find_phrases(text_lower)
         evidence = []
         score = 0.0
         
         for indicator in self.unpaid_indicators:
-            if indicator in text_lower:
+            if indicator in found:
                 evidence.append(f"UNPAID: {indicator}")
                 score += 0.2
         
         # Check for due dates in future (indicates unpaid)
-        due_patterns = [
-            r'due\s*date\s*:?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',
-            r'payment\s*due\s*:?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}'
-        ]
-        for pattern in due_patterns:
-            matches = re.findall(pattern, text_lower)
+        for pattern in DUE_PATTERNS:
+            matches = pattern.findall(text_lower)
             if matches:
                 evidence.append(f"DUE_DATE: {matches[0]}")
                 score += 0.3
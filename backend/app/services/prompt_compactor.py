@@ -0,0 +1,264 @@
+"""
+✂️ PROMPT COMPACTOR
+Shrinks large OCR dumps before they are sent to Flash-Lite
+
+- Collapses repeated whitespace and drops blank lines
+- Drops boilerplate ("Page n of m", "computer generated" footers, copy labels)
+  and bare page numbers only where they sit next to a form feed
+- Dedupes header/footer lines that repeat at the top or bottom of every page;
+  anything else (item descriptions, units, lone quantities) is invoice data
+- Splits the document into a header+summary region (invoice-level fields)
+  and line-item chunks small enough that each response fits in
+  max_output_tokens, so long consolidated bills are never truncated
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Set, Tuple
+
+from app.services.ocr_field_engine import iter_bill_headers
+
+
+# Rough Gemini tokenizer ratio for Latin-script OCR text
+CHARS_PER_TOKEN = 4
+
+# Output tokens one compact line item costs in the response (no per-field confidences)
+TOKENS_PER_LINE_ITEM = 100
+
+# Lines kept verbatim at the top of every document (vendor, customer, invoice meta)
+HEADER_LINES = 25
+
+# Lines at the bottom that usually hold totals, bank details and terms
+FOOTER_LINES = 12
+
+# Lines at the top and bottom of each page checked for running headers/footers
+RUNNING_LINES = 5
+
+_WHITESPACE_RUN = re.compile(r'[ \t ]+')
+_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+PAGE_MARKER = re.compile(r'^page\s*\d+\s*(?:of|/)\s*\d+$', re.IGNORECASE)
+
+# A line holding only a number: a page number next to a form feed, data anywhere else
+_LONE_NUMBER = re.compile(r'^\d+$')
+
+BOILERPLATE_PATTERNS = (PAGE_MARKER,) + tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'^-\s*\d+\s*-$',  # "- 3 -" page numbers
+    r'(?:computer|system)\s+generated\s+(?:invoice|bill|document)',
+    r'does\s+not\s+require\s+(?:a\s+)?signature',
+    r'^(?:original|duplicate|triplicate)\s+(?:for|copy)',
+    r'^continued(?:\s+on\s+next\s+page)?\.*$',
+    r'^e\.?\s*&\s*o\.?\s*e\.?$',
+    r'thank\s+you\s+for\s+your\s+business',
+))
+
+# Lines carrying invoice-level amounts and payment info
+SUMMARY_KEYWORDS = re.compile(
+    r'TOTAL|SUB\s*TOTAL|GST|CGST|SGST|IGST|CESS|TAX|DISCOUNT|ROUND|PAYABLE|BALANCE|'
+    r'PAID|DUE|BANK|IFSC|A/C|ACCOUNT|UPI|TERMS|AMOUNT\s+IN\s+WORDS',
+    re.IGNORECASE
+)
+
+
+@dataclass
+class CompactedDocument:
+    """Compacted OCR text split into prompt-sized regions"""
+    text: str
+    header: str
+    summary: str
+    item_chunks: List[str] = field(default_factory=list)
+    original_chars: int = 0
+
+    @property
+    def compact_chars(self) -> int:
+        return len(self.text)
+
+    @property
+    def is_chunked(self) -> bool:
+        return len(self.item_chunks) > 1
+
+
+def _normalize(line: str) -> str:
+    return _WHITESPACE_RUN.sub(' ', line).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def is_boilerplate(line: str) -> bool:
+    return any(pattern.search(line) for pattern in BOILERPLATE_PATTERNS)
+
+
+def is_item_line(line: str) -> bool:
+    """A table row: some text plus at least two numbers (qty/rate/amount)"""
+    return len(_NUMBER.findall(line)) >= 2 and any(ch.isalpha() for ch in line)
+
+
+def split_pages(raw_text: str) -> Tuple[List[List[str]], bool]:
+    """
+    Normalized non-blank lines of each page, and whether pages came from form feeds
+
+    Pages are split at form feeds; without any, after each "Page n of m"
+    line (text after the last marker belongs to the last page).
+    """
+    if '\f' in raw_text:
+        pages = [[line for line in map(_normalize, page.split('\n')) if line] for page in raw_text.split('\f')]
+        return [page for page in pages if page], True
+
+    pages: List[List[str]] = []
+    current: List[str] = []
+    for line in map(_normalize, raw_text.split('\n')):
+        if not line:
+            continue
+        current.append(line)
+        if PAGE_MARKER.search(line):
+            pages.append(current)
+            current = []
+    if current:
+        if pages:
+            pages[-1].extend(current)
+        else:
+            pages.append(current)
+    return pages, False
+
+
+def _page_edges(page: List[str]) -> List[str]:
+    return page[:RUNNING_LINES] + page[-RUNNING_LINES:]
+
+
+def running_lines(pages: List[List[str]]) -> Set[str]:
+    """Lines (upper-cased) at the top or bottom of every page - running headers/footers"""
+    if len(pages) < 2:
+        return set()
+    common = None
+    for page in pages:
+        edges = {line.upper() for line in _page_edges(page) if not is_item_line(line)}
+        common = edges if common is None else common & edges
+    return common or set()
+
+
+def compact_lines(raw_text: str) -> List[str]:
+    """
+    Normalized lines of an OCR dump without boilerplate and running headers
+
+    A running header/footer line is kept on its first page only. A lone
+    number is dropped only as the first or last line next to a form feed;
+    elsewhere it is a quantity, rate or amount.
+    """
+    pages, by_form_feed = split_pages(raw_text)
+    running = running_lines(pages)
+    seen_running = set()
+    lines = []
+    for page_index, page in enumerate(pages):
+        for position, line in enumerate(page):
+            if is_boilerplate(line):
+                continue
+            if by_form_feed and _LONE_NUMBER.match(line) and (
+                (position == 0 and page_index > 0) or (position == len(page) - 1 and page_index < len(pages) - 1)
+            ):
+                continue
+            key = line.upper()
+            if key in running and (position < RUNNING_LINES or position >= len(page) - RUNNING_LINES):
+                if key in seen_running:
+                    continue
+                seen_running.add(key)
+            lines.append(line)
+    return lines
+
+
+def compact_text(raw_text: str) -> str:
+    return '\n'.join(compact_lines(raw_text))
+
+
+def _chunk_lines(lines: List[str], max_items: int, max_chars: int) -> List[List[str]]:
+    """Greedy split of the item region by item-line count and input size"""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    items = chars = 0
+    for line in lines:
+        line_is_item = is_item_line(line)
+        if current and ((line_is_item and items >= max_items) or chars + len(line) > max_chars):
+            chunks.append(current)
+            current, items, chars = [], 0, 0
+        current.append(line)
+        chars += len(line) + 1
+        items += line_is_item
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chunk_sub_bills(body: str, max_items: int, max_chars: int) -> List[str]:
+    """Keep each consolidated sub-bill (header + its rows) together in one chunk"""
+    starts = [m.start() for m in iter_bill_headers(body)]
+    if len(starts) < 2:
+        return []
+    sections = [body[:starts[0]]] + [
+        body[start:end] for start, end in zip(starts, starts[1:] + [len(body)])
+    ]
+
+    chunks: List[str] = []
+    current = ''
+    current_items = 0
+    for section in sections:
+        section_items = sum(1 for line in section.split('\n') if is_item_line(line))
+        if current and (current_items + section_items > max_items or len(current) + len(section) > max_chars):
+            chunks.append(current.strip('\n'))
+            current, current_items = '', 0
+        if section_items > max_items or len(section) > max_chars:
+            # A single oversized sub-bill: fall back to line chunks within it
+            chunks.extend('\n'.join(c) for c in _chunk_lines(section.split('\n'), max_items, max_chars))
+            continue
+        current += section
+        current_items += section_items
+    if current.strip():
+        chunks.append(current.strip('\n'))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def compact_document(
+    raw_text: str,
+    max_output_tokens: int = 2048,
+    max_input_tokens: int = 6000,
+) -> CompactedDocument:
+    """
+    Compact raw OCR text and plan the prompts needed to format it
+
+    A document whose line items fit into one response gets a single
+    item chunk (the whole compacted text). Otherwise the header and
+    summary lines are formatted once for invoice-level fields and the whole
+    text (header region included) is split into item chunks that each fit
+    the output budget.
+    """
+    lines = compact_lines(raw_text)
+    text = '\n'.join(lines)
+
+    header_lines = lines[:HEADER_LINES]
+    body_lines = lines[HEADER_LINES:]
+    footer_lines = body_lines[-FOOTER_LINES:] if len(body_lines) > FOOTER_LINES else body_lines
+    summary_lines = [line for line in body_lines[:-len(footer_lines) or None]
+                     if SUMMARY_KEYWORDS.search(line) and not is_item_line(line)]
+
+    document = CompactedDocument(
+        text=text,
+        header='\n'.join(header_lines),
+        summary='\n'.join(summary_lines + footer_lines),
+        original_chars=len(raw_text),
+    )
+
+    # Leave a quarter of the output budget for invoice-level keys and JSON overhead
+    max_items = max(1, (max_output_tokens * 3 // 4) // TOKENS_PER_LINE_ITEM)
+    max_chars = max_input_tokens * CHARS_PER_TOKEN
+
+    item_count = sum(1 for line in lines if is_item_line(line))
+    if item_count <= max_items and len(text) <= max_chars:
+        document.item_chunks = [text]
+        return document
+
+    # Items can start inside the header region, so the whole text is chunked
+    chunks = _chunk_sub_bills(text, max_items, max_chars)
+    if not chunks:
+        chunks = ['\n'.join(c) for c in _chunk_lines(lines, max_items, max_chars)]
+    document.item_chunks = chunks or [text]
+    return document
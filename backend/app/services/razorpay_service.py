@@ -6,6 +6,7 @@ Handles all Razorpay payment operations
 import razorpay
 import hmac
 import hashlib
+import json
 from typing import Dict, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
@@ -326,78 +327,135 @@ class RazorpayService:
             "billing_cycle": billing_cycle
         }
     
-    def handle_webhook(self, event: Dict, signature: str, db: Session) -> Tuple[bool, str]:
+    def verify_webhook_signature(self, raw_body: bytes, signature: str) -> bool:
         """
-        Handle Razorpay webhook events - UPDATED FOR SUBSCRIPTIONS
-        
-        Supports 8+ subscription events:
-        - subscription.activated: First payment successful
-        - subscription.charged: Recurring payment successful (AUTO-RENEWAL!)
-        - subscription.payment_failed: Payment failed (retry logic)
-        - subscription.cancelled: User cancelled subscription
-        - subscription.paused: Subscription paused
-        - subscription.resumed: Subscription resumed
-        - subscription.completed: Subscription completed all cycles
-        - subscription.pending: Subscription created, awaiting payment
-        - payment.captured: Legacy one-time payments (backward compatible)
-        
-        Features:
-        - Idempotency: Uses event_id to prevent duplicate processing
-        - Retry logic: Tracks attempts and implements exponential backoff
-        - Logging: Stores all webhook events in webhook_logs table
-        
+        Check X-Razorpay-Signature against the raw request body.
+
+        Razorpay signs the exact bytes it sent, so the HMAC must be computed
+        over the body before any JSON parsing or re-serialisation.
+
+        Args:
+            raw_body: Request body bytes
+            signature: X-Razorpay-Signature header
+
+        Returns:
+            True if the webhook secret is configured and the signature matches
+        """
+        webhook_secret = getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', '')
+        if not webhook_secret or not signature:
+            return False
+        expected_signature = hmac.new(
+            webhook_secret.encode('utf-8'),
+            raw_body,
+            hashlib.sha256
+        ).hexdigest()
+        return hmac.compare_digest(expected_signature, signature)
+
+    def handle_webhook(
+        self,
+        event: Dict,
+        signature: str,
+        db: Session,
+        raw_body: Optional[bytes] = None,
+        event_id: Optional[str] = None
+    ) -> Tuple[bool, str]:
+        """
+        Verify and process a Razorpay webhook event synchronously.
+
+        The /api/payments/webhook endpoint no longer calls this: it verifies
+        the signature, stores the event and leaves processing to the
+        background consumer (app/services/webhook_inbox.py).
+
         Args:
             event: Webhook event data
             signature: Webhook signature
             db: Database session
-        
+            raw_body: Body bytes the signature was computed over (defaults
+                to compact JSON of event, which only matches if Razorpay
+                sent it that way)
+            event_id: X-Razorpay-Event-Id header, if known
+
         Returns:
             Tuple of (success: bool, message: str)
         """
-        # Extract event ID for idempotency
-        event_id = event.get("id", f"unknown_{int(datetime.utcnow().timestamp())}")
+        event_id = event_id or event.get("id", f"unknown_{int(datetime.utcnow().timestamp())}")
         event_type = event.get("event")
-        
+
         print(f"📨 Webhook received: {event_type} (ID: {event_id})")
-        
+
         # SECURITY FIX: Webhook signature verification is MANDATORY
         webhook_secret = getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', '')
-        
+
         if not webhook_secret:
             # CRITICAL: Don't process webhooks without secret configured
             print("🚨 SECURITY: RAZORPAY_WEBHOOK_SECRET not configured - rejecting webhook")
             self._log_webhook(db, event_id, event_type, event, signature, 'failed', error='Webhook secret not configured')
             return False, "Webhook secret not configured - cannot verify signature"
-        
+
         if not signature:
             print("🚨 SECURITY: Webhook signature missing")
             self._log_webhook(db, event_id, event_type, event, signature, 'failed', error='Signature missing')
             return False, "Webhook signature missing"
-        
-        # Generate signature
-        expected_signature = hmac.new(
-            webhook_secret.encode('utf-8'),
-            str(event).encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        
-        if not hmac.compare_digest(expected_signature, signature):
+
+        if raw_body is None:
+            raw_body = json.dumps(event, separators=(',', ':')).encode('utf-8')
+
+        if not self.verify_webhook_signature(raw_body, signature):
             print("🚨 SECURITY: Invalid webhook signature - possible attack")
             self._log_webhook(db, event_id, event_type, event, signature, 'failed', error='Invalid signature')
             return False, "Invalid webhook signature"
-        
+
         print("✅ Webhook signature verified")
-        
+        return self.process_webhook_event(event, db, signature, event_id)
+
+    def process_webhook_event(
+        self,
+        event: Dict,
+        db: Session,
+        signature: str = "",
+        event_id: Optional[str] = None
+    ) -> Tuple[bool, str]:
+        """
+        Apply an already-verified Razorpay webhook event - UPDATED FOR SUBSCRIPTIONS
+
+        Supports 8+ subscription events:
+        - subscription.activated: First payment successful
+        - subscription.charged: Recurring payment successful (AUTO-RENEWAL!)
+        - subscription.payment_failed: Payment failed (retry logic)
+        - subscription.cancelled: User cancelled subscription
+        - subscription.paused: Subscription paused
+        - subscription.resumed: Subscription resumed
+        - subscription.completed: Subscription completed all cycles
+        - subscription.pending: Subscription created, awaiting payment
+        - payment.captured: Legacy one-time payments (backward compatible)
+
+        Features:
+        - Idempotency: Uses event_id to prevent duplicate processing
+        - Retry logic: Tracks attempts in webhook_logs.attempt_count
+        - Logging: Stores all webhook events in webhook_logs table
+
+        Args:
+            event: Webhook event data (signature already verified)
+            db: Database session
+            signature: Webhook signature, kept in webhook_logs
+            event_id: X-Razorpay-Event-Id (falls back to event["id"])
+
+        Returns:
+            Tuple of (success: bool, message: str)
+        """
+        event_id = event_id or event.get("id", f"unknown_{int(datetime.utcnow().timestamp())}")
+        event_type = event.get("event")
+
         # IDEMPOTENCY CHECK: Has this event been processed already?
         existing_log = self._check_webhook_processed(db, event_id)
         if existing_log and existing_log.status == 'processed':
             print(f"⏭️ Webhook {event_id} already processed, skipping")
             return True, f"Webhook {event_id} already processed (idempotent)"
-        
+
         # Log webhook attempt
         attempt_count = (existing_log.attempt_count + 1) if existing_log else 1
-        print(f"🔄 Processing webhook (attempt {attempt_count})")
-        
+        print(f"🔄 Processing webhook {event_type} (attempt {attempt_count})")
+
         # Process event based on type
         payload = event.get("payload", {})
         
@@ -1071,7 +1129,7 @@ class RazorpayService:
         try:
             from sqlalchemy import text
             result = db.execute(
-                text("SELECT * FROM webhook_logs WHERE event_id = :event_id"),
+                text("SELECT id, event_id, status, attempt_count FROM webhook_logs WHERE event_id = :event_id"),
                 {"event_id": event_id}
             ).fetchone()
             
@@ -1081,8 +1139,8 @@ class RazorpayService:
                     def __init__(self, row):
                         self.id = row[0]
                         self.event_id = row[1]
-                        self.status = row[6]
-                        self.attempt_count = row[7]
+                        self.status = row[2]
+                        self.attempt_count = row[3]
                 
                 return WebhookLog(result)
             return None
@@ -1117,7 +1175,6 @@ class RazorpayService:
             error: Error message (if failed)
         """
         try:
-            import json
             from sqlalchemy import text
             
             # Check if log exists
@@ -1134,10 +1191,10 @@ class RazorpayService:
                         UPDATE webhook_logs 
                         SET status = :status,
                             attempt_count = :attempt_count,
-                            last_attempt_at = NOW(),
+                            last_attempt_at = CURRENT_TIMESTAMP,
                             error_message = :error,
-                            processed_at = CASE WHEN :status = 'processed' THEN NOW() ELSE processed_at END,
-                            updated_at = NOW()
+                            processed_at = CASE WHEN :status = 'processed' THEN CURRENT_TIMESTAMP ELSE processed_at END,
+                            updated_at = CURRENT_TIMESTAMP
                         WHERE event_id = :event_id
                     """),
                     {
@@ -1158,8 +1215,8 @@ class RazorpayService:
                         ) VALUES (
                             :event_id, :event_type, :subscription_id, :user_id,
                             :payload, :signature, :status, 1,
-                            NOW(), :error,
-                            CASE WHEN :status = 'processed' THEN NOW() ELSE NULL END
+                            CURRENT_TIMESTAMP, :error,
+                            CASE WHEN :status = 'processed' THEN CURRENT_TIMESTAMP ELSE NULL END
                         )
                     """),
                     {
@@ -0,0 +1,61 @@
+"""
+⏱️ STAGE TIMER
+Per-stage wall time and database round trips for one request
+
+Usage:
+    timer = StageTimer('process_document')
+    with timer.stage('fetch_document', round_trips=1):
+        ...
+    timer.log()   # DEBUG process_document: fetch_document=12.3ms ... | total=850.1ms, 3 round trips
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from app.core.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """
+    Accumulates elapsed milliseconds per named stage (a stage may run more than once)
+
+    Every stage is also observed in trulyinvoice_stage_seconds{stage=name}.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.stages: Dict[str, float] = {}
+        self.round_trips = 0
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, round_trips: int = 0) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            observe_stage(name, seconds)
+            self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000
+            self.round_trips += round_trips
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def summary(self) -> Dict[str, float]:
+        result = {name: round(ms, 1) for name, ms in self.stages.items()}
+        result['total'] = round(self.total_ms, 1)
+        result['round_trips'] = self.round_trips
+        return result
+
+    def log(self) -> None:
+        """One DEBUG line per request (timings are also in summary() and the metrics)"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        stages = ' '.join(f"{name}={ms:.1f}ms" for name, ms in self.stages.items())
+        logger.debug('%s: %s | total=%.1fms, %s round trips', self.label, stages, self.total_ms, self.round_trips)
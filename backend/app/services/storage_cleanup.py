@@ -3,28 +3,271 @@ Storage Cleanup Service
 Automatically removes old invoices and documents based on subscription tier
 """
 
+import json
 import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Dict, List
+from pathlib import Path
+from typing import Dict, List, Optional
 import logging
 
-from app.services.supabase_helper import supabase
+from app.services.supabase_helper import supabase, call_rpc
 from app.config.plans import get_storage_days
 
 logger = logging.getLogger(__name__)
 
+STORAGE_BUCKET = "invoice-documents"
+
+# Documents deleted per RPC / in_() batch; also bounds the storage paths per remove() call
+DELETE_BATCH_SIZE = 500
+
+# Supabase Storage accepts at most 1000 paths per remove()
+STORAGE_REMOVE_LIMIT = 1000
+
+# Rows per page when the stats SQL function isn't deployed
+STATS_PAGE_SIZE = 1000
+
+# Users cleaned concurrently by cleanup_all_users
+CLEANUP_WORKERS = int(os.getenv("STORAGE_CLEANUP_WORKERS", "4"))
+
+CHECKPOINT_PATH = Path(os.getenv(
+    "STORAGE_CLEANUP_CHECKPOINT",
+    str(Path(__file__).parent.parent.parent / ".storage_cleanup_checkpoint.json")
+))
+
+# A checkpoint older than this is a different run, not one to resume
+CHECKPOINT_MAX_AGE = timedelta(hours=24)
+
+
+def _chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CleanupCheckpoint:
+    """
+    Progress of a cleanup_all_users run, persisted as JSON
+    
+    Records users already cleaned and storage paths whose rows were deleted
+    but whose objects could not be removed yet, so an interrupted run
+    resumes where it stopped and retries the orphaned objects.
+    """
+    
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or CHECKPOINT_PATH
+        self._lock = threading.Lock()
+        self.run_id = str(uuid.uuid4())
+        self.started_at = datetime.utcnow()
+        self.completed_users: set = set()
+        self.pending_storage_paths: List[str] = []
+    
+    @classmethod
+    def load_or_start(cls, path: Optional[Path] = None) -> "CleanupCheckpoint":
+        checkpoint = cls(path)
+        try:
+            data = json.loads(checkpoint.path.read_text())
+        except (OSError, ValueError):
+            return checkpoint
+        
+        # Orphaned objects are always retried; completed users only within the same run window
+        checkpoint.pending_storage_paths = list(data.get("pending_storage_paths", []))
+        started_at = datetime.fromisoformat(data.get("started_at", "1970-01-01T00:00:00"))
+        if datetime.utcnow() - started_at < CHECKPOINT_MAX_AGE:
+            checkpoint.run_id = data.get("run_id", checkpoint.run_id)
+            checkpoint.started_at = started_at
+            checkpoint.completed_users = set(data.get("completed_users", []))
+            logger.info(f"Resuming cleanup run {checkpoint.run_id}: {len(checkpoint.completed_users)} users already done")
+        return checkpoint
+    
+    def mark_user_done(self, user_id: str) -> None:
+        with self._lock:
+            self.completed_users.add(user_id)
+            self._save()
+    
+    def add_pending_paths(self, paths: List[str]) -> None:
+        if not paths:
+            return
+        with self._lock:
+            self.pending_storage_paths.extend(paths)
+            self._save()
+    
+    def take_pending_paths(self) -> List[str]:
+        with self._lock:
+            paths, self.pending_storage_paths = self.pending_storage_paths, []
+            self._save()
+            return paths
+    
+    def finish(self) -> None:
+        """Run complete: forget users, keep only objects still waiting for removal"""
+        with self._lock:
+            if self.pending_storage_paths:
+                self.completed_users = set()
+                self.started_at = datetime(1970, 1, 1)
+                self._save()
+            else:
+                try:
+                    self.path.unlink()
+                except FileNotFoundError:
+                    pass
+    
+    def _save(self) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(),
+            "completed_users": sorted(self.completed_users),
+            "pending_storage_paths": self.pending_storage_paths
+        }))
+        tmp.replace(self.path)  # atomic: a crash never leaves a half-written checkpoint
+
 
 class StorageCleanupService:
     """Service for cleaning up old data based on subscription tiers"""
     
     @staticmethod
-    def cleanup_user_data(user_id: str, tier: str) -> Dict[str, int]:
+    def remove_storage_objects(paths: List[str]) -> List[str]:
+        """
+        Remove objects from the invoice bucket, STORAGE_REMOVE_LIMIT paths per call
+        
+        Returns the paths that could not be removed.
+        """
+        failed: List[str] = []
+        for chunk in _chunks([p for p in paths if p], STORAGE_REMOVE_LIMIT):
+            try:
+                supabase.storage.from_(STORAGE_BUCKET).remove(chunk)
+            except Exception as e:
+                logger.warning(f"Storage removal failed for {len(chunk)} objects: {e}")
+                failed.extend(chunk)
+        return failed
+    
+    @staticmethod
+    def _purge_batch_rpc(user_id: Optional[str], cutoff_iso: str, dry_run: bool) -> Optional[Dict]:
+        """One purge_expired_documents call; None if the function isn't deployed"""
+        data = call_rpc(supabase, "purge_expired_documents", {
+            "user_id_param": user_id,
+            "cutoff_param": cutoff_iso,
+            "batch_size": DELETE_BATCH_SIZE,
+            "dry_run": dry_run
+        })
+        return None if data is None else (data or {})
+    
+    @staticmethod
+    def _expired_documents_query(columns: str, user_id: Optional[str], cutoff_iso: str):
+        query = supabase.table("documents").select(columns)
+        query = query.eq("user_id", user_id) if user_id else query.is_("user_id", "null")
+        return query.lt("created_at", cutoff_iso)
+    
+    @staticmethod
+    def _purge_batch_fallback(user_id: Optional[str], cutoff_iso: str) -> Dict:
+        """Same as one RPC batch, via PostgREST: select batch, then in_() deletes"""
+        batch = StorageCleanupService._expired_documents_query(
+            "id, storage_path, file_size", user_id, cutoff_iso
+        ).order("created_at").limit(DELETE_BATCH_SIZE).execute()
+        
+        documents = batch.data or []
+        if not documents:
+            return {"documents_deleted": 0, "invoices_deleted": 0, "bytes": 0, "storage_paths": []}
+        
+        ids = [doc["id"] for doc in documents]
+        # Invoices first (foreign key constraint)
+        invoice_result = supabase.table("invoices").delete().in_("document_id", ids).execute()
+        doc_result = supabase.table("documents").delete().in_("id", ids).execute()
+        
+        return {
+            "documents_deleted": len(doc_result.data or []),
+            "invoices_deleted": len(invoice_result.data or []),
+            "bytes": sum(doc.get("file_size") or 0 for doc in documents),
+            "storage_paths": [doc["storage_path"] for doc in documents if doc.get("storage_path")]
+        }
+    
+    @staticmethod
+    def _estimate_fallback(user_id: Optional[str], cutoff_iso: str) -> Dict:
+        """Dry-run totals via PostgREST (paged, read-only)"""
+        documents = bytes_total = invoices = 0
+        offset = 0
+        while True:
+            page = StorageCleanupService._expired_documents_query(
+                "id, file_size", user_id, cutoff_iso
+            ).order("created_at").range(offset, offset + DELETE_BATCH_SIZE - 1).execute()
+            rows = page.data or []
+            documents += len(rows)
+            bytes_total += sum(row.get("file_size") or 0 for row in rows)
+            if rows:
+                count = supabase.table("invoices").select("id", count="exact").in_(
+                    "document_id", [row["id"] for row in rows]
+                ).limit(1).execute()
+                invoices += count.count or 0
+            if len(rows) < DELETE_BATCH_SIZE:
+                break
+            offset += DELETE_BATCH_SIZE
+        return {"documents": documents, "invoices": invoices, "bytes": bytes_total}
+    
+    @staticmethod
+    def purge_documents_before(
+        user_id: Optional[str],
+        cutoff_iso: str,
+        dry_run: bool = False,
+        checkpoint: Optional[CleanupCheckpoint] = None
+    ) -> Dict[str, int]:
+        """
+        Delete documents (and their invoices and storage objects) older than the cutoff
+        
+        Args:
+            user_id: Owner, or None for anonymous uploads
+            cutoff_iso: Delete documents created before this timestamp
+            dry_run: Only report what would be deleted and the bytes reclaimed
+            checkpoint: Records storage paths that failed to delete for a later retry
+        """
+        if dry_run:
+            totals = StorageCleanupService._purge_batch_rpc(user_id, cutoff_iso, dry_run=True)
+            if totals is None:
+                totals = StorageCleanupService._estimate_fallback(user_id, cutoff_iso)
+            return {
+                "documents_to_delete": int(totals.get("documents", 0)),
+                "invoices_to_delete": int(totals.get("invoices", 0)),
+                "bytes_to_reclaim": int(totals.get("bytes", 0)),
+                "dry_run": True
+            }
+        
+        totals = {"documents_deleted": 0, "invoices_deleted": 0, "bytes_reclaimed": 0,
+                  "storage_objects_removed": 0, "storage_objects_failed": 0}
+        while True:
+            batch = StorageCleanupService._purge_batch_rpc(user_id, cutoff_iso, dry_run=False)
+            if batch is None:
+                batch = StorageCleanupService._purge_batch_fallback(user_id, cutoff_iso)
+            
+            deleted = int(batch.get("documents_deleted", 0))
+            paths = batch.get("storage_paths") or []
+            failed = StorageCleanupService.remove_storage_objects(paths)
+            if failed and checkpoint:
+                checkpoint.add_pending_paths(failed)
+            
+            totals["documents_deleted"] += deleted
+            totals["invoices_deleted"] += int(batch.get("invoices_deleted", 0))
+            totals["bytes_reclaimed"] += int(batch.get("bytes", 0))
+            totals["storage_objects_removed"] += len(paths) - len(failed)
+            totals["storage_objects_failed"] += len(failed)
+            
+            if deleted < DELETE_BATCH_SIZE:
+                return totals
+    
+    @staticmethod
+    def cleanup_user_data(
+        user_id: str,
+        tier: str,
+        dry_run: bool = False,
+        checkpoint: Optional[CleanupCheckpoint] = None
+    ) -> Dict[str, int]:
         """
         Clean up old data for a specific user based on their subscription tier
         
         Args:
             user_id: User ID to clean up data for
             tier: User's subscription tier (free, basic, pro, ultra, max)
+            dry_run: Report documents/invoices/bytes that would be deleted, delete nothing
+            checkpoint: Optional run checkpoint (records storage objects to retry)
         
         Returns:
             Dictionary with counts of deleted documents and invoices
@@ -44,34 +287,18 @@ class StorageCleanupService:
             logger.info(f"Cleaning up data for user {user_id} (tier: {tier}, retention: {retention_days} days)")
             logger.info(f"Deleting documents older than: {cutoff_iso}")
             
-            # Get old documents
-            old_documents = supabase.table("documents").select("id").eq("user_id", user_id).lt("created_at", cutoff_iso).execute()
-            
-            documents_deleted = 0
-            invoices_deleted = 0
-            
-            if old_documents.data:
-                document_ids = [doc["id"] for doc in old_documents.data]
-                
-                # Delete associated invoices first (foreign key constraint)
-                for doc_id in document_ids:
-                    invoice_result = supabase.table("invoices").delete().eq("document_id", doc_id).execute()
-                    if invoice_result.data:
-                        invoices_deleted += len(invoice_result.data)
-                
-                # Delete documents
-                for doc_id in document_ids:
-                    doc_result = supabase.table("documents").delete().eq("id", doc_id).execute()
-                    if doc_result.data:
-                        documents_deleted += len(doc_result.data)
-                
-                logger.info(f"✅ Cleanup complete: {documents_deleted} documents, {invoices_deleted} invoices deleted")
+            result = StorageCleanupService.purge_documents_before(user_id, cutoff_iso, dry_run, checkpoint)
+            if dry_run:
+                logger.info(f"Dry run for {user_id}: {result['documents_to_delete']} documents, "
+                            f"{result['bytes_to_reclaim']} bytes to reclaim")
+            elif result["documents_deleted"]:
+                logger.info(f"✅ Cleanup complete: {result['documents_deleted']} documents, "
+                            f"{result['invoices_deleted']} invoices deleted")
             else:
                 logger.info(f"No old documents found for user {user_id}")
             
             return {
-                "documents_deleted": documents_deleted,
-                "invoices_deleted": invoices_deleted,
+                **result,
                 "retention_days": retention_days,
                 "cutoff_date": cutoff_iso
             }
@@ -82,15 +309,19 @@ class StorageCleanupService:
     
     
     @staticmethod
-    def cleanup_all_users() -> Dict[str, any]:
+    def cleanup_all_users(dry_run: bool = False, max_workers: int = CLEANUP_WORKERS) -> Dict[str, any]:
         """
         Clean up old data for all users based on their subscription tiers
         
+        Users are processed by a bounded thread pool. Progress is checkpointed
+        after every user, so a crashed or interrupted run resumes without
+        redoing finished users (dry runs don't touch the checkpoint).
+        
         Returns:
             Dictionary with cleanup statistics
         """
         try:
-            logger.info("🧹 Starting storage cleanup for all users...")
+            logger.info(f"🧹 Starting storage cleanup for all users{' (dry run)' if dry_run else ''}...")
             
             # Get all users with their subscription tiers
             subscriptions = supabase.table("subscriptions").select("user_id, tier, status").execute()
@@ -99,45 +330,76 @@ class StorageCleanupService:
                 logger.info("No subscriptions found")
                 return {"total_users": 0, "users_cleaned": 0}
             
-            total_documents_deleted = 0
-            total_invoices_deleted = 0
-            users_cleaned = 0
-            errors = []
+            checkpoint = None if dry_run else CleanupCheckpoint.load_or_start()
+            if checkpoint:
+                # Objects whose rows were deleted by an earlier run but removal failed
+                retry_paths = checkpoint.take_pending_paths()
+                if retry_paths:
+                    checkpoint.add_pending_paths(StorageCleanupService.remove_storage_objects(retry_paths))
             
+            # Only cleanup for active subscriptions that this run hasn't finished yet
+            pending = []
             for subscription in subscriptions.data:
                 user_id = subscription.get("user_id")
-                tier = subscription.get("tier", "free")
-                status = subscription.get("status", "active")
-                
-                # Only cleanup for active subscriptions
-                if status != "active":
+                if subscription.get("status", "active") != "active":
                     logger.info(f"Skipping user {user_id} - subscription not active")
                     continue
-                
-                try:
-                    result = StorageCleanupService.cleanup_user_data(user_id, tier)
+                if checkpoint and user_id in checkpoint.completed_users:
+                    continue
+                pending.append((user_id, subscription.get("tier", "free")))
+            
+            totals: Dict[str, int] = {}
+            users_cleaned = 0
+            errors = []
+            
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                futures = {
+                    executor.submit(StorageCleanupService.cleanup_user_data, user_id, tier, dry_run, checkpoint): user_id
+                    for user_id, tier in pending
+                }
+                for future in as_completed(futures):
+                    user_id = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"error": str(e)}
                     
-                    if "error" not in result:
-                        total_documents_deleted += result.get("documents_deleted", 0)
-                        total_invoices_deleted += result.get("invoices_deleted", 0)
-                        users_cleaned += 1
-                    else:
+                    if "error" in result:
+                        logger.error(f"Error processing user {user_id}: {result['error']}")
                         errors.append(f"User {user_id}: {result['error']}")
-                        
-                except Exception as e:
-                    logger.error(f"Error processing user {user_id}: {e}")
-                    errors.append(f"User {user_id}: {str(e)}")
+                        continue
+                    
+                    users_cleaned += 1
+                    for key, value in result.items():
+                        if isinstance(value, int) and not isinstance(value, bool) and key != "retention_days":
+                            totals[key] = totals.get(key, 0) + value
+                    if checkpoint:
+                        checkpoint.mark_user_done(user_id)
+            
+            if checkpoint and not errors:
+                checkpoint.finish()
             
             logger.info(f"✅ Storage cleanup complete!")
-            logger.info(f"   Users processed: {users_cleaned}/{len(subscriptions.data)}")
-            logger.info(f"   Documents deleted: {total_documents_deleted}")
-            logger.info(f"   Invoices deleted: {total_invoices_deleted}")
+            logger.info(f"   Users processed: {users_cleaned}/{len(pending)} "
+                        f"({len(subscriptions.data)} subscriptions)")
+            if dry_run:
+                logger.info(f"   Would delete: {totals.get('documents_to_delete', 0)} documents, "
+                            f"{totals.get('bytes_to_reclaim', 0)} bytes")
+            else:
+                logger.info(f"   Documents deleted: {totals.get('documents_deleted', 0)}")
+                logger.info(f"   Invoices deleted: {totals.get('invoices_deleted', 0)}")
+                logger.info(f"   Bytes reclaimed: {totals.get('bytes_reclaimed', 0)}")
             
             return {
                 "total_users": len(subscriptions.data),
                 "users_cleaned": users_cleaned,
-                "total_documents_deleted": total_documents_deleted,
-                "total_invoices_deleted": total_invoices_deleted,
+                "total_documents_deleted": totals.get("documents_deleted", 0),
+                "total_invoices_deleted": totals.get("invoices_deleted", 0),
+                "total_bytes_reclaimed": totals.get("bytes_reclaimed", 0),
+                "total_documents_to_delete": totals.get("documents_to_delete", 0),
+                "total_bytes_to_reclaim": totals.get("bytes_to_reclaim", 0),
+                "storage_objects_failed": totals.get("storage_objects_failed", 0),
+                "dry_run": dry_run,
                 "errors": errors,
                 "timestamp": datetime.utcnow().isoformat()
             }
@@ -152,7 +414,7 @@ class StorageCleanupService:
     
     
     @staticmethod
-    def cleanup_anonymous_uploads() -> Dict[str, int]:
+    def cleanup_anonymous_uploads(dry_run: bool = False) -> Dict[str, int]:
         """
         Clean up anonymous uploads older than 24 hours
         
@@ -165,34 +427,12 @@ class StorageCleanupService:
             # Delete documents older than 24 hours with no user_id
             cutoff_date = (datetime.utcnow() - timedelta(hours=24)).isoformat()
             
-            # Get old anonymous documents
-            old_docs = supabase.table("documents").select("id").is_("user_id", "null").lt("created_at", cutoff_date).execute()
-            
-            documents_deleted = 0
-            invoices_deleted = 0
+            result = StorageCleanupService.purge_documents_before(None, cutoff_date, dry_run)
+            if not dry_run and result["documents_deleted"]:
+                logger.info(f"✅ Anonymous cleanup: {result['documents_deleted']} documents, "
+                            f"{result['invoices_deleted']} invoices deleted")
             
-            if old_docs.data:
-                document_ids = [doc["id"] for doc in old_docs.data]
-                
-                # Delete invoices first
-                for doc_id in document_ids:
-                    invoice_result = supabase.table("invoices").delete().eq("document_id", doc_id).execute()
-                    if invoice_result.data:
-                        invoices_deleted += len(invoice_result.data)
-                
-                # Delete documents
-                for doc_id in document_ids:
-                    doc_result = supabase.table("documents").delete().eq("id", doc_id).execute()
-                    if doc_result.data:
-                        documents_deleted += len(doc_result.data)
-                
-                logger.info(f"✅ Anonymous cleanup: {documents_deleted} documents, {invoices_deleted} invoices deleted")
-            
-            return {
-                "documents_deleted": documents_deleted,
-                "invoices_deleted": invoices_deleted,
-                "cutoff_date": cutoff_date
-            }
+            return {**result, "cutoff_date": cutoff_date}
             
         except Exception as e:
             logger.error(f"Error cleaning up anonymous uploads: {e}")
@@ -211,26 +451,18 @@ class StorageCleanupService:
             Dictionary with storage statistics
         """
         try:
-            # Get user's documents
-            documents = supabase.table("documents").select("id, created_at, file_size").eq("user_id", user_id).execute()
-            
-            if not documents.data:
-                return {
-                    "total_documents": 0,
-                    "total_storage_bytes": 0,
-                    "oldest_document": None,
-                    "newest_document": None
-                }
-            
-            total_storage = sum(doc.get("file_size", 0) for doc in documents.data)
-            created_dates = [doc["created_at"] for doc in documents.data if doc.get("created_at")]
+            # One aggregate row computed in Postgres (ADD_AGGREGATE_STATS_FUNCTIONS.sql)
+            stats = call_rpc(supabase, "get_storage_stats", {"user_id_param": user_id})
+            if stats is None:
+                stats = StorageCleanupService._storage_stats_fallback(user_id)
             
+            total_storage = int(stats.get("total_storage_bytes") or 0)
             return {
-                "total_documents": len(documents.data),
+                "total_documents": int(stats.get("total_documents") or 0),
                 "total_storage_bytes": total_storage,
                 "total_storage_mb": round(total_storage / (1024 * 1024), 2),
-                "oldest_document": min(created_dates) if created_dates else None,
-                "newest_document": max(created_dates) if created_dates else None
+                "oldest_document": stats.get("oldest_document"),
+                "newest_document": stats.get("newest_document")
             }
             
         except Exception as e:
@@ -238,20 +470,47 @@ class StorageCleanupService:
             return {"error": str(e)}
 
 
+    @staticmethod
+    def _storage_stats_fallback(user_id: str) -> Dict[str, any]:
+        """get_storage_stats without the SQL function: count + min/max rows, sum over file_size only"""
+        def documents():
+            return supabase.table("documents").select("created_at").eq("user_id", user_id)
+        
+        oldest = documents().order("created_at").limit(1).execute().data
+        newest = documents().order("created_at", desc=True).limit(1).execute().data
+        
+        total_documents = total_bytes = offset = 0
+        while True:
+            page = supabase.table("documents").select("file_size").eq("user_id", user_id)\
+                .range(offset, offset + STATS_PAGE_SIZE - 1).execute().data or []
+            total_documents += len(page)
+            total_bytes += sum(row.get("file_size") or 0 for row in page)
+            if len(page) < STATS_PAGE_SIZE:
+                break
+            offset += STATS_PAGE_SIZE
+        
+        return {
+            "total_documents": total_documents,
+            "total_storage_bytes": total_bytes,
+            "oldest_document": oldest[0]["created_at"] if oldest else None,
+            "newest_document": newest[0]["created_at"] if newest else None
+        }
+
+
 # Convenience functions
-def cleanup_user_storage(user_id: str, tier: str) -> Dict[str, int]:
+def cleanup_user_storage(user_id: str, tier: str, dry_run: bool = False) -> Dict[str, int]:
     """Clean up storage for a specific user"""
-    return StorageCleanupService.cleanup_user_data(user_id, tier)
+    return StorageCleanupService.cleanup_user_data(user_id, tier, dry_run)
 
 
-def cleanup_all_storage() -> Dict[str, any]:
+def cleanup_all_storage(dry_run: bool = False) -> Dict[str, any]:
     """Clean up storage for all users"""
-    return StorageCleanupService.cleanup_all_users()
+    return StorageCleanupService.cleanup_all_users(dry_run)
 
 
-def cleanup_anonymous_storage() -> Dict[str, int]:
+def cleanup_anonymous_storage(dry_run: bool = False) -> Dict[str, int]:
     """Clean up anonymous uploads"""
-    return StorageCleanupService.cleanup_anonymous_uploads()
+    return StorageCleanupService.cleanup_anonymous_uploads(dry_run)
 
 
 def get_user_storage_stats(user_id: str) -> Dict[str, any]:
@@ -267,27 +526,39 @@ if __name__ == "__main__":
     print("🧹 STORAGE CLEANUP SERVICE")
     print("="*60 + "\n")
     
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
+    dry_run = "--dry-run" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--dry-run"]
+    
+    if args:
+        command = args[0]
         
         if command == "cleanup-all":
-            print("Cleaning up storage for all users...")
-            result = cleanup_all_storage()
+            print(f"Cleaning up storage for all users{' (dry run)' if dry_run else ''}...")
+            result = cleanup_all_storage(dry_run)
             print(f"\n✅ Results:")
             print(f"   Users cleaned: {result.get('users_cleaned', 0)}")
-            print(f"   Documents deleted: {result.get('total_documents_deleted', 0)}")
-            print(f"   Invoices deleted: {result.get('total_invoices_deleted', 0)}")
+            if dry_run:
+                print(f"   Documents to delete: {result.get('total_documents_to_delete', 0)}")
+                print(f"   Storage to reclaim: {result.get('total_bytes_to_reclaim', 0) / (1024 * 1024):.2f} MB")
+            else:
+                print(f"   Documents deleted: {result.get('total_documents_deleted', 0)}")
+                print(f"   Invoices deleted: {result.get('total_invoices_deleted', 0)}")
+                print(f"   Storage reclaimed: {result.get('total_bytes_reclaimed', 0) / (1024 * 1024):.2f} MB")
             
         elif command == "cleanup-anonymous":
-            print("Cleaning up anonymous uploads...")
-            result = cleanup_anonymous_storage()
+            print(f"Cleaning up anonymous uploads{' (dry run)' if dry_run else ''}...")
+            result = cleanup_anonymous_storage(dry_run)
             print(f"\n✅ Results:")
-            print(f"   Documents deleted: {result.get('documents_deleted', 0)}")
-            print(f"   Invoices deleted: {result.get('invoices_deleted', 0)}")
+            if dry_run:
+                print(f"   Documents to delete: {result.get('documents_to_delete', 0)}")
+                print(f"   Storage to reclaim: {result.get('bytes_to_reclaim', 0) / (1024 * 1024):.2f} MB")
+            else:
+                print(f"   Documents deleted: {result.get('documents_deleted', 0)}")
+                print(f"   Invoices deleted: {result.get('invoices_deleted', 0)}")
             
         elif command == "stats":
-            if len(sys.argv) > 2:
-                user_id = sys.argv[2]
+            if len(args) > 1:
+                user_id = args[1]
                 print(f"Getting storage stats for user: {user_id}")
                 stats = get_user_storage_stats(user_id)
                 print(f"\n📊 Storage Stats:")
@@ -306,6 +577,6 @@ if __name__ == "__main__":
         print("  cleanup-all       - Clean up storage for all users")
         print("  cleanup-anonymous - Clean up anonymous uploads")
         print("  stats <user_id>   - Get storage stats for a user")
-        print("\nUsage: python storage_cleanup.py <command>")
+        print("\nUsage: python storage_cleanup.py <command> [--dry-run]")
     
     print("\n" + "="*60 + "\n")
@@ -0,0 +1,167 @@
+"""
+🌊 STREAMING INVOICE JSON PARSER
+Incremental parser for schema-constrained Gemini responses
+
+Text is fed as the response streams in. Every object inside the top-level
+"line_items" array is emitted as soon as its closing brace arrives, and the
+parser remembers the last top-level member boundary, so a response cut off
+by max_output_tokens still yields all complete invoice fields and items
+without any regex repair.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Structural characters outside strings / characters that end or escape inside strings
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class StreamingInvoiceParser:
+    """
+    Feed response fragments, collect completed line items, then finish()
+
+    Usage:
+        parser = StreamingInvoiceParser()
+        for chunk in response:
+            parser.feed(chunk.text)
+        data, truncated = parser.finish()
+    """
+
+    def __init__(self, items_key: str = 'line_items'):
+        self.items_key = items_key
+        self.items: List[Dict[str, Any]] = []
+        self.skipped_items = 0
+
+        self._buf = ''
+        self._pos = 0                  # next unscanned index
+        self._stack: List[str] = []
+        self._in_string = False
+        self._string_start = -1
+        self._last_key: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._root_start = -1
+        self._root_end = -1
+        self._last_member_end = -1     # index of the last top-level ',' (safe cut point)
+        self._items_level = 0          # stack depth of the line_items array, 0 if not inside it
+        self._item_start = -1
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    @property
+    def complete(self) -> bool:
+        return self._root_end >= 0
+
+    def feed(self, fragment: str) -> List[Dict[str, Any]]:
+        """Consume a fragment; returns the line items completed by it"""
+        if not fragment or self.complete:
+            return []
+        self._buf += fragment
+        emitted_from = len(self.items)
+
+        buf = self._buf
+        pos = self._pos
+        while pos < len(buf):
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buf, pos)
+                if not match:
+                    pos = len(buf)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buf):
+                        pos = match.start()  # escape split across fragments; rescan it next time
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                if len(self._stack) == 1:
+                    self._last_key = buf[self._string_start + 1:match.start()]
+                pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(buf, pos)
+            if not match:
+                pos = len(buf)
+                break
+            ch = match.group()
+            i = match.start()
+            pos = match.end()
+
+            if not self._stack and ch != '{':
+                continue  # preamble before the root object (e.g. a stray code fence)
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ':':
+                if len(self._stack) == 1:
+                    self._pending_key = self._last_key
+            elif ch == ',':
+                if len(self._stack) == 1:
+                    self._last_member_end = i
+            elif ch in '{[':
+                if not self._stack:
+                    self._root_start = i
+                elif ch == '{' and self._items_level and len(self._stack) == self._items_level:
+                    self._item_start = i
+                self._stack.append(ch)
+                if ch == '[' and len(self._stack) == 2 and self._pending_key == self.items_key:
+                    self._items_level = 2
+            else:  # '}' or ']'
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                depth = len(self._stack)
+                if ch == '}' and self._items_level and depth == self._items_level and self._item_start >= 0:
+                    self._emit_item(buf[self._item_start:i + 1])
+                    self._item_start = -1
+                elif ch == ']' and self._items_level and depth == self._items_level - 1:
+                    self._items_level = 0
+                elif depth == 0:
+                    self._root_end = i + 1
+                    break
+
+        self._pos = pos
+        return self.items[emitted_from:]
+
+    def _emit_item(self, text: str) -> None:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            self.skipped_items += 1
+            return
+        if isinstance(item, dict):
+            self.items.append(item)
+
+    def finish(self) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Final document and whether the response was truncated
+
+        Returns (None, truncated) if not even a partial root object could be
+        recovered; callers then fall back to the regex repair path.
+        """
+        if self._root_start < 0:
+            return None, False
+
+        if self.complete:
+            try:
+                data = json.loads(self._buf[self._root_start:self._root_end])
+            except json.JSONDecodeError:
+                data = None
+            if isinstance(data, dict):
+                return data, False
+
+        # Truncated: keep every complete top-level member, plus the items streamed so far
+        data: Dict[str, Any] = {}
+        if self._last_member_end > self._root_start:
+            try:
+                data = json.loads(self._buf[self._root_start:self._last_member_end] + '}')
+            except json.JSONDecodeError:
+                return None, True
+        if self.items or self.items_key not in data:
+            data[self.items_key] = list(self.items)
+        return data, True
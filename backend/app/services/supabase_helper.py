@@ -2,8 +2,14 @@
 Supabase Helper - Using official Supabase Python client
 """
 import os
+import threading
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+from app.core.metrics import record_fallback
 
 # Load environment variables with UTF-8 encoding
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -27,13 +33,63 @@ if not supabase_key:
 else:
     print(f"✅ Supabase configured with SERVICE_KEY (bypasses RLS)")
 
-# Create official Supabase client (non-blocking, will fail gracefully at runtime if keys missing)
-try:
-    supabase: Client = create_client(
-        supabase_url=supabase_url,
-        supabase_key=supabase_key
-    )
-    print(f"✅ Supabase client initialized: {supabase_url}")
-except Exception as e:
-    print(f"⚠️ WARNING: Failed to initialize Supabase client: {e}")
-    supabase = None
+
+class _LazySupabaseClient:
+    """
+    Stands in for the Supabase client until it is first used
+
+    Importing the supabase package and building the client costs ~0.25s, so
+    it happens on first attribute access (or in the startup hook via
+    connect()) rather than at import. Modules keep importing `supabase` from
+    here and calling it exactly like the real client.
+    """
+
+    def __init__(self, url: str, key: str):
+        self._url = url
+        self._key = key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def connect(self) -> "Client":
+        """Create the client if it doesn't exist yet and return it"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(supabase_url=self._url, supabase_key=self._key)
+                    print(f"✅ Supabase client initialized: {self._url}")
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+
+# Official Supabase client, created on first use (fails at runtime if keys missing)
+supabase: "Client" = _LazySupabaseClient(supabase_url, supabase_key)
+
+
+# Postgres functions found missing (PGRST202) - not retried for the life of the process
+_missing_functions = set()
+
+
+def call_rpc(client, function_name: str, params: dict):
+    """
+    Call a Postgres function through PostgREST
+    
+    Returns the function's data, or None when the function has not been
+    deployed yet so callers can fall back to plain table queries. Any
+    other error is raised.
+    """
+    if function_name in _missing_functions:
+        record_fallback(f"rpc:{function_name}")
+        return None
+    try:
+        return client.rpc(function_name, params).execute().data
+    except Exception as e:
+        message = str(e)
+        if "PGRST202" in message or "Could not find the function" in message:
+            print(f"⚠️ SQL function {function_name} not deployed - using table query fallback")
+            _missing_functions.add(function_name)
+            record_fallback(f"rpc:{function_name}")
+            return None
+        raise
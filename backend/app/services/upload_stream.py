@@ -0,0 +1,429 @@
+"""
+📥 STREAMING UPLOAD INGESTION
+Reads a multipart upload chunk by chunk instead of buffering the whole body
+
+- MultipartFileStream pulls the file part out of request.stream() as the
+  bytes arrive (python-multipart's push parser, the one Starlette uses)
+- IncomingFile tracks the size (rejecting as soon as the limit is crossed),
+  SHA-256 and magic bytes per chunk, and spools the bytes: up to
+  SPOOL_MAX_SIZE in memory, the rest on disk
+- StorageUpload forwards the same chunks to Supabase Storage in one
+  streamed request while they arrive, through a small bounded queue
+- image_dimensions() reads width/height from the image header only
+
+Peak memory per upload is the spool buffer plus a few chunks in flight,
+whatever the file size.
+"""
+
+import asyncio
+import hashlib
+import logging
+import struct
+import weakref
+from tempfile import SpooledTemporaryFile
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024  # same in-memory limit as Starlette's UploadFile
+SNIFF_BYTES = 1024            # PDF allows junk before %PDF within the first 1KB
+STORAGE_QUEUE_CHUNKS = 4      # chunks buffered between the request and the storage upload
+
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+# Declared types that share a signature
+_TYPE_ALIASES = {"image/jpg": "image/jpeg", "image/heif": "image/heic"}
+
+
+class UploadRejected(Exception):
+    """The upload failed a check; status_code / detail go back to the client"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Content type from the file's magic bytes, or None if unrecognised"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in _HEIF_BRANDS:
+        return "image/heic"
+    if b"%PDF-" in head[:SNIFF_BYTES]:
+        return "application/pdf"
+    return None
+
+
+def matches_declared_type(head: bytes, declared: str) -> bool:
+    sniffed = sniff_content_type(head)
+    return sniffed is not None and sniffed == _TYPE_ALIASES.get(declared, declared)
+
+
+def _jpeg_dimensions(fp: BinaryIO) -> Optional[Tuple[int, int]]:
+    """Walk the JPEG segment headers to the first SOFn marker, skipping segment bodies"""
+    fp.seek(2)
+    while True:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:          # fill byte
+            fp.seek(-1, 1)
+            continue
+        if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:  # markers without a length
+            continue
+        length = fp.read(2)
+        if len(length) < 2:
+            return None
+        size = struct.unpack(">H", length)[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            frame = fp.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">xHH", frame)
+            return width, height
+        if code == 0xDA:          # start of scan without a frame header
+            return None
+        fp.seek(size - 2, 1)
+
+
+def _webp_dimensions(header: bytes) -> Optional[Tuple[int, int]]:
+    chunk = header[12:16]
+    if chunk == b"VP8X" and len(header) >= 30:
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+        return width, height
+    if chunk == b"VP8L" and len(header) >= 25:
+        b = header[21:25]
+        width = 1 + (b[0] | (b[1] & 0x3F) << 8)
+        height = 1 + (b[1] >> 6 | b[2] << 2 | (b[3] & 0x0F) << 10)
+        return width, height
+    if chunk == b"VP8 " and len(header) >= 30:
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    return None
+
+
+def image_dimensions(fp: BinaryIO) -> Optional[Tuple[int, int]]:
+    """
+    (width, height) from the image header - nothing is decoded
+
+    Reads a few bytes for PNG / WebP and only segment headers for JPEG.
+    Returns None for formats it doesn't parse (HEIC) or malformed headers.
+    """
+    fp.seek(0)
+    header = fp.read(30)
+    sniffed = sniff_content_type(header)
+    if sniffed == "image/png" and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    if sniffed == "image/webp":
+        return _webp_dimensions(header)
+    if sniffed == "image/jpeg":
+        return _jpeg_dimensions(fp)
+    return None
+
+
+class IncomingFile:
+    """
+    An upload as it arrives: size, SHA-256 and the first bytes are tracked
+    per chunk, and the bytes are spooled (memory up to SPOOL_MAX_SIZE, then disk)
+    """
+
+    def __init__(self, filename: str, content_type: str, max_bytes: int):
+        self.filename = filename
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b""
+        self._sha256 = hashlib.sha256()
+        self.file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadRejected(413, f"File too large. Maximum size: {self.max_bytes // (1024 * 1024)}MB")
+        if len(self.head) < SNIFF_BYTES:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+        self._sha256.update(chunk)
+        self.file.write(chunk)
+
+    @property
+    def sniffed(self) -> bool:
+        """Enough bytes seen to check the magic bytes"""
+        return len(self.head) >= SNIFF_BYTES
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def dimensions(self) -> Optional[Tuple[int, int]]:
+        dimensions = image_dimensions(self.file)
+        self.file.seek(0, 2)
+        return dimensions
+
+    def chunks(self, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self) -> bytes:
+        """The whole file in memory - only for consumers that need bytes (extraction)"""
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class MultipartFileStream:
+    """
+    One file field of a multipart/form-data request, read as it arrives
+
+    Usage:
+        stream = MultipartFileStream(request, "file")
+        await stream.open()            # filename / content_type are set
+        async for chunk in stream:
+            ...
+    """
+
+    def __init__(self, request, field: str = "file"):
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadRejected(400, "Expected a multipart/form-data upload")
+        self.field = field
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self._body = request.stream().__aiter__()
+        self._pending: List[bytes] = []
+        self._part_headers: dict = {}
+        self._header_name = self._header_value = b""
+        self._in_field = False
+        self._done = False
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    @staticmethod
+    def _decode(value: bytes) -> str:
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            return value.decode("latin-1")
+
+    def _on_part_begin(self) -> None:
+        self._part_headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._part_headers[self._header_name.lower()] = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._part_headers.get(b"content-disposition", b""))
+        if self.filename is None and options.get(b"name") == self.field.encode() and b"filename" in options:
+            self._in_field = True
+            self.filename = self._decode(options[b"filename"])
+            self.content_type = self._decode(
+                self._part_headers.get(b"content-type", b"application/octet-stream")).strip()
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_field:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._in_field:
+            self._in_field = False
+            self._done = True
+
+    async def _pull(self) -> bool:
+        """Feed the next piece of the request body to the parser; False at the end of the body"""
+        try:
+            chunk = await self._body.__anext__()
+        except StopAsyncIteration:
+            return False
+        if chunk:
+            self._parser.write(chunk)
+        return True
+
+    async def open(self) -> None:
+        """Read up to the file part's headers"""
+        while self.filename is None:
+            if not await self._pull():
+                raise UploadRejected(400, f"No file uploaded in field '{self.field}'")
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while True:
+            if self._pending:
+                data = b"".join(self._pending)
+                self._pending.clear()
+                yield data
+            if self._done:
+                break
+            if not await self._pull():
+                raise UploadRejected(400, "Upload ended before the file was complete")
+        # Only the closing boundary is left; read it so the connection stays usable
+        async for _ in self._body:
+            pass
+
+
+class StorageUpload:
+    """
+    Streams an object into Supabase Storage as the bytes arrive
+
+    One POST to the Storage REST API with a streamed body fed from a bounded
+    queue: write() waits while the queue is full, so a slow storage link
+    slows down reading the request rather than buffering it. abort() before
+    finish() cancels the request and no object is created.
+    """
+
+    # One keep-alive client per event loop
+    _clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+        weakref.WeakKeyDictionary()
+
+    def __init__(
+        self,
+        bucket: str,
+        path: str,
+        content_type: str,
+        url: Optional[str] = None,
+        key: Optional[str] = None,
+        transport: Optional["httpx.AsyncBaseTransport"] = None
+    ):
+        if url is None or key is None:
+            from app.services.supabase_helper import supabase_key, supabase_url
+            url, key = url or supabase_url, key or supabase_key
+        self.bucket = bucket
+        self.path = path
+        self._url = f"{url.rstrip('/')}/storage/v1/object/{bucket}/{quote(path)}"
+        self._headers = {
+            "Authorization": f"Bearer {key}",
+            "apikey": key,
+            "Content-Type": content_type,
+            "Cache-Control": "max-age=3600",
+            "x-upsert": "false",
+        }
+        self._transport = transport
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=STORAGE_QUEUE_CHUNKS)
+        self._task: Optional[asyncio.Task] = None
+
+    def _shared_client(self) -> "httpx.AsyncClient":
+        import httpx
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+            self._clients[loop] = client
+        return client
+
+    async def _body(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def _send(self) -> "httpx.Response":
+        if self._transport is None:
+            return await self._shared_client().post(self._url, content=self._body(), headers=self._headers)
+        import httpx
+        async with httpx.AsyncClient(transport=self._transport) as client:
+            return await client.post(self._url, content=self._body(), headers=self._headers)
+
+    def _start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._send())
+        return self._task
+
+    async def write(self, chunk: bytes) -> None:
+        task = self._start()
+        put = asyncio.ensure_future(self._queue.put(chunk))
+        await asyncio.wait((put, task), return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            # The request ended (failed) before the body was complete
+            put.cancel()
+            response = task.result()
+            raise RuntimeError(f"Storage upload failed ({response.status_code}): {response.text[:200]}")
+
+    async def finish(self) -> None:
+        """End the body and wait for Storage to store the object"""
+        task = self._start()
+        if not task.done():
+            await self._queue.put(None)
+        response = await task
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f"Storage upload failed ({response.status_code}): {response.text[:200]}")
+        logger.info("Streamed %s to storage", self.path)
+
+    async def abort(self) -> None:
+        """Cancel the upload before finish(): Storage drops the partial object"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+
+
+async def read_upload(
+    stream: MultipartFileStream,
+    incoming: IncomingFile,
+    storage: StorageUpload,
+    allowed_type: Optional[str] = None
+) -> None:
+    """
+    Copy the file part to the spool and to storage, checking as it goes
+
+    Raises UploadRejected as soon as the size limit is crossed, or when the
+    magic bytes don't match allowed_type, before any byte is sent to
+    storage. The storage upload is left open: the caller calls finish()
+    once its own checks pass (or abort()).
+    """
+    pending: List[bytes] = []
+    async for chunk in stream:
+        incoming.write(chunk)
+        if pending is not None:
+            # Hold the first bytes back until the type is confirmed
+            pending.append(chunk)
+            if not incoming.sniffed:
+                continue
+            _check_type(incoming, allowed_type)
+            chunk, pending = b"".join(pending), None
+        await storage.write(chunk)
+    if pending is not None:
+        _check_type(incoming, allowed_type)
+        if pending:
+            await storage.write(b"".join(pending))
+
+
+def _check_type(incoming: IncomingFile, allowed_type: Optional[str]) -> None:
+    if allowed_type and not matches_declared_type(incoming.head, allowed_type):
+        raise UploadRejected(415, "File content doesn't match declared type. File may be corrupted or renamed.")
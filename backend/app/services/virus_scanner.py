@@ -2,308 +2,351 @@
 Virus Scanner Service
 SECURITY FIX: Malware/virus scanning for uploaded files
 Supports VirusTotal API (recommended) or ClamAV (self-hosted)
+
+Hash-first: verdicts are cached by the file's SHA-256 (in-process LRU, then
+Redis through CacheManager), so a file seen before - by any worker - is not
+sent anywhere again. On a cache miss:
+- ClamAV scans inline with clamd's INSTREAM command, streaming the bytes
+  the upload already holds in chunks (no second buffer)
+- VirusTotal looks the hash up (one GET). A file VirusTotal has never seen
+  comes back "pending": the caller quarantines it and scan_in_background()
+  uploads it and polls for the analysis, without holding a request open.
+  If the lookup itself fails (timeout, rate limit, 5xx) the file is not
+  "pending": it is scanned by ClamAV when clamd is reachable, otherwise
+  it falls under the scanner-error policy below
+Scanner errors keep the existing policy: the file is treated as safe
+("scanned": False) and the error is logged.
 """
 
-import os
+import asyncio
 import hashlib
 import logging
-import requests
-from typing import Dict, Tuple
-from datetime import datetime, timedelta
+import os
+import socket
+import struct
+import weakref
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterable, Iterator, Optional, Union
+
+from app.core.caching import CacheManager, _LocalCacheStore
+
+if TYPE_CHECKING:
+    import httpx
 
 logger = logging.getLogger(__name__)
 
+CLEAN_TTL = 7 * 24 * 3600
+MALICIOUS_TTL = 30 * 24 * 3600
+INSTREAM_CHUNK_SIZE = 64 * 1024
+
+
+# The bytes, or a seekable binary file holding them (a spooled upload)
+FileContent = Union[bytes, BinaryIO]
+
+
+def _iter_content(file_content: FileContent) -> Iterator[bytes]:
+    if isinstance(file_content, (bytes, bytearray, memoryview)):
+        yield file_content
+        return
+    file_content.seek(0)
+    while True:
+        chunk = file_content.read(INSTREAM_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def sha256_hex(file_content: FileContent) -> str:
+    """SHA-256 of the file, hex - the verdict cache key"""
+    digest = hashlib.sha256()
+    for chunk in _iter_content(file_content):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _result(status: str, safe: bool, message: str, details: Optional[Dict] = None, scanned: bool = True) -> Dict:
+    return {"scanned": scanned, "safe": safe, "status": status, "message": message, "details": details or {}}
+
+
+def _unscanned(message: str) -> Dict:
+    # Assume safe if the scanner is unavailable or fails
+    return _result("unscanned", True, message, scanned=False)
+
+
+def _from_stats(stats: Dict[str, Any], message: str) -> Dict:
+    malicious = stats.get("malicious", 0)
+    suspicious = stats.get("suspicious", 0)
+    safe = malicious == 0 and suspicious == 0
+    return _result("clean" if safe else "malicious", safe, message, {
+        "malicious": malicious,
+        "suspicious": suspicious,
+        "undetected": stats.get("undetected", 0),
+        "harmless": stats.get("harmless", 0)
+    })
+
+
+def verdict_message(verdict: Dict) -> str:
+    """Message for logs / API errors"""
+    details = verdict.get("details") or {}
+    if details.get("malicious", 0) > 0:
+        return f"Malware detected: {details['malicious']} threats found"
+    if details.get("suspicious", 0) > 0:
+        return f"Suspicious file: {details['suspicious']} warnings"
+    return verdict.get("message", "Scan complete")
+
+
+class VerdictCache:
+    """Scan verdicts by SHA-256: in-process LRU in front of Redis"""
+
+    PREFIX = "scan:sha256:"
+
+    def __init__(self, max_entries: int = 4096):
+        self._local = _LocalCacheStore(max_entries=max_entries)
+
+    @staticmethod
+    def _ttl(verdict: Dict) -> int:
+        return CLEAN_TTL if verdict.get("safe") else MALICIOUS_TTL
+
+    def get(self, sha256: str) -> Optional[Dict]:
+        verdict = self._local.get(sha256)
+        if verdict is None:
+            verdict = CacheManager.get(self.PREFIX + sha256)
+            if verdict:
+                self._local.set(sha256, verdict, self._ttl(verdict))
+        return verdict
+
+    def set(self, sha256: str, verdict: Dict) -> None:
+        """Remember a completed scan (errors and pending results are not cached)"""
+        if verdict.get("status") not in ("clean", "malicious"):
+            return
+        self._local.set(sha256, verdict, self._ttl(verdict))
+        CacheManager.set(self.PREFIX + sha256, verdict, self._ttl(verdict))
+
+    def clear(self) -> None:
+        self._local.clear()
+
 
 class VirusTotalScanner:
     """
-    Scan files using VirusTotal API
+    Scan files using VirusTotal API (async)
     Free tier: 4 requests/minute, 500/day
     """
-    
-    def __init__(self):
-        self.api_key = os.getenv('VIRUSTOTAL_API_KEY')
-        self.api_url = "https://www.virustotal.com/api/v3/files"
+
+    API_URL = "https://www.virustotal.com/api/v3"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        transport: Optional["httpx.AsyncBaseTransport"] = None,
+        poll_interval: float = 15.0,
+        max_polls: int = 20
+    ):
+        self.api_key = api_key or os.getenv('VIRUSTOTAL_API_KEY')
         self.enabled = bool(self.api_key)
-        
+        self.poll_interval = poll_interval
+        self.max_polls = max_polls
+        self._transport = transport
+        # One keep-alive client per event loop (uploads run on the server
+        # loop, bulk extraction on per-thread loops)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+            weakref.WeakKeyDictionary()
+
         if not self.enabled:
             logger.warning("VirusTotal API key not found. Malware scanning disabled.")
             logger.info("Set VIRUSTOTAL_API_KEY in .env to enable malware scanning")
-    
-    def calculate_file_hash(self, file_content: bytes) -> str:
-        """Calculate SHA256 hash of file"""
-        return hashlib.sha256(file_content).hexdigest()
-    
-    def scan_file(self, file_content: bytes, filename: str = "file") -> Dict:
+
+    def _client(self) -> "httpx.AsyncClient":
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            import httpx
+            client = httpx.AsyncClient(
+                base_url=self.API_URL,
+                headers={"x-apikey": self.api_key or ""},
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                transport=self._transport
+            )
+            self._clients[loop] = client
+        return client
+
+    async def lookup(self, sha256: str) -> Optional[Dict]:
         """
-        Scan file for malware
-        
-        Args:
-            file_content: File content as bytes
-            filename: Original filename
-        
-        Returns:
-            Dictionary with scan results
+        Verdict VirusTotal already has for this hash
+
+        None if VirusTotal doesn't know the file yet; an unscanned result
+        ("scanned": False) if the lookup itself failed.
         """
-        if not self.enabled:
-            return {
-                "scanned": False,
-                "safe": True,  # Assume safe if scanning disabled
-                "message": "Malware scanning disabled (no API key)",
-                "details": {}
-            }
-        
-        try:
-            # Calculate file hash
-            file_hash = self.calculate_file_hash(file_content)
-            
-            # Check if file was previously scanned
-            cached_result = self._check_hash(file_hash)
-            if cached_result:
-                return cached_result
-            
-            # Upload and scan new file
-            headers = {"x-apikey": self.api_key}
-            files = {"file": (filename, file_content)}
-            
-            logger.info(f"Scanning file with VirusTotal: {filename} ({len(file_content)} bytes)")
-            
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                files=files,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                analysis_id = data.get("data", {}).get("id")
-                
-                # Get scan results
-                if analysis_id:
-                    result = self._get_scan_results(analysis_id)
-                    return result
-                else:
-                    logger.error("No analysis ID returned from VirusTotal")
-                    return {
-                        "scanned": False,
-                        "safe": True,  # Assume safe if scan fails
-                        "message": "Scan failed - no analysis ID",
-                        "details": {}
-                    }
-            
-            elif response.status_code == 429:
-                # Rate limit exceeded
-                logger.warning("VirusTotal rate limit exceeded")
-                return {
-                    "scanned": False,
-                    "safe": True,  # Assume safe if rate limited
-                    "message": "Rate limit exceeded - scan skipped",
-                    "details": {}
-                }
-            
-            else:
-                logger.error(f"VirusTotal API error: {response.status_code}")
-                return {
-                    "scanned": False,
-                    "safe": True,  # Assume safe if API error
-                    "message": f"API error: {response.status_code}",
-                    "details": {}
-                }
-        
-        except requests.Timeout:
-            logger.error("VirusTotal API timeout")
-            return {
-                "scanned": False,
-                "safe": True,
-                "message": "Scan timeout",
-                "details": {}
-            }
-        
-        except Exception as e:
-            logger.error(f"VirusTotal scan error: {str(e)}")
-            return {
-                "scanned": False,
-                "safe": True,
-                "message": f"Scan error: {str(e)}",
-                "details": {}
-            }
-    
-    def _check_hash(self, file_hash: str) -> Dict:
-        """Check if file hash was previously scanned"""
+        import httpx
         try:
-            headers = {"x-apikey": self.api_key}
-            url = f"https://www.virustotal.com/api/v3/files/{file_hash}"
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                stats = data.get("data", {}).get("attributes", {}).get("last_analysis_stats", {})
-                
-                malicious = stats.get("malicious", 0)
-                suspicious = stats.get("suspicious", 0)
-                
-                logger.info(f"File hash found in VirusTotal cache: {file_hash[:8]}...")
-                
-                return {
-                    "scanned": True,
-                    "safe": malicious == 0 and suspicious == 0,
-                    "message": "Previously scanned (cached result)",
-                    "details": {
-                        "malicious": malicious,
-                        "suspicious": suspicious,
-                        "undetected": stats.get("undetected", 0),
-                        "harmless": stats.get("harmless", 0)
-                    }
-                }
-            
-            return None  # Not in cache
-        
-        except Exception as e:
-            logger.debug(f"Hash check failed: {str(e)}")
+            response = await self._client().get(f"/files/{sha256}", timeout=10.0)
+        except httpx.HTTPError as e:
+            logger.warning("VirusTotal hash lookup failed: %s", e)
+            return _unscanned(f"Hash lookup failed: {e}")
+        if response.status_code == 404:
             return None
-    
-    def _get_scan_results(self, analysis_id: str, max_attempts: int = 3) -> Dict:
-        """
-        Get scan results from VirusTotal
-        Polls for results if analysis is still pending
-        """
-        import time
-        
-        headers = {"x-apikey": self.api_key}
-        url = f"https://www.virustotal.com/api/v3/analyses/{analysis_id}"
-        
-        for attempt in range(max_attempts):
+        if response.status_code != 200:
+            logger.warning("VirusTotal hash lookup returned %s", response.status_code)
+            return _unscanned(f"Hash lookup failed: HTTP {response.status_code}")
+        stats = response.json().get("data", {}).get("attributes", {}).get("last_analysis_stats") or {}
+        if not any(stats.values()):
+            return None  # Known hash, no finished analysis yet
+        logger.info("File hash found in VirusTotal cache: %s...", sha256[:8])
+        return _from_stats(stats, "Previously scanned (cached result)")
+
+    async def scan(self, file_content: FileContent, filename: str = "file", sha256: Optional[str] = None) -> Dict:
+        """Full scan: hash lookup, then upload and poll the analysis (seconds to minutes)"""
+        if not self.enabled:
+            return _unscanned("Malware scanning disabled (no API key)")
+        import httpx
+        verdict = await self.lookup(sha256 or sha256_hex(file_content))
+        if verdict and verdict["scanned"]:
+            return verdict
+
+        logger.info("Scanning file with VirusTotal: %s", filename)
+        if not isinstance(file_content, bytes):
+            file_content.seek(0)  # httpx streams the file from here
+        try:
+            response = await self._client().post("/files", files={"file": (filename, file_content)})
+        except httpx.HTTPError as e:
+            logger.error("VirusTotal upload failed: %s", e)
+            return _unscanned(f"Scan error: {e}")
+        if response.status_code == 429:
+            logger.warning("VirusTotal rate limit exceeded")
+            return _unscanned("Rate limit exceeded - scan skipped")
+        if response.status_code != 200:
+            logger.error("VirusTotal API error: %s", response.status_code)
+            return _unscanned(f"API error: {response.status_code}")
+
+        analysis_id = response.json().get("data", {}).get("id")
+        if not analysis_id:
+            logger.error("No analysis ID returned from VirusTotal")
+            return _unscanned("Scan failed - no analysis ID")
+        return await self._poll(analysis_id)
+
+    async def _poll(self, analysis_id: str) -> Dict:
+        import httpx
+        for _ in range(self.max_polls):
             try:
-                response = requests.get(url, headers=headers, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    status = data.get("data", {}).get("attributes", {}).get("status")
-                    
-                    if status == "completed":
-                        stats = data.get("data", {}).get("attributes", {}).get("stats", {})
-                        
-                        malicious = stats.get("malicious", 0)
-                        suspicious = stats.get("suspicious", 0)
-                        
-                        return {
-                            "scanned": True,
-                            "safe": malicious == 0 and suspicious == 0,
-                            "message": f"Scan complete: {malicious} threats detected",
-                            "details": {
-                                "malicious": malicious,
-                                "suspicious": suspicious,
-                                "undetected": stats.get("undetected", 0),
-                                "harmless": stats.get("harmless", 0)
-                            }
-                        }
-                    
-                    # Still queued/in-progress
-                    if attempt < max_attempts - 1:
-                        time.sleep(2)  # Wait 2 seconds before retry
-                        continue
-                
-                # Timeout or error
-                return {
-                    "scanned": False,
-                    "safe": True,
-                    "message": "Scan timeout - assuming safe",
-                    "details": {}
-                }
-            
-            except Exception as e:
-                logger.error(f"Error getting scan results: {str(e)}")
-                return {
-                    "scanned": False,
-                    "safe": True,
-                    "message": f"Error: {str(e)}",
-                    "details": {}
-                }
-        
-        # Max attempts reached
-        return {
-            "scanned": False,
-            "safe": True,
-            "message": "Scan timeout - assuming safe",
-            "details": {}
-        }
-    
-    def is_safe(self, scan_result: Dict) -> bool:
-        """Check if file is safe based on scan result"""
-        return scan_result.get("safe", True)
+                response = await self._client().get(f"/analyses/{analysis_id}", timeout=10.0)
+            except httpx.HTTPError as e:
+                logger.warning("Error getting scan results: %s", e)
+                response = None
+            if response is not None and response.status_code == 200:
+                attributes = response.json().get("data", {}).get("attributes", {})
+                if attributes.get("status") == "completed":
+                    stats = attributes.get("stats", {})
+                    return _from_stats(stats, f"Scan complete: {stats.get('malicious', 0)} threats detected")
+            # Still queued/in-progress
+            await asyncio.sleep(self.poll_interval)
+        return _unscanned("Scan timeout - assuming safe")
+
+    async def aclose(self) -> None:
+        for client in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
 
 
 class ClamAVScanner:
     """
     Scan files using ClamAV (self-hosted antivirus)
-    Requires clamd service running
+    Talks to clamd directly: CLAMD_SOCKET (unix socket) or CLAMD_HOST / CLAMD_PORT
     """
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        timeout: float = 30.0
+    ):
+        self.host = host or os.getenv("CLAMD_HOST")
+        self.port = port or int(os.getenv("CLAMD_PORT", "3310"))
+        self.socket_path = socket_path or os.getenv("CLAMD_SOCKET", "/var/run/clamav/clamd.ctl")
+        self.timeout = timeout
         try:
-            import clamd
-            self.cd = clamd.ClamdUnixSocket()
-            self.enabled = True
+            self.enabled = self._command(b"zPING\0") == "PONG"
             logger.info("ClamAV scanner initialized")
-        except ImportError:
-            self.enabled = False
-            logger.warning("ClamAV not available (clamd not installed)")
-        except Exception as e:
+        except OSError as e:
             self.enabled = False
-            logger.warning(f"ClamAV not available: {str(e)}")
-    
-    def scan_file(self, file_content: bytes, filename: str = "file") -> Dict:
-        """Scan file with ClamAV"""
+            logger.warning("ClamAV not available: %s", e)
+
+    def _connect(self) -> socket.socket:
+        if self.host:
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("unix sockets not supported here - set CLAMD_HOST")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _reply(sock: socket.socket) -> str:
+        data = b""
+        while not data.endswith(b"\0"):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        return data.rstrip(b"\0").decode("utf-8", "replace").strip()
+
+    def _command(self, command: bytes) -> str:
+        with self._connect() as sock:
+            sock.sendall(command)
+            return self._reply(sock)
+
+    def scan_stream(self, chunks: Iterable[bytes]) -> Dict:
+        """
+        INSTREAM scan of the given chunks
+
+        Each chunk is sent as length-prefixed slices of memoryview, so the
+        caller's bytes are never copied into another buffer.
+        """
         if not self.enabled:
-            return {
-                "scanned": False,
-                "safe": True,
-                "message": "ClamAV not available",
-                "details": {}
-            }
-        
+            return _unscanned("ClamAV not available")
         try:
-            result = self.cd.scan_stream(file_content)
-            
-            if result is None:
-                # Clean file
-                return {
-                    "scanned": True,
-                    "safe": True,
-                    "message": "File is clean",
-                    "details": {}
-                }
-            else:
-                # Virus found
-                return {
-                    "scanned": True,
-                    "safe": False,
-                    "message": f"Virus detected: {result}",
-                    "details": {"result": str(result)}
-                }
-        
-        except Exception as e:
-            logger.error(f"ClamAV scan error: {str(e)}")
-            return {
-                "scanned": False,
-                "safe": True,
-                "message": f"Scan error: {str(e)}",
-                "details": {}
-            }
-    
-    def is_safe(self, scan_result: Dict) -> bool:
-        """Check if file is safe"""
-        return scan_result.get("safe", True)
+            with self._connect() as sock:
+                sock.sendall(b"zINSTREAM\0")
+                for chunk in chunks:
+                    view = memoryview(chunk)
+                    for start in range(0, len(view), INSTREAM_CHUNK_SIZE):
+                        piece = view[start:start + INSTREAM_CHUNK_SIZE]
+                        sock.sendall(struct.pack("!L", len(piece)))
+                        sock.sendall(piece)
+                sock.sendall(struct.pack("!L", 0))
+                reply = self._reply(sock)
+        except OSError as e:
+            logger.error("ClamAV scan error: %s", e)
+            return _unscanned(f"Scan error: {e}")
+
+        # "stream: OK" / "stream: Eicar-Signature FOUND" / "... ERROR"
+        result = reply.split(":", 1)[-1].strip()
+        if result == "OK":
+            return _result("clean", True, "File is clean")
+        if result.endswith("FOUND"):
+            signature = result[:-len("FOUND")].strip()
+            return _result("malicious", False, f"Virus detected: {signature}", {"malicious": 1, "result": signature})
+        logger.error("ClamAV scan error: %s", reply)
+        return _unscanned(f"Scan error: {reply}")
+
+    async def scan(self, file_content: FileContent, filename: str = "file", sha256: Optional[str] = None) -> Dict:
+        return await asyncio.to_thread(self.scan_stream, _iter_content(file_content))
 
 
 # Default scanner (VirusTotal)
 _scanner = None
+# ClamAV behind VirusTotal, for when VirusTotal can't be reached
+_fallback = None
+_verdicts = VerdictCache()
+
 
 def get_scanner():
     """Get active virus scanner"""
     global _scanner
-    
+
     if _scanner is None:
         # Try VirusTotal first (preferred)
         vt_scanner = VirusTotalScanner()
@@ -317,45 +360,70 @@ def get_scanner():
                 _scanner = clamav_scanner
                 logger.info("Using ClamAV scanner")
             else:
-                # No scanner available - create disabled scanner
-                _scanner = VirusTotalScanner()  # Returns safe=True for all scans
+                # No scanner available - disabled scanner, every file is unscanned
+                _scanner = vt_scanner
                 logger.warning("No virus scanner available - malware scanning disabled")
-    
+
     return _scanner
 
 
-def scan_file(file_content: bytes, filename: str = "file") -> Tuple[bool, str]:
+def get_fallback_scanner() -> ClamAVScanner:
+    """ClamAV scanner used when a VirusTotal lookup fails"""
+    global _fallback
+
+    if _fallback is None:
+        _fallback = ClamAVScanner()
+    return _fallback
+
+
+def get_verdict_cache() -> VerdictCache:
+    return _verdicts
+
+
+async def check_file(file_content: FileContent, filename: str = "file", sha256: Optional[str] = None) -> Dict:
     """
-    Scan file for malware
-    
-    Args:
-        file_content: File content as bytes
-        filename: Original filename
-    
-    Returns:
-        Tuple of (is_safe: bool, message: str)
+    Verdict for an upload without waiting on a remote scan
+
+    Returns the scan result dict; "status" is clean / malicious / unscanned,
+    or pending - VirusTotal doesn't know the file: quarantine it and call
+    scan_in_background(). A failed VirusTotal lookup is never pending.
     """
     scanner = get_scanner()
-    result = scanner.scan_file(file_content, filename)
-    
-    is_safe = scanner.is_safe(result)
-    message = result.get("message", "Scan complete")
-    
-    if result.get("scanned") and result.get("details"):
-        details = result["details"]
-        if details.get("malicious", 0) > 0:
-            message = f"Malware detected: {details['malicious']} threats found"
-        elif details.get("suspicious", 0) > 0:
-            message = f"Suspicious file: {details['suspicious']} warnings"
-    
-    return is_safe, message
+    if not scanner.enabled:
+        return _unscanned("Malware scanning disabled")
+
+    sha256 = sha256 or sha256_hex(file_content)
+    cached = await asyncio.to_thread(_verdicts.get, sha256)
+    if cached:
+        return cached
+
+    if isinstance(scanner, VirusTotalScanner):
+        verdict = await scanner.lookup(sha256)
+        if verdict is None:
+            return _result("pending", False, "Unknown file - scan in progress", scanned=False)
+        if not verdict["scanned"]:
+            fallback = await asyncio.to_thread(get_fallback_scanner)
+            if fallback.enabled:
+                verdict = await fallback.scan(file_content, filename, sha256)
+    else:
+        verdict = await scanner.scan(file_content, filename, sha256)
+    await asyncio.to_thread(_verdicts.set, sha256, verdict)
+    return verdict
+
+
+async def scan_in_background(file_content: FileContent, filename: str = "file", sha256: Optional[str] = None) -> Dict:
+    """Full scan of a file check_file() returned pending for; the verdict is cached"""
+    sha256 = sha256 or sha256_hex(file_content)
+    verdict = await get_scanner().scan(file_content, filename, sha256)
+    await asyncio.to_thread(_verdicts.set, sha256, verdict)
+    return verdict
 
 
 if __name__ == "__main__":
     print("✅ Virus Scanner module loaded")
     print("\nAvailable scanners:")
     print("  - VirusTotal API (requires VIRUSTOTAL_API_KEY)")
-    print("  - ClamAV (requires clamd service)")
+    print("  - ClamAV (requires clamd: CLAMD_SOCKET or CLAMD_HOST)")
     print("\nTo enable:")
     print("  1. Add VIRUSTOTAL_API_KEY=your_key to .env")
-    print("  2. Or install ClamAV: pip install clamd")
+    print("  2. Or run clamd and set CLAMD_SOCKET / CLAMD_HOST")
@@ -6,14 +6,14 @@ Ultra-fast text extraction from invoice images at ₹0.12 per invoice
 import os
 import base64
 import json
+from importlib.util import find_spec
 from typing import Dict, Any, Optional
 
-# Google Cloud Vision API (optional - will fall back to Gemini if not available)
+# Google Cloud Vision API (optional - will fall back to Gemini if not available).
+# Calls go through the REST endpoint, so only check the SDK is installed
+# instead of importing it
 try:
-    from google.cloud import vision
-    import google.auth
-    from google.oauth2 import service_account
-    VISION_AVAILABLE = True
+    VISION_AVAILABLE = find_spec("google.cloud.vision") is not None
 except ImportError:
     VISION_AVAILABLE = False
 
@@ -6,11 +6,15 @@ No Gemini fallback - requires Vision API to be available
 
 import os
 import time
+import logging
 from typing import Dict, Any, Optional
 
 # Require Vision API - no fallback allowed
 from .vision_extractor import VisionExtractor
 from .flash_lite_formatter import FlashLiteFormatter
+from app.core.metrics import time_stage
+
+logger = logging.getLogger(__name__)
 
 
 class VisionOCR_FlashLite_Extractor:
@@ -20,18 +24,18 @@ class VisionOCR_FlashLite_Extractor:
         """Initialize with strict Vision API requirement"""
         try:
             self.vision_extractor = VisionExtractor()
-            print("✅ VISION API INITIALIZED - OCR extraction ready")
+            logger.info('VISION API INITIALIZED - OCR extraction ready')
         except Exception as e:
             raise RuntimeError(f"❌ VISION API REQUIRED but failed to initialize: {e}. Please ensure Vision API is properly configured.")
 
         try:
             self.flash_lite_formatter = FlashLiteFormatter()
-            print("✅ GEMINI 2.5 FLASH-LITE INITIALIZED - JSON formatting ready")
+            logger.info('GEMINI 2.5 FLASH-LITE INITIALIZED - JSON formatting ready')
         except Exception as e:
             raise RuntimeError(f"❌ FLASH-LITE REQUIRED but failed to initialize: {e}")
 
-        print("🚀 VISION OCR + FLASH-LITE SYSTEM READY")
-        print("💰 Cost: ₹0.12 (Vision) + ₹0.01 (Flash-Lite) = ₹0.13 per invoice")
+        logger.info('VISION OCR + FLASH-LITE SYSTEM READY')
+        logger.info('Cost: ₹0.12 (Vision) + ₹0.01 (Flash-Lite) = ₹0.13 per invoice')
 
     def extract_invoice_data(self, image_data: bytes, image_filename: str = "unknown") -> Dict[str, Any]:
         """
@@ -46,33 +50,32 @@ class VisionOCR_FlashLite_Extractor:
         """
         start_time = time.time()
 
-        print(f"🔍 Processing: {image_filename}")
-        print("📸 VISION OCR + ⚡ FLASH-LITE FORMATTING")
-        print("=" * 50)
+        logger.info('Processing %s (Vision OCR + Flash-Lite)', image_filename)
 
         try:
             # Step 1: Extract raw text using Vision API OCR (₹0.12)
-            print("📸 Step 1: Vision API OCR text extraction...")
-            vision_result = self.vision_extractor.extract_text_from_image(image_data)
+            logger.debug('Step 1: Vision API OCR text extraction...')
+            with time_stage("ocr"):
+                vision_result = self.vision_extractor.extract_text_from_image(image_data)
 
             if not vision_result['success']:
                 error_msg = vision_result.get('error', 'Vision API extraction failed')
-                print(f"❌ Vision OCR failed: {error_msg}")
+                logger.error('Vision OCR failed: %s', error_msg)
                 return self._create_error_response(error_msg, image_filename)
 
             extracted_text = vision_result['extracted_text']
             vision_confidence = vision_result['confidence']
 
-            print(f"✅ Vision OCR: {len(extracted_text)} characters extracted")
-            print(f"📊 Vision confidence: {vision_confidence:.1%}")
+            logger.info('Vision OCR: %d characters extracted (confidence %.1f%%)',
+                        len(extracted_text), vision_confidence * 100)
 
             # Step 2: Format text to JSON using Flash-Lite (₹0.01)
-            print("⚡ Step 2: Flash-Lite JSON formatting...")
+            logger.debug('Step 2: Flash-Lite JSON formatting...')
             formatted_result = self.flash_lite_formatter.format_text_to_json(extracted_text)
 
             if formatted_result.get('error'):
                 error_msg = f"Flash-Lite formatting failed: {formatted_result.get('error_message', 'Unknown error')}"
-                print(f"❌ {error_msg}")
+                logger.error(error_msg)
                 return self._create_error_response(error_msg, image_filename, extracted_text)
 
             # Step 3: Combine results and add metadata
@@ -97,37 +100,32 @@ class VisionOCR_FlashLite_Extractor:
             overall_confidence = self._calculate_overall_confidence(formatted_result, vision_confidence)
             quality_grade = self._get_quality_grade(overall_confidence)
 
-            print("=" * 50)
-            print("📊 EXTRACTION QUALITY REPORT")
-            print("=" * 50)
-            print(f"🎯 Overall Confidence: {overall_confidence:.1%}")
-            print(f"🏅 Quality Grade: {quality_grade}")
-            print(f"⚡ Processing Time: {processing_time:.1f} seconds")
-            print(f"💰 Total Cost: ₹0.13")
-
-            # Count extracted fields
+            # One structured quality-report line (LOG_FORMAT=json keeps the fields)
             field_count = self._count_extracted_fields(formatted_result)
-            print(f"📋 Total fields extracted: {field_count}")
-
-            # Count line items
             line_items = formatted_result.get('line_items', [])
-            print(f"📊 Line items extracted: {len(line_items)}")
-            print()
-
-            # Create summary
             vendor_name = formatted_result.get('vendor_name', 'Unknown')
             total_amount = formatted_result.get('total_amount', 0)
             currency = formatted_result.get('currency', 'INR')
 
-            print(f"✅ Extracted: {vendor_name} - {currency} {total_amount:,.2f}")
-            print("=" * 50)
+            logger.info(
+                'Extracted: %s - %s %.2f | confidence %.1f%% (%s), %d fields, %d line items, %.1fs',
+                vendor_name, currency, total_amount, overall_confidence * 100, quality_grade,
+                field_count, len(line_items), processing_time,
+                extra={
+                    'overall_confidence': round(overall_confidence, 4),
+                    'quality_grade': quality_grade,
+                    'field_count': field_count,
+                    'line_item_count': len(line_items),
+                    'processing_seconds': round(processing_time, 3),
+                },
+            )
 
             return formatted_result
 
         except Exception as e:
             processing_time = time.time() - start_time
             error_msg = f"Vision OCR + Flash-Lite extraction error: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(error_msg)
             return self._create_error_response(error_msg, image_filename, processing_time=processing_time)
 
     def _calculate_overall_confidence(self, formatted_data: Dict[str, Any], vision_confidence: float) -> float:
@@ -0,0 +1,566 @@
+"""
+📬 WEBHOOK INBOX - Store-then-process Razorpay webhooks
+Used by POST /api/payments/webhook and scripts/replay_webhooks.py
+
+The endpoint only verifies the signature over the raw body and inserts the
+event into webhook_logs (status 'pending', ON CONFLICT (event_id) DO
+NOTHING), so it answers Razorpay in a few ms and a redelivery is a no-op.
+
+WebhookConsumer applies stored events in the background:
+- each event is stored with an ordering_key (subscription, else order /
+  payment id); a worker claims an event (pending -> processing) with a
+  conditional UPDATE that only matches if every earlier event for the key
+  is processed (or dead), so events for one subscription are applied one
+  at a time in arrival order across all gunicorn workers, and a pending or
+  failed event holds back the ones after it
+- a failed event is retried automatically with exponential backoff
+  (next_attempt_at); after max_attempts it is marked 'dead' and stops
+  holding back its key. A sweeper thread re-queues due retries and warns
+  about keys that stay held back
+- the worker that finishes an event goes on to claim the next pending
+  event for its key; different keys run in parallel on the worker threads
+- on Postgres, store and claim take pg_advisory_xact_lock on the key, so
+  an event can't be claimed while an earlier one is still being inserted
+- RazorpayService.process_webhook_event records processed / failed; a
+  crash is recorded as failed here
+- recover() re-queues pending events and stale claims (startup) and starts
+  the retry sweeper
+- replay() re-applies stored events in arrival order (failed ones by
+  default), synchronously
+"""
+
+import hashlib
+import json
+import logging
+import queue
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# (entity, field) pairs that identify what an event is about, most specific first
+_ORDERING_FIELDS = (
+    ("subscription", "id"),
+    ("payment", "subscription_id"),
+    ("invoice", "subscription_id"),
+    ("payment", "order_id"),
+    ("order", "id"),
+    ("payment", "id"),
+)
+
+
+def webhook_event_id(event: Dict[str, Any], raw_body: bytes, header_event_id: Optional[str] = None) -> str:
+    """
+    Idempotency key: X-Razorpay-Event-Id (the same on every redelivery),
+    then the payload's id, then a hash of the body
+    """
+    if header_event_id:
+        return header_event_id
+    if event.get("id"):
+        return str(event["id"])
+    return "body_" + hashlib.sha256(raw_body).hexdigest()
+
+
+def ordering_key(event: Dict[str, Any]) -> str:
+    """Id whose events must be applied in order (subscription, else order / payment)"""
+    payload = event.get("payload") or {}
+    for entity_name, field in _ORDERING_FIELDS:
+        entity = (payload.get(entity_name) or {}).get("entity") or {}
+        if entity.get(field):
+            return str(entity[field])
+    return ""
+
+
+def _subscription_and_user(event: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    payload = event.get("payload") or {}
+    subscription = (payload.get("subscription") or {}).get("entity") or {}
+    payment = (payload.get("payment") or {}).get("entity") or {}
+    subscription_id = subscription.get("id") or payment.get("subscription_id")
+    notes = subscription.get("notes") or payment.get("notes") or {}
+    user_id = notes.get("user_id") if isinstance(notes, dict) else None
+    return subscription_id, user_id
+
+
+def _lock_key(db, key: Optional[str]) -> None:
+    """Postgres: serialize store / claim for one ordering key until the transaction commits"""
+    if key and db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": key})
+
+
+def store_event(db, event_id: str, event: Dict[str, Any], raw_body: bytes, signature: str) -> bool:
+    """
+    Insert a verified event as pending
+
+    Returns:
+        False if the event was already stored (redelivery)
+    """
+    subscription_id, user_id = _subscription_and_user(event)
+    key = ordering_key(event) or None
+    _lock_key(db, key)
+    result = db.execute(
+        text("""
+            INSERT INTO webhook_logs (
+                event_id, event_type, subscription_id, user_id, ordering_key,
+                payload, signature, status, attempt_count
+            ) VALUES (
+                :event_id, :event_type, :subscription_id, :user_id, :ordering_key,
+                :payload, :signature, 'pending', 0
+            )
+            ON CONFLICT (event_id) DO NOTHING
+        """),
+        {
+            "event_id": event_id,
+            "event_type": event.get("event") or "unknown",
+            "subscription_id": subscription_id,
+            "user_id": user_id,
+            "ordering_key": key,
+            "payload": raw_body.decode("utf-8"),
+            "signature": signature,
+        }
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def claim_event(db, event_id: str) -> Optional[Tuple[Dict[str, Any], str, Optional[str]]]:
+    """
+    pending -> processing, only once every earlier event with the same
+    ordering key is processed
+
+    Returns:
+        (event, signature, ordering key), or None if someone else has it,
+        it's done or an earlier event for its key is pending / failed
+    """
+    row = db.execute(
+        text("SELECT ordering_key FROM webhook_logs WHERE event_id = :event_id"),
+        {"event_id": event_id}
+    ).fetchone()
+    if row is None:
+        db.rollback()
+        return None
+    key = row[0]
+    _lock_key(db, key)
+    result = db.execute(
+        text("""
+            UPDATE webhook_logs
+            SET status = 'processing', updated_at = CURRENT_TIMESTAMP
+            WHERE event_id = :event_id AND status = 'pending'
+              AND NOT EXISTS (
+                  SELECT 1 FROM webhook_logs earlier
+                  WHERE earlier.ordering_key = webhook_logs.ordering_key
+                    AND earlier.id < webhook_logs.id
+                    AND earlier.status NOT IN ('processed', 'dead')
+              )
+        """),
+        {"event_id": event_id}
+    )
+    db.commit()
+    if result.rowcount != 1:
+        return None
+    row = db.execute(
+        text("SELECT payload, signature FROM webhook_logs WHERE event_id = :event_id"),
+        {"event_id": event_id}
+    ).fetchone()
+    payload = row[0]
+    # jsonb comes back decoded from Postgres, as text elsewhere
+    return (json.loads(payload) if isinstance(payload, str) else payload), row[1], key
+
+
+def next_pending_event(db, key: str) -> Optional[str]:
+    """Oldest pending event for an ordering key"""
+    row = db.execute(
+        text("""
+            SELECT event_id FROM webhook_logs
+            WHERE ordering_key = :key AND status = 'pending'
+            ORDER BY id
+            LIMIT 1
+        """),
+        {"key": key}
+    ).fetchone()
+    return row[0] if row else None
+
+
+def finish_event(db, event_id: str, success: bool, message: str) -> str:
+    """
+    Record the outcome if the processor didn't (it logs its own processed /
+    failed status); returns the event's final status
+    """
+    db.execute(
+        text("""
+            UPDATE webhook_logs
+            SET status = :status,
+                attempt_count = attempt_count + 1,
+                last_attempt_at = CURRENT_TIMESTAMP,
+                error_message = :error,
+                processed_at = CASE WHEN :status = 'processed' THEN CURRENT_TIMESTAMP ELSE processed_at END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE event_id = :event_id AND status = 'processing'
+        """),
+        {"event_id": event_id, "status": "processed" if success else "failed",
+         "error": None if success else message}
+    )
+    db.commit()
+    row = db.execute(
+        text("SELECT status FROM webhook_logs WHERE event_id = :event_id"),
+        {"event_id": event_id}
+    ).fetchone()
+    return row[0] if row else "missing"
+
+
+def schedule_retry(db, event_id: str, max_attempts: int, base_delay: float) -> str:
+    """
+    failed -> retry at now + base_delay * 2^(attempts - 1), or 'dead' once
+    max_attempts is reached; returns the event's status
+    """
+    row = db.execute(
+        text("SELECT attempt_count FROM webhook_logs WHERE event_id = :event_id AND status = 'failed'"),
+        {"event_id": event_id}
+    ).fetchone()
+    if row is None:
+        db.rollback()
+        return "missing"
+    attempts = row[0] or 0
+    if attempts >= max_attempts:
+        db.execute(
+            text("""
+                UPDATE webhook_logs
+                SET status = 'dead', next_attempt_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE event_id = :event_id AND status = 'failed'
+            """),
+            {"event_id": event_id}
+        )
+        db.commit()
+        return "dead"
+    db.execute(
+        text("""
+            UPDATE webhook_logs
+            SET next_attempt_at = :next_attempt_at, updated_at = CURRENT_TIMESTAMP
+            WHERE event_id = :event_id AND status = 'failed'
+        """),
+        {"event_id": event_id,
+         "next_attempt_at": datetime.utcnow() + timedelta(seconds=base_delay * 2 ** max(attempts - 1, 0))}
+    )
+    db.commit()
+    return "failed"
+
+
+def _default_session_factory():
+    from app.core.database import SessionLocal
+    return SessionLocal()
+
+
+def _default_processor(event: Dict[str, Any], db, signature: str, event_id: str) -> Tuple[bool, str]:
+    from app.services.razorpay_service import razorpay_service
+    return razorpay_service.process_webhook_event(event, db, signature, event_id)
+
+
+class WebhookConsumer:
+    """
+    Usage:
+        stored = store_event(db, event_id, event, raw_body, signature)
+        if stored:
+            webhook_consumer.submit(event_id, ordering_key(event))
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Any]] = None,
+        processor: Optional[Callable[..., Tuple[bool, str]]] = None,
+        workers: int = 4,
+        stale_after: float = 300.0,
+        max_attempts: int = 5,
+        retry_base_delay: float = 60.0,
+        sweep_interval: float = 30.0,
+        blocked_after: float = 3600.0,
+    ):
+        self.session_factory = session_factory or _default_session_factory
+        self.processor = processor or _default_processor
+        self.workers = workers
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.sweep_interval = sweep_interval
+        self.blocked_after = blocked_after
+
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        self._sweeper: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.processed = 0
+        self.failed = 0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def submit(self, event_id: str, key: str = "") -> None:
+        """
+        Queue a stored event; events with the same key share a worker
+        thread (the database decides whether it can run yet)
+        """
+        self._start()
+        shard = zlib.crc32((key or event_id).encode("utf-8")) % self.workers
+        self._queues[shard].put(event_id)
+
+    def recover(self, limit: int = 1000) -> int:
+        """
+        Re-queue pending events and claims older than stale_after (left by
+        a crash), and start the workers so failed events get retried
+        """
+        self._start()
+        db = self.session_factory()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+            db.execute(
+                text("""
+                    UPDATE webhook_logs SET status = 'pending'
+                    WHERE status = 'processing' AND updated_at < :cutoff
+                """),
+                {"cutoff": cutoff}
+            )
+            db.commit()
+            rows = db.execute(
+                text("""
+                    SELECT event_id, payload FROM webhook_logs
+                    WHERE status = 'pending'
+                    ORDER BY id
+                    LIMIT :limit
+                """),
+                {"limit": limit}
+            ).fetchall()
+        finally:
+            db.close()
+
+        for event_id, payload in rows:
+            event = json.loads(payload) if isinstance(payload, str) else payload
+            self.submit(event_id, ordering_key(event or {}))
+        if rows:
+            logger.info("Re-queued %d stored webhook events", len(rows))
+        return len(rows)
+
+    def retry_due(self, limit: int = 100) -> int:
+        """
+        Re-queue failed events whose backoff has elapsed and warn about keys
+        held back longer than blocked_after; returns the events re-queued
+        """
+        now = datetime.utcnow()
+        requeued: List[Tuple[str, Optional[str]]] = []
+        db = self.session_factory()
+        try:
+            due = db.execute(
+                text("""
+                    SELECT event_id, ordering_key FROM webhook_logs
+                    WHERE status = 'failed' AND next_attempt_at <= :now
+                    ORDER BY id
+                    LIMIT :limit
+                """),
+                {"now": now, "limit": limit}
+            ).fetchall()
+            for event_id, key in due:
+                result = db.execute(
+                    text("""
+                        UPDATE webhook_logs SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                        WHERE event_id = :event_id AND status = 'failed'
+                    """),
+                    {"event_id": event_id}
+                )
+                if result.rowcount == 1:
+                    requeued.append((event_id, key))
+            db.commit()
+            blocked = db.execute(
+                text("""
+                    SELECT ordering_key, COUNT(*), MIN(created_at) FROM webhook_logs
+                    WHERE status IN ('pending', 'failed') AND ordering_key IS NOT NULL
+                      AND created_at < :cutoff
+                    GROUP BY ordering_key
+                """),
+                {"cutoff": now - timedelta(seconds=self.blocked_after)}
+            ).fetchall()
+        finally:
+            db.close()
+
+        for key, count, since in blocked:
+            logger.warning("Webhooks for %s held back: %d events unapplied since %s", key, count, since)
+        for event_id, key in requeued:
+            self.submit(event_id, key or "")
+        return len(requeued)
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            queues = [queue.Queue() for _ in range(self.workers)]
+            threads = [
+                threading.Thread(target=self._run, args=(q,), name=f"webhook-consumer-{i}", daemon=True)
+                for i, q in enumerate(queues)
+            ]
+            self._queues = queues
+            for thread in threads:
+                thread.start()
+            self._stopping.clear()
+            self._sweeper = threading.Thread(target=self._sweep, name="webhook-retry-sweeper", daemon=True)
+            self._sweeper.start()
+            self._threads = threads
+
+    def _sweep(self) -> None:
+        while not self._stopping.wait(self.sweep_interval):
+            try:
+                self.retry_due()
+            except Exception:
+                logger.exception("Webhook retry sweep failed")
+
+    def _run(self, events: queue.Queue) -> None:
+        while True:
+            event_id = events.get()
+            try:
+                if event_id is None:
+                    return
+                self.process(event_id)
+            except Exception:
+                logger.exception("Webhook consumer error for %s", event_id)
+            finally:
+                events.task_done()
+
+    def process(self, event_id: str) -> Optional[str]:
+        """
+        Claim and apply one stored event, then the events for its key that
+        were held back behind it; returns the event's final status, None if
+        not claimed
+        """
+        return self._apply_in_order(event_id)[event_id]
+
+    def _apply_in_order(self, event_id: str) -> Dict[str, Optional[str]]:
+        """{event_id: final status} for the event and each follower applied after it"""
+        status, key = self._apply(event_id)
+        applied = {event_id: status}
+        # A dead event no longer holds its key back either
+        while status in ("processed", "dead") and key:
+            db = self.session_factory()
+            try:
+                event_id = next_pending_event(db, key)
+            finally:
+                db.close()
+            if event_id is None:
+                break
+            status, _ = self._apply(event_id)
+            applied[event_id] = status
+        return applied
+
+    def _apply(self, event_id: str) -> Tuple[Optional[str], Optional[str]]:
+        db = self.session_factory()
+        try:
+            claimed = claim_event(db, event_id)
+            if claimed is None:
+                return None, None
+            event, signature, key = claimed
+            try:
+                success, message = self.processor(event, db, signature, event_id)
+            except Exception as e:
+                db.rollback()
+                success, message = False, str(e)
+                logger.exception("Webhook %s failed", event_id)
+            status = finish_event(db, event_id, success, message)
+            if status == "failed":
+                status = schedule_retry(db, event_id, self.max_attempts, self.retry_base_delay)
+                if status == "dead":
+                    logger.error("Webhook %s dead-lettered after %d attempts; later events for %s are released",
+                                 event_id, self.max_attempts, key)
+        finally:
+            db.close()
+
+        if status == "processed":
+            self.processed += 1
+        else:
+            self.failed += 1
+            logger.warning("Webhook %s %s: %s", event_id, status, message)
+        return status, key
+
+    def replay(
+        self,
+        event_ids: Optional[List[str]] = None,
+        status: str = "failed",
+        since: Optional[datetime] = None,
+        limit: int = 100,
+        dry_run: bool = False,
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        Re-apply stored events in arrival order, in the calling thread
+
+        Args:
+            event_ids: Specific events (any status); otherwise every event
+                with the given status, optionally received after since
+            dry_run: Only list what would be replayed
+
+        Returns:
+            [(event_id, final status or None if not run)]
+        """
+        db = self.session_factory()
+        try:
+            if event_ids:
+                params: Dict[str, Any] = {f"id{i}": event_id for i, event_id in enumerate(event_ids)}
+                where = "event_id IN (" + ", ".join(f":{name}" for name in params) + ")"
+            else:
+                params = {"status": status}
+                where = "status = :status"
+                if since is not None:
+                    params["since"] = since
+                    where += " AND created_at >= :since"
+            params["limit"] = limit
+            selected = [row[0] for row in db.execute(
+                text(f"SELECT event_id FROM webhook_logs WHERE {where} ORDER BY id LIMIT :limit"), params
+            ).fetchall()]
+            if dry_run or not selected:
+                return [(event_id, None) for event_id in selected]
+
+            for event_id in selected:
+                db.execute(
+                    text("""
+                        UPDATE webhook_logs SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                        WHERE event_id = :event_id AND status <> 'processing'
+                    """),
+                    {"event_id": event_id}
+                )
+            db.commit()
+        finally:
+            db.close()
+
+        results: Dict[str, Optional[str]] = {}
+        for event_id in selected:
+            if results.get(event_id) is None:
+                results.update(self._apply_in_order(event_id))
+        return [(event_id, results.get(event_id)) for event_id in selected]
+
+    def join(self) -> None:
+        """Block until every queued event has been handled"""
+        for events in list(self._queues):
+            events.join()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Finish queued events and stop the workers (FastAPI shutdown)"""
+        with self._lock:
+            threads, queues = self._threads, self._queues
+            self._threads, self._queues = [], []
+            sweeper, self._sweeper = self._sweeper, None
+        self._stopping.set()
+        if sweeper is not None:
+            sweeper.join(timeout)
+        for events in queues:
+            events.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+
+# Global instance
+webhook_consumer = WebhookConsumer()
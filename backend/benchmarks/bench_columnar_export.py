@@ -0,0 +1,112 @@
+"""
+📊 BENCHMARK: columnar (Parquet / Arrow IPC) vs. xlsx export
+Run from backend/: python -m benchmarks.bench_columnar_export
+
+For the same synthetic invoices (3 line items each) measures write time,
+file size and full read time of:
+
+- export_invoices (flat xlsx, app/services/excel_exporter.py)
+- AccountantExcelExporter.export_invoices_bulk, "accountant" template
+- ColumnarExporter, parquet and arrow
+
+xlsx files are read back with openpyxl in read-only mode, the columnar
+zips with pyarrow.
+"""
+
+import io
+import os
+import tempfile
+import time
+import zipfile
+
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from app.services.accountant_excel_exporter import AccountantExcelExporter
+from app.services.columnar_exporter import ColumnarExporter
+from app.services.excel_exporter import export_invoices
+
+SIZES = (1_000, 5_000)
+VENDORS = ("Penny Bazar", "Reliance Fresh", "DMart", "Big Bazaar", "Star Bazaar")
+STATES = ("Maharashtra", "Karnataka", "Gujarat")
+
+
+def make_invoices(count: int):
+    invoices = []
+    for i in range(count):
+        subtotal = 100.0 + (i % 900) + 0.5
+        invoices.append({
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "invoice_number": f"INV/2025/{i:06d}",
+            "invoice_date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "vendor_name": VENDORS[i % len(VENDORS)],
+            "vendor_gstin": "27AAPFU0939F1ZV",
+            "vendor_state": STATES[i % len(STATES)],
+            "subtotal": subtotal,
+            "cgst": round(subtotal * 0.09, 2),
+            "sgst": round(subtotal * 0.09, 2),
+            "igst": 0.0,
+            "total_amount": round(subtotal * 1.18, 2),
+            "payment_status": "paid" if i % 3 else "unpaid",
+            "currency": "INR",
+            "created_at": "2025-10-01T10:00:00+00:00",
+            "line_items": [
+                {"description": f"Item {j}", "hsn_code": "0713", "quantity": j + 1, "rate": 10.5 * (j + 1),
+                 "amount": 10.5 * (j + 1) ** 2}
+                for j in range(3)
+            ],
+            "raw_extracted_data": {"place_of_supply": STATES[i % len(STATES)], "irn": f"irn{i}"},
+        })
+    return invoices
+
+
+def read_xlsx(path: str) -> int:
+    cells = 0
+    workbook = load_workbook(path, read_only=True)
+    for sheet in workbook.worksheets:
+        for row in sheet.iter_rows(values_only=True):
+            cells += len(row)
+    workbook.close()
+    return cells
+
+
+def read_columnar(path: str) -> int:
+    rows = 0
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            data = archive.read(name)
+            table = pq.read_table(io.BytesIO(data)) if name.endswith(".parquet") else ipc.open_stream(data).read_all()
+            rows += table.num_rows
+    return rows
+
+
+def measure(label: str, write, read, path: str) -> None:
+    start = time.perf_counter()
+    write(path)
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    read(path)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} write {written:>7.2f}s   size {os.path.getsize(path) / 1024:>8.0f} KiB   "
+          f"read {elapsed:>7.3f}s")
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            invoices = make_invoices(size)
+            print(f"{size} invoices")
+            measure("xlsx (flat)", lambda p: export_invoices(invoices, p), read_xlsx,
+                    os.path.join(tmp, f"flat_{size}.xlsx"))
+            measure("xlsx (accountant)",
+                    lambda p: AccountantExcelExporter().export_invoices_bulk(invoices, p, template="accountant"),
+                    read_xlsx, os.path.join(tmp, f"accountant_{size}.xlsx"))
+            measure("parquet", lambda p: ColumnarExporter("parquet").export(invoices, p), read_columnar,
+                    os.path.join(tmp, f"parquet_{size}.zip"))
+            measure("arrow ipc", lambda p: ColumnarExporter("arrow").export(invoices, p), read_columnar,
+                    os.path.join(tmp, f"arrow_{size}.zip"))
+
+
+if __name__ == "__main__":
+    main()
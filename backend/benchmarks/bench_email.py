@@ -0,0 +1,97 @@
+"""
+📊 BENCHMARK: email delivery, connection per message vs. pooled MailQueue
+Run from backend/: python -m benchmarks.bench_email   (needs aiosmtpd)
+
+A local aiosmtpd server stands in for the SMTP relay. Its EHLO handler
+sleeps HANDSHAKE_MS to stand in for the network round trips and TLS
+negotiation a real relay costs on every new connection.
+
+"before" is the old EmailService.send_email: connect, EHLO, send, QUIT for
+each message, in the caller. "after" queues on MailQueue (SMTP_POOL_SIZE
+pooled connections, batched sends); caller latency is the time submit()
+takes, throughput is until the queue drains.
+"""
+
+import asyncio
+import smtplib
+import socket
+import statistics
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.services.email import build_message
+from app.services.mail_queue import MailQueue, SMTPConnectionPool
+
+MESSAGES = 200
+HANDSHAKE_MS = 20
+POOL_SIZE = 2
+
+
+class Relay:
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(HANDSHAKE_MS / 1000)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        return "250 Message accepted"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def before(port: int, messages) -> tuple:
+    latencies = []
+    start = time.perf_counter()
+    for message in messages:
+        sent = time.perf_counter()
+        with smtplib.SMTP("127.0.0.1", port) as smtp:
+            smtp.ehlo()
+            smtp.send_message(message)
+        latencies.append(time.perf_counter() - sent)
+    return latencies, time.perf_counter() - start
+
+
+def after(port: int, messages) -> tuple:
+    mail = MailQueue(
+        pool_factory=lambda: SMTPConnectionPool("127.0.0.1", port, starttls=False, size=POOL_SIZE),
+        workers=POOL_SIZE,
+    )
+    latencies = []
+    start = time.perf_counter()
+    for message in messages:
+        sent = time.perf_counter()
+        mail.submit(message)
+        latencies.append(time.perf_counter() - sent)
+    mail.join()
+    elapsed = time.perf_counter() - start
+    mail.stop()
+    return latencies, elapsed
+
+
+def main() -> None:
+    controller = Controller(Relay(), hostname="127.0.0.1", port=free_port())
+    controller.start()
+    try:
+        messages = [build_message(f"user{i}@example.com", "Renewal reminder", "<p>renews soon</p>", "renews soon")
+                    for i in range(MESSAGES)]
+        results = {
+            "before": before(controller.port, messages),
+            "after": after(controller.port, messages),
+        }
+    finally:
+        controller.stop()
+
+    print(f"{MESSAGES} messages, {HANDSHAKE_MS} ms handshake, pool of {POOL_SIZE}")
+    print(f"{'sender':<8} {'caller p50 ms':>14} {'caller max ms':>14} {'messages/s':>11}")
+    for name, (latencies, elapsed) in results.items():
+        print(f"{name:<8} {statistics.median(latencies) * 1000:>14.3f} {max(latencies) * 1000:>14.3f} "
+              f"{MESSAGES / elapsed:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
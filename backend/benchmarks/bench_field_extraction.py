@@ -0,0 +1,80 @@
+"""
+📊 BENCHMARK: OCR field extraction vs. input size
+Run from backend/: python -m benchmarks.bench_field_extraction
+
+Measures FlashLiteFormatter's regex heuristics (direct extraction + field
+enhancement) on synthetic consolidated-bill OCR dumps from 3k to 100k chars,
+and compares the sub-bill header scan against the plain finditer it replaces.
+"""
+
+import re
+import time
+
+from app.services.flash_lite_formatter import FlashLiteFormatter
+from app.services.ocr_field_engine import (
+    BILL_HEADER_PATTERN,
+    CANDIDATE_PATTERNS,
+    analyze,
+    iter_bill_headers,
+)
+
+SIZES = (3_000, 10_000, 30_000, 100_000)
+REPEAT = 5
+
+SAMPLE_BILL = """PENNY BIG BAZAR / BREIN Bill No: OCT25-4761 Dated: 25-Oct-25 GSTIN:01AEAPJ0354G1ZB
+Item Name Quantity Case QuantityRate Amount
+10X CLASSIC CHAKKI FRESH ATTA 5KG 1 6 1255.00 1255.00
+10X CLASSIC CHAKKI FRESH ATTA 10KG 1 3 1240.00 1240.00
+Contact: accounts@pennybazar.in +91 9876543210 PAN AEAPJ0354G
+2495.00
+0.00
+2,495.00 Total :Discount(-) :Bill Total :
+"""
+HEADER = "AL UMAIR TRADING AND MARKETING\nFIRDOUS ABAD BATAMALOO\nList Of Bills With Detail\n"
+
+
+def make_document(size: int) -> str:
+    body = SAMPLE_BILL * (size // len(SAMPLE_BILL) + 1)
+    return (HEADER + body)[:size]
+
+
+def timed(fn, repeat: int = REPEAT) -> float:
+    """Best-of-N wall time in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        analyze.cache_clear()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    formatter = FlashLiteFormatter.__new__(FlashLiteFormatter)  # no model needed for heuristics
+    combined = re.compile("|".join(
+        f"(?P<{label}>{pattern.pattern})" if not pattern.flags & re.IGNORECASE
+        else f"(?P<{label}>(?i:{pattern.pattern}))"
+        for label, pattern in CANDIDATE_PATTERNS.items()
+    ))
+
+    print(f"{'chars':>8} {'extract ms':>11} {'ms/10k':>8} {'headers ms':>11} {'finditer ms':>12} "
+          f"{'sep. scans ms':>14} {'alternation ms':>15}")
+    for size in SIZES:
+        text = make_document(size)
+
+        def extract():
+            result = formatter._direct_ocr_extraction(text)
+            formatter._enhance_critical_fields(result, text)
+
+        extract_ms = timed(extract)
+        headers_ms = timed(lambda: list(iter_bill_headers(text)))
+        finditer_ms = timed(lambda: list(BILL_HEADER_PATTERN.finditer(text)), repeat=1)
+        separate_ms = timed(lambda: [p.findall(text) for p in CANDIDATE_PATTERNS.values()])
+        combined_ms = timed(lambda: list(combined.finditer(text)))
+
+        print(f"{size:>8} {extract_ms:>11.2f} {extract_ms / size * 10_000:>8.2f} {headers_ms:>11.2f} "
+              f"{finditer_ms:>12.2f} {separate_ms:>14.2f} {combined_ms:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+📊 BENCHMARK: request throughput vs. log level and log pipeline
+Run from backend/: python -m benchmarks.bench_logging
+
+Serves a route that runs FlashLiteFormatter's direct OCR extraction (the
+chattiest hot path) behind RequestIdMiddleware and measures requests/sec:
+
+- queue pipeline at INFO and at WARNING (records dropped before formatting)
+- a plain synchronous StreamHandler at INFO, i.e. writing in the request path
+
+All output goes to os.devnull, so the numbers show logging overhead rather
+than terminal speed.
+"""
+
+import logging
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.logging_config import TEXT_FORMAT, RequestIdFilter, configure_logging, shutdown_logging
+from app.middleware.request_id import RequestIdMiddleware
+from app.services.flash_lite_formatter import FlashLiteFormatter
+
+from benchmarks.bench_field_extraction import make_document
+
+REQUESTS = 300
+DOCUMENT_CHARS = 10_000
+
+
+def build_app() -> FastAPI:
+    formatter = FlashLiteFormatter.__new__(FlashLiteFormatter)  # no model needed for heuristics
+    text = make_document(DOCUMENT_CHARS)
+    app = FastAPI()
+
+    @app.get("/extract")
+    def extract():
+        result = formatter._direct_ocr_extraction(text)
+        return {"total_amount": result["total_amount"]}
+
+    app.add_middleware(RequestIdMiddleware)
+    return app
+
+
+def use_sync_handler(stream) -> None:
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def measure(client: TestClient) -> float:
+    client.get("/extract")  # warm-up
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get("/extract")
+    return REQUESTS / (time.perf_counter() - start)
+
+
+def main():
+    client = TestClient(build_app())
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        setups = {
+            "queue, WARNING": lambda: configure_logging(level="WARNING", module_levels="", stream=devnull),
+            "queue, INFO": lambda: configure_logging(level="INFO", module_levels="", stream=devnull),
+            "queue, INFO, json": lambda: configure_logging(level="INFO", module_levels="", fmt="json", stream=devnull),
+            "sync handler, INFO": lambda: use_sync_handler(devnull),
+        }
+        results = {}
+        for label, setup in setups.items():
+            setup()
+            results[label] = measure(client)
+        shutdown_logging()
+
+    print(f"{REQUESTS} requests, {DOCUMENT_CHARS} char document")
+    print(f"{'pipeline':<22} {'req/s':>8}")
+    for label, rps in results.items():
+        print(f"{label:<22} {rps:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+📊 BENCHMARK: /health requests/sec, BaseHTTPMiddleware stack vs. SecurityMiddleware
+Run from backend/: python -m benchmarks.bench_middleware
+
+"before" rebuilds the layers SecurityMiddleware replaced, doing the same
+work the same way: RequestValidationMiddleware and SecurityHeadersMiddleware
+as BaseHTTPMiddleware subclasses plus rate_limit_middleware registered with
+app.middleware("http"). "after" is the single pure ASGI SecurityMiddleware.
+Both sit behind RequestIdMiddleware, as in app/main.py.
+
+Requests are driven straight through the ASGI app (no sockets, no HTTP
+client), sequentially and CONCURRENCY at a time, so the numbers are
+framework + middleware cost only.
+"""
+
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from app.api import health
+from app.middleware.rate_limiter import RATE_LIMIT_SKIP_PATHS
+from app.middleware.request_id import RequestIdMiddleware
+from app.middleware.security_headers import SECURITY_HEADERS, SecurityMiddleware
+
+REQUESTS = 5_000
+CONCURRENCY = 50
+
+
+class LegacyRequestValidation(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if request.method in ["POST", "PUT", "PATCH"]:
+            content_type = request.headers.get("content-type", "")
+            allowed_types = ["application/json", "multipart/form-data", "application/x-www-form-urlencoded"]
+            if content_type and not any(t in content_type for t in allowed_types):
+                return Response(status_code=415)
+        try:
+            if int(request.headers.get("content-length", "0")) > 10 * 1024 * 1024:
+                return Response(status_code=413)
+        except ValueError:
+            pass
+        request.headers.get("user-agent", "").lower()
+        return await call_next(request)
+
+
+class LegacySecurityHeaders(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS:
+            response.headers[name.decode()] = value.decode()
+        return response
+
+
+async def legacy_rate_limit(request: Request, call_next):
+    if any(request.url.path.startswith(path) for path in RATE_LIMIT_SKIP_PATHS):
+        return await call_next(request)
+    getattr(request.state, "user_id", None)
+    return await call_next(request)
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+    app.include_router(health.router)
+    if stack == "before":
+        app.middleware("http")(legacy_rate_limit)
+        app.add_middleware(LegacyRequestValidation)
+        app.add_middleware(LegacySecurityHeaders)
+    else:
+        app.add_middleware(SecurityMiddleware)
+    app.add_middleware(RequestIdMiddleware)
+    return app
+
+
+async def request(app, path: str = "/health") -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 8000),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app) -> tuple:
+    assert await request(app) == 200
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await request(app)
+    sequential = REQUESTS / (time.perf_counter() - start)
+
+    async def worker():
+        for _ in range(REQUESTS // CONCURRENCY):
+            await request(app)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    concurrent = REQUESTS / (time.perf_counter() - start)
+    return sequential, concurrent
+
+
+def main() -> None:
+    results = {stack: asyncio.run(measure(build_app(stack))) for stack in ("before", "after")}
+    print(f"GET /health, {REQUESTS} requests")
+    print(f"{'stack':<8} {'sequential req/s':>18} {f'{CONCURRENCY} concurrent req/s':>22}")
+    for stack, (sequential, concurrent) in results.items():
+        print(f"{stack:<8} {sequential:>18.0f} {concurrent:>22.0f}")
+
+
+if __name__ == "__main__":
+    main()
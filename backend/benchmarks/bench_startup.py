@@ -0,0 +1,89 @@
+"""
+📊 BENCHMARK: import-time profile of app.main (python -X importtime)
+Run from backend/: python -m benchmarks.bench_startup [--top 25] [--runs 3]
+
+Imports app.main in a fresh interpreter RUNS times and reports the median
+total, the slowest top-level imports (cumulative time, as -X importtime
+reports them) and which heavy SDKs got loaded. The SDKs in LAZY_MODULES
+are imported on first use (or preloaded by gunicorn.conf.py), so none of
+them should show up here - a "LOADED" line means a module-level import
+crept back in.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = (
+    "google.generativeai",
+    "google.cloud.vision",
+    "PyPDF2",
+    "PIL.Image",
+    "openpyxl",
+    "supabase",
+    "redis",
+    "sentry_sdk",
+)
+
+PROBE = (
+    "import sys, app.main; "
+    "print('loaded:' + ','.join(m for m in {modules!r} if m in sys.modules))"
+)
+
+
+def profile_once() -> tuple:
+    """One fresh interpreter: (wall seconds, [(cumulative us, depth, module)], loaded lazy modules)"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    # Profile the default (no DSN) path, whatever the shell has set
+    env.pop("SENTRY_DSN", None)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(modules=LAZY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((int(cumulative_us), depth, name.strip()))
+    loaded = [m for m in result.stdout.strip().splitlines()[-1][len("loaded:"):].split(",") if m]
+    return wall, imports, loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=25, help="Slowest imports to list")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to time")
+    args = parser.parse_args()
+
+    runs = [profile_once() for _ in range(args.runs)]
+    walls = [wall for wall, _, _ in runs]
+    totals = [max(imports)[0] for _, imports, _ in runs]
+    # Report the module breakdown of the median run
+    median_run = sorted(runs, key=lambda run: max(run[1])[0])[len(runs) // 2]
+    _, imports, loaded = median_run
+
+    print(f"import app.main, {args.runs} fresh interpreters")
+    print(f"  import time (median)   {statistics.median(totals) / 1e6:6.3f}s")
+    print(f"  process wall (median)  {statistics.median(walls):6.3f}s")
+    print()
+    print(f"{'cumulative':>10}  module (imports up to two levels deep)")
+    shown = [(us, depth, name) for us, depth, name in imports if depth <= 2]
+    for us, depth, name in sorted(shown, reverse=True)[:args.top]:
+        print(f"{us / 1e6:>9.3f}s  {'  ' * depth}{name}")
+    print()
+    for module in LAZY_MODULES:
+        print(f"  {'LOADED' if module in loaded else 'lazy  '}  {module}")
+
+
+if __name__ == "__main__":
+    main()
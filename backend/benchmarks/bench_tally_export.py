@@ -0,0 +1,55 @@
+"""
+📊 BENCHMARK: Tally XML export time and peak memory vs. voucher count
+Run from backend/: python -m benchmarks.bench_tally_export
+
+Invoices are generated lazily and the XML goes to a temp file, so peak
+traced memory should stay flat as the voucher count grows.
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.services.tally_xml_exporter import TallyXMLExporter
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def make_invoices(count: int):
+    for i in range(count):
+        subtotal = 100.0 + (i % 500)
+        igst = i % 3 == 0
+        tax = round(subtotal * 0.18, 2)
+        yield {
+            "id": f"id-{i}",
+            "invoice_number": f"INV/2025/{i:06d}",
+            "invoice_date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "vendor_name": f"Vendor {i % 250}",
+            "vendor_gstin": "27AAPFU0939F1ZV",
+            "subtotal": subtotal,
+            "cgst": 0.0 if igst else tax / 2,
+            "sgst": 0.0 if igst else tax / 2,
+            "igst": tax if igst else 0.0,
+            "total_amount": round(subtotal + tax),
+        }
+
+
+def main() -> None:
+    print(f"{'vouchers':>10} {'seconds':>9} {'vouchers/s':>11} {'peak KiB':>9} {'file MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            path = os.path.join(tmp, f"tally_{size}.xml")
+            exporter = TallyXMLExporter()
+            tracemalloc.start()
+            start = time.perf_counter()
+            exporter.export(make_invoices(size), path)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{size:>10} {elapsed:>9.2f} {size / elapsed:>11.0f} {peak / 1024:>9.0f} "
+                  f"{os.path.getsize(path) / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+📊 BENCHMARK: upload ingestion, buffered vs. streamed
+Run from backend/: python -m benchmarks.bench_upload
+
+A multipart body arrives in 64KB pieces and is sent on to a storage
+endpoint that consumes the body as it streams (nothing retained).
+
+"before" is the old /upload: Starlette parses the whole form, the handler
+reads the file into bytes, opens it with PIL for the dimension check and
+hashes the bytes, and storage gets the bytes. "after" is MultipartFileStream
+-> IncomingFile -> StorageUpload. Peak is tracemalloc's peak for one upload,
+time the mean of 5 untraced runs.
+"""
+
+import asyncio
+import hashlib
+import io
+import time
+import tracemalloc
+
+import httpx
+from PIL import Image
+
+from app.services.upload_stream import IncomingFile, MultipartFileStream, StorageUpload, read_upload
+
+SIZES_MB = (1, 5, 9)
+PIECE = 64 * 1024
+BOUNDARY = "----bench-boundary"
+
+
+class DrainTransport(httpx.AsyncBaseTransport):
+    """Storage stand-in: reads the request body chunk by chunk and drops it"""
+
+    async def handle_async_request(self, request):
+        async for _ in request.stream:
+            pass
+        return httpx.Response(200, json={"Key": "bench"})
+
+
+class BenchRequest:
+    def __init__(self, body: bytes):
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        self._body = body
+
+    async def stream(self):
+        view = memoryview(self._body)
+        for start in range(0, len(view), PIECE):
+            yield bytes(view[start:start + PIECE])
+        yield b""
+
+
+def make_body(size_mb: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(buffer, "PNG")
+    content = buffer.getvalue() + b"\0" * (size_mb * 1024 * 1024 - len(buffer.getvalue()))
+    return (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="bill.png"\r\n'
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def before(body: bytes) -> None:
+    from starlette.datastructures import Headers
+    from starlette.formparsers import MultiPartParser
+
+    request = BenchRequest(body)
+    form = await MultiPartParser(Headers(request.headers), request.stream()).parse()
+    upload = form["file"]
+    content = await upload.read()
+    Image.open(io.BytesIO(content)).size
+    hashlib.sha256(content).hexdigest()
+    async with httpx.AsyncClient(transport=DrainTransport()) as client:
+        await client.post("http://storage/object", content=content)
+    await upload.close()
+
+
+async def after(body: bytes) -> None:
+    stream = MultipartFileStream(BenchRequest(body), "file")
+    await stream.open()
+    incoming = IncomingFile(stream.filename, stream.content_type, 10 * 1024 * 1024)
+    storage = StorageUpload("bench", "bill.png", stream.content_type, url="http://storage", key="k",
+                            transport=DrainTransport())
+    await read_upload(stream, incoming, storage, allowed_type="image/png")
+    incoming.dimensions()
+    incoming.sha256
+    await storage.finish()
+    incoming.close()
+
+
+def measure(ingest, body: bytes, runs: int = 5) -> tuple:
+    asyncio.run(ingest(body))  # warm up imports
+    start = time.perf_counter()
+    for _ in range(runs):
+        asyncio.run(ingest(body))
+    elapsed = (time.perf_counter() - start) / runs
+    # tracemalloc slows allocation down, so memory is measured on its own run
+    tracemalloc.start()
+    asyncio.run(ingest(body))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main() -> None:
+    print(f"{'file MB':>7} {'ingest':<7} {'peak MB':>8} {'ms':>8}")
+    for size_mb in SIZES_MB:
+        body = make_body(size_mb)
+        for name, ingest in (("before", before), ("after", after)):
+            peak, elapsed = measure(ingest, body)
+            print(f"{size_mb:>7} {name:<7} {peak / 1024 / 1024:>8.2f} {elapsed * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration - multi-worker alternative to the single uvicorn process
+
+Run from backend/:
+    gunicorn -c gunicorn.conf.py app.main:app
+
+WEB_CONCURRENCY   worker processes (default 2)
+PRELOAD_APP       "true" imports app.main and the heavy SDKs (app.core.preload)
+                  in the master before forking, so workers share them
+                  copy-on-write and start serving immediately
+PORT              listen port (default 8000)
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_APP", "false").lower() == "true"
+timeout = 120
+graceful_timeout = 30
+
+
+def when_ready(server):
+    """Master is up and the app is loaded - warm the lazy imports before workers fork"""
+    if preload_app:
+        from app.core.preload import preload_modules
+        timings = preload_modules()
+        server.log.info("Preloaded %d modules in %.2fs", len(timings), sum(timings.values()))
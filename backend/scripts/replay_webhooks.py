@@ -0,0 +1,63 @@
+"""
+Replay stored Razorpay webhook events
+Re-applies events from webhook_logs in arrival order
+
+Usage (from backend/):
+    python scripts/replay_webhooks.py                       # every failed event
+    python scripts/replay_webhooks.py --since 2025-10-01    # failed since a date
+    python scripts/replay_webhooks.py --event-id evt_1 evt_2
+    python scripts/replay_webhooks.py --status dead          # gave up after automatic retries
+    python scripts/replay_webhooks.py --status processed --dry-run
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.webhook_inbox import webhook_consumer
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay stored Razorpay webhook events")
+    parser.add_argument("--event-id", nargs="+", help="Replay these events whatever their status")
+    parser.add_argument("--status", default="failed", help="Replay events with this status (default: failed)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only events received at or after this time")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="List the events without replaying them")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🔁 REPLAY RAZORPAY WEBHOOKS" + (" (dry run)" if args.dry_run else ""))
+    print("=" * 70)
+
+    results = webhook_consumer.replay(
+        event_ids=args.event_id,
+        status=args.status,
+        since=args.since,
+        limit=args.limit,
+        dry_run=args.dry_run
+    )
+    if not results:
+        print("No matching events")
+        return 0
+
+    failed = 0
+    for event_id, status in results:
+        if status is None:
+            print(f"   {event_id}" + ("" if args.dry_run else " (skipped - already being processed)"))
+            continue
+        icon = "✅" if status == "processed" else "❌"
+        failed += status != "processed"
+        print(f"{icon} {event_id}: {status}")
+
+    print()
+    print(f"{len(results)} events, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Shared test doubles
+"""
+
+import operator
+from types import SimpleNamespace
+
+_COMPARISONS = {"eq": operator.eq, "lt": operator.lt, "gt": operator.gt, "lte": operator.le, "gte": operator.ge}
+
+
+def _compare(op, key, value):
+    """PostgREST comparison: NULL never matches"""
+    def check(row):
+        current = row.get(key)
+        if current is None:
+            return False
+        target = type(current)(value) if isinstance(current, (int, float)) else value
+        return _COMPARISONS[op](current, target)
+    return check
+
+
+def _split_terms(text):
+    """Split a PostgREST logical list on top-level commas (outside parens and quotes)"""
+    terms, depth, quoted, current = [], 0, False, ""
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quoted and ch == "\\":
+            current += text[i:i + 2]
+            i += 2
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            terms.append(current)
+            current = ""
+            i += 1
+            continue
+        current += ch
+        i += 1
+    terms.append(current)
+    return terms
+
+
+def _parse_logical(term):
+    if term.startswith("and(") and term.endswith(")"):
+        parts = [_parse_logical(t) for t in _split_terms(term[4:-1])]
+        return lambda row: all(p(row) for p in parts)
+    key, op, value = term.split(".", 2)
+    if op == "is":
+        return lambda row: row.get(key) is None
+    if value.startswith('"'):
+        value = value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return _compare(op, key, value)
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.filters, self.action = [], "select"
+        self.orders, self.limit_n, self.offset = [], None, 0
+        self.columns = None
+
+    def select(self, columns="*", **__):
+        if self.action == "select" and columns != "*":
+            self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def update(self, values):
+        self.action, self.payload = "update", values
+        return self
+
+    def insert(self, rows):
+        self.action = "insert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def eq(self, key, value):
+        self.filters.append(lambda row: row.get(key) == value)
+        return self
+
+    def is_(self, key, _):
+        self.filters.append(lambda row: row.get(key) is None)
+        return self
+
+    def lt(self, key, value):
+        self.filters.append(_compare("lt", key, value))
+        return self
+
+    def lte(self, key, value):
+        self.filters.append(_compare("lte", key, value))
+        return self
+
+    def gte(self, key, value):
+        self.filters.append(_compare("gte", key, value))
+        return self
+
+    def ilike(self, key, pattern):
+        needle = pattern.strip("%").lower()
+        self.filters.append(lambda row: needle in (row.get(key) or "").lower())
+        return self
+
+    def or_(self, expression):
+        terms = [_parse_logical(t) for t in _split_terms(expression)]
+        self.filters.append(lambda row: any(t(row) for t in terms))
+        return self
+
+    def in_(self, key, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(key) in values)
+        return self
+
+    def order(self, key, desc=False, nullsfirst=None):
+        # Postgres default: NULLs sort as if larger than any value
+        self.orders.append((key, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset, self.limit_n = start, end - start + 1
+        return self
+
+    def execute(self):
+        self.db.calls.append((self.action, self.table))
+        if self.action == "insert":
+            for row in self.payload:
+                row.setdefault("id", f"{self.table}-{len(self.db.tables.get(self.table, [])) + 1}")
+            self.db.tables.setdefault(self.table, []).extend(self.payload)
+            return SimpleNamespace(data=self.payload, count=len(self.payload))
+        rows = [row for row in self.db.tables[self.table] if all(f(row) for f in self.filters)]
+        total = len(rows)  # count="exact" ignores limit/range
+        for key, desc, nulls_first in reversed(self.orders):
+            values = sorted((row for row in rows if row.get(key) is not None), key=lambda row: row[key], reverse=desc)
+            nulls = [row for row in rows if row.get(key) is None]
+            rows = nulls + values if nulls_first else values + nulls
+        if self.limit_n is not None:
+            rows = rows[self.offset:self.offset + self.limit_n]
+        if self.columns and self.action == "select":
+            rows = [{c: row.get(c) for c in self.columns} for row in rows]
+        if self.action == "update":
+            for row in rows:
+                row.update(self.payload)
+        if self.action == "delete":
+            ids = {id(row) for row in rows}
+            self.db.tables[self.table] = [row for row in self.db.tables[self.table] if id(row) not in ids]
+        return SimpleNamespace(data=rows, count=total)
+
+
+class FakeSupabase:
+    def __init__(self, tables):
+        self.tables = tables
+        self.calls = []
+        self.removed = []
+        self.fail_removal = False
+        self.functions = {}
+        self.files = {}
+        self.storage = SimpleNamespace(from_=lambda bucket: SimpleNamespace(
+            remove=self._remove, download=self._download, upload=self._upload, move=self._move))
+
+    def _upload(self, path, file, file_options=None):
+        self.calls.append(("upload", path))
+        self.files[path] = file
+
+    def _move(self, source, destination):
+        self.calls.append(("move", source))
+        self.files[destination] = self.files.pop(source)
+
+    def _download(self, path):
+        self.calls.append(("download", path))
+        return self.files.get(path)
+
+    def _remove(self, paths):
+        if self.fail_removal:
+            raise RuntimeError("storage unavailable")
+        self.removed.append(list(paths))
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        if name not in self.functions:
+            raise RuntimeError(f"PGRST202: Could not find the function public.{name}")
+        self.calls.append(("rpc", name))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self.functions[name](params)))
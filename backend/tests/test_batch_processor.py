@@ -0,0 +1,123 @@
+"""
+Tests for BatchProcessor retries and adaptive (AIMD) concurrency
+"""
+
+import asyncio
+
+from fastapi import HTTPException
+
+from app.services.batch_processor import (
+    AdaptiveConcurrencyLimiter,
+    BatchItem,
+    BatchProcessor,
+    is_throttle_error,
+    is_transient_error,
+)
+
+
+def _items(n):
+    return [BatchItem(id=f"item_{i}", file_id=f"file_{i}", file_path="", file_size=0) for i in range(n)]
+
+
+class TestErrorClassification:
+    def test_throttle_errors(self):
+        assert is_throttle_error(Exception("429 Resource has been exhausted"))
+        assert is_throttle_error(Exception("503 Service Unavailable"))
+        assert not is_throttle_error(Exception("Invoice INV-4291 failed validation"))
+        assert is_transient_error(Exception("Connection reset by peer"))
+        assert not is_transient_error(ValueError("No text found in PDF"))
+
+    def test_own_http_errors(self):
+        quota = HTTPException(status_code=429, detail="Monthly scan limit exceeded. Used: 10/10.")
+        assert not is_throttle_error(quota) and not is_transient_error(quota)
+        assert not is_transient_error(HTTPException(status_code=400, detail="Invalid file"))
+        # A 500 wrapping the upstream error is judged by its text
+        assert is_throttle_error(HTTPException(status_code=500, detail="429 Resource has been exhausted"))
+
+
+class TestAdaptiveConcurrencyLimiter:
+    def test_additive_increase_and_single_decrease_per_window(self):
+        async def scenario():
+            limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=10)
+            tickets = [await limiter.acquire() for _ in range(4)]
+            for ticket in tickets:
+                await limiter.release(ticket, throttled=True)
+            after_burst = limiter.limit
+
+            for _ in range(20):
+                await limiter.release(await limiter.acquire())
+            return after_burst, limiter
+
+        after_burst, limiter = asyncio.run(scenario())
+        assert after_burst == 2  # four 429s from one wave halve the limit once
+        assert limiter.decreases == 1
+        assert limiter.limit > 2
+
+    def test_never_exceeds_limit(self):
+        async def scenario():
+            limiter = AdaptiveConcurrencyLimiter(initial=3, max_limit=3)
+            peak = 0
+
+            async def work():
+                nonlocal peak
+                ticket = await limiter.acquire()
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.001)
+                await limiter.release(ticket)
+
+            await asyncio.gather(*(work() for _ in range(20)))
+            return peak
+
+        assert asyncio.run(scenario()) == 3
+
+
+class TestBatchProcessor:
+    def test_retries_release_slot_while_backing_off(self):
+        attempts = {}
+
+        async def processor_fn(item):
+            attempts[item.id] = attempts.get(item.id, 0) + 1
+            if item.id == "item_0" and attempts[item.id] == 1:
+                raise Exception("429 rate limit")
+            await asyncio.sleep(0.01)
+            return {"ok": item.id}
+
+        async def scenario():
+            processor = BatchProcessor(max_concurrent=1, concurrency_ceiling=1, retry_base_delay=0.05)
+            events = []
+            result = await processor.process_batch(
+                _items(3), processor_fn, lambda done, total, item_id, status: events.append((item_id, status))
+            )
+            return result, events
+
+        result, events = asyncio.run(scenario())
+        assert result["succeeded"] == 3
+        assert attempts["item_0"] == 2
+        # While item_0 backed off, the single slot was free for the other items
+        succeeded_order = [item_id for item_id, status in events if status == "succeeded"]
+        assert succeeded_order[-1] == "item_0"
+        assert ("item_0", "retrying") in events
+
+    def test_permanent_errors_fail_without_retry(self):
+        calls = []
+
+        async def processor_fn(item):
+            calls.append(item.id)
+            raise ValueError("No text found in PDF")
+
+        result = asyncio.run(BatchProcessor(max_retries=2).process_batch(_items(2), processor_fn))
+        assert result["failed"] == 2
+        assert len(calls) == 2
+        assert result["results"][0].error == "No text found in PDF"
+
+    def test_quota_exceeded_fails_without_throttling(self):
+        calls = []
+        limiter = AdaptiveConcurrencyLimiter(initial=8, max_limit=8)
+
+        async def processor_fn(item):
+            calls.append(item.id)
+            raise HTTPException(status_code=429, detail="Monthly scan limit exceeded")
+
+        result = asyncio.run(BatchProcessor(max_retries=2, limiter=limiter).process_batch(_items(4), processor_fn))
+        assert result["failed"] == 4 and len(calls) == 4
+        assert limiter.throttled == 0 and limiter.limit == 8
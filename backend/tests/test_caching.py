@@ -0,0 +1,176 @@
+"""
+Read-through cache tests
+Covers key stability, single-flight, stale-while-revalidate and negative caching
+(runs against the in-process store - Redis is patched out)
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from unittest.mock import patch
+
+from app.core import caching
+from app.core.caching import build_call_key, read_through_cache
+
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    """Force the in-process backend and start from an empty store"""
+    caching._local_store.clear()
+    with patch.object(caching, "get_redis_client", return_value=None):
+        yield
+    caching._local_store.clear()
+
+
+def _sample(user_id, tier=None, limit=10):
+    return user_id
+
+
+class TestCallKey:
+    
+    def test_positional_and_keyword_calls_share_key(self):
+        a = build_call_key(_sample, ("u1",), {"tier": "pro"})
+        b = build_call_key(_sample, (), {"user_id": "u1", "tier": "pro", "limit": 10})
+        assert a == b
+    
+    def test_none_args_do_not_collide(self):
+        """cache_result drops None args - f(None, 'x') and f('x') must differ here"""
+        a = build_call_key(_sample, (None, "x"), {})
+        b = build_call_key(_sample, ("x",), {})
+        assert a != b
+    
+    def test_kwargs_are_part_of_key(self):
+        a = build_call_key(_sample, ("u1",), {"limit": 10})
+        b = build_call_key(_sample, ("u1",), {"limit": 20})
+        assert a != b
+
+
+class TestReadThroughSync:
+    
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        
+        @read_through_cache(ttl=60, beta=0)
+        def slow(user_id):
+            calls.append(user_id)
+            time.sleep(0.2)
+            return {"user": user_id}
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow("u1"))) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert len(calls) == 1
+        assert results == [{"user": "u1"}] * 10
+    
+    def test_stale_value_served_while_refreshing(self):
+        counter = {"n": 0}
+        
+        @read_through_cache(ttl=1, stale_ttl=30, beta=0)
+        def value():
+            counter["n"] += 1
+            return counter["n"]
+        
+        assert value() == 1
+        time.sleep(1.1)
+        
+        # Expired but within the stale window: old value returned immediately
+        assert value() == 1
+        
+        deadline = time.time() + 2
+        while counter["n"] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert value() == 2
+    
+    def test_none_results_negatively_cached(self):
+        calls = []
+        
+        @read_through_cache(ttl=60, negative_ttl=60, beta=0)
+        def lookup(key):
+            calls.append(key)
+            return None
+        
+        assert lookup("missing") is None
+        assert lookup("missing") is None
+        assert len(calls) == 1
+    
+    def test_none_not_cached_without_negative_ttl(self):
+        calls = []
+        
+        @read_through_cache(ttl=60, beta=0)
+        def lookup(key):
+            calls.append(key)
+            return None
+        
+        lookup("missing")
+        lookup("missing")
+        assert len(calls) == 2
+    
+    def test_errors_propagate_and_are_not_cached(self):
+        calls = []
+        
+        @read_through_cache(ttl=60, beta=0)
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return "ok"
+        
+        with pytest.raises(RuntimeError):
+            flaky()
+        assert flaky() == "ok"
+    
+    def test_invalidate(self):
+        counter = {"n": 0}
+        
+        @read_through_cache(ttl=60, beta=0)
+        def value(user_id):
+            counter["n"] += 1
+            return counter["n"]
+        
+        assert value("u1") == 1
+        value.invalidate("u1")
+        assert value("u1") == 2
+
+
+class TestReadThroughAsync:
+    
+    def test_concurrent_async_misses_compute_once(self):
+        calls = []
+        
+        @read_through_cache(ttl=60, beta=0)
+        async def slow(user_id):
+            calls.append(user_id)
+            await asyncio.sleep(0.1)
+            return [user_id]
+        
+        async def run():
+            return await asyncio.gather(*(slow("u1") for _ in range(20)))
+        
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert results == [["u1"]] * 20
+    
+    def test_async_stale_while_revalidate(self):
+        counter = {"n": 0}
+        
+        @read_through_cache(ttl=1, stale_ttl=30, beta=0)
+        async def value():
+            counter["n"] += 1
+            return counter["n"]
+        
+        async def run():
+            first = await value()
+            await asyncio.sleep(1.1)
+            stale = await value()
+            await asyncio.sleep(0.05)
+            fresh = await value()
+            return first, stale, fresh
+        
+        assert asyncio.run(run()) == (1, 1, 2)
@@ -0,0 +1,145 @@
+"""
+Tests for Parquet / Arrow IPC export (POST /api/bulk/export-columnar)
+"""
+
+import io
+import json
+import zipfile
+from datetime import date
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.ipc as ipc  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from app.api import exports  # noqa: E402
+from app.auth import get_current_user  # noqa: E402
+from app.services.columnar_exporter import ColumnarExporter  # noqa: E402
+from conftest import FakeSupabase  # noqa: E402
+
+
+def invoice(id, vendor="Penny Bazar", total=1180.0, user_id="u1", items=None, **extra):
+    row = {
+        "id": id, "user_id": user_id, "invoice_number": f"INV-{id}", "invoice_date": "2025-08-15",
+        "vendor_name": vendor, "vendor_state": "Maharashtra", "total_amount": total, "subtotal": 1000,
+        "payment_status": "unpaid", "created_at": "2025-10-01T10:00:00+00:00",
+        "line_items": json.dumps(items if items is not None else [
+            {"description": "Rice", "quantity": 2, "rate": 250.5, "amount": 501.0},
+            {"description": "Dal", "quantity": 1, "rate": 499, "amount": 499, "hsn_code": "0713"},
+        ]),
+        "raw_extracted_data": {"place_of_supply": "Maharashtra", "irn": "abc", "vendor_name_confidence": 0.9},
+    }
+    row.update(extra)
+    return row
+
+
+def read_zip(path, fmt="parquet"):
+    tables = {}
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            data = archive.read(name)
+            if fmt == "parquet":
+                tables[name] = pq.read_table(io.BytesIO(data))
+            else:
+                tables[name] = ipc.open_stream(data).read_all()
+    return tables
+
+
+class TestColumnarExporter:
+    def test_typed_invoice_columns(self, tmp_path):
+        rows = [invoice("1"), invoice("2", vendor="Reliance Fresh", total=105.5, due_date="15/09/2025")]
+        path = ColumnarExporter().export(rows, str(tmp_path / "out.zip"))
+        table = read_zip(path)["invoices.parquet"]
+        schema = table.schema
+
+        assert schema.field("total_amount").type == pa.float64()
+        assert schema.field("subtotal").type == pa.int64()
+        assert schema.field("invoice_date").type == pa.date32()
+        assert schema.field("created_at").type == pa.timestamp("us", tz="UTC")
+        assert pa.types.is_dictionary(schema.field("vendor_name").type)
+        assert pa.types.is_dictionary(schema.field("place_of_supply").type)
+        assert "irn" in schema.names and "vendor_name_confidence" not in schema.names
+        assert not any(name.startswith("line_item_") for name in schema.names)
+
+        data = table.to_pydict()
+        assert data["invoice_date"] == [date(2025, 8, 15)] * 2
+        assert data["due_date"] == [None, date(2025, 9, 15)]
+        assert data["total_amount"] == [1180.0, 105.5]
+
+    def test_flattened_line_items(self, tmp_path):
+        rows = [invoice("1"), invoice("2", items=[])]
+        table = read_zip(ColumnarExporter().export(rows, str(tmp_path / "out.zip")))["line_items.parquet"]
+        data = table.to_pydict()
+
+        assert data["invoice_id"] == ["1", "1"]
+        assert data["line_no"] == [1, 2]
+        assert data["hsn_code"] == [None, "0713"]
+        assert table.schema.field("quantity").type == pa.int64()
+        assert table.schema.field("rate").type == pa.float64()
+
+    def test_row_groups_and_mixed_values(self, tmp_path):
+        rows = [invoice(str(i)) for i in range(7)]
+        rows[3]["raw_extracted_data"] = {"irn": 12345}
+        path = ColumnarExporter(row_group_size=3).export(rows, str(tmp_path / "out.zip"))
+        with zipfile.ZipFile(path) as archive:
+            metadata = pq.ParquetFile(io.BytesIO(archive.read("invoices.parquet"))).metadata
+        assert metadata.num_row_groups == 3 and metadata.num_rows == 7
+
+        # Mixed text / number values keep their text
+        table = read_zip(path)["invoices.parquet"]
+        assert table.schema.field("irn").type == pa.string()
+        assert table.column("irn").to_pylist()[3] == "12345"
+
+    def test_stored_registry_drives_schema(self, tmp_path):
+        registry = {"invoice_count": 500, "line_item_count": 900, "fields": [
+            {"scope": "invoice", "field": "id", "data_type": "string"},
+            {"scope": "invoice", "field": "total_amount", "data_type": "decimal"},
+            {"scope": "invoice", "field": "vendor_name", "data_type": "string"},
+            {"scope": "raw", "field": "eway_bill_number", "data_type": "string"},
+            {"scope": "line_item", "field": "amount", "data_type": "decimal"},
+        ]}
+        path = ColumnarExporter(field_registry=registry).export([invoice("1")], str(tmp_path / "out.zip"))
+        tables = read_zip(path)
+
+        invoices = tables["invoices.parquet"]
+        assert invoices.schema.names == ["vendor_name", "total_amount", "eway_bill_number", "id"]
+        assert invoices.column("eway_bill_number").to_pylist() == [None]
+        assert tables["line_items.parquet"].schema.names == ["invoice_id", "invoice_number", "line_no", "amount"]
+
+    def test_arrow_stream_format(self, tmp_path):
+        path = ColumnarExporter(format="arrow", row_group_size=1).export(
+            [invoice("1"), invoice("2", vendor="Other")], str(tmp_path / "out.zip"))
+        tables = read_zip(path, "arrow")
+        assert set(tables) == {"invoices.arrows", "line_items.arrows"}
+        assert tables["invoices.arrows"].column("vendor_name").to_pylist() == ["Penny Bazar", "Other"]
+
+    def test_unknown_format_rejected(self):
+        with pytest.raises(ValueError):
+            ColumnarExporter(format="csv")
+
+
+class TestColumnarEndpoint:
+    @pytest.fixture
+    def client(self, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(exports, "supabase", FakeSupabase({
+            "invoices": [invoice("1"), invoice("2", user_id="u2")],
+        }))
+        app = FastAPI()
+        app.include_router(exports.router, prefix="/api/bulk")
+        app.dependency_overrides[get_current_user] = lambda: "u1"
+        return TestClient(app)
+
+    def test_export_scoped_to_user(self, client):
+        response = client.post("/api/bulk/export-columnar", json={"invoice_ids": ["1", "2"]})
+        assert response.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            table = pq.read_table(io.BytesIO(archive.read("invoices.parquet")))
+        assert table.column("id").to_pylist() == ["1"]
+
+    def test_bad_format(self, client):
+        response = client.post("/api/bulk/export-columnar", json={"invoice_ids": ["1"], "format": "orc"})
+        assert response.status_code == 400
@@ -0,0 +1,66 @@
+"""
+Tests for windowed, server-side quality statistics
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import data_quality_monitor, supabase_helper
+from app.services.data_quality_monitor import DataQualityMonitor
+from conftest import FakeSupabase
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    recent = (datetime.now() - timedelta(days=1)).isoformat()
+    old = (datetime.now() - timedelta(days=90)).isoformat()
+    logs = [
+        {"user_id": "u1", "invoice_id": "inv1", "document_id": "d1", "severity": "critical",
+         "issue_type": "missing_total", "description": "No total", "created_at": recent},
+        {"user_id": "u1", "invoice_id": "inv1", "document_id": "d1", "severity": "warning",
+         "issue_type": "missing_gstin", "description": "No GSTIN", "created_at": recent},
+        {"user_id": "u1", "invoice_id": "inv2", "document_id": "d2", "severity": "warning",
+         "issue_type": "missing_gstin", "description": "No GSTIN", "created_at": recent},
+        # Outside every window used below
+        {"user_id": "u1", "invoice_id": "inv3", "document_id": "d3", "severity": "critical",
+         "issue_type": "bad_date", "description": "Old", "created_at": old},
+    ]
+    fake = FakeSupabase({"invoice_quality_logs": logs})
+    monkeypatch.setattr(data_quality_monitor, "supabase", fake)
+    monkeypatch.setattr(supabase_helper, "_missing_functions", set())
+    return fake
+
+
+class TestQualityReport:
+    def test_fallback_respects_time_window(self, fake_db):
+        report = DataQualityMonitor.generate_quality_report("u1", days=7)
+
+        assert report["critical_issues"] == 1
+        assert report["warnings"] == 2
+        assert report["issue_breakdown"] == {"missing_total": 1, "missing_gstin": 2}
+        assert report["quality_score"] == 70
+
+    def test_uses_sql_summary_when_deployed(self, fake_db):
+        seen = {}
+
+        def summary(params):
+            seen.update(params)
+            return {"critical": 0, "warning": 1, "info": 0, "issue_breakdown": {"missing_gstin": 1}}
+
+        fake_db.functions["get_quality_summary"] = summary
+        report = DataQualityMonitor.generate_quality_report("u1", days=30)
+
+        assert report["quality_score"] == 95
+        assert seen["user_id_param"] == "u1"
+        assert seen["since_param"] > (datetime.now() - timedelta(days=31)).isoformat()
+        assert ("select", "invoice_quality_logs") not in fake_db.calls
+
+
+class TestProblematicInvoices:
+    def test_fallback_ranks_within_window(self, fake_db):
+        ranked = DataQualityMonitor.get_problematic_invoices("u1", limit=5, days=30)
+
+        assert [entry["invoice_id"] for entry in ranked] == ["inv1", "inv2"]
+        assert ranked[0]["critical_count"] == 1
+        assert ranked[0]["issue_count"] == 2
@@ -0,0 +1,170 @@
+"""
+Tests for the document processing hot path (round trips per processed document)
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import documents
+from app.auth import get_current_user
+from app.middleware import subscription
+from app.services import supabase_helper
+from conftest import FakeSupabase
+
+
+class FakeExtractor:
+    def extract_invoice_data(self, content, file_name):
+        assert content == b"image-bytes"
+        return {
+            "vendor_name": "Acme Traders",
+            "invoice_number": "INV-1",
+            "invoice_date": "2025-10-01",
+            "subtotal": 100.0,
+            "cgst": 9.0,
+            "sgst": 9.0,
+            "total_amount": 118.0,
+            "payment_status": "unpaid",
+        }
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    document = {"id": "doc-1", "user_id": "u1", "file_name": "bill.jpg",
+                "storage_path": "documents/u1/bill.jpg", "status": "uploaded"}
+    fake = FakeSupabase({
+        "documents": [document],
+        "invoices": [],
+        "subscriptions": [{"user_id": "u1", "tier": "pro", "status": "active",
+                           "scans_used_this_period": 3}],
+    })
+    fake.files[document["storage_path"]] = b"image-bytes"
+
+    monkeypatch.setattr(documents, "supabase", fake)
+    monkeypatch.setattr(subscription, "supabase", fake)
+    monkeypatch.setattr(supabase_helper, "_missing_functions", set())
+    monkeypatch.setattr(documents, "AI_AVAILABLE", True)
+    monkeypatch.setattr(documents, "_vision_flash_lite_extractor", FakeExtractor)
+    monkeypatch.setenv("GOOGLE_AI_API_KEY", "test-key")
+    return fake
+
+
+def _complete(fake):
+    def complete(params):
+        for row in fake.tables["documents"]:
+            if row["id"] == params["document_id_param"]:
+                row["status"] = "completed"
+        sub = fake.tables["subscriptions"][0]
+        sub["scans_used_this_period"] += params["scans_to_add"]
+        return {"document_updated": True, "usage_incremented": True,
+                "scans_used": sub["scans_used_this_period"]}
+    return complete
+
+
+class TestProcessDocument:
+    def test_upload_path_skips_read_and_download(self, fake_db):
+        fake_db.functions["complete_document_processing"] = _complete(fake_db)
+        document = dict(fake_db.tables["documents"][0])
+
+        result = asyncio.run(documents._process_document(
+            "doc-1", document=document, file_content=b"image-bytes"))
+
+        assert result.success
+        assert fake_db.calls == [
+            ("select", "subscriptions"),
+            ("insert", "invoices"),
+            ("rpc", "complete_document_processing"),
+        ]
+        assert result.timings["round_trips"] == 3
+        assert "extract" in result.timings
+        assert fake_db.tables["documents"][0]["status"] == "completed"
+        assert fake_db.tables["subscriptions"][0]["scans_used_this_period"] == 4
+        assert fake_db.tables["invoices"][0]["payment_status"] == "pending"
+
+    def test_process_endpoint_fetches_once_without_verify_read(self, fake_db):
+        fake_db.functions["complete_document_processing"] = _complete(fake_db)
+
+        asyncio.run(documents._process_document("doc-1"))
+
+        assert fake_db.calls == [
+            ("select", "documents"),
+            ("select", "subscriptions"),
+            ("download", "documents/u1/bill.jpg"),
+            ("insert", "invoices"),
+            ("rpc", "complete_document_processing"),
+        ]
+
+    def test_falls_back_without_sql_function(self, fake_db):
+        result = asyncio.run(documents._process_document(
+            "doc-1", document=dict(fake_db.tables["documents"][0]), file_content=b"image-bytes"))
+
+        assert result.success
+        assert fake_db.tables["documents"][0]["status"] == "completed"
+        assert fake_db.tables["subscriptions"][0]["scans_used_this_period"] == 4
+
+
+class TestBulkItem:
+    def test_staged_file_is_downloaded_released_and_processed(self, fake_db, monkeypatch):
+        monkeypatch.setattr(documents, "VIRUS_SCAN_ENABLED", False)
+        fake_db.functions["complete_document_processing"] = _complete(fake_db)
+        staged = documents.QUARANTINE_PREFIX + "documents/u1/bulk_bill.jpg"
+        fake_db.files[staged] = b"image-bytes"
+        fake_db.tables["documents"].append({"id": "doc-2", "user_id": "u1", "file_name": "bill.jpg",
+                                            "storage_path": staged, "status": "quarantined"})
+        item = documents.BatchItem(
+            id="doc-2", file_id="bill.jpg", file_path="documents/u1/bulk_bill.jpg", file_size=11,
+            metadata={"user_id": "u1", "file_name": "bill.jpg", "content_type": "image/jpeg",
+                      "staged_path": staged})
+
+        result = asyncio.run(documents._process_bulk_item(item))
+
+        assert result["vendor_name"] == "Acme Traders"
+        assert ("download", staged) in fake_db.calls and staged not in fake_db.files
+        assert fake_db.files["documents/u1/bulk_bill.jpg"] == b"image-bytes"
+        row = fake_db.tables["documents"][-1]
+        assert row["id"] == "doc-2" and row["status"] == "completed"
+        assert row["storage_path"] == "documents/u1/bulk_bill.jpg"
+        # The batch only ever holds paths, never file bytes
+        assert not any(isinstance(value, bytes) for value in item.metadata.values())
+
+
+class TestBulkUpload:
+    @pytest.fixture
+    def client(self, fake_db, monkeypatch):
+        batches = []
+
+        async def check_subscription(user_id):
+            return True, "ok"
+
+        async def process_bulk_item(item):
+            batches.append(dict(item.metadata))
+            return {}
+
+        monkeypatch.setattr(documents, "check_subscription", check_subscription)
+        monkeypatch.setattr(documents, "_process_bulk_item", process_bulk_item)
+        monkeypatch.setattr(documents, "MAX_UPLOAD_BYTES", 2048)
+        app = FastAPI()
+        app.include_router(documents.router, prefix="/api/documents")
+        app.dependency_overrides[get_current_user] = lambda: "u1"
+        client = TestClient(app)
+        client.batches = batches
+        return client
+
+    def test_files_staged_with_quarantined_rows(self, client, fake_db):
+        pdf = b"%PDF-1.4\n" + b"x" * 100
+        response = client.post("/api/documents/bulk", files=[
+            ("files", ("big.pdf", b"%PDF-1.4\n" + b"x" * 4096, "application/pdf")),
+            ("files", ("bill.pdf", pdf, "application/pdf")),
+        ])
+
+        assert response.status_code == 200
+        assert "event: rejected" in response.text and "File too large" in response.text
+        [row] = [row for row in fake_db.tables["documents"] if row["file_name"] == "bill.pdf"]
+        assert row["status"] == "quarantined" and row["storage_path"].startswith(documents.QUARANTINE_PREFIX)
+        assert fake_db.files[row["storage_path"]] == pdf
+        assert not any(row["file_name"] == "big.pdf" for row in fake_db.tables["documents"])
+        # The batch holds the staged path, not the bytes
+        [meta] = client.batches
+        assert meta["staged_path"] == row["storage_path"] and "content" not in meta
@@ -0,0 +1,112 @@
+"""
+Tests for the per-user field registry used by the dynamic exporters
+"""
+
+import json
+
+import pytest
+
+from app.services import supabase_helper
+from app.services.accountant_excel_exporter import AccountantExcelExporter
+from app.services.field_registry import (
+    REGISTRY_MIN_INVOICES,
+    FieldRegistry,
+    fields_by_scope,
+    get_field_registry,
+    registry_for_export,
+)
+from conftest import FakeSupabase
+
+
+def invoice(id, **extra):
+    row = {
+        "id": id, "user_id": "u1", "invoice_number": f"INV-{id}", "invoice_date": "2025-08-15",
+        "vendor_name": "Penny Bazar", "total_amount": 1180.0, "subtotal": 1000, "cgst": 90.0, "sgst": 90.0,
+        "paid_amount": None, "created_at": "2025-10-01T10:00:00+00:00", "search_text": "penny bazar",
+        "line_items": json.dumps([{"description": "Rice", "quantity": 2, "rate": 250.5, "hsn_sac": "1006"}]),
+        "raw_extracted_data": {"irn": "abc", "vendor_name_confidence": 0.9, "_extraction_metadata": {"x": 1},
+                               "tax_information": {"cess": 0}},
+    }
+    row.update(extra)
+    return row
+
+
+def types(registry):
+    return {(e["scope"], e["field"]): e["data_type"] for e in registry["fields"]}
+
+
+class TestFieldRegistry:
+    def test_scopes_types_and_fill_rates(self):
+        rows = [invoice("1"), invoice("2", total_amount=105.5, invoice_date="15/08/2025", paid_amount=100,
+                                      line_items=[{"description": "Dal", "quantity": 1.5}])]
+        registry = FieldRegistry(rows).to_dict()
+        found = types(registry)
+
+        assert registry["invoice_count"] == 2 and registry["line_item_count"] == 2
+        assert found[("invoice", "total_amount")] == "decimal"
+        assert found[("invoice", "subtotal")] == "integer"
+        assert found[("invoice", "invoice_date")] == "date"
+        assert found[("invoice", "created_at")] == "datetime"
+        assert found[("raw", "irn")] == "string"
+        assert found[("line_item", "quantity")] == "decimal"
+        # JSON documents, search columns, AI bookkeeping and nested values aren't fields
+        assert not {("invoice", "line_items"), ("invoice", "search_text"), ("raw", "vendor_name_confidence"),
+                    ("raw", "_extraction_metadata"), ("raw", "tax_information")} & set(found)
+
+        entries = fields_by_scope(registry)
+        assert entries["invoice"]["paid_amount"]["fill_rate"] == 0.5
+        assert entries["line_item"]["hsn_sac"]["fill_rate"] == 0.5
+
+    def test_incremental_updates_match_recompute(self):
+        rows = [invoice("1"), invoice("2"), invoice("3", raw_extracted_data={"eway_bill": "E1"})]
+        registry = FieldRegistry(rows)
+
+        updated = dict(rows[0], total_amount="n/a", raw_extracted_data={"po_number": "PO-9"})
+        registry.apply(rows[0], -1)
+        registry.apply(updated, 1)
+        registry.apply(rows[2], -1)
+
+        assert registry.to_dict() == FieldRegistry([updated, rows[1]]).to_dict()
+        assert ("raw", "eway_bill") not in types(registry.to_dict())
+        assert types(registry.to_dict())[("invoice", "total_amount")] == "string"
+
+
+class TestExporterDiscovery:
+    def test_registry_columns_match_scan(self):
+        items = [{"description": "Rice", "quantity": 2, "rate": 250.5}]
+        rows = [invoice("1", line_items=items), invoice("2", vendor_gstin="27AAPFU0939F1ZV", line_items=items)]
+        scanned = AccountantExcelExporter()._analyze_all_available_columns(rows)
+        exporter = AccountantExcelExporter(field_registry=FieldRegistry(rows).to_dict())
+
+        assert list(exporter._analyze_all_available_columns([])) == list(scanned)
+        assert exporter._analyze_available_columns([]) == AccountantExcelExporter()._analyze_available_columns(rows)
+
+    def test_registry_answers_without_rows(self):
+        registry = {"fields": [
+            {"scope": "invoice", "field": "total_amount", "data_type": "decimal"},
+            {"scope": "line_item", "field": "quantity", "data_type": "integer"},
+        ]}
+        exporter = AccountantExcelExporter(field_registry=registry)
+        columns = exporter._analyze_available_columns([])
+        assert "Invoice Total" in columns and "Quantity" in columns
+        assert "Vendor Name" not in columns and "Rate" not in columns
+
+
+class TestRegistryLookup:
+    @pytest.fixture(autouse=True)
+    def fresh_rpc_cache(self, monkeypatch):
+        monkeypatch.setattr(supabase_helper, "_missing_functions", set())
+
+    def test_stored_registry(self):
+        stored = {"invoice_count": 5000, "line_item_count": 0,
+                  "fields": [{"scope": "invoice", "field": "id", "data_type": "string"}]}
+        client = FakeSupabase({})
+        client.functions["get_invoice_field_registry"] = lambda params: stored
+        assert get_field_registry(client, "u1") == stored
+        assert registry_for_export(client, "u1", REGISTRY_MIN_INVOICES) == stored
+
+    def test_small_exports_and_missing_function_scan(self):
+        client = FakeSupabase({})
+        assert registry_for_export(client, "u1", REGISTRY_MIN_INVOICES - 1) is None
+        assert ("rpc", "get_invoice_field_registry") not in client.calls
+        assert get_field_registry(client, "u1") is None
@@ -0,0 +1,114 @@
+"""
+Tests for the cursor-paginated invoice listing (GET /api/invoices/)
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import invoices
+from app.auth import get_current_user
+from app.services import invoice_listing
+from conftest import FakeSupabase
+
+
+def make_invoices():
+    rows = []
+    for i in range(1, 13):
+        rows.append({
+            "id": f"inv-{i:03d}",
+            "user_id": "u1",
+            # pairs share a timestamp so the id tiebreaker matters
+            "created_at": f"2025-10-{(i + 1) // 2:02d}T10:00:00+00:00",
+            "invoice_date": None if i % 4 == 0 else f"2025-09-{i:02d}",
+            "vendor_name": "Acme Traders" if i % 3 == 0 else "Penny Bazar",
+            "invoice_number": f"INV-{i}",
+            "total_amount": float(i * 100),
+            "payment_status": "paid" if i % 2 else "unpaid",
+            "line_items": [{"description": "x" * 500}],
+        })
+    rows.append({"id": "other-1", "user_id": "u2", "created_at": "2025-10-30T00:00:00+00:00",
+                 "vendor_name": "Acme Traders", "total_amount": 1.0, "payment_status": "paid"})
+    return rows
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeSupabase({"invoices": make_invoices()})
+    monkeypatch.setattr(invoices, "supabase", fake)
+    app = FastAPI()
+    app.include_router(invoices.router, prefix="/api/invoices")
+    app.dependency_overrides[get_current_user] = lambda: "u1"
+    return TestClient(app)
+
+
+def collect(client, **params):
+    ids, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        page = client.get("/api/invoices/", params=query).json()
+        ids.extend(item["id"] for item in page["items"])
+        if not page["has_more"]:
+            return ids
+        cursor = page["next_cursor"]
+
+
+class TestKeysetPagination:
+    def test_pages_cover_every_row_once_in_order(self, client):
+        ids = collect(client, limit=5)
+        mine = [row for row in make_invoices() if row["user_id"] == "u1"]
+        # newest first, id descending within a shared timestamp
+        expected = [row["id"] for row in sorted(mine, key=lambda r: (r["created_at"], r["id"]), reverse=True)]
+        assert ids == expected
+
+    def test_nullable_sort_column_pages_through_null_tail(self, client):
+        ids = collect(client, limit=4, sort="invoice_date", order="asc")
+        assert len(ids) == len(set(ids)) == 12
+        assert ids[-3:] == ["inv-004", "inv-008", "inv-012"]  # NULL dates last, by id
+
+    def test_cursor_bound_to_sort(self, client):
+        page = client.get("/api/invoices/", params={"limit": 2}).json()
+        response = client.get("/api/invoices/", params={"cursor": page["next_cursor"], "sort": "total_amount"})
+        assert response.status_code == 400
+        assert client.get("/api/invoices/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+class TestFiltersAndFields:
+    def test_default_projection_skips_line_items(self, client):
+        item = client.get("/api/invoices/").json()["items"][0]
+        assert "line_items" not in item and "user_id" not in item
+        assert {"id", "vendor_name", "total_amount"} <= set(item)
+
+    def test_fields_always_include_cursor_columns(self, client):
+        item = client.get("/api/invoices/", params={"fields": "vendor_name", "sort": "total_amount"}).json()["items"][0]
+        assert set(item) == {"vendor_name", "total_amount", "id"}
+        assert client.get("/api/invoices/", params={"fields": "id;drop"}).status_code == 400
+
+    def test_filters_combine(self, client):
+        ids = collect(client, vendor="acme", status="paid,overdue", min_amount=200, max_amount=1000)
+        assert sorted(ids) == ["inv-003", "inv-009"]
+
+    def test_date_range(self, client):
+        ids = collect(client, date_from="2025-09-02", date_to="2025-09-05")
+        assert sorted(ids) == ["inv-002", "inv-003", "inv-005"]
+
+    def test_other_users_rows_never_returned(self, client):
+        assert "other-1" not in collect(client, vendor="acme")
+
+
+class TestEtag:
+    def test_if_none_match_returns_304(self, client):
+        first = client.get("/api/invoices/", params={"limit": 3})
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+
+        cached = client.get("/api/invoices/", params={"limit": 3}, headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+        changed = client.get("/api/invoices/", params={"limit": 4}, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+
+    def test_keyset_filter_quotes_values(self):
+        expression = invoice_listing.keyset_filter("vendor_name", True, 'A, "B" (C)', "id-1")
+        assert expression.startswith('vendor_name.lt."A, \\"B\\" (C)"')
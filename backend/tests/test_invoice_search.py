@@ -0,0 +1,104 @@
+"""
+Tests for invoice search (GET /api/invoices/search) and the in-process fallback index
+"""
+
+import json
+import sqlite3
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import invoices
+from app.auth import get_current_user
+from app.services import invoice_search
+from app.services.invoice_search import InvoiceSearchIndex
+from conftest import FakeSupabase
+
+ROWS = [
+    {"id": "inv-1", "user_id": "u1", "created_at": "2025-10-01", "vendor_name": "Penny Big Bazar",
+     "invoice_number": "OCT25-4761", "vendor_gstin": "01AEAPJ0354G1ZB", "total_amount": 2495.0,
+     "line_items": [{"description": "Classic Chakki Fresh Atta 5KG"}]},
+    {"id": "inv-2", "user_id": "u1", "created_at": "2025-10-02", "vendor_name": "Al Umair Trading",
+     "invoice_number": "INV/2025/001", "vendor_gstin": "29ABCDE1234F1Z5", "total_amount": 900.0,
+     "line_items": [{"item": "Basmati rice 10kg"}, {"description": "Penny candy"}]},
+    {"id": "inv-3", "user_id": "u1", "created_at": "2025-10-03", "vendor_name": "Reliance Fresh",
+     "invoice_number": "RF-77", "vendor_gstin": None, "total_amount": 120.0, "line_items": None},
+    {"id": "inv-9", "user_id": "u2", "created_at": "2025-10-04", "vendor_name": "Penny Big Bazar",
+     "invoice_number": "X-1", "vendor_gstin": None, "total_amount": 1.0, "line_items": []},
+]
+
+
+def ids(results):
+    return [row["id"] for row in results]
+
+
+class TestInvoiceSearchIndex:
+    def setup_method(self):
+        self.index = InvoiceSearchIndex(row for row in ROWS if row["user_id"] == "u1")
+
+    def test_prefix_match_ranks_vendor_above_line_items(self):
+        # "penny" is inv-1's vendor (weight A) but only an item on inv-2 (weight C)
+        assert ids(self.index.search("pen")) == ["inv-1", "inv-2"]
+
+    def test_fuzzy_match_tolerates_typos(self):
+        assert ids(self.index.search("bazzar")) == ["inv-1"]
+        assert ids(self.index.search("reliannce")) == ["inv-3"]
+
+    def test_every_word_must_match(self):
+        assert ids(self.index.search("penny atta")) == ["inv-1"]
+        assert self.index.search("penny unicorn") == []
+
+    def test_invoice_number_and_gstin(self):
+        assert ids(self.index.search("INV/2025/001")) == ["inv-2"]
+        assert ids(self.index.search("29abcde1234f1z5")) == ["inv-2"]
+
+    def test_results_are_projected_and_paginated(self):
+        first, second = self.index.search("pen", limit=1), self.index.search("pen", limit=1, offset=1)
+        assert ids(first + second) == ["inv-1", "inv-2"]
+        assert "line_items" not in first[0] and first[0]["rank"] > second[0]["rank"]
+
+    def test_rows_loaded_from_sqlite(self):
+        db = sqlite3.connect(":memory:")
+        db.row_factory = sqlite3.Row
+        db.execute("CREATE TABLE invoices (id TEXT, created_at TEXT, vendor_name TEXT, "
+                   "invoice_number TEXT, vendor_gstin TEXT, line_items TEXT)")
+        db.executemany("INSERT INTO invoices VALUES (?, ?, ?, ?, ?, ?)", [
+            (r["id"], r["created_at"], r["vendor_name"], r["invoice_number"], r["vendor_gstin"],
+             json.dumps(r["line_items"])) for r in ROWS if r["user_id"] == "u1"
+        ])
+        rows = [dict(row, line_items=json.loads(row["line_items"])) for row in db.execute("SELECT * FROM invoices")]
+
+        assert ids(InvoiceSearchIndex(rows).search("basmati")) == ["inv-2"]
+
+
+class TestSearchEndpoint:
+    @pytest.fixture
+    def client(self, monkeypatch):
+        self.fake = FakeSupabase({"invoices": [dict(row) for row in ROWS]})
+        monkeypatch.setattr(invoices, "supabase", self.fake)
+        invoice_search.invalidate_user_index("u1")
+        app = FastAPI()
+        app.include_router(invoices.router, prefix="/api/invoices")
+        app.dependency_overrides[get_current_user] = lambda: "u1"
+        return TestClient(app)
+
+    def test_fallback_index_scoped_to_user_and_cached(self, client):
+        page = client.get("/api/invoices/search", params={"q": "penny", "limit": 1}).json()
+        assert ids(page["items"]) == ["inv-1"]
+        assert page["has_more"] and page["next_offset"] == 1
+
+        page = client.get("/api/invoices/search", params={"q": "penny", "offset": 1}).json()
+        assert ids(page["items"]) == ["inv-2"] and not page["has_more"]
+        assert self.fake.calls.count(("select", "invoices")) == 1
+
+    def test_postgres_function_used_when_deployed(self, client, monkeypatch):
+        monkeypatch.setattr(invoice_search, "call_rpc",
+                            lambda client, name, params: [{"id": "inv-3", "rank": 1.0}] * params["limit_param"])
+        page = client.get("/api/invoices/search", params={"q": "fresh", "limit": 5}).json()
+        assert len(page["items"]) == 5 and page["has_more"]
+        assert ("select", "invoices") not in self.fake.calls
+
+    def test_search_route_not_shadowed_by_invoice_id(self, client):
+        assert client.get("/api/invoices/search", params={"q": "!!"}).json()["items"] == []
+        assert client.get("/api/invoices/search").status_code == 422
@@ -0,0 +1,113 @@
+"""
+Tests for per-user dashboard aggregates (GET /api/invoices/stats)
+"""
+
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import invoices
+from app.auth import get_current_user
+from app.core import caching
+from app.services import supabase_helper
+from app.services.invoice_stats import InvoiceStatsRollup, gst_rate_key, month_key
+from conftest import FakeSupabase
+
+
+def invoice(id, vendor, total, subtotal, gst, status="unpaid", date="2025-09-15", igst=False):
+    row = {"id": id, "user_id": "u1", "vendor_name": vendor, "total_amount": total, "subtotal": subtotal,
+           "payment_status": status, "invoice_date": date, "created_at": "2025-10-01T00:00:00+00:00",
+           "cgst": 0.0, "sgst": 0.0, "igst": 0.0}
+    if igst:
+        row["igst"] = gst
+    else:
+        row["cgst"] = row["sgst"] = gst / 2
+    return row
+
+
+ROWS = [
+    invoice("a", "Penny Bazar", 118.0, 100.0, 18.0),
+    invoice("b", "penny bazar ", 1180.0, 1000.0, 180.0, status="paid", date="2025-08-02"),
+    invoice("c", "Reliance Fresh", 105.0, 100.0, 5.0, igst=True, date="15/08/2025"),
+    invoice("d", None, 50.0, 0.0, 0.0, status=None, date=None),
+]
+
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    with patch.object(caching, "get_redis_client", return_value=None):
+        yield
+
+
+class TestRollup:
+    def test_buckets(self):
+        stats = InvoiceStatsRollup(ROWS).to_dict()
+
+        assert stats["totals"] == {"invoice_count": 4, "total_amount": 1453.0, "subtotal": 1200.0}
+        assert stats["tax"] == {"cgst": 99.0, "sgst": 99.0, "igst": 5.0, "cess": 0.0, "total": 203.0}
+        assert stats["by_vendor"][0] == {"vendor_name": "penny bazar ", "invoice_count": 2, "total_amount": 1298.0}
+        assert stats["vendor_count"] == 3
+        assert [m["month"] for m in stats["by_month"]] == ["2025-08", "2025-09", "2025-10"]
+        assert stats["by_status"]["unknown"]["invoice_count"] == 1
+        assert {g["gst_rate"]: g["invoice_count"] for g in stats["by_gst_rate"]} == {"0": 1, "18": 2, "5": 1}
+
+    def test_incremental_updates_match_recompute(self):
+        rollup = InvoiceStatsRollup(ROWS)
+
+        # update: invoice "a" paid and re-attributed; delete "c"; insert "e"
+        updated = dict(ROWS[0], payment_status="paid", vendor_name="Big Bazar", total_amount=236.0, subtotal=200.0,
+                       cgst=18.0, sgst=18.0)
+        rollup.apply(ROWS[0], -1)
+        rollup.apply(updated, 1)
+        rollup.apply(ROWS[2], -1)
+        added = invoice("e", "Reliance Fresh", 1280.0, 1000.0, 280.0, date="2025-10-09")
+        rollup.apply(added, 1)
+
+        final = [updated, ROWS[1], ROWS[3], added]
+        assert rollup.to_dict() == InvoiceStatsRollup(final).to_dict()
+
+    def test_deleting_last_invoice_removes_bucket(self):
+        rollup = InvoiceStatsRollup(ROWS[:1])
+        rollup.apply(ROWS[0], -1)
+        stats = rollup.to_dict()
+        assert stats["by_vendor"] == [] and stats["by_month"] == [] and stats["by_status"] == {}
+        assert stats["totals"]["invoice_count"] == 0
+
+    def test_bucketing_helpers(self):
+        assert gst_rate_key(100.0, 112.0, 12.0) == "12"
+        assert gst_rate_key(0.0, 100.25, 0.25) == "0.25"
+        assert gst_rate_key(100.0, 110.0, 10.0) == "mixed"
+        assert gst_rate_key(0.0, 0.0, 0.0) == "mixed"
+        assert month_key("2025-03-31", "2025-10-01T00:00:00") == "2025-03"
+        assert month_key("31 Mar 2025", "2025-10-01T00:00:00") == "2025-10"
+
+
+class TestStatsEndpoint:
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(supabase_helper, "_missing_functions", set())
+        self.fake = FakeSupabase({
+            "invoices": [dict(row) for row in ROWS] + [dict(ROWS[0], id="z", user_id="u2")],
+            "subscriptions": [{"user_id": "u1", "tier": "basic", "scans_used_this_period": 7,
+                               "current_period_end": "2025-11-01"}],
+        })
+        monkeypatch.setattr(invoices, "supabase", self.fake)
+        app = FastAPI()
+        app.include_router(invoices.router, prefix="/api/invoices")
+        app.dependency_overrides[get_current_user] = lambda: "u1"
+        return TestClient(app)
+
+    def test_fallback_scoped_to_user_with_quota(self, client):
+        stats = client.get("/api/invoices/stats").json()
+        assert stats["totals"]["invoice_count"] == 4
+        assert stats["quota"]["tier"] == "basic" and stats["quota"]["scans_used"] == 7
+        assert stats["quota"]["scans_remaining"] == stats["quota"]["scan_limit"] - 7
+
+    def test_rollup_function_used_when_deployed(self, client):
+        self.fake.functions["get_invoice_stats"] = lambda params: {
+            "totals": {"invoice_count": 50000}, "quota": {"tier": "pro", "scans_used": 1}}
+        stats = client.get("/api/invoices/stats").json()
+        assert stats["totals"]["invoice_count"] == 50000
+        assert stats["quota"]["scans_used"] == 1
+        assert ("select", "invoices") not in self.fake.calls
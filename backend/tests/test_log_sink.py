@@ -0,0 +1,118 @@
+"""
+Tests for the batched log sink
+"""
+
+import threading
+
+from app.services import data_quality_monitor, audit
+from app.services.log_sink import BatchedLogWriter
+from conftest import FakeSupabase
+
+
+class Collector:
+    def __init__(self, fail_times: int = 0, gate: threading.Event = None):
+        self.batches = []
+        self.fail_times = fail_times
+        self.gate = gate
+
+    def __call__(self, rows):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("insert failed")
+        self.batches.append(list(rows))
+
+
+class TestBatchedLogWriter:
+    def test_flushes_in_batches(self):
+        sink = Collector()
+        writer = BatchedLogWriter("test", sink, batch_size=10, flush_interval=60)
+
+        for i in range(25):
+            assert writer.submit({"n": i})
+        assert writer.flush(timeout=5)
+
+        assert [len(batch) for batch in sink.batches] == [10, 10, 5]
+        assert [row["n"] for batch in sink.batches for row in batch] == list(range(25))
+        writer.drain()
+
+    def test_full_buffer_drops_oldest(self):
+        gate = threading.Event()
+        sink = Collector(gate=gate)
+        writer = BatchedLogWriter("test", sink, max_buffer=3, batch_size=1,
+                                  flush_interval=60, put_timeout=0.01)
+
+        writer.submit({"n": 0})  # taken by the flusher, which blocks on the gate
+        while writer.stats()["buffered"]:
+            pass
+        results = [writer.submit({"n": i}) for i in range(1, 6)]
+        gate.set()
+        writer.drain()
+
+        assert results == [True, True, True, False, False]
+        assert writer.dropped_overflow == 2
+        assert [row["n"] for batch in sink.batches for row in batch] == [0, 3, 4, 5]
+
+    def test_failed_batch_is_retried_then_counted(self):
+        sink = Collector(fail_times=1)
+        writer = BatchedLogWriter("test", sink, batch_size=2, max_retries=1)
+        writer.submit({"n": 1})
+        writer.submit({"n": 2})
+        writer.drain()
+        assert writer.written == 2 and writer.dropped_failed == 0
+
+        failing = BatchedLogWriter("failing", Collector(fail_times=5), max_retries=1)
+        failing.submit({"n": 1})
+        failing.drain()
+        assert failing.dropped_failed == 1 and failing.failed_batches == 1
+
+    def test_drain_writes_everything_and_writes_through_after(self):
+        sink = Collector()
+        writer = BatchedLogWriter("test", sink, batch_size=100, flush_interval=60)
+        for i in range(7):
+            writer.submit({"n": i})
+        assert writer.drain()
+        assert writer.written == 7
+
+        assert writer.submit({"n": 7})
+        assert sink.batches[-1] == [{"n": 7}]
+
+
+class TestCallers:
+    def test_quality_issues_are_batched(self, monkeypatch):
+        fake = FakeSupabase({"invoice_quality_logs": []})
+        monkeypatch.setattr(data_quality_monitor, "supabase", fake)
+        writer = BatchedLogWriter("quality", data_quality_monitor._insert_quality_logs,
+                                  flush_interval=60)
+        monkeypatch.setattr(data_quality_monitor, "quality_log_writer", writer)
+
+        for i in range(3):
+            assert data_quality_monitor.DataQualityMonitor.log_validation_issue(
+                "u1", {"id": f"inv{i}"}, "warning", "missing_gstin", "No GSTIN")
+        assert fake.tables["invoice_quality_logs"] == []
+
+        writer.drain()
+        assert [row["invoice_id"] for row in fake.tables["invoice_quality_logs"]] == ["inv0", "inv1", "inv2"]
+
+    def test_audit_events_skip_the_request_session(self, monkeypatch):
+        sink = Collector()
+        writer = BatchedLogWriter("audit", sink, flush_interval=60)
+        monkeypatch.setattr(audit, "audit_log_writer", writer)
+
+        class ExplodingSession:
+            def add(self, obj):
+                raise AssertionError("request session must not be used")
+            flush = add
+
+        record = audit.AuditLogger.log_action(
+            ExplodingSession(), "u1", audit.AuditAction.INVOICE_UPLOADED,
+            resource_type="invoice", resource_id="inv1",
+        )
+        writer.drain()
+
+        assert record is not None
+        rows = sink.batches[0]
+        assert rows[0]["action"] == "invoice_uploaded"
+        assert rows[0]["resource_id"] == "inv1"
+        assert "id" not in rows[0]
@@ -0,0 +1,135 @@
+"""
+Tests for structured logging, request-ID correlation and sampled debug artifacts
+"""
+
+import io
+import json
+import logging
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import artifacts
+from app.core.logging_config import (
+    configure_logging,
+    parse_module_levels,
+    request_id_var,
+    shutdown_logging,
+)
+from app.middleware.request_id import RequestIdMiddleware
+
+
+@pytest.fixture
+def log_stream():
+    """Install the pipeline into a buffer and restore the root logger afterwards"""
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    stream = io.StringIO()
+    yield stream
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in saved_handlers:
+        root.addHandler(handler)
+    root.setLevel(saved_level)
+    logging.getLogger("tests.quiet").setLevel(logging.NOTSET)
+
+
+def lines(stream):
+    shutdown_logging()  # stops the listener after the queue is drained
+    return [line for line in stream.getvalue().splitlines() if line]
+
+
+class TestConfigureLogging:
+    def test_json_lines_carry_request_id_and_extras(self, log_stream):
+        configure_logging(level="INFO", module_levels="", fmt="json", stream=log_stream)
+        token = request_id_var.set("req-12345678")
+        try:
+            logging.getLogger("tests.app").info("Saved %s", "invoice", extra={"field_count": 7})
+        finally:
+            request_id_var.reset(token)
+
+        [record] = [json.loads(line) for line in lines(log_stream)]
+        assert record["msg"] == "Saved invoice"
+        assert record["request_id"] == "req-12345678"
+        assert record["level"] == "INFO"
+        assert record["field_count"] == 7
+
+    def test_module_levels_override_root(self, log_stream):
+        configure_logging(level="INFO", module_levels="tests.quiet=WARNING", fmt="text", stream=log_stream)
+        logging.getLogger("tests.quiet").info("hidden")
+        logging.getLogger("tests.quiet").warning("shown")
+        logging.getLogger("tests.loud").info("also shown")
+
+        output = "\n".join(lines(log_stream))
+        assert "hidden" not in output
+        assert "shown" in output and "also shown" in output
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="fork required")
+    def test_forked_child_records_are_written(self, log_stream, tmp_path):
+        path = tmp_path / "child.log"
+        with open(path, "w") as output:
+            configure_logging(level="INFO", module_levels="", fmt="text", stream=output)
+            pid = os.fork()
+            if pid == 0:
+                # gunicorn worker after preload: log, flush and exit without atexit
+                try:
+                    logging.getLogger("tests.child").info("from child %d", os.getpid())
+                    shutdown_logging()
+                    output.flush()
+                finally:
+                    os._exit(0)
+            _, status = os.waitpid(pid, 0)
+            shutdown_logging()
+
+        assert status == 0
+        assert f"from child {pid}" in path.read_text()
+
+    def test_parse_module_levels_skips_garbage(self):
+        assert parse_module_levels("a.b=debug, c=WARNING, bad, d=NOPE") == {
+            "a.b": logging.DEBUG,
+            "c": logging.WARNING,
+        }
+
+
+class TestRequestIdMiddleware:
+    def client(self):
+        app = FastAPI()
+
+        @app.get("/ping")
+        def ping():
+            return {"request_id": request_id_var.get()}
+
+        app.add_middleware(RequestIdMiddleware)
+        return TestClient(app)
+
+    def test_valid_incoming_id_is_reused(self):
+        response = self.client().get("/ping", headers={"X-Request-ID": "frontend-abc123"})
+        assert response.headers["x-request-id"] == "frontend-abc123"
+        assert response.json()["request_id"] == "frontend-abc123"
+
+    def test_missing_or_malformed_id_is_generated(self):
+        client = self.client()
+        for headers in ({}, {"X-Request-ID": "bad id\n"}):
+            response = client.get("/ping", headers=headers)
+            generated = response.headers["x-request-id"]
+            assert len(generated) == 32
+            assert response.json()["request_id"] == generated
+
+
+class TestDebugArtifacts:
+    def test_sampling_rate_controls_writes(self, tmp_path):
+        assert artifacts.save_artifact("ocr_text", "skipped", directory=str(tmp_path), sample_rate=0) is None
+
+        name = artifacts.save_artifact("ocr_text", "raw text", directory=str(tmp_path), sample_rate=1)
+        artifacts.flush_artifacts()
+
+        assert name.startswith("ocr_text-")
+        assert os.listdir(tmp_path) == [name]
+        assert (tmp_path / name).read_text(encoding="utf-8") == "raw text"
+
+    def test_disabled_without_directory(self, monkeypatch):
+        monkeypatch.setattr(artifacts, "ARTIFACTS_DIR", None)
+        assert artifacts.save_artifact("ocr_text", "raw text", sample_rate=1) is None
@@ -0,0 +1,183 @@
+"""
+Tests for pooled, queued email delivery against a local aiosmtpd server
+"""
+
+import smtplib
+import socket
+import threading
+import time
+from email import message_from_bytes
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services import email as email_service  # noqa: E402
+from app.services.email import EmailService  # noqa: E402
+from app.services.mail_queue import MailQueue, SMTPConnectionPool  # noqa: E402
+
+
+class Recorder:
+    """aiosmtpd handler that records messages and can refuse or defer them"""
+
+    def __init__(self):
+        self.messages = []
+        self.refuse = set()
+        self.defer = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.defer:
+            self.defer -= 1
+            return "451 Try again later"
+        self.messages.append((id(session), list(envelope.rcpt_tos), envelope.content))
+        return "250 Message accepted"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    handler = Recorder()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    handler.port = controller.port
+    yield handler
+    controller.stop()
+
+
+def make_queue(port, workers=1, size=1, max_idle=30.0, smtp_class=smtplib.SMTP, **options):
+    pools = []
+
+    def pool_factory():
+        pools.append(SMTPConnectionPool("127.0.0.1", port, starttls=False, size=size, timeout=2.0,
+                                        max_idle=max_idle, smtp_class=smtp_class))
+        return pools[-1]
+
+    mail = MailQueue(pool_factory=pool_factory, workers=workers, retry_delay=0.01, **options)
+    mail.pools = pools
+    return mail
+
+
+def message(to, subject="Hello"):
+    return email_service.build_message(to, subject, "<p>hi</p>", "hi")
+
+
+class TestMailQueue:
+    def test_batch_shares_one_session(self, server):
+        mail = make_queue(server.port)
+        futures = [mail.submit(message(f"user{i}@example.com")) for i in range(20)]
+        assert mail.join(10)
+        mail.stop()
+
+        assert all(future.result() is True for future in futures)
+        assert len(server.messages) == 20 and len({session for session, _, _ in server.messages}) == 1
+        assert mail.pools[0].connects == 1 and mail.sent == 20
+
+    def test_dropped_connection_is_replaced(self, server):
+        mail = make_queue(server.port)
+        assert mail.submit(message("a@example.com")).result(5)
+        # Connection dies while idle in the pool (no QUIT)
+        mail.pools[0]._idle[0][0].close()
+
+        assert mail.submit(message("b@example.com")).result(5)
+        mail.stop()
+        assert [rcpt for _, rcpt, _ in server.messages] == [["a@example.com"], ["b@example.com"]]
+        assert mail.pools[0].connects == 2
+
+    def test_idle_connection_checked_with_noop(self, server):
+        mail = make_queue(server.port, max_idle=0)
+        for to in ("a@example.com", "b@example.com"):
+            assert mail.submit(message(to)).result(5)
+        mail.stop()
+        assert mail.pools[0].connects == 1
+
+    def test_transient_error_retried_permanent_fails(self, server):
+        server.defer = 1
+        server.refuse.add("gone@example.com")
+        mail = make_queue(server.port)
+
+        deferred = mail.submit(message("later@example.com"))
+        refused = mail.submit(message("gone@example.com"))
+        assert deferred.result(5) is True
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            refused.result(5)
+        mail.stop()
+        assert mail.sent == 1 and mail.failed == 1
+
+    def test_gives_up_after_max_retries(self):
+        mail = make_queue(free_port(), max_retries=2)
+        future = mail.submit(message("a@example.com"))
+        with pytest.raises(OSError):
+            future.result(5)
+        mail.stop()
+        assert mail.failed == 1 and mail.sent == 0
+
+    def test_full_queue_rejects_without_blocking(self, server, monkeypatch):
+        gate = threading.Event()
+
+        def slow_smtp(*args, **kwargs):
+            gate.wait(5)
+            return smtplib.SMTP(*args, **kwargs)
+
+        mail = make_queue(server.port, maxsize=1, smtp_class=slow_smtp)
+        monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+        monkeypatch.setattr(email_service, "mail_queue", mail)
+
+        assert EmailService.send_email("u0@example.com", "s", "<p>x</p>") is True
+        while not mail._queue.empty():
+            time.sleep(0.001)
+        # The worker is stuck connecting, so the one-slot queue fills up
+        assert EmailService.send_email("u1@example.com", "s", "<p>x</p>") is True
+        assert EmailService.send_email("u2@example.com", "s", "<p>x</p>") is False
+        gate.set()
+        assert mail.join(5)
+        mail.stop()
+        assert sorted(rcpt[0] for _, rcpt, _ in server.messages) == ["u0@example.com", "u1@example.com"]
+
+
+class TestEmailService:
+    @pytest.fixture
+    def mail(self, server, monkeypatch):
+        mail = make_queue(server.port)
+        monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+        monkeypatch.setattr(email_service, "mail_queue", mail)
+        yield mail
+        mail.stop()
+
+    def test_not_configured(self, monkeypatch):
+        monkeypatch.setattr(settings, "SMTP_HOST", "")
+        assert EmailService.send_email("a@example.com", "s", "<p>x</p>") is False
+
+    def test_payment_confirmation_rendered_and_delivered(self, server, mail):
+        assert EmailService.send_payment_confirmation("a@example.com", 1499.5, "pro", "INV-1") is True
+        assert mail.join(5)
+
+        parsed = message_from_bytes(server.messages[0][2])
+        assert parsed["Subject"] == "Payment Confirmation - Invoice #INV-1"
+        text, html_part = [part.get_payload(decode=True).decode() for part in parsed.get_payload()]
+        assert text.strip() == "Payment confirmed: ₹1,499.50 for pro plan"
+        assert "₹1,499.50" in html_part and "<td style=\"padding: 10px; border: 1px solid #ddd;\">Pro</td>" in html_part
+
+    def test_html_values_are_escaped(self, server, mail):
+        EmailService.send_invoice_processed("a@example.com", "<script>x</script>.pdf", 0.9)
+        assert mail.join(5)
+        html_part = message_from_bytes(server.messages[0][2]).get_payload(decode=True).decode()
+        assert "&lt;script&gt;x&lt;/script&gt;.pdf" in html_part and "90.0%" in html_part
+
+    def test_bulk_send_over_one_session(self, server, mail):
+        recipients = [f"user{i}@example.com" for i in range(10)]
+        assert EmailService.send_bulk_email(recipients, "News", "<p>news</p>") == 10
+        assert sorted(rcpt[0] for _, rcpt, _ in server.messages) == sorted(recipients)
+        assert mail.pools[0].connects == 1
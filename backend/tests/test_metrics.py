@@ -0,0 +1,67 @@
+"""
+Tests for Prometheus pipeline metrics and the /metrics endpoint
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.api import health
+from app.core import metrics
+from app.services import flash_lite_formatter
+from app.services.stage_timer import StageTimer
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestPipelineMetrics:
+    def test_stage_timer_feeds_histogram(self):
+        before = sample("trulyinvoice_stage_seconds_count", stage="unit_stage")
+
+        timer = StageTimer("test")
+        with timer.stage("unit_stage", round_trips=1):
+            pass
+        with timer.stage("unit_stage"):
+            pass
+
+        assert sample("trulyinvoice_stage_seconds_count", stage="unit_stage") == before + 2
+        assert timer.round_trips == 1
+
+    def test_formatter_repairs_are_exported(self):
+        before = sample("trulyinvoice_json_repairs_total", kind="regex_fix")
+        flash_lite_formatter._count("json_repairs")
+        flash_lite_formatter._count("structured_responses")  # stats only, not a repair
+        assert sample("trulyinvoice_json_repairs_total", kind="regex_fix") == before + 1
+
+    def test_in_flight_gauge_returns_to_zero(self):
+        before = sample("trulyinvoice_extractions_in_flight")
+        metrics.extraction_started()
+        assert sample("trulyinvoice_extractions_in_flight") == before + 1
+        metrics.extraction_finished()
+        assert sample("trulyinvoice_extractions_in_flight") == before
+
+
+class TestMetricsEndpoint:
+    def client(self):
+        app = FastAPI()
+        app.include_router(health.router)
+        return TestClient(app)
+
+    def test_exposition_format(self, monkeypatch):
+        monkeypatch.delenv("METRICS_TOKEN", raising=False)
+        metrics.record_fallback("unit_test")
+
+        response = self.client().get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'trulyinvoice_fallbacks_total{kind="unit_test"}' in response.text
+
+    def test_token_required_when_configured(self, monkeypatch):
+        monkeypatch.setenv("METRICS_TOKEN", "secret")
+        client = self.client()
+
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
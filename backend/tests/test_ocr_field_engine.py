@@ -0,0 +1,92 @@
+"""
+OCR field engine tests
+The compiled engine must return exactly what the original per-call regexes did
+"""
+
+import re
+
+import pytest
+
+from app.services.ocr_field_engine import (
+    BILL_HEADER_PATTERN,
+    OCRText,
+    iter_bill_headers,
+    largest_amount,
+)
+
+
+CONSOLIDATED_BILL = """AL UMAIR TRADING AND MARKETING
+FIRDOUS ABAD BATAMALOO
+List Of Bills With Detail
+PENNY BIG BAZAR / BREIN Bill No: OCT25-4761 Dated: 25-Oct-25 GSTIN:01AEAPJ0354G1ZB
+Item Name Quantity Case QuantityRate Amount
+CLASSIC CHAKKI FRESH ATTA 5KG 1 6 1255.00 1255.00
+CLASSIC CHAKKI FRESH ATTA 10KG 1 3 1240.00 1240.00
+2495.00
+0.00
+2,495.00 Total :Discount(-) :Bill Total :
+MARKET PLACE / BREIN Bill No: OCT25-31768 Dated: 25-Oct-25 GSTIN:01ADLPW8230C1ZQ
+Item Name Quantity Case QuantityRate Amount
+SUPREME SELLA GOLD 1 KG 1 20 2320.00 2320.00
+2320.00
+0.00
+2,320.00 Total :Discount(-) :Bill Total :
+"""
+
+
+class TestBillHeaders:
+    
+    @pytest.mark.parametrize("text", [
+        CONSOLIDATED_BILL,
+        "A Bill No: X1 Dated: 1-JAN\nB / C bill no: Y2 dated: 2-FEB GSTIN:01ABC",
+        "Bill No: X1 Dated: 1",                       # marker at start - no vendor part
+        "VENDOR\n  \n Bill No: X1 Dated: 1",          # whitespace run spans lines
+        "A Bill No: Dated: Bill No: Z Dated: 9",      # first marker fails, second on same line
+        "\n\n BILL NO: Q DATED: 1 x BILL NO: R DATED: 2",
+    ])
+    def test_matches_plain_finditer(self, text):
+        expected = [(m.span(), m.groups()) for m in BILL_HEADER_PATTERN.finditer(text)]
+        actual = [(m.span(), m.groups()) for m in iter_bill_headers(text)]
+        assert actual == expected
+
+
+class TestOCRText:
+    
+    def test_consolidated_line_items(self):
+        items = OCRText(CONSOLIDATED_BILL).consolidated_line_items()
+        assert [i['amount'] for i in items] == [1255.0, 1240.0, 2320.0]
+        assert items[0]['sub_vendor'] == 'PENNY BIG BAZAR'
+        assert items[2]['sub_bill_number'] == 'OCT25-31768'
+        assert items[2]['sub_gstin'] == '01ADLPW8230C1ZQ'
+    
+    def test_vendor_from_header(self):
+        assert OCRText(CONSOLIDATED_BILL).vendor_from_header() == 'AL UMAIR TRADING AND MARKETING'
+    
+    def test_candidates_carry_positions(self):
+        text = "Seller 27AABCU9603R1ZM mail: a@b.co ph +91 9876543210"
+        doc = OCRText(text)
+        gstin = doc.candidates['gstin'][0]
+        assert text[gstin.start:gstin.end] == '27AABCU9603R1ZM'
+        assert doc.values('phone') == ['9876543210']
+        assert doc.values('email') == ['a@b.co']
+
+
+class TestLargestAmount:
+    
+    @pytest.mark.parametrize("text", [
+        "12 1,255.00 99 7",
+        "000050 9999",            # leading zeros must not shadow a larger value
+        "10,000,000 9,999,999.99 5",
+        "none here",
+        CONSOLIDATED_BILL,
+    ])
+    def test_matches_naive_scan(self, text):
+        amounts = []
+        for token in re.findall(r'([0-9,]+\.?\d{0,2})', text):
+            try:
+                amount = float(token.replace(',', ''))
+            except ValueError:
+                continue
+            if 10 < amount < 10000000:
+                amounts.append(amount)
+        assert largest_amount(text) == (max(amounts) if amounts else None)
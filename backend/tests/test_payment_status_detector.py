@@ -0,0 +1,66 @@
+"""
+Payment status detector tests
+Single-pass keyword matching must give the same verdicts as the per-phrase scan
+"""
+
+import pytest
+
+from app.services.keyword_matcher import KeywordMatcher
+from app.services.payment_status_detector import PaymentStatusDetector
+
+
+# Fixtures from the detector's own self-test
+FIXTURES = [
+    ("INVOICE #123\nTotal: ₹5000\nPAID\nReceived by: John", "paid"),
+    ("Invoice #456\nAmount: ₹3000\nUPI ID: merchant@paytm\nTxn ID: 123456789", "paid"),
+    ("Invoice #789\nTotal: ₹10000\nAdvance paid: ₹2000\nBalance due: ₹8000", "partial"),
+    ("Invoice #999\nAmount: ₹7500\nDue date: 15/02/2025\nPayment pending", "unpaid"),
+]
+
+
+def reference_phrases(detector, text_lower):
+    """Per-phrase substring scan the detector used before the matcher"""
+    phrases = set()
+    for group in detector.paid_indicators.values():
+        phrases |= {p.lower() for p in group}
+    phrases |= set(detector.partial_indicators) | set(detector.unpaid_indicators)
+    phrases |= {'upi:', 'neft:', 'rtgs:', 'imps:', 'cheque no', 'cash:',
+                'card payment', 'net banking', 'online payment'}
+    return {p for p in phrases if p in text_lower}
+
+
+class TestKeywordMatcher:
+    
+    def test_finds_overlapping_and_nested_phrases(self):
+        matcher = KeywordMatcher(['paid', 'unpaid', 'payment received', 'received by', 'payment'])
+        hits = matcher.find_all('unpaid. payment received by cashier')
+        assert [(h.phrase, h.start) for h in hits] == [
+            ('unpaid', 0), ('paid', 2),
+            ('payment received', 8), ('payment', 8),
+            ('received by', 16),
+        ]
+    
+    def test_empty_table(self):
+        assert KeywordMatcher([]).find_all('anything') == []
+
+
+class TestPaymentStatusDetector:
+    
+    @pytest.mark.parametrize("text,status", FIXTURES)
+    def test_fixture_statuses(self, text, status):
+        assert PaymentStatusDetector().detect_payment_status(text)[0] == status
+    
+    @pytest.mark.parametrize("text", [t for t, _ in FIXTURES] + [
+        "Cleared settlement; amount received via NEFT: 1234",
+        "overdue balance payable, partial settlement done",
+        "",
+    ])
+    def test_phrase_set_matches_substring_scan(self, text):
+        detector = PaymentStatusDetector()
+        assert detector._find_phrases(text.lower()) == reference_phrases(detector, text.lower())
+    
+    def test_locate_indicators_reports_positions(self):
+        text = "Total: 5000\nPAID"
+        located = PaymentStatusDetector().locate_indicators(text)
+        hit = located['STAMPS'][0]
+        assert text.lower()[hit.start:hit.end] == 'paid'
@@ -0,0 +1,109 @@
+"""
+Tests for prompt compaction of large OCR text
+"""
+
+from app.services.prompt_compactor import (
+    HEADER_LINES,
+    compact_document,
+    compact_lines,
+    estimate_tokens,
+    is_item_line,
+)
+
+
+def _page(page_no, items):
+    lines = [
+        "ACME TRADING COMPANY PVT LTD",
+        "Tax   Invoice      ",
+        "",
+        "Description   Qty   Rate   Amount",
+    ]
+    lines += [f"ITEM {page_no}-{i}   {i + 1}   10.00   {(i + 1) * 10}.00" for i in range(items)]
+    lines += [f"Page {page_no} of 9", "This is a computer generated invoice", ""]
+    return "\n".join(lines)
+
+
+class TestCompactLines:
+    def test_collapses_whitespace_and_blank_lines(self):
+        assert compact_lines("  Tax    Invoice  \n\n\n\tTotal\t 100.00 ") == ["Tax Invoice", "Total 100.00"]
+
+    def test_drops_boilerplate(self):
+        text = "Page 2 of 5\n- 3 -\nThis is a Computer Generated Invoice\nE.&O.E\nItem A 1 10.00"
+        assert compact_lines(text) == ["Item A 1 10.00"]
+
+    def test_dedupes_repeated_header_lines_but_keeps_numeric_rows(self):
+        text = "\n".join([_page(1, 2), _page(2, 2)])
+        lines = compact_lines(text)
+        assert lines.count("ACME TRADING COMPANY PVT LTD") == 1
+        assert lines.count("Description Qty Rate Amount") == 1
+
+        repeated = "ITEM X 1 10.00 10.00\nHEADER\nITEM X 1 10.00 10.00"
+        assert compact_lines(repeated).count("ITEM X 1 10.00 10.00") == 2
+
+    def test_keeps_lone_numbers_and_repeated_item_text(self):
+        # OCR of a table read column-wise: every cell on its own line
+        text = "\n".join([
+            "TAX INVOICE", "Description", "Qty", "Unit", "Rate", "Amount",
+            "Widget", "10", "Nos", "85", "850",
+            "Widget", "2", "Nos", "85", "170",
+            "Total", "1020",
+        ])
+        lines = compact_lines(text)
+        for value in ("10", "850", "2", "170", "1020"):
+            assert value in lines
+        assert lines.count("Widget") == 2 and lines.count("Nos") == 2
+
+    def test_lone_number_dropped_only_next_to_form_feed(self):
+        text = "ACME\nWidget\n10\n1\f2\nACME\nGadget\n5\nTotal\n15"
+        assert compact_lines(text) == ["ACME", "Widget", "10", "Gadget", "5", "Total", "15"]
+
+
+class TestCompactDocument:
+    def test_small_document_is_single_prompt(self):
+        document = compact_document(_page(1, 5))
+        assert not document.is_chunked
+        assert document.item_chunks == [document.text]
+        assert document.compact_chars < document.original_chars
+
+    def test_long_document_is_chunked_within_output_budget(self):
+        text = "\n".join(_page(p, 20) for p in range(1, 10)) + "\nGRAND TOTAL 9,450.00\nBank: HDFC IFSC HDFC0001"
+        document = compact_document(text, max_output_tokens=2048)
+
+        assert document.is_chunked
+        for chunk in document.item_chunks:
+            assert sum(1 for line in chunk.split("\n") if is_item_line(line)) <= 15
+
+        # Every line, header region included, lands in exactly one chunk, in order
+        chunked = [line for chunk in document.item_chunks for line in chunk.split("\n")]
+        assert chunked == compact_lines(text)
+        assert "GRAND TOTAL 9,450.00" in document.summary
+        assert "ACME TRADING COMPANY PVT LTD" in document.header
+
+    def test_items_in_header_region_are_chunked(self):
+        text = "ACME TRADING\n" + "\n".join(f"ITEM {i} {i + 1} 10.00 {(i + 1) * 10}.00" for i in range(40))
+        document = compact_document(text, max_output_tokens=1024)
+
+        assert document.is_chunked
+        chunked = [line for chunk in document.item_chunks for line in chunk.split("\n")]
+        assert sum(1 for line in chunked if is_item_line(line)) == 40
+        assert len(compact_lines(text)) > HEADER_LINES
+
+    def test_consolidated_sub_bills_are_not_split(self):
+        bills = []
+        for b in range(6):
+            bills.append(f"STORE {b} / CITY Bill No: B{b:03d} Dated: 01-APR-24 GSTIN:27AABCU9603R1ZM")
+            bills += [f"PRODUCT {b}-{i} 1 1 10.00 10.00" for i in range(5)]
+            bills.append("10.00 Total :Discount(-) :Bill Total :")
+        text = "\n".join(["CONSOLIDATED STATEMENT"] * 1 + ["filler line %d" % i for i in range(30)] + bills)
+
+        document = compact_document(text, max_output_tokens=1024)
+        assert document.is_chunked
+        for chunk in document.item_chunks:
+            headers = [line for line in chunk.split("\n") if "Bill No:" in line]
+            for header in headers:
+                bill = header.split("Bill No: ")[1][:4]
+                assert sum(1 for line in chunk.split("\n") if line.startswith(f"PRODUCT {int(bill[1:])}-")) == 5
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("a" * 400) == 101
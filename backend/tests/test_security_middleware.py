@@ -0,0 +1,133 @@
+"""
+Tests for the pure ASGI SecurityMiddleware (validation, rate limits, security headers)
+"""
+
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware import security_headers
+from app.middleware.security_headers import SecurityMiddleware
+
+
+def build_app(**options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/payments/history")
+    def history():
+        return JSONResponse({"items": []}, headers={"Cache-Control": "max-age=600"})
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"received": len(await request.body())}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a" * 10, b"b" * 10, b"c" * 10]), media_type="text/plain")
+
+    app.add_middleware(SecurityMiddleware, **options)
+    return app
+
+
+class WithUser:
+    """Stands in for authentication: puts user_id / user_tier on request.state"""
+
+    def __init__(self, app, user_id):
+        self.app = app
+        self.user_id = user_id
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {}).update(user_id=self.user_id, user_tier="pro")
+        await self.app(scope, receive, send)
+
+
+class TestSecurityHeaders:
+    def test_headers_on_every_response(self):
+        response = TestClient(build_app(environment="development")).get("/health")
+        assert response.status_code == 200
+        assert response.headers["x-frame-options"] == "DENY"
+        assert response.headers["x-content-type-options"] == "nosniff"
+        assert "frame-ancestors 'none'" in response.headers["content-security-policy"]
+        assert "strict-transport-security" not in response.headers
+        assert "cache-control" not in response.headers
+
+    def test_hsts_in_production(self):
+        response = TestClient(build_app(environment="production")).get("/health")
+        assert response.headers["strict-transport-security"].startswith("max-age=31536000")
+
+    def test_sensitive_paths_are_not_cached(self):
+        response = TestClient(build_app()).get("/api/payments/history")
+        assert response.headers.get_list("cache-control") == ["no-store, no-cache, must-revalidate, proxy-revalidate"]
+        assert response.headers["pragma"] == "no-cache"
+
+    def test_streaming_response_is_not_buffered(self):
+        app = build_app()
+        messages = []
+
+        async def receive():
+            # Client stays connected
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "headers": [],
+                 "query_string": b"", "root_path": "", "scheme": "http", "server": ("test", 80),
+                 "http_version": "1.1"}
+        asyncio.run(app(scope, receive, send))
+        chunks = [m["body"] for m in messages if m["type"] == "http.response.body" and m.get("body")]
+        assert chunks == [b"a" * 10, b"b" * 10, b"c" * 10]
+        assert (b"x-frame-options", b"DENY") in messages[0]["headers"]
+
+
+class TestRequestValidation:
+    def test_unsupported_content_type(self):
+        client = TestClient(build_app())
+        response = client.post("/upload", content=b"hi", headers={"Content-Type": "text/plain"})
+        assert response.status_code == 415
+        assert response.json() == {"error": "Unsupported Media Type"}
+        assert response.headers["x-frame-options"] == "DENY"
+        assert client.post("/upload", content=b'{"a": 1}', headers={"Content-Type": "application/json; charset=utf-8"}) \
+            .json() == {"received": 8}
+
+    def test_declared_length_over_limit(self):
+        response = TestClient(build_app(max_body_bytes=16)).post("/upload", json={"payload": "x" * 32})
+        assert response.status_code == 413
+        assert response.json() == {"error": "Payload Too Large"}
+
+    def test_chunked_body_over_limit(self):
+        client = TestClient(build_app(max_body_bytes=16))
+        response = client.post("/upload", content=iter([b"x" * 10, b"x" * 10]),
+                               headers={"Content-Type": "application/json"})
+        assert response.status_code == 413
+        small = client.post("/upload", content=iter([b"x" * 4, b"x" * 4]), headers={"Content-Type": "application/json"})
+        assert small.json() == {"received": 8}
+
+
+class TestRateLimits:
+    def test_limited_user_gets_429(self, monkeypatch):
+        monkeypatch.setattr(security_headers, "rate_limit_violation", lambda user_id, tier: {
+            "error": "Rate limit exceeded", "tier": tier, "retry_after_seconds": 60})
+        client = TestClient(WithUser(build_app(), "u1"))
+
+        response = client.get("/api/payments/history")
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "60"
+        assert response.json()["tier"] == "pro"
+        # Health checks are never limited
+        assert client.get("/health").status_code == 200
+
+    def test_allowed_user_gets_limit_headers(self, monkeypatch):
+        seen = []
+        monkeypatch.setattr(security_headers, "rate_limit_violation", lambda user_id, tier: seen.append(user_id))
+        response = TestClient(WithUser(build_app(), "u1")).get("/api/payments/history")
+        assert response.status_code == 200 and seen == ["u1"]
+        assert int(response.headers["x-ratelimit-limit-minute"]) > 0
+        assert TestClient(build_app()).get("/api/payments/history").headers.get("x-ratelimit-limit-minute") is None
@@ -0,0 +1,123 @@
+"""
+Tests for the session / login lockout store behind SessionManager and LoginAttemptTracker
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.core import advanced_security
+from app.core.advanced_security import (
+    InMemorySecurityStore,
+    LoginAttemptTracker,
+    SessionManager,
+    get_security_store,
+    set_security_store,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def store(clock):
+    store = InMemorySecurityStore(clock=clock)
+    set_security_store(store)
+    yield store
+    set_security_store(None)
+
+
+class TestSessions:
+    def test_create_validate_invalidate(self, store):
+        token = SessionManager.create_session("u1", "1.2.3.4", "pytest")
+        assert SessionManager.validate_session(token, "1.2.3.4", "pytest") == (True, "u1")
+        assert SessionManager.invalidate_session(token) is True
+        assert SessionManager.validate_session(token, "1.2.3.4", "pytest") == (False, None)
+        assert SessionManager.invalidate_session(token) is False
+
+    def test_idle_timeout_is_sliding(self, store, clock):
+        token = SessionManager.create_session("u1", "ip", "ua")
+        clock.now += SessionManager.SESSION_TIMEOUT - 1
+        assert SessionManager.validate_session(token, "ip", "ua")[0]
+        clock.now += SessionManager.SESSION_TIMEOUT - 1
+        assert SessionManager.validate_session(token, "ip", "ua")[0]
+        clock.now += SessionManager.SESSION_TIMEOUT
+        assert SessionManager.validate_session(token, "ip", "ua") == (False, None)
+
+    def test_least_recently_used_session_evicted(self, store, clock):
+        tokens = []
+        for _ in range(SessionManager.MAX_SESSIONS_PER_USER):
+            tokens.append(SessionManager.create_session("u1", "ip", "ua"))
+            clock.now += 1
+        other = SessionManager.create_session("u2", "ip", "ua")
+        # Using the first session makes the second one the oldest
+        SessionManager.validate_session(tokens[0], "ip", "ua")
+        clock.now += 1
+
+        newest = SessionManager.create_session("u1", "ip", "ua")
+        valid = [t for t in tokens + [newest] if SessionManager.validate_session(t, "ip", "ua")[0]]
+        assert tokens[1] not in valid and len(valid) == SessionManager.MAX_SESSIONS_PER_USER
+        assert SessionManager.validate_session(other, "ip", "ua")[0]
+
+    def test_invalidate_all_user_sessions(self, store):
+        for _ in range(3):
+            SessionManager.create_session("u1", "ip", "ua")
+        kept = SessionManager.create_session("u2", "ip", "ua")
+        assert SessionManager.invalidate_all_user_sessions("u1") == 3
+        assert SessionManager.invalidate_all_user_sessions("u1") == 0
+        assert SessionManager.validate_session(kept, "ip", "ua") == (True, "u2")
+
+    def test_expired_sessions_leave_no_state(self, store, clock):
+        for user in ("u1", "u2", "u3"):
+            SessionManager.create_session(user, "ip", "ua")
+        clock.now += SessionManager.SESSION_TIMEOUT + 1
+        SessionManager.create_session("u4", "ip", "ua")
+        assert [session["user_id"] for session in store._sessions.values()] == ["u4"]
+        assert list(store._user_sessions) == ["u4"] and len(store._scores) == 1
+
+
+class TestLoginAttempts:
+    def test_lockout_after_max_failures(self, store, clock):
+        for _ in range(LoginAttemptTracker.MAX_ATTEMPTS - 1):
+            LoginAttemptTracker.record_attempt("a@b.c", False)
+            LoginAttemptTracker.record_attempt("a@b.c", True)
+        assert LoginAttemptTracker.is_locked_out("a@b.c") == (False, 0)
+
+        LoginAttemptTracker.record_attempt("a@b.c", False)
+        assert LoginAttemptTracker.is_locked_out("a@b.c") == (True, LoginAttemptTracker.LOCKOUT_DURATION)
+        assert LoginAttemptTracker.is_locked_out("other") == (False, 0)
+
+        # The lockout outlasts the attempt window
+        clock.now += LoginAttemptTracker.ATTEMPT_WINDOW + 60
+        locked, remaining = LoginAttemptTracker.is_locked_out("a@b.c")
+        assert locked and remaining == LoginAttemptTracker.LOCKOUT_DURATION - LoginAttemptTracker.ATTEMPT_WINDOW - 60
+        clock.now += LoginAttemptTracker.LOCKOUT_DURATION
+        assert LoginAttemptTracker.is_locked_out("a@b.c") == (False, 0)
+
+    def test_failures_outside_window_do_not_count(self, store, clock):
+        for _ in range(LoginAttemptTracker.MAX_ATTEMPTS - 1):
+            LoginAttemptTracker.record_attempt("1.2.3.4", False)
+        clock.now += LoginAttemptTracker.ATTEMPT_WINDOW + 1
+        LoginAttemptTracker.record_attempt("1.2.3.4", False)
+        assert LoginAttemptTracker.is_locked_out("1.2.3.4") == (False, 0)
+        assert len(store._failures["1.2.3.4"]) == 1
+
+
+class TestStoreSelection:
+    def test_falls_back_to_memory_without_redis(self):
+        set_security_store(None)
+        try:
+            with patch.object(advanced_security, "get_redis_client", return_value=None):
+                assert isinstance(get_security_store(), InMemorySecurityStore)
+        finally:
+            set_security_store(None)
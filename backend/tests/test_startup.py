@@ -0,0 +1,26 @@
+"""
+Tests for fast startup: heavy SDKs load on first use, not when app.main is imported
+"""
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_SDKS = ("google.generativeai", "google.cloud.vision", "PyPDF2", "PIL.Image", "openpyxl", "supabase", "redis",
+              "sentry_sdk")
+
+
+class TestLazyImports:
+    def test_import_app_main_loads_no_heavy_sdk(self):
+        env = dict(os.environ)
+        env.pop("SENTRY_DSN", None)
+        probe = f"import sys, app.main; print('loaded:', [m for m in {HEAVY_SDKS!r} if m in sys.modules])"
+        result = subprocess.run([sys.executable, "-c", probe],
+                                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+        assert result.stdout.strip().splitlines()[-1] == "loaded: []"
+
+    def test_preload_imports_installed_modules(self):
+        from app.core.preload import preload_modules
+        timings = preload_modules(["json", "not_a_real_module_xyz"])
+        assert list(timings) == ["json"]
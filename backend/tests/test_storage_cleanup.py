@@ -0,0 +1,101 @@
+"""
+Tests for set-based retention cleanup (PostgREST fallback path, storage removal, checkpoints)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import storage_cleanup, supabase_helper
+from app.services.storage_cleanup import CleanupCheckpoint, StorageCleanupService
+from conftest import FakeSupabase
+
+
+@pytest.fixture
+def fake_db(monkeypatch, tmp_path):
+    old = (datetime.utcnow() - timedelta(days=400)).isoformat()
+    new = datetime.utcnow().isoformat()
+    documents = [
+        {"id": f"d{i}", "user_id": "u1", "created_at": old, "storage_path": f"documents/u1/{i}.pdf", "file_size": 100}
+        for i in range(7)
+    ] + [{"id": "fresh", "user_id": "u1", "created_at": new, "storage_path": "documents/u1/new.pdf", "file_size": 5}]
+    invoices = [{"id": f"i{i}", "document_id": f"d{i}"} for i in range(7)]
+    fake = FakeSupabase({"documents": documents, "invoices": invoices, "subscriptions": [
+        {"user_id": "u1", "tier": "free", "status": "active"},
+        {"user_id": "u2", "tier": "free", "status": "active"},
+    ]})
+    monkeypatch.setattr(storage_cleanup, "supabase", fake)
+    monkeypatch.setattr(storage_cleanup, "DELETE_BATCH_SIZE", 3)
+    monkeypatch.setattr(storage_cleanup, "STORAGE_REMOVE_LIMIT", 2)
+    monkeypatch.setattr(storage_cleanup, "CHECKPOINT_PATH", tmp_path / "checkpoint.json")
+    monkeypatch.setattr(supabase_helper, "_missing_functions", set())
+    return fake
+
+
+class TestPurge:
+    def test_batched_deletes_and_storage_removal(self, fake_db):
+        result = StorageCleanupService.cleanup_user_data("u1", "free")
+
+        assert result["documents_deleted"] == 7
+        assert result["invoices_deleted"] == 7
+        assert result["bytes_reclaimed"] == 700
+        assert result["storage_objects_removed"] == 7
+        assert [d["id"] for d in fake_db.tables["documents"]] == ["fresh"]
+        # One in_() delete per batch instead of one per document
+        assert fake_db.calls.count(("delete", "documents")) == 3
+        assert all(len(chunk) <= storage_cleanup.STORAGE_REMOVE_LIMIT for chunk in fake_db.removed)
+        assert sorted(p for chunk in fake_db.removed for p in chunk) == sorted(
+            f"documents/u1/{i}.pdf" for i in range(7)
+        )
+
+    def test_dry_run_reports_bytes_without_deleting(self, fake_db):
+        result = StorageCleanupService.cleanup_user_data("u1", "free", dry_run=True)
+
+        assert result["documents_to_delete"] == 7
+        assert result["invoices_to_delete"] == 7
+        assert result["bytes_to_reclaim"] == 700
+        assert len(fake_db.tables["documents"]) == 8
+        assert not fake_db.removed
+
+
+class TestCheckpoint:
+    def test_failed_storage_removal_is_retried_next_run(self, fake_db):
+        fake_db.fail_removal = True
+        first = StorageCleanupService.cleanup_all_users(max_workers=2)
+        assert first["total_documents_deleted"] == 7
+        assert first["storage_objects_failed"] == 7
+
+        fake_db.fail_removal = False
+        StorageCleanupService.cleanup_all_users(max_workers=2)
+        assert sum(len(chunk) for chunk in fake_db.removed) == 7
+        assert not storage_cleanup.CHECKPOINT_PATH.exists()
+
+    def test_resume_skips_completed_users(self, fake_db):
+        checkpoint = CleanupCheckpoint.load_or_start()
+        checkpoint.mark_user_done("u1")
+
+        result = StorageCleanupService.cleanup_all_users()
+        assert result["users_cleaned"] == 1  # only u2
+        assert len(fake_db.tables["documents"]) == 8
+
+
+class TestStorageStats:
+    def test_uses_sql_aggregate(self, fake_db):
+        fake_db.functions["get_storage_stats"] = lambda params: {
+            "total_documents": 3, "total_storage_bytes": 3 * 1024 * 1024,
+            "oldest_document": "2024-01-01", "newest_document": "2024-06-01"
+        }
+        stats = StorageCleanupService.get_storage_stats("u1")
+
+        assert stats["total_storage_mb"] == 3.0
+        assert stats["oldest_document"] == "2024-01-01"
+        assert ("select", "documents") not in fake_db.calls
+
+    def test_fallback_matches_row_aggregation(self, fake_db):
+        stats = StorageCleanupService.get_storage_stats("u1")
+
+        rows = fake_db.tables["documents"]
+        assert stats["total_documents"] == 8
+        assert stats["total_storage_bytes"] == 705
+        assert stats["oldest_document"] == min(row["created_at"] for row in rows)
+        assert stats["newest_document"] == max(row["created_at"] for row in rows)
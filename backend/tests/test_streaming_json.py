@@ -0,0 +1,115 @@
+"""
+Tests for the streaming invoice JSON parser and structured-output formatting
+"""
+
+import json
+
+from app.services.streaming_json import StreamingInvoiceParser
+from app.services import flash_lite_formatter
+from app.services.flash_lite_formatter import FlashLiteFormatter
+
+
+INVOICE = {
+    "invoice_number": "INV-7 \"A\"",
+    "vendor_name": "ACME {Traders} [Pune]",
+    "total_amount": 1180.0,
+    "line_items": [
+        {"description": "Widget, large", "quantity": 2, "amount": 500.0},
+        {"description": "Back\\slash", "quantity": 1, "amount": 500.0},
+    ],
+    "notes": "done",
+}
+
+
+def _feed(parser, text, size):
+    emitted = []
+    for i in range(0, len(text), size):
+        emitted.extend(parser.feed(text[i:i + size]))
+    return emitted
+
+
+class TestStreamingInvoiceParser:
+    def test_complete_document_any_fragment_size(self):
+        text = json.dumps(INVOICE)
+        for size in (1, 3, 7, len(text)):
+            parser = StreamingInvoiceParser()
+            emitted = _feed(parser, text, size)
+            data, truncated = parser.finish()
+            assert data == INVOICE
+            assert not truncated
+            assert emitted == INVOICE["line_items"]
+
+    def test_truncated_response_keeps_complete_items_and_fields(self):
+        text = json.dumps(INVOICE)
+        cut = text.index("Back") + 3
+        parser = StreamingInvoiceParser()
+        parser.feed(text[:cut])
+        data, truncated = parser.finish()
+
+        assert truncated
+        assert data["invoice_number"] == INVOICE["invoice_number"]
+        assert data["total_amount"] == 1180.0
+        assert data["line_items"] == INVOICE["line_items"][:1]
+
+    def test_preamble_and_no_object(self):
+        parser = StreamingInvoiceParser()
+        parser.feed("```json\n" + json.dumps({"a": 1}) + "\n```")
+        assert parser.finish() == ({"a": 1}, False)
+
+        parser = StreamingInvoiceParser()
+        parser.feed("Sorry, no invoice here")
+        assert parser.finish() == (None, False)
+
+
+class _Chunk:
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("no parts")
+        return self._text
+
+
+class _StreamingModel:
+    def __init__(self, text, size=16):
+        self.parts = [text[i:i + size] for i in range(0, len(text), size)] + [None]
+        self.calls = []
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls.append(generation_config)
+        return iter(_Chunk(part) for part in self.parts)
+
+
+def _formatter(model):
+    formatter = FlashLiteFormatter.__new__(FlashLiteFormatter)
+    formatter.model = model
+    formatter.structured_output = True
+    formatter.generation_config = {'temperature': 0.1, 'max_output_tokens': 2048}
+    return formatter
+
+
+class TestStructuredOutputMode:
+    def test_requests_schema_and_parses_stream(self):
+        model = _StreamingModel(json.dumps(INVOICE))
+        result = _formatter(model).format_text_to_json("Invoice INV-7\nWidget 2 250 500\nTotal 1180")
+
+        assert model.calls[0]['response_mime_type'] == 'application/json'
+        assert 'line_items' in model.calls[0]['response_schema']['properties']
+        assert result['invoice_number'] == INVOICE['invoice_number']
+        assert len(result['line_items']) == 2
+        assert result['_formatting_metadata']['method'] == 'structured_output'
+        assert result['_formatting_metadata']['truncated'] is False
+
+    def test_truncated_stream_needs_no_repair(self):
+        text = json.dumps(INVOICE)
+        model = _StreamingModel(text[:text.index("Back") + 3])
+        before = flash_lite_formatter.get_formatter_stats().get('json_repairs', 0)
+
+        result = _formatter(model).format_text_to_json("Invoice INV-7\nWidget 2 250 500\nTotal 1180")
+
+        assert result['_formatting_metadata']['truncated'] is True
+        assert result['line_items'] == INVOICE['line_items'][:1]
+        assert flash_lite_formatter.get_formatter_stats().get('json_repairs', 0) == before
+        assert flash_lite_formatter.get_formatter_stats()['truncated_responses'] >= 1
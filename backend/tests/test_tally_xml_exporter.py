@@ -0,0 +1,124 @@
+"""
+Tests for the Tally purchase-voucher exporter (POST /api/bulk/export-tally)
+"""
+
+import io
+import xml.etree.ElementTree as ET
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import exports
+from app.auth import get_current_user
+from app.services import tally_xml_exporter
+from app.services.tally_xml_exporter import TallyXMLExporter, financial_year, parse_invoice_date
+from conftest import FakeSupabase
+
+
+def invoice(id, vendor="Penny Bazar", date="2025-06-15", subtotal=1000.0, cgst=90.0, sgst=90.0, igst=0.0,
+            total=1180.0, user_id="u1", created_at="2025-10-01T00:00:00+00:00"):
+    return {"id": id, "user_id": user_id, "invoice_number": f"INV/{id}", "invoice_date": date,
+            "vendor_name": vendor, "vendor_gstin": "27aapfu0939f1zv", "subtotal": subtotal, "cgst": cgst,
+            "sgst": sgst, "igst": igst, "cess": 0.0, "total_amount": total, "created_at": created_at}
+
+
+def export_xml(rows, **kwargs):
+    exporter = TallyXMLExporter(**kwargs)
+    stream = io.BytesIO()
+    exporter.write(rows, stream)
+    return exporter, ET.fromstring(stream.getvalue())
+
+
+def ledger_amounts(voucher):
+    return {e.findtext("LEDGERNAME"): Decimal(e.findtext("AMOUNT")) for e in voucher.iter("ALLLEDGERENTRIES.LIST")}
+
+
+class TestVouchers:
+    def test_intra_state_split_balances(self):
+        exporter, root = export_xml([invoice("1")])
+        voucher = root.find(".//VOUCHER")
+
+        assert voucher.findtext("DATE") == "20250615"
+        assert voucher.findtext("PARTYGSTIN") == "27AAPFU0939F1ZV"
+        assert ledger_amounts(voucher) == {
+            "Penny Bazar": Decimal("1180.00"),
+            "Purchase @ 18%": Decimal("-1000.00"),
+            "Input CGST @ 9%": Decimal("-90.00"),
+            "Input SGST @ 9%": Decimal("-90.00"),
+        }
+        assert exporter.vouchers == 1 and exporter.skipped == 0
+
+    def test_inter_state_with_round_off(self):
+        _, root = export_xml([invoice("2", cgst=0, sgst=0, igst=50.0, subtotal=1000.0, total=1050.40)])
+        amounts = ledger_amounts(root.find(".//VOUCHER"))
+        assert amounts["Input IGST @ 5%"] == Decimal("-50.00")
+        assert amounts["Round Off"] == Decimal("-0.40")
+        assert sum(amounts.values()) == 0
+
+    def test_unsplit_ledgers_and_escaping(self):
+        _, root = export_xml([invoice("3", vendor="  ", subtotal=0, total=1100.0, cgst=50.0, sgst=50.0),
+                              invoice("4", vendor="A & B <Traders>")], split_by_rate=False)
+        first, second = root.findall(".//VOUCHER")
+        assert first.findtext("PARTYLEDGERNAME") == "Unknown Vendor"
+        assert ledger_amounts(first)["Purchase"] == Decimal("-1000.00")
+        assert second.findtext("PARTYLEDGERNAME") == "A & B <Traders>"
+
+    def test_undated_or_empty_invoices_skipped(self):
+        rows = [invoice("5", date=None, created_at=None), invoice("6", subtotal=0, cgst=0, sgst=0, total=0),
+                invoice("7", date="bad date")]
+        exporter, root = export_xml(rows)
+        assert exporter.vouchers == 1 and exporter.skipped == 2
+        assert root.find(".//VOUCHER/DATE").text == "20251001"  # created_at fallback
+
+
+class TestFinancialYear:
+    def test_period_spans_all_voucher_dates(self):
+        rows = [invoice("1", date="15/08/2024"), invoice("2", date="2026-03-31"), invoice("3", date="2025-04-01")]
+        exporter, root = export_xml(rows, company="Acme & Co")
+        assert exporter.period == (date(2024, 4, 1), date(2026, 3, 31))
+        variables = root.find(".//STATICVARIABLES")
+        assert variables.findtext("PERIODSTARTDATE") == "20240401"
+        assert variables.findtext("PERIODENDDATE") == "20260331"
+        assert variables.findtext("SVCURRENTCOMPANY") == "Acme & Co"
+
+    def test_helpers(self):
+        assert financial_year(date(2025, 3, 31)) == (date(2024, 4, 1), date(2025, 3, 31))
+        assert financial_year(date(2025, 4, 1)) == (date(2025, 4, 1), date(2026, 3, 31))
+        assert parse_invoice_date("2025-08-15T10:00:00+05:30") == date(2025, 8, 15)
+        assert parse_invoice_date("15 Aug 2025") == date(2025, 8, 15)
+        assert parse_invoice_date("") is None
+
+
+class TestTallyEndpoint:
+    @pytest.fixture
+    def client(self, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(tally_xml_exporter, "PAGE_SIZE", 2)
+        rows = [invoice(str(i), created_at=f"2025-10-0{i}T00:00:00+00:00") for i in range(1, 6)]
+        rows.append(invoice("other", user_id="u2"))
+        self.fake = FakeSupabase({"invoices": rows})
+        monkeypatch.setattr(exports, "supabase", self.fake)
+        app = FastAPI()
+        app.include_router(exports.router, prefix="/api/bulk")
+        app.dependency_overrides[get_current_user] = lambda: "u1"
+        return TestClient(app)
+
+    def test_all_user_invoices_paged(self, client):
+        response = client.post("/api/bulk/export-tally", json={})
+        assert response.status_code == 200
+        assert response.headers["x-vouchers-exported"] == "5"
+        root = ET.fromstring(response.content)
+        assert [v.findtext("VOUCHERNUMBER") for v in root.iter("VOUCHER")] == [f"INV/{i}" for i in range(1, 6)]
+        assert self.fake.calls.count(("select", "invoices")) == 3
+
+    def test_selected_ids_scoped_to_user(self, client):
+        response = client.post("/api/bulk/export-tally", json={"invoice_ids": ["2", "other"]})
+        root = ET.fromstring(response.content)
+        assert [v.findtext("VOUCHERNUMBER") for v in root.iter("VOUCHER")] == ["INV/2"]
+
+    def test_nothing_to_export(self, client):
+        response = client.post("/api/bulk/export-tally", json={"invoice_ids": ["other"]})
+        assert response.status_code == 404
@@ -0,0 +1,231 @@
+"""
+Tests for streaming upload ingestion: multipart parsing as the body arrives,
+size / magic byte / image header checks and the streamed storage upload
+"""
+
+import asyncio
+import io
+import struct
+from urllib.parse import unquote
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import documents
+from app.core import caching
+from app.services import upload_stream, virus_scanner
+from app.services.upload_stream import (
+    IncomingFile, MultipartFileStream, StorageUpload, UploadRejected, image_dimensions, sniff_content_type
+)
+from conftest import FakeSupabase
+
+BOUNDARY = "----test-boundary"
+
+
+def png_header(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sIIBBBBB", 13, b"IHDR", width, height, 8, 2, 0, 0, 0)
+
+
+def png(width=40, height=30):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def multipart_body(content, filename="bill.png", content_type="image/png"):
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class FakeRequest:
+    """Request whose body arrives in small pieces; counts the pieces read"""
+
+    def __init__(self, body, piece=7):
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        self.pieces = [body[i:i + piece] for i in range(0, len(body), piece)]
+        self.read = 0
+
+    async def stream(self):
+        for piece in self.pieces:
+            self.read += 1
+            yield piece
+        yield b""
+
+
+class TestImageHeaders:
+    @pytest.mark.parametrize("fmt", ["PNG", "JPEG", "WEBP"])
+    def test_dimensions_match_pillow(self, fmt):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGB", (123, 45), "white").save(buffer, fmt)
+        assert image_dimensions(buffer) == (123, 45)
+
+    def test_jpeg_frame_after_large_app_segment(self):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48)).save(buffer, "JPEG")
+        jpeg = buffer.getvalue()
+        # 60KB APP1 segment between SOI and the frame header
+        app1 = b"\xff\xe1" + struct.pack(">H", 60000) + b"\0" * 59998
+        assert image_dimensions(io.BytesIO(jpeg[:2] + app1 + jpeg[2:])) == (64, 48)
+
+    def test_bomb_header_read_without_decoding(self):
+        assert image_dimensions(io.BytesIO(png_header(20000, 20000))) == (20000, 20000)
+
+    def test_sniffing(self):
+        assert sniff_content_type(b"%PDF-1.7\n") == "application/pdf"
+        assert sniff_content_type(b"\0\0\0\x18ftypheic") == "image/heic"
+        assert sniff_content_type(b"MZ\x90\0") is None
+
+
+class TestIncomingFile:
+    def test_hash_size_and_head_tracked_per_chunk(self):
+        incoming = IncomingFile("a.pdf", "application/pdf", max_bytes=10_000)
+        for chunk in (b"%PDF-1.4\n", b"x" * 3000, b"y" * 10):
+            incoming.write(chunk)
+        assert incoming.size == 3019 and incoming.sniffed
+        assert incoming.sha256 == virus_scanner.sha256_hex(b"%PDF-1.4\n" + b"x" * 3000 + b"y" * 10)
+        assert incoming.read() == b"%PDF-1.4\n" + b"x" * 3000 + b"y" * 10
+        incoming.close()
+
+    def test_rejects_as_soon_as_limit_crossed(self):
+        incoming = IncomingFile("a.pdf", "application/pdf", max_bytes=100)
+        incoming.write(b"x" * 100)
+        with pytest.raises(UploadRejected) as error:
+            incoming.write(b"x")
+        assert error.value.status_code == 413
+
+
+class TestMultipartFileStream:
+    def test_file_part_reassembled_from_small_pieces(self):
+        content = png()
+        request = FakeRequest(multipart_body(content))
+
+        async def read():
+            stream = MultipartFileStream(request, "file")
+            await stream.open()
+            return stream.filename, stream.content_type, b"".join([chunk async for chunk in stream])
+
+        assert asyncio.run(read()) == ("bill.png", "image/png", content)
+
+    def test_oversized_upload_stops_reading(self):
+        request = FakeRequest(multipart_body(b"%PDF-1.4\n" + b"x" * 50_000, "a.pdf", "application/pdf"), piece=1024)
+        storage = StorageUpload("bucket", "a.pdf", "application/pdf", url="http://storage", key="k",
+                                transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+
+        async def read():
+            stream = MultipartFileStream(request, "file")
+            await stream.open()
+            try:
+                await upload_stream.read_upload(stream, IncomingFile("a.pdf", "application/pdf", 10_000), storage)
+            finally:
+                await storage.abort()
+
+        with pytest.raises(UploadRejected):
+            asyncio.run(read())
+        assert request.read < len(request.pieces) // 3
+
+    def test_missing_file_field(self):
+        body = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="note"\r\n\r\nhi\r\n--{BOUNDARY}--\r\n'
+
+        async def read():
+            await MultipartFileStream(FakeRequest(body.encode()), "file").open()
+
+        with pytest.raises(UploadRejected) as error:
+            asyncio.run(read())
+        assert error.value.status_code == 400
+
+
+class FakeStorage:
+    """Storage REST endpoint behind httpx.MockTransport, writing into FakeSupabase.files"""
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.requests = 0
+        self.stored = []
+
+    async def __call__(self, request):
+        self.requests += 1
+        path = request.url.path.split("/storage/v1/object/invoice-documents/", 1)[1]
+        body = b"".join([chunk async for chunk in request.stream])
+        self.fake.files[unquote(path)] = body
+        self.stored.append(unquote(path))
+        return httpx.Response(200, json={"Key": path})
+
+
+@pytest.fixture
+def upload_app(monkeypatch):
+    fake = FakeSupabase({"documents": []})
+    storage = FakeStorage(fake)
+    monkeypatch.setattr(documents, "supabase", fake)
+    monkeypatch.setattr(documents, "VIRUS_SCAN_ENABLED", False)
+    monkeypatch.setattr(documents, "_storage_upload", lambda path, content_type: StorageUpload(
+        "invoice-documents", path, content_type, url="http://storage", key="k",
+        transport=httpx.MockTransport(storage)))
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/api/documents")
+    client = TestClient(app)
+    client.fake, client.storage = fake, storage
+    return client
+
+
+def post(client, content, filename="bill.png", content_type="image/png"):
+    return client.post("/api/documents/upload", content=multipart_body(content, filename, content_type),
+                       headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+
+
+class TestUploadEndpoint:
+    def test_anonymous_upload_streamed_to_storage(self, upload_app):
+        content = png()
+        response = post(upload_app, content)
+
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert body["status"] == "uploaded" and body["file_size"] == len(content)
+        assert upload_app.fake.files == {body["storage_path"]: content}
+        assert upload_app.fake.tables["documents"][0]["file_size"] == len(content)
+
+    def test_renamed_executable_never_reaches_storage(self, upload_app):
+        response = post(upload_app, b"MZ\x90\0" + b"\0" * 2000, "invoice.pdf", "application/pdf")
+
+        assert response.status_code == 415
+        assert upload_app.storage.requests == 0 and upload_app.fake.tables["documents"] == []
+
+    def test_too_large(self, upload_app, monkeypatch):
+        monkeypatch.setattr(documents, "MAX_UPLOAD_BYTES", 2048)
+        response = post(upload_app, b"%PDF-1.4\n" + b"x" * 4096, "a.pdf", "application/pdf")
+
+        assert response.status_code == 413
+        assert upload_app.fake.files == {} and upload_app.fake.tables["documents"] == []
+
+    def test_image_bomb_rejected_from_header(self, upload_app):
+        response = post(upload_app, png_header(20000, 20000) + b"\0" * 2000)
+
+        assert response.status_code == 413
+        assert upload_app.fake.files == {}
+
+    def test_unknown_file_is_quarantined(self, upload_app, monkeypatch):
+        monkeypatch.setattr(caching, "get_redis_client", lambda: None)
+        scanner = virus_scanner.VirusTotalScanner(
+            api_key="k", transport=httpx.MockTransport(lambda request: httpx.Response(404)), max_polls=0)
+        monkeypatch.setattr(virus_scanner, "_scanner", scanner)
+        monkeypatch.setattr(documents, "VIRUS_SCAN_ENABLED", True)
+        monkeypatch.setattr(documents, "_start_background_scan", lambda document, content: content.close())
+
+        response = post(upload_app, png())
+
+        assert response.status_code == 200, response.text
+        path = response.json()["storage_path"]
+        assert response.json()["status"] == "quarantined" and path.startswith(documents.QUARANTINE_PREFIX)
+        # Streamed straight into quarantine - never stored at the normal path
+        assert upload_app.storage.stored == [path] and list(upload_app.fake.files) == [path]
+        row = upload_app.fake.tables["documents"][0]
+        assert row["status"] == "quarantined" and row["scan_started_at"]
@@ -0,0 +1,290 @@
+"""
+Tests for hash-first virus scanning: verdict cache, async VirusTotal client,
+clamd INSTREAM and the upload quarantine
+"""
+
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import threading
+
+import httpx
+import pytest
+
+from app.api import documents
+from app.core import caching
+from app.services import virus_scanner
+from app.services.virus_scanner import ClamAVScanner, VirusTotalScanner, sha256_hex
+from conftest import FakeSupabase
+
+CLEAN_STATS = {"malicious": 0, "suspicious": 0, "undetected": 60, "harmless": 5}
+BAD_STATS = {"malicious": 12, "suspicious": 1, "undetected": 40, "harmless": 0}
+
+
+class FakeVirusTotal:
+    """httpx.MockTransport handler: known hashes, uploads and analyses"""
+
+    def __init__(self, known=None, analysis_stats=CLEAN_STATS, queued_polls=1):
+        self.known = dict(known or {})
+        self.lookup_error = None  # status code or exception for hash lookups
+        self.analysis_stats = analysis_stats
+        self.queued_polls = queued_polls
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append((request.method, request.url.path))
+        path = request.url.path.replace("/api/v3", "")
+        if request.method == "GET" and path.startswith("/files/"):
+            if isinstance(self.lookup_error, Exception):
+                raise self.lookup_error
+            if self.lookup_error:
+                return httpx.Response(self.lookup_error)
+            stats = self.known.get(path[len("/files/"):])
+            if stats is None:
+                return httpx.Response(404, json={"error": {"code": "NotFoundError"}})
+            return httpx.Response(200, json={"data": {"attributes": {"last_analysis_stats": stats}}})
+        if request.method == "POST" and path == "/files":
+            assert b"invoice-bytes" in request.read()
+            return httpx.Response(200, json={"data": {"id": "analysis-1"}})
+        if request.method == "GET" and path == "/analyses/analysis-1":
+            if self.queued_polls:
+                self.queued_polls -= 1
+                return httpx.Response(200, json={"data": {"attributes": {"status": "queued"}}})
+            return httpx.Response(200, json={"data": {"attributes": {
+                "status": "completed", "stats": self.analysis_stats}}})
+        return httpx.Response(500)
+
+
+@pytest.fixture
+def virustotal(monkeypatch, tmp_path):
+    monkeypatch.setattr(caching, "get_redis_client", lambda: None)
+    monkeypatch.setattr(virus_scanner, "_fallback", ClamAVScanner(socket_path=str(tmp_path / "missing.ctl")))
+    virus_scanner.get_verdict_cache().clear()
+    service = FakeVirusTotal()
+    scanner = VirusTotalScanner(api_key="test-key", transport=httpx.MockTransport(service), poll_interval=0)
+    monkeypatch.setattr(virus_scanner, "_scanner", scanner)
+    yield service
+    virus_scanner.get_verdict_cache().clear()
+
+
+class TestCheckFile:
+    def test_known_hash_answered_once_then_cached(self, virustotal):
+        content = b"invoice-bytes"
+        virustotal.known[sha256_hex(content)] = CLEAN_STATS
+
+        async def check_twice():
+            return await virus_scanner.check_file(content), await virus_scanner.check_file(content)
+
+        first, second = asyncio.run(check_twice())
+        assert first["status"] == second["status"] == "clean"
+        assert len(virustotal.requests) == 1
+
+    def test_malicious_hash(self, virustotal):
+        content = b"invoice-bytes"
+        virustotal.known[sha256_hex(content)] = BAD_STATS
+
+        verdict = asyncio.run(virus_scanner.check_file(content))
+        assert verdict["status"] == "malicious" and not verdict["safe"]
+        assert virus_scanner.verdict_message(verdict) == "Malware detected: 12 threats found"
+
+    def test_unknown_file_is_pending_without_upload(self, virustotal):
+        verdict = asyncio.run(virus_scanner.check_file(b"invoice-bytes"))
+        assert verdict["status"] == "pending"
+        assert virustotal.requests == [("GET", f"/api/v3/files/{sha256_hex(b'invoice-bytes')}")]
+
+    def test_background_scan_uploads_polls_and_caches(self, virustotal):
+        content = b"invoice-bytes"
+        verdict = asyncio.run(virus_scanner.scan_in_background(content, "bill.pdf"))
+        assert verdict["status"] == "clean"
+        assert [method for method, _ in virustotal.requests] == ["GET", "POST", "GET", "GET"]
+
+        # The next upload of the same bytes doesn't go to VirusTotal
+        assert asyncio.run(virus_scanner.check_file(content))["status"] == "clean"
+        assert len(virustotal.requests) == 4
+
+    def test_pending_is_not_cached(self, virustotal):
+        assert asyncio.run(virus_scanner.check_file(b"invoice-bytes"))["status"] == "pending"
+        assert virus_scanner.get_verdict_cache().get(sha256_hex(b"invoice-bytes")) is None
+
+    @pytest.mark.parametrize("error", [429, 503, httpx.ConnectTimeout("timed out")])
+    def test_failed_lookup_is_unscanned_not_pending(self, virustotal, error):
+        virustotal.lookup_error = error
+
+        verdict = asyncio.run(virus_scanner.check_file(b"invoice-bytes"))
+        assert verdict["status"] == "unscanned" and verdict["safe"]
+        assert verdict["message"].startswith("Hash lookup failed")
+        assert virus_scanner.get_verdict_cache().get(sha256_hex(b"invoice-bytes")) is None
+
+    def test_background_scan_uploads_after_failed_lookup(self, virustotal):
+        virustotal.lookup_error = 503
+        verdict = asyncio.run(virus_scanner.scan_in_background(b"invoice-bytes", "bill.pdf"))
+        assert verdict["status"] == "clean"
+        assert [method for method, _ in virustotal.requests] == ["GET", "POST", "GET", "GET"]
+
+
+class FakeClamd(threading.Thread):
+    """clamd on a unix socket: answers zPING and zINSTREAM"""
+
+    def __init__(self, path, signature=b"EICAR"):
+        super().__init__(daemon=True)
+        self.signature = signature
+        self.streams = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                self._handle(conn.makefile("rb"), conn)
+
+    def _handle(self, reader, conn):
+        command = b""
+        while not command.endswith(b"\0"):
+            command += reader.read(1)
+        if command == b"zPING\0":
+            conn.sendall(b"PONG\0")
+            return
+        chunks = []
+        while True:
+            size = struct.unpack("!L", reader.read(4))[0]
+            if not size:
+                break
+            chunks.append(reader.read(size))
+        self.streams.append(chunks)
+        data = b"".join(chunks)
+        reply = b"stream: Eicar-Test-Signature FOUND\0" if self.signature in data else b"stream: OK\0"
+        conn.sendall(reply)
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="unix sockets required")
+class TestClamAV:
+    @pytest.fixture
+    def clamd(self):
+        with tempfile.TemporaryDirectory() as directory:
+            server = FakeClamd(os.path.join(directory, "clamd.ctl"))
+            server.start()
+            yield server, ClamAVScanner(socket_path=os.path.join(directory, "clamd.ctl"))
+            server.close()
+
+    def test_stream_is_sent_in_length_prefixed_chunks(self, clamd):
+        server, scanner = clamd
+        content = b"x" * (virus_scanner.INSTREAM_CHUNK_SIZE * 2 + 10)
+
+        assert scanner.enabled
+        assert scanner.scan_stream([content])["status"] == "clean"
+        assert [len(chunk) for chunk in server.streams[0]] == [
+            virus_scanner.INSTREAM_CHUNK_SIZE, virus_scanner.INSTREAM_CHUNK_SIZE, 10]
+
+    def test_signature_found(self, clamd):
+        _, scanner = clamd
+        verdict = asyncio.run(scanner.scan(b"header EICAR trailer"))
+        assert verdict["status"] == "malicious"
+        assert verdict["details"]["result"] == "Eicar-Test-Signature"
+
+    def test_failed_virustotal_lookup_falls_back_to_clamav(self, clamd, virustotal, monkeypatch):
+        server, scanner = clamd
+        monkeypatch.setattr(virus_scanner, "_fallback", scanner)
+        virustotal.lookup_error = 429
+
+        verdict = asyncio.run(virus_scanner.check_file(b"header EICAR trailer"))
+        assert verdict["status"] == "malicious"
+        assert len(server.streams) == 1
+
+    def test_unreachable_daemon_disables_scanner(self, tmp_path):
+        scanner = ClamAVScanner(socket_path=str(tmp_path / "missing.ctl"))
+        assert not scanner.enabled
+        assert scanner.scan_stream([b"data"])["scanned"] is False
+
+
+class TestQuarantine:
+    @pytest.fixture
+    def fake_db(self, monkeypatch, virustotal):
+        path = documents.QUARANTINE_PREFIX + "documents/anonymous/bill.pdf"
+        fake = FakeSupabase({"documents": [{
+            "id": "doc-1", "user_id": None, "file_name": "bill.pdf",
+            "storage_path": path, "status": "quarantined"}]})
+        fake.files[path] = b"invoice-bytes"
+        monkeypatch.setattr(documents, "supabase", fake)
+        return fake
+
+    def test_clean_file_is_released(self, fake_db):
+        document = dict(fake_db.tables["documents"][0])
+
+        assert asyncio.run(documents._release_quarantined(document, b"invoice-bytes")) == "released"
+        row = fake_db.tables["documents"][0]
+        assert row["status"] == "uploaded" and row["storage_path"] == "documents/anonymous/bill.pdf"
+        assert fake_db.files == {"documents/anonymous/bill.pdf": b"invoice-bytes"}
+
+    def test_second_release_is_skipped(self, fake_db):
+        document = dict(fake_db.tables["documents"][0])
+
+        async def release_twice():
+            first = await documents._release_quarantined(document, b"invoice-bytes")
+            return first, await documents._release_quarantined(document, b"invoice-bytes")
+
+        assert asyncio.run(release_twice()) == ("released", "skipped")
+
+    def test_failed_move_leaves_row_in_quarantine(self, fake_db, monkeypatch):
+        document = dict(fake_db.tables["documents"][0])
+
+        def move(source, destination):
+            raise RuntimeError("storage unavailable")
+
+        monkeypatch.setattr(fake_db, "_move", move)
+        with pytest.raises(RuntimeError):
+            asyncio.run(documents._release_quarantined(document, b"invoice-bytes"))
+        row = fake_db.tables["documents"][0]
+        assert row["status"] == "quarantined" and row["storage_path"] == document["storage_path"]
+        assert list(fake_db.files) == [document["storage_path"]]
+
+    def test_malicious_file_is_removed(self, fake_db, virustotal):
+        virustotal.analysis_stats = BAD_STATS
+        document = dict(fake_db.tables["documents"][0])
+
+        assert asyncio.run(documents._release_quarantined(document, b"invoice-bytes")) == "rejected"
+        assert fake_db.tables["documents"][0]["status"] == "rejected"
+        assert fake_db.removed == [[document["storage_path"]]]
+
+    def test_quarantined_document_is_not_processed(self, fake_db):
+        with pytest.raises(documents.HTTPException) as error:
+            asyncio.run(documents._process_document("doc-1"))
+        assert error.value.status_code == 409
+        assert fake_db.tables["documents"][0]["status"] == "quarantined"
+
+    def test_resume_restarts_scans(self, fake_db):
+        async def resume():
+            count = await documents.resume_quarantined_documents()
+            await asyncio.gather(*documents._background_scans)
+            return count
+
+        assert asyncio.run(resume()) == 1
+        assert fake_db.tables["documents"][0]["status"] == "uploaded"
+
+    def test_resume_skips_scans_another_worker_holds(self, fake_db):
+        row = fake_db.tables["documents"][0]
+        row["scan_started_at"] = documents.datetime.now().isoformat()
+
+        assert asyncio.run(documents.resume_quarantined_documents()) == 0
+        assert ("download", row["storage_path"]) not in fake_db.calls
+
+        # Lease ran out (its worker died): taken over
+        expired = documents.datetime.now() - documents.timedelta(seconds=documents.SCAN_LEASE_SECONDS + 60)
+        row["scan_started_at"] = expired.isoformat()
+
+        async def resume():
+            count = await documents.resume_quarantined_documents()
+            await asyncio.gather(*documents._background_scans)
+            return count
+
+        assert asyncio.run(resume()) == 1
+        assert row["status"] == "uploaded" and row["scan_started_at"] > expired.isoformat()
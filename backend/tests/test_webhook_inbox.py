@@ -0,0 +1,311 @@
+"""
+Tests for store-then-process Razorpay webhooks (POST /api/payments/webhook)
+"""
+
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.api import payments
+from app.core.config import settings
+from app.core.database import get_db
+from app.services.razorpay_service import razorpay_service
+from app.services.webhook_inbox import WebhookConsumer, ordering_key, store_event, webhook_event_id
+
+SECRET = "whsec_test"
+
+# webhook_logs as created by WEBHOOK_LOGS_MIGRATION.sql + ADD_WEBHOOK_INBOX.sql, in SQLite
+WEBHOOK_LOGS = """
+CREATE TABLE webhook_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id VARCHAR(255) UNIQUE NOT NULL,
+    event_type VARCHAR(100) NOT NULL,
+    subscription_id VARCHAR(255),
+    user_id VARCHAR(255),
+    ordering_key VARCHAR(255),
+    payload TEXT NOT NULL,
+    signature VARCHAR(255) NOT NULL,
+    status VARCHAR(50) NOT NULL DEFAULT 'pending',
+    attempt_count INTEGER NOT NULL DEFAULT 0,
+    last_attempt_at TIMESTAMP,
+    error_message TEXT,
+    processed_at TIMESTAMP,
+    next_attempt_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def event(event_type="subscription.pending", subscription_id="sub_1", **payload):
+    body = {"entity": "event", "event": event_type, "created_at": 1760000000, "payload": payload}
+    if subscription_id:
+        body["payload"]["subscription"] = {"entity": {"id": subscription_id, "notes": {"user_id": "u1"}}}
+    return body
+
+
+def sign(raw_body):
+    return hmac.new(SECRET.encode(), raw_body, hashlib.sha256).hexdigest()
+
+
+def rows(sessions):
+    db = sessions()
+    try:
+        return {r[0]: {"status": r[1], "attempt_count": r[2], "error": r[3], "subscription_id": r[4]}
+                for r in db.execute(text(
+                    "SELECT event_id, status, attempt_count, error_message, subscription_id FROM webhook_logs"))}
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'webhooks.db'}", connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text(WEBHOOK_LOGS))
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(settings, "RAZORPAY_WEBHOOK_SECRET", SECRET, raising=False)
+
+
+def store(sessions, event_id, body):
+    db = sessions()
+    try:
+        raw = json.dumps(body).encode()
+        return store_event(db, event_id, body, raw, sign(raw))
+    finally:
+        db.close()
+
+
+class TestInbox:
+    def test_event_id_and_ordering_key(self):
+        body = event(payment={"entity": {"id": "pay_1", "subscription_id": "sub_9"}}, subscription_id=None)
+        assert webhook_event_id(body, b"{}", "evt_header") == "evt_header"
+        assert webhook_event_id({"id": "evt_1"}, b"{}") == "evt_1"
+        assert webhook_event_id(body, b"{}").startswith("body_")
+        assert ordering_key(body) == "sub_9"
+        assert ordering_key(event(subscription_id="sub_2")) == "sub_2"
+        assert ordering_key(event(subscription_id=None, payment={"entity": {"id": "pay_3", "order_id": "order_3"}})) \
+            == "order_3"
+
+    def test_store_is_idempotent(self, sessions):
+        assert store(sessions, "evt_1", event()) is True
+        assert store(sessions, "evt_1", event()) is False
+        assert rows(sessions) == {"evt_1": {"status": "pending", "attempt_count": 0, "error": None,
+                                            "subscription_id": "sub_1"}}
+
+
+class TestConsumer:
+    def test_per_subscription_order(self, sessions):
+        applied, lock = [], threading.Lock()
+
+        def processor(body, db, signature, event_id):
+            time.sleep(0.001 * (hash(event_id) % 3))
+            with lock:
+                applied.append((body["payload"]["subscription"]["entity"]["id"], event_id))
+            return True, "ok"
+
+        consumer = WebhookConsumer(session_factory=sessions, processor=processor, workers=3)
+        for i in range(30):
+            sub = f"sub_{i % 4}"
+            store(sessions, f"evt_{i:02d}", event(subscription_id=sub))
+            consumer.submit(f"evt_{i:02d}", sub)
+        consumer.join()
+        consumer.stop()
+
+        for sub in {s for s, _ in applied}:
+            ids = [event_id for s, event_id in applied if s == sub]
+            assert ids == sorted(ids)
+        assert len(applied) == 30 and consumer.processed == 30
+        assert {r["status"] for r in rows(sessions).values()} == {"processed"}
+
+    def test_order_holds_across_processes(self, sessions):
+        applied, lock = [], threading.Lock()
+
+        def processor(body, db, signature, event_id):
+            time.sleep(0.001 * (hash(event_id) % 3))
+            with lock:
+                applied.append(event_id)
+            return True, "ok"
+
+        # One consumer per gunicorn worker, each with its own in-process queues
+        consumers = [WebhookConsumer(session_factory=sessions, processor=processor, workers=2) for _ in range(3)]
+        for i in range(12):
+            store(sessions, f"evt_{i:02d}", event(subscription_id="sub_1"))
+        for i in reversed(range(12)):
+            consumers[i % 3].submit(f"evt_{i:02d}", "sub_1")
+        for consumer in consumers:
+            consumer.join()
+            consumer.stop()
+
+        assert applied == sorted(applied) and len(applied) == 12
+        assert {r["status"] for r in rows(sessions).values()} == {"processed"}
+
+    def test_failed_event_holds_back_later_ones(self, sessions):
+        outcomes = {"evt_1": iter([(False, "declined"), (True, "ok")])}
+        applied = []
+
+        def processor(body, db, signature, event_id):
+            applied.append(event_id)
+            return next(outcomes[event_id]) if event_id in outcomes else (True, "ok")
+
+        consumer = WebhookConsumer(session_factory=sessions, processor=processor)
+        store(sessions, "evt_1", event())
+        store(sessions, "evt_2", event())
+        store(sessions, "evt_3", event(subscription_id="sub_2"))
+        assert consumer.process("evt_1") == "failed"
+        assert consumer.process("evt_2") is None
+        assert consumer.process("evt_3") == "processed"
+        assert rows(sessions)["evt_2"]["status"] == "pending"
+
+        # Replaying the failed event applies the one held back behind it
+        assert consumer.replay() == [("evt_1", "processed")]
+        assert applied == ["evt_1", "evt_3", "evt_1", "evt_2"]
+        assert rows(sessions)["evt_2"]["status"] == "processed"
+
+    def test_failed_event_is_retried_before_later_ones(self, sessions):
+        # subscription.activated arrives before the subscription row exists
+        outcomes = {"evt_1": iter([(False, "Subscription not found"), (True, "ok")])}
+        applied = []
+
+        def processor(body, db, signature, event_id):
+            applied.append(event_id)
+            return next(outcomes[event_id]) if event_id in outcomes else (True, "ok")
+
+        consumer = WebhookConsumer(session_factory=sessions, processor=processor, retry_base_delay=0)
+        store(sessions, "evt_1", event("subscription.activated"))
+        store(sessions, "evt_2", event("subscription.charged"))
+        assert consumer.process("evt_1") == "failed"
+        assert consumer.process("evt_2") is None
+
+        assert consumer.retry_due() == 1
+        consumer.join()
+        consumer.stop()
+        assert applied == ["evt_1", "evt_1", "evt_2"]
+        assert {r["status"] for r in rows(sessions).values()} == {"processed"}
+
+    def test_dead_letter_releases_key(self, sessions):
+        applied = []
+
+        def processor(body, db, signature, event_id):
+            applied.append(event_id)
+            return (False, "broken") if event_id == "evt_1" else (True, "ok")
+
+        consumer = WebhookConsumer(session_factory=sessions, processor=processor, max_attempts=2,
+                                   retry_base_delay=0)
+        store(sessions, "evt_1", event())
+        store(sessions, "evt_2", event())
+        assert consumer.process("evt_1") == "failed"
+        assert consumer.retry_due() == 1
+        consumer.join()
+        consumer.stop()
+
+        assert applied == ["evt_1", "evt_1", "evt_2"]
+        assert rows(sessions)["evt_1"]["status"] == "dead" and rows(sessions)["evt_1"]["attempt_count"] == 2
+        assert rows(sessions)["evt_2"]["status"] == "processed"
+        assert consumer.retry_due() == 0
+
+    def test_claim_prevents_double_processing(self, sessions):
+        calls = []
+        consumer = WebhookConsumer(session_factory=sessions, processor=lambda *a: calls.append(a) or (True, "ok"))
+        store(sessions, "evt_1", event())
+        assert consumer.process("evt_1") == "processed"
+        assert consumer.process("evt_1") is None
+        assert len(calls) == 1
+
+    def test_crash_is_recorded_and_replayed(self, sessions):
+        outcomes = iter([RuntimeError("db down"), (True, "ok")])
+
+        def processor(*args):
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        consumer = WebhookConsumer(session_factory=sessions, processor=processor)
+        store(sessions, "evt_1", event())
+        assert consumer.process("evt_1") == "failed"
+        assert rows(sessions)["evt_1"]["error"] == "db down"
+
+        assert consumer.replay(dry_run=True) == [("evt_1", None)]
+        assert consumer.replay() == [("evt_1", "processed")]
+        assert rows(sessions)["evt_1"]["attempt_count"] == 2
+
+    def test_recover_requeues_pending(self, sessions):
+        seen = []
+        consumer = WebhookConsumer(session_factory=sessions, processor=lambda b, db, s, e: seen.append(e) or (True, ""))
+        store(sessions, "evt_1", event())
+        store(sessions, "evt_2", event())
+        assert consumer.recover() == 2
+        consumer.join()
+        consumer.stop()
+        assert seen == ["evt_1", "evt_2"]
+
+    def test_razorpay_processor_records_status(self, sessions, secret):
+        consumer = WebhookConsumer(session_factory=sessions)
+        store(sessions, "evt_1", event("subscription.pending"))
+        assert consumer.process("evt_1") == "processed"
+        assert rows(sessions)["evt_1"]["attempt_count"] == 1
+
+
+class TestWebhookEndpoint:
+    @pytest.fixture
+    def client(self, sessions, secret, monkeypatch):
+        submitted = []
+        monkeypatch.setattr(payments.webhook_consumer, "submit", lambda event_id, key: submitted.append((event_id, key)))
+
+        def db():
+            session = sessions()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        app = FastAPI()
+        app.include_router(payments.router, prefix="/api/payments")
+        app.dependency_overrides[get_db] = db
+        client = TestClient(app)
+        client.submitted = submitted
+        return client
+
+    def post(self, client, raw, signature=None, event_id="evt_1"):
+        return client.post("/api/payments/webhook", content=raw, headers={
+            "Content-Type": "application/json",
+            "X-Razorpay-Signature": sign(raw) if signature is None else signature,
+            "X-Razorpay-Event-Id": event_id,
+        })
+
+    def test_signed_raw_body_is_queued_once(self, client, sessions):
+        # Razorpay's own formatting - re-serialising the parsed dict would change the bytes
+        raw = b'{"entity": "event",\n "event": "subscription.charged", "payload": {"subscription": {"entity": {"id": "sub_1"}}}}'
+        first = self.post(client, raw)
+        assert first.status_code == 200 and first.json()["message"] == "Queued"
+        assert client.submitted == [("evt_1", "sub_1")]
+
+        again = self.post(client, raw)
+        assert again.status_code == 200 and again.json()["message"] == "Already received"
+        assert len(client.submitted) == 1
+        assert rows(sessions)["evt_1"]["status"] == "pending"
+
+    def test_bad_signature_is_not_stored(self, client, sessions):
+        raw = json.dumps(event()).encode()
+        assert self.post(client, raw, signature=sign(str(json.loads(raw)).encode())).status_code == 400
+        assert self.post(client, raw, signature="").status_code == 400
+        assert rows(sessions) == {} and client.submitted == []
+
+    def test_signature_helper(self, secret):
+        raw = b'{"a": 1}'
+        assert razorpay_service.verify_webhook_signature(raw, sign(raw))
+        assert not razorpay_service.verify_webhook_signature(raw + b" ", sign(raw))